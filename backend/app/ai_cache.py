@@ -0,0 +1,297 @@
+"""Content-addressed cache for AI provider responses.
+
+Requests are keyed by a SHA-256 of the normalized request (kind, provider,
+model and parameters with whitespace/case folded), looked up in an
+in-memory LRU with TTL and then in an optional second tier (AI_CACHE_TIER=
+disk or postgres). Concurrent identical misses are collapsed by
+single-flight, so only one upstream call is made and every waiter shares its
+result. Failures are never cached.
+
+Image URLs returned by OpenAI expire after about an hour, so image entries
+use the shorter AI_CACHE_IMAGE_TTL.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+
+from psycopg2.extras import Json
+
+from db import get_db
+
+log = logging.getLogger(__name__)
+
+CACHE_ENABLED = os.getenv('AI_CACHE', '1').lower() not in ('0', 'false', 'no')
+CACHE_MAX_ENTRIES = int(os.getenv('AI_CACHE_MAX_ENTRIES', '1024'))
+CACHE_TTL = float(os.getenv('AI_CACHE_TTL', str(24 * 3600)))
+CACHE_IMAGE_TTL = float(os.getenv('AI_CACHE_IMAGE_TTL', '3000'))
+CACHE_TIER = os.getenv('AI_CACHE_TIER', 'none')
+CACHE_DIR = os.getenv('AI_CACHE_DIR', '/tmp/executive-disorder-ai-cache')
+
+
+def normalize_text(text):
+    return ' '.join(str(text).split()).casefold()
+
+
+def request_key(kind, provider, model, params):
+    normalized = {name: normalize_text(value) if isinstance(value, str) else value
+                  for name, value in params.items()}
+    raw = json.dumps({'kind': kind, 'provider': provider, 'model': model, 'params': normalized},
+                     sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
+class LRUCache:
+    """Thread-safe LRU with per-entry expiry"""
+
+    def __init__(self, max_entries=CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at < time.time():
+                del self._entries[key]
+                self.expirations += 1
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._entries[key] = (value, time.time() + ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class DiskTier:
+    """One JSON file per key; expiry is stored alongside the value"""
+
+    def __init__(self, directory=CACHE_DIR):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+    def _path(self, key):
+        return self.directory / key[:2] / f'{key}.json'
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if entry['expires_at'] < time.time():
+            path.unlink(missing_ok=True)
+            return None
+        return entry['value']
+
+    def set(self, key, value, ttl):
+        path = self._path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(f'.{os.getpid()}.{threading.get_ident()}.tmp')
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump({'value': value, 'expires_at': time.time() + ttl}, f)
+        os.replace(tmp, path)
+
+
+class PostgresTier:
+    """Shared across workers and replicas via the ai_cache table"""
+
+    def get(self, key):
+        with get_db() as conn, conn.cursor() as cur:
+            cur.execute("SELECT value FROM ai_cache WHERE key = %s AND expires_at > now()", (key,))
+            row = cur.fetchone()
+        return row['value'] if row else None
+
+    def set(self, key, value, ttl):
+        with get_db() as conn, conn.cursor() as cur:
+            cur.execute("DELETE FROM ai_cache WHERE expires_at < now()")
+            cur.execute(
+                "INSERT INTO ai_cache (key, value, expires_at) "
+                "VALUES (%s, %s, now() + make_interval(secs => %s)) "
+                "ON CONFLICT (key) DO UPDATE SET value = EXCLUDED.value, expires_at = EXCLUDED.expires_at",
+                (key, Json(value), ttl)
+            )
+
+
+CACHE_TIERS = {
+    'disk': DiskTier,
+    'postgres': PostgresTier,
+}
+
+
+class _Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class ResponseCache:
+    def __init__(self, memory=None, tier=None):
+        self.memory = memory or LRUCache()
+        self.tier = tier
+        self._flights = {}
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'tier_hits': 0, 'misses': 0, 'coalesced': 0,
+                       'upstream_calls': 0, 'upstream_errors': 0, 'tier_errors': 0}
+
+    def _count(self, name):
+        with self._lock:
+            self._stats[name] += 1
+
+    def _tier_get(self, key):
+        if self.tier is None:
+            return None
+        try:
+            return self.tier.get(key)
+        except Exception:
+            log.exception('AI cache tier read failed')
+            self._count('tier_errors')
+            return None
+
+    def _tier_set(self, key, value, ttl):
+        if self.tier is None:
+            return
+        try:
+            self.tier.set(key, value, ttl)
+        except Exception:
+            log.exception('AI cache tier write failed')
+            self._count('tier_errors')
+
+    def lookup(self, key):
+        """Cached value from either tier, or None (counted as a hit or miss)"""
+        value = self.memory.get(key)
+        if value is not None:
+            self._count('hits')
+            return value
+        value = self._tier_get(key)
+        if value is not None:
+            self._count('tier_hits')
+            return value
+        self._count('misses')
+        return None
+
+    def store(self, key, value, ttl=CACHE_TTL):
+        self._tier_set(key, value, ttl)
+        self.memory.set(key, value, ttl)
+
+    def get_or_compute(self, key, compute, ttl=CACHE_TTL):
+        value = self.memory.get(key)
+        if value is not None:
+            self._count('hits')
+            return value
+
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+            else:
+                self._stats['coalesced'] += 1
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.value
+
+        try:
+            value = self._tier_get(key)
+            if value is not None:
+                self._count('tier_hits')
+            else:
+                self._count('misses')
+                self._count('upstream_calls')
+                try:
+                    value = compute()
+                except Exception:
+                    self._count('upstream_errors')
+                    raise
+                self._tier_set(key, value, ttl)
+            self.memory.set(key, value, ttl)
+            flight.value = value
+            return value
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]
+            flight.done.set()
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        lookups = stats['hits'] + stats['tier_hits'] + stats['misses']
+        stats.update(
+            entries=len(self.memory),
+            max_entries=self.memory.max_entries,
+            evictions=self.memory.evictions,
+            expirations=self.memory.expirations,
+            tier=CACHE_TIER if self.tier is not None else None,
+            hit_rate=round((stats['hits'] + stats['tier_hits']) / lookups, 4) if lookups else 0.0,
+        )
+        return stats
+
+
+class CachingProvider:
+    """Wraps an AI provider so identical requests are answered from the cache"""
+
+    def __init__(self, inner, cache):
+        self.inner = inner
+        self.cache = cache
+        self.name = inner.name
+
+    def _model(self, attr):
+        return getattr(self.inner, attr, None)
+
+    def _cards_key(self, theme, count):
+        return request_key('cards', self.name, self._model('card_model'), {'theme': theme, 'count': count})
+
+    def generate_cards(self, theme, count):
+        return self.cache.get_or_compute(self._cards_key(theme, count),
+                                         lambda: self.inner.generate_cards(theme, count))
+
+    def stream_cards(self, theme, count):
+        # Streams are not single-flighted; a completed stream fills the cache.
+        key = self._cards_key(theme, count)
+        cached = self.cache.lookup(key)
+        if cached is not None:
+            yield cached
+            return
+        self.cache._count('upstream_calls')
+        parts = []
+        for part in self.inner.stream_cards(theme, count):
+            parts.append(part)
+            yield part
+        self.cache.store(key, ''.join(parts))
+
+    def generate_image(self, prompt):
+        key = request_key('image', self.name, self._model('image_model'), {'prompt': prompt})
+        return self.cache.get_or_compute(key, lambda: self.inner.generate_image(prompt), ttl=CACHE_IMAGE_TTL)
+
+
+def _build_cache():
+    tier = CACHE_TIERS[CACHE_TIER]() if CACHE_TIER in CACHE_TIERS else None
+    return ResponseCache(tier=tier)
+
+
+cache = _build_cache()
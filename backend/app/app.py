@@ -1,31 +1,63 @@
-from flask import Flask, jsonify, request
+from flask import Flask, Response, jsonify, request, stream_with_context
 from flask_cors import CORS
-import psycopg2
-from psycopg2.extras import RealDictCursor
 import os
 from datetime import datetime
 import hashlib
-import openai
-import requests
+import hmac
+import time
+import zlib
+import psycopg2
+from db import PoolTimeout, get_db, pool_stats
+from compression import DecompressMiddleware, REQUEST_MAX_DECODED_BYTES, compress_response
+import metrics
+import saves
+import save_archive
+import retention
+import leaderboard
+import write_behind
+import jobs
+import telemetry
+from catalog import KINDS as CATALOG_KINDS, catalog
+import ai_cache
+from card_stream import CardArrayParser, sse_event, validate_card
+from providers import ProviderError, get_provider
 
 app = Flask(__name__)
+app.config['MAX_CONTENT_LENGTH'] = REQUEST_MAX_DECODED_BYTES
+app.wsgi_app = DecompressMiddleware(app.wsgi_app)
+metrics.init_app(app)
+app.after_request(compress_response)
 CORS(app)
 
-DB_CONFIG = {
-    'host': os.getenv('DB_HOST', 'localhost'),
-    'database': os.getenv('DB_NAME', 'executive_disorder'),
-    'user': os.getenv('DB_USER', 'postgres'),
-    'password': os.getenv('DB_PASSWORD', 'postgres'),
-    'port': os.getenv('DB_PORT', '5432')
-}
+metrics.register_gauges('db_pool', pool_stats)
+metrics.register_gauges('save_write_behind', write_behind.buffer.stats)
+metrics.register_gauges('ai_jobs', jobs.queue.stats)
+metrics.register_gauges('ai_cache', ai_cache.cache.stats)
+metrics.register_gauges('save_compaction', retention.compactor.stats)
 
-def get_db():
-    return psycopg2.connect(**DB_CONFIG, cursor_factory=RealDictCursor)
+@app.errorhandler(PoolTimeout)
+def database_busy(e):
+    response = jsonify({'error': 'Database busy, retry shortly'})
+    response.headers['Retry-After'] = '1'
+    return response, 503
 
 @app.route('/health', methods=['GET'])
 def health():
     return jsonify({'status': 'ok', 'timestamp': datetime.utcnow().isoformat()})
 
+@app.route('/health/db', methods=['GET'])
+def health_db():
+    """Database round trip plus connection pool metrics"""
+    status, code = 'ok', 200
+    try:
+        with get_db() as conn, conn.cursor() as cur:
+            cur.execute("SELECT 1")
+    except PoolTimeout:
+        raise
+    except Exception as e:
+        status, code = f'error: {e}', 503
+    return jsonify({'status': status, 'pool': pool_stats()}), code
+
 @app.route('/api/users', methods=['POST'])
 def create_user():
     data = request.json
@@ -44,103 +76,377 @@ def create_user():
 @app.route('/api/saves', methods=['POST'])
 def save_game():
     data = request.json
+    mode = request.headers.get('X-Save-Mode')
+    if mode and mode not in saves.SAVE_MODES:
+        return jsonify({'error': f'Unknown save mode: {mode}'}), 400
+    storage = request.headers.get('X-Save-Storage')
+    if storage and storage not in saves.STORAGE_FORMATS:
+        return jsonify({'error': f'Unknown save storage: {storage}'}), 400
+    # Delta saves and explicit X-Save-Sync saves bypass the write-behind buffer
+    if write_behind.WRITE_BEHIND_ENABLED:
+        if (mode or saves.SAVE_MODE) == 'full' and not request.headers.get('X-Save-Sync'):
+            write_behind.buffer.submit(data['user_id'], data['save_data'], storage)
+            return jsonify({'id': None, 'queued': True}), 202
+        write_behind.buffer.discard(data['user_id'])
     with get_db() as conn, conn.cursor() as cur:
-        cur.execute(
-            "INSERT INTO game_saves (user_id, save_data) VALUES (%s, %s) RETURNING id",
-            (data['user_id'], data['save_data'])
-        )
-        save_id = cur.fetchone()['id']
+        save_id = saves.insert_save(cur, data['user_id'], data['save_data'], mode, storage)
         conn.commit()
     return jsonify({'id': save_id}), 201
 
 @app.route('/api/saves/<int:user_id>', methods=['GET'])
 def get_saves(user_id):
+    """Full saves by default; ?view=meta returns keyset-paginated metadata"""
+    if write_behind.WRITE_BEHIND_ENABLED:
+        write_behind.buffer.flush_user(user_id)
+    if request.args.get('view') == 'meta':
+        return list_saves(user_id)
+    with get_db() as conn, conn.cursor() as cur:
+        rows = saves.list_saves_full(cur, user_id)
+    return jsonify(rows)
+
+def list_saves(user_id):
+    limit = request.args.get('limit', saves.DEFAULT_PAGE_SIZE, type=int)
+    cursor = request.args.get('cursor')
+    try:
+        with get_db() as conn, conn.cursor() as cur:
+            rows, next_cursor = saves.list_save_meta(cur, user_id, limit, cursor)
+    except saves.InvalidCursor as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify({'saves': rows, 'next_cursor': next_cursor})
+
+@app.route('/api/saves/<int:user_id>/<int:save_id>', methods=['GET'])
+def get_save(user_id, save_id):
+    """Raw save_data of a single save"""
+    if write_behind.WRITE_BEHIND_ENABLED:
+        write_behind.buffer.flush_user(user_id)
+    with get_db() as conn, conn.cursor() as cur:
+        body = saves.fetch_save_text(cur, user_id, save_id)
+    if body is None:
+        return jsonify({'error': 'Save not found'}), 404
+    return Response(body, mimetype='application/json')
+
+@app.route('/api/leaderboard', methods=['GET'])
+def get_leaderboard():
+    """Top players by days survived in one save; ?leader_id= for one leader's board"""
+    leader_id = request.args.get('leader_id')
+    limit = request.args.get('limit', leaderboard.DEFAULT_LIMIT, type=int)
+    with get_db() as conn, conn.cursor() as cur:
+        entries = leaderboard.top_players(cur, leader_id, limit)
+    return jsonify({'leader_id': leader_id, 'entries': entries})
+
+@app.route('/api/leaderboard/totals', methods=['GET'])
+def get_leaderboard_totals():
+    """Save counts, average/max days survived and average final stats, global and per leader"""
+    with get_db() as conn, conn.cursor() as cur:
+        return jsonify(leaderboard.totals(cur))
+
+@app.route('/api/players/<int:user_id>/stats', methods=['GET'])
+def get_player_stats(user_id):
+    if write_behind.WRITE_BEHIND_ENABLED:
+        write_behind.buffer.flush_user(user_id)
     with get_db() as conn, conn.cursor() as cur:
-        cur.execute("SELECT * FROM game_saves WHERE user_id = %s ORDER BY created_at DESC", (user_id,))
-        saves = cur.fetchall()
-    return jsonify(saves)
+        return jsonify(leaderboard.player_stats(cur, user_id))
+
+@app.route('/api/saves/write-behind', methods=['GET'])
+def write_behind_stats():
+    """Coalescing and flush counters of the write-behind buffer"""
+    return jsonify(write_behind.buffer.stats())
+
+# Admin endpoints are disabled unless ADMIN_TOKEN is set
+ADMIN_TOKEN = os.getenv('ADMIN_TOKEN')
+
+def _admin_denied():
+    """Error response unless the request carries `Authorization: Bearer <ADMIN_TOKEN>`"""
+    if not ADMIN_TOKEN:
+        return jsonify({'error': 'Admin endpoints are disabled (ADMIN_TOKEN is not set)'}), 403
+    supplied = request.headers.get('Authorization', '').removeprefix('Bearer ').strip()
+    if not hmac.compare_digest(supplied.encode(), ADMIN_TOKEN.encode()):
+        return jsonify({'error': 'Unauthorized'}), 401
+    return None
+
+@app.route('/api/admin/saves/export', methods=['GET'])
+def export_saves():
+    """One batch of saves as NDJSON: ?after_id=, ?limit= and ?user_id= (repeatable).
+
+    X-Export-Last-Id is the after_id of the next batch; X-Export-Rows is 0
+    once everything up to X-Export-Max-Id has been sent.
+    """
+    denied = _admin_denied()
+    if denied:
+        return denied
+    after_id = request.args.get('after_id', 0, type=int)
+    limit = max(1, min(request.args.get('limit', save_archive.SHARD_ROWS, type=int), save_archive.SHARD_ROWS))
+    user_ids = request.args.getlist('user_id', type=int)
+    upto_id = request.args.get('max_id', type=int)
+    with get_db() as conn, conn.cursor() as cur:
+        if upto_id is None:
+            upto_id = save_archive.max_id(cur)
+        rows, last_id = save_archive.next_batch(cur, after_id, upto_id, limit, user_ids)
+
+    gzipped = 'gzip' in request.accept_encodings
+
+    def body():
+        lines = save_archive.iter_ndjson(after_id, last_id, user_ids) if rows else ()
+        if not gzipped:
+            yield from lines
+            return
+        encoder = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+        for line in lines:
+            chunk = encoder.compress(line)
+            if chunk:
+                yield chunk
+        yield encoder.flush()
+
+    response = Response(body(), mimetype='application/x-ndjson')
+    response.headers['X-Export-Rows'] = str(rows)
+    response.headers['X-Export-Last-Id'] = str(last_id)
+    response.headers['X-Export-Max-Id'] = str(upto_id)
+    response.vary.add('Accept-Encoding')
+    if gzipped:
+        response.headers['Content-Encoding'] = 'gzip'
+    return response
+
+@app.route('/api/admin/saves/import', methods=['POST'])
+def import_saves():
+    """NDJSON saves as produced by the export (Content-Encoding gzip/zstd ok);
+    existing ids are skipped. ?user_id= (repeatable) imports only those users."""
+    denied = _admin_denied()
+    if denied:
+        return denied
+    try:
+        result = save_archive.import_stream(request.stream, request.args.getlist('user_id', type=int))
+    except (psycopg2.DataError, psycopg2.IntegrityError) as e:
+        return jsonify({'error': f'Invalid save rows: {e}'.strip()}), 400
+    return jsonify(result)
+
+@app.route('/api/admin/saves/compaction', methods=['GET'])
+def compaction_stats():
+    """Retention settings, compaction totals and the last pass of this process"""
+    denied = _admin_denied()
+    if denied:
+        return denied
+    return jsonify({'stats': retention.compactor.stats(), 'last': retention.compactor.last_report()})
+
+@app.route('/api/admin/saves/compaction', methods=['POST'])
+def compact_saves():
+    """Start a compaction pass in the background (?dry_run=1 reports without
+    deleting); poll GET /api/admin/saves/compaction for its report"""
+    denied = _admin_denied()
+    if denied:
+        return denied
+    if not retention.RETENTION_ENABLED:
+        return jsonify({'error': 'Retention is disabled (SAVE_RETENTION_KEEP_LAST is 0)'}), 409
+    dry_run = bool(request.args.get('dry_run'))
+    if not retention.compactor.trigger(dry_run=dry_run):
+        return jsonify({'error': 'A compaction pass is already running'}), 409
+    response = jsonify({'started': True, 'dry_run': dry_run, 'status_url': '/api/admin/saves/compaction'})
+    response.headers['Location'] = '/api/admin/saves/compaction'
+    return response, 202
 
 # AI Content Generation Endpoints
 
+def _submit_job(kind, params):
+    try:
+        job = jobs.queue.submit(kind, params)
+    except jobs.InvalidJob as e:
+        return jsonify({'error': str(e)}), 400
+    except jobs.QueueFull as e:
+        response = jsonify({'error': f'Job queue full: {e}'})
+        response.headers['Retry-After'] = '5'
+        return response, 429
+    response = jsonify({'job_id': job['id'], 'status': job['status'],
+                        'status_url': f"/api/ai/jobs/{job['id']}"})
+    response.headers['Location'] = f"/api/ai/jobs/{job['id']}"
+    return response, 202
+
+def _catalog_response(payload, etag):
+    """JSON response with a strong ETag; 304 when the client already has it"""
+    if request.if_none_match.contains_weak(etag):
+        response = Response(status=304)
+    else:
+        response = jsonify(payload)
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+@app.route('/api/catalog', methods=['GET'])
+def catalog_info():
+    """Catalog version, entity counts and index keys"""
+    snapshot = catalog.snapshot()
+    return _catalog_response({
+        'version': snapshot.version,
+        'digest': snapshot.digest,
+        'counts': {kind: len(snapshot.entities[kind]) for kind in CATALOG_KINDS},
+        'indexes': snapshot.index_summary(),
+    }, snapshot.digest)
+
+@app.route('/api/catalog/changes', methods=['GET'])
+def catalog_changes():
+    """Delta feed: entities upserted or deleted after ?since=<version> (0 = everything)"""
+    since = request.args.get('since', 0, type=int)
+    kinds = request.args.getlist('kind') or list(CATALOG_KINDS)
+    if since < 0 or any(kind not in CATALOG_KINDS for kind in kinds):
+        return jsonify({'error': f'since must be >= 0 and kind one of {list(CATALOG_KINDS)}'}), 400
+    snapshot, changes = catalog.changes(since, kinds)
+    etag = hashlib.sha256(f'{snapshot.digest}:{since}:{",".join(sorted(kinds))}'.encode()).hexdigest()[:32]
+    return _catalog_response({'version': max(since, snapshot.version), 'since': since,
+                              'changes': changes}, etag)
+
+@app.route('/api/catalog/<kind>', methods=['GET'])
+def catalog_list(kind):
+    """All entities of a kind; cards filter by ?tag= (repeatable), rarity, effect and faction"""
+    if kind not in CATALOG_KINDS:
+        return jsonify({'error': 'Unknown catalog kind'}), 404
+    snapshot = catalog.snapshot()
+    if kind == 'cards':
+        ids = snapshot.query_cards(tags=request.args.getlist('tag'), rarity=request.args.get('rarity'),
+                                   effects=request.args.getlist('effect'), faction=request.args.get('faction'))
+    else:
+        ids = sorted(snapshot.entities[kind])
+    etag = hashlib.sha256(f'{snapshot.digest}:{request.full_path}'.encode()).hexdigest()[:32]
+    items = [snapshot.entities[kind][entity_id] for entity_id in ids]
+    return _catalog_response({'version': snapshot.version, 'count': len(items), kind: items}, etag)
+
+@app.route('/api/catalog/<kind>/<entity_id>', methods=['GET'])
+def catalog_entity(kind, entity_id):
+    snapshot = catalog.snapshot()
+    if kind not in CATALOG_KINDS or entity_id not in snapshot.entities[kind]:
+        return jsonify({'error': 'Not found'}), 404
+    return _catalog_response(snapshot.entities[kind][entity_id], snapshot.hashes[kind][entity_id][:32])
+
+@app.route('/api/catalog/cards/<card_id>/reactions', methods=['GET'])
+def catalog_card_reactions(card_id):
+    """Faction influence changes triggered by a card's tags"""
+    snapshot = catalog.snapshot()
+    if card_id not in snapshot.entities['cards']:
+        return jsonify({'error': 'Not found'}), 404
+    etag = hashlib.sha256(f'{snapshot.digest}:reactions:{card_id}'.encode()).hexdigest()[:32]
+    return _catalog_response({'card_id': card_id, 'reactions': snapshot.card_reactions(card_id)}, etag)
+
 @app.route('/api/ai/generate-cards', methods=['POST'])
 def generate_cards():
-    """Generate decision cards using OpenAI GPT"""
+    """Generate decision cards; ?async=1 queues a job instead of blocking"""
     data = request.json
+    if request.args.get('async'):
+        return _submit_job('cards', data)
     theme = data.get('theme', 'General Policy')
     count = data.get('count', 1)
-    
-    openai_key = os.getenv('OPENAI_API_KEY')
-    if not openai_key:
-        return jsonify({'error': 'OpenAI API key not configured'}), 500
-    
+
     try:
-        openai.api_key = openai_key
-        
-        prompt = f"""Generate {count} decision cards for Executive Disorder, a political simulation game.
-        
-Theme: {theme}
-
-For each card, provide:
-1. Title (10-15 words)
-2. Description (30-50 words)
-3. 2-3 choices with consequences for: Popularity, Stability, MediaTrust, EconomicHealth (values -20 to +20)
-
-Format as JSON array."""
-        
-        response = openai.ChatCompletion.create(
-            model="gpt-4",
-            messages=[
-                {"role": "system", "content": "You are a creative writer for a political simulation game. Generate balanced, realistic decision cards."},
-                {"role": "user", "content": prompt}
-            ],
-            max_tokens=1500,
-            temperature=0.8
-        )
-        
-        generated_content = response.choices[0].message.content
+        generated_content = get_provider().generate_cards(theme, count)
         return jsonify({'cards': generated_content, 'count': count}), 200
-        
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/ai/generate-cards/stream', methods=['POST'])
+def stream_cards():
+    """Generate decision cards as Server-Sent Events, one `card` event per complete card"""
+    data = request.get_json(silent=True) or {}
+    theme = data.get('theme', 'General Policy')
+    try:
+        count = int(data.get('count', 1))
+    except (TypeError, ValueError):
+        return jsonify({'error': 'count must be an integer'}), 400
+
+    def events():
+        started = time.perf_counter()
+        parser = CardArrayParser()
+        index = sent = 0
+        try:
+            for fragment in get_provider().stream_cards(theme, count):
+                for raw in parser.feed(fragment):
+                    card, reason = validate_card(raw)
+                    if card is None:
+                        yield sse_event('invalid', {'index': index, 'error': reason})
+                    else:
+                        sent += 1
+                        yield sse_event('card', {'index': index, 'card': card})
+                    index += 1
+        except ProviderError as e:
+            yield sse_event('error', {'error': str(e), 'retryable': e.retryable})
+            return
+        except Exception as e:
+            app.logger.exception('card stream failed')
+            yield sse_event('error', {'error': str(e), 'retryable': False})
+            return
+        if not parser.started:
+            yield sse_event('error', {'error': 'model output contained no JSON array', 'retryable': True})
+            return
+        yield sse_event('done', {'count': sent, 'invalid': index - sent,
+                                 'elapsed_ms': round((time.perf_counter() - started) * 1000, 1)})
+
+    response = Response(stream_with_context(events()), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
 @app.route('/api/ai/generate-image', methods=['POST'])
 def generate_image():
-    """Generate images using DALL-E 3"""
+    """Generate an image; ?async=1 queues a job instead of blocking"""
     data = request.json
+    if request.args.get('async'):
+        return _submit_job('image', data)
     prompt = data.get('prompt', '')
-    
-    openai_key = os.getenv('OPENAI_API_KEY')
-    if not openai_key:
-        return jsonify({'error': 'OpenAI API key not configured'}), 500
-    
+
     try:
-        openai.api_key = openai_key
-        
-        response = openai.Image.create(
-            model="dall-e-3",
-            prompt=prompt,
-            size="1024x1024",
-            quality="standard",
-            n=1
-        )
-        
-        image_url = response.data[0].url
+        image_url = get_provider().generate_image(prompt)
         return jsonify({'image_url': image_url}), 200
-        
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/ai/jobs', methods=['POST'])
+def submit_job():
+    """Queue a generation job: {"kind": "cards"|"image", ...params}"""
+    data = request.json or {}
+    return _submit_job(data.get('kind'), data)
+
+@app.route('/api/ai/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    job = jobs.queue.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify(job)
+
+@app.route('/api/ai/jobs/<job_id>', methods=['DELETE'])
+def cancel_job(job_id):
+    job = jobs.queue.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    if job['status'] in jobs.FINISHED:
+        return jsonify(job), 409
+    return jsonify(jobs.queue.cancel(job_id))
+
+@app.route('/api/ai/jobs/stats', methods=['GET'])
+def job_stats():
+    return jsonify(jobs.queue.stats())
+
+@app.route('/api/ai/cache/stats', methods=['GET'])
+def ai_cache_stats():
+    return jsonify(dict(ai_cache.cache.stats(), enabled=ai_cache.CACHE_ENABLED))
+
 @app.route('/api/ai/test-balance', methods=['POST'])
 def test_balance():
-    """Endpoint for ML-Agents to submit test results"""
-    data = request.json
-    test_results = data.get('results', [])
-    
+    """Endpoint for ML-Agents to submit test results.
+
+    Accepts {"results": [...]} or an application/x-ndjson stream of episode
+    results; everything is persisted and folded into the balance aggregates.
+    """
+    run_id = request.args.get('run_id')
+    if request.mimetype in ('application/x-ndjson', 'application/jsonl'):
+        totals = telemetry.ingest(telemetry.iter_ndjson(request.stream), run_id)
+    else:
+        data = request.get_json(silent=True)
+        if not isinstance(data, dict) or not isinstance(data.get('results', []), list):
+            return jsonify({'error': 'expected {"results": [...]} or an NDJSON body'}), 400
+        totals = telemetry.ingest(data.get('results', []), run_id or data.get('run_id'))
+
     # Analyze results and provide balance suggestions
     analysis = {
-        'total_tests': len(test_results),
-        'avg_survival_days': sum(r.get('days_survived', 0) for r in test_results) / max(len(test_results), 1),
-        'win_rate': sum(1 for r in test_results if r.get('won', False)) / max(len(test_results), 1),
+        'total_tests': totals['ingested'],
+        'avg_survival_days': totals['days_sum'] / max(totals['ingested'], 1),
+        'win_rate': totals['wins'] / max(totals['ingested'], 1),
+        'rejected': totals['rejected'],
+        'errors': totals['errors'],
         'suggestions': []
     }
     
@@ -152,5 +458,33 @@ def test_balance():
     
     return jsonify(analysis), 200
 
+@app.route('/api/ai/balance/summary', methods=['GET'])
+def balance_summary():
+    """Precomputed outcome summary, globally or for ?leader=<id>"""
+    bin_width = request.args.get('bin_width', 1, type=int)
+    if bin_width < 1:
+        return jsonify({'error': 'bin_width must be positive'}), 400
+    with get_db() as conn, conn.cursor() as cur:
+        return jsonify(telemetry.summary(cur, request.args.get('leader'), bin_width))
+
+@app.route('/api/ai/balance/leaders', methods=['GET'])
+def balance_leaders():
+    with get_db() as conn, conn.cursor() as cur:
+        return jsonify({'leaders': telemetry.leader_breakdown(cur)})
+
+@app.route('/api/ai/balance/cards', methods=['GET'])
+def balance_cards():
+    """Per-card outcomes of the episodes each card was played in"""
+    sort = request.args.get('sort', 'episodes')
+    if sort not in telemetry.CARD_SORTS:
+        return jsonify({'error': f'sort must be one of {sorted(telemetry.CARD_SORTS)}'}), 400
+    limit = min(max(request.args.get('limit', 50, type=int), 1), 500)
+    min_episodes = request.args.get('min_episodes', 1, type=int)
+    with get_db() as conn, conn.cursor() as cur:
+        return jsonify({'cards': telemetry.card_breakdown(cur, sort, limit, min_episodes)})
+
 if __name__ == '__main__':
-    app.run(host='0.0.0.0', port=8000, debug=True)
+    # Local development only; production runs gunicorn with gunicorn.conf.py
+    retention.compactor.start()
+    app.run(host='0.0.0.0', port=int(os.getenv('PORT', '8000')),
+            debug=os.getenv('FLASK_DEBUG', '1').lower() in ('1', 'true', 'yes'))
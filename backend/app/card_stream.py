@@ -0,0 +1,111 @@
+"""Incremental parsing of streamed card generations.
+
+Models stream the JSON array of cards token by token. CardArrayParser is fed
+those fragments and hands back each top-level object as soon as its closing
+brace arrives, so cards can be validated and forwarded (as Server-Sent
+Events) long before the completion ends. Anything before the opening '[' --
+prose or a ```json fence -- is skipped.
+"""
+
+import json
+
+STAT_RANGE = (-20, 20)
+CHOICES_RANGE = (2, 3)
+
+
+class CardArrayParser:
+    def __init__(self):
+        self._buf = ''
+        self._pos = 0
+        self._start = None
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self.started = False
+        self.finished = False
+
+    def feed(self, text):
+        """Consume a fragment; returns the raw JSON text of every card completed by it"""
+        self._buf += text
+        done = []
+        buf = self._buf
+        i = self._pos
+        while i < len(buf) and not self.finished:
+            ch = buf[i]
+            if not self.started:
+                if ch == '[':
+                    self.started = True
+            elif self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == '\\':
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+            elif ch == '"':
+                self._in_string = True
+            elif ch in '{[':
+                if self._depth == 0:
+                    self._start = i
+                self._depth += 1
+            elif ch in '}]':
+                if self._depth == 0:
+                    self.finished = ch == ']'
+                else:
+                    self._depth -= 1
+                    if self._depth == 0:
+                        done.append(buf[self._start:i + 1])
+                        self._start = None
+            i += 1
+        # Keep only the unfinished element
+        if self._start is not None:
+            self._buf = buf[self._start:]
+            self._pos = i - self._start
+            self._start = 0
+        else:
+            self._buf = ''
+            self._pos = 0
+        return done
+
+
+def _field(obj, *names):
+    lowered = {str(key).lower(): value for key, value in obj.items()}
+    for name in names:
+        if name in lowered:
+            return lowered[name]
+    return None
+
+
+def validate_card(raw):
+    """Parse and check one streamed card; returns (card, None) or (None, reason)"""
+    try:
+        card = json.loads(raw)
+    except ValueError as e:
+        return None, f'invalid JSON: {e}'
+    if not isinstance(card, dict):
+        return None, 'card is not an object'
+    for name in ('title', 'description'):
+        value = _field(card, name)
+        if not isinstance(value, str) or not value.strip():
+            return None, f'missing {name}'
+    choices = _field(card, 'choices', 'options')
+    if not isinstance(choices, list) or not CHOICES_RANGE[0] <= len(choices) <= CHOICES_RANGE[1]:
+        return None, f'expected {CHOICES_RANGE[0]}-{CHOICES_RANGE[1]} choices'
+    for choice in choices:
+        if not isinstance(choice, dict):
+            return None, 'choice is not an object'
+        effects = _field(choice, 'effects', 'consequences')
+        if effects is None:
+            continue
+        if not isinstance(effects, dict):
+            return None, 'choice effects are not an object'
+        for stat, value in effects.items():
+            if not isinstance(value, (int, float)) or isinstance(value, bool):
+                return None, f'effect {stat} is not a number'
+            if not STAT_RANGE[0] <= value <= STAT_RANGE[1]:
+                return None, f'effect {stat}={value} outside {STAT_RANGE[0]}..{STAT_RANGE[1]}'
+    return card, None
+
+
+def sse_event(event, data):
+    return f'event: {event}\ndata: {json.dumps(data, separators=(",", ":"))}\n\n'
@@ -0,0 +1,237 @@
+"""Content catalog served from the data/ YAML corpus.
+
+Cards, leaders, crises and factions are parsed once into an immutable
+snapshot together with inverted indexes over cards (tag, rarity, effect type
+and the faction reactions their tags trigger). Requests read whichever
+snapshot is current, so a reload never blocks them. The tree is rescanned
+at most every CATALOG_RELOAD_INTERVAL seconds (by file mtime and size) and
+reparsed only when something changed.
+
+Every reload is reconciled against catalog_entities in Postgres under an
+advisory lock: changed, added and removed entities are appended to
+catalog_changes with the next catalog version. Versions are therefore shared
+by all workers and survive restarts, and clients holding version N can ask
+for just the changes after it. All replicas must serve the same data/ tree.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from pathlib import Path
+
+import yaml
+
+from db import get_db
+
+log = logging.getLogger(__name__)
+
+DATA_DIR = Path(os.getenv('CATALOG_DATA_DIR') or Path(__file__).resolve().parent.parent.parent / 'data')
+RELOAD_INTERVAL = float(os.getenv('CATALOG_RELOAD_INTERVAL', '5'))
+KINDS = ('cards', 'leaders', 'crises', 'factions')
+ADVISORY_LOCK_ID = 0x0ed0ca7a  # pg_advisory_xact_lock key for catalog reconciliation
+
+Loader = getattr(yaml, 'CSafeLoader', yaml.SafeLoader)
+
+
+def _canonical(doc):
+    return json.dumps(doc, sort_keys=True, separators=(',', ':'), default=str)
+
+
+def _digest(text):
+    return hashlib.sha256(text.encode()).hexdigest()
+
+
+def _as_list(value):
+    return value if isinstance(value, list) else []
+
+
+class Snapshot:
+    """One immutable, fully indexed view of the corpus"""
+
+    def __init__(self, entities, version=0):
+        self.entities = entities  # kind -> {id: doc}
+        self.version = version
+        self.hashes = {kind: {entity_id: _digest(_canonical(doc)) for entity_id, doc in docs.items()}
+                       for kind, docs in entities.items()}
+        self.digest = _digest(_canonical(self.hashes))[:32]
+
+        self.by_tag, self.by_rarity, self.by_effect = {}, {}, {}
+        for card_id, card in entities.get('cards', {}).items():
+            for tag in _as_list(card.get('tags')):
+                self.by_tag.setdefault(str(tag), set()).add(card_id)
+            if card.get('rarity'):
+                self.by_rarity.setdefault(str(card['rarity']), set()).add(card_id)
+            for effect in _as_list(card.get('effects')):
+                if isinstance(effect, dict) and effect.get('type'):
+                    self.by_effect.setdefault(str(effect['type']), set()).add(card_id)
+
+        # cardTag -> [(faction id, influence delta)], and faction -> cards it reacts to
+        self.reactions_by_tag, self.by_faction = {}, {}
+        for faction_id, faction in entities.get('factions', {}).items():
+            mechanics = faction.get('mechanics') if isinstance(faction.get('mechanics'), dict) else {}
+            for reaction in _as_list(mechanics.get('reactions')):
+                if not isinstance(reaction, dict) or not reaction.get('cardTag'):
+                    continue
+                tag = str(reaction['cardTag'])
+                self.reactions_by_tag.setdefault(tag, []).append((faction_id, reaction.get('influenceDelta', 0)))
+                self.by_faction.setdefault(faction_id, set()).update(self.by_tag.get(tag, ()))
+
+    def query_cards(self, tags=(), rarity=None, effects=(), faction=None):
+        """Card ids matching every given filter, sorted"""
+        sets = [self.by_tag.get(tag, set()) for tag in tags]
+        sets += [self.by_effect.get(effect, set()) for effect in effects]
+        if rarity:
+            sets.append(self.by_rarity.get(rarity, set()))
+        if faction:
+            sets.append(self.by_faction.get(faction, set()))
+        if not sets:
+            return sorted(self.entities['cards'])
+        sets.sort(key=len)
+        return sorted(sets[0].intersection(*sets[1:]))
+
+    def card_reactions(self, card_id):
+        reactions = {}
+        for tag in _as_list(self.entities['cards'][card_id].get('tags')):
+            for faction_id, delta in self.reactions_by_tag.get(str(tag), ()):
+                entry = reactions.setdefault(faction_id, {'faction_id': faction_id, 'influenceDelta': 0, 'tags': []})
+                entry['influenceDelta'] += delta
+                entry['tags'].append(str(tag))
+        return sorted(reactions.values(), key=lambda r: r['faction_id'])
+
+    def index_summary(self):
+        def counts(index):
+            return {key: len(ids) for key, ids in sorted(index.items())}
+        return {'tags': counts(self.by_tag), 'rarities': counts(self.by_rarity),
+                'effects': counts(self.by_effect), 'factions': counts(self.by_faction)}
+
+
+def _scan(root):
+    """Signature of the YAML tree: (kind, name, mtime, size) per file"""
+    signature = []
+    for kind in KINDS:
+        directory = root / kind
+        if not directory.is_dir():
+            continue
+        for entry in os.scandir(directory):
+            if entry.name.endswith(('.yaml', '.yml')) and entry.is_file():
+                stat = entry.stat()
+                signature.append((kind, entry.name, stat.st_mtime_ns, stat.st_size))
+    return tuple(sorted(signature))
+
+
+def _load(root):
+    entities = {kind: {} for kind in KINDS}
+    for kind in KINDS:
+        for path in sorted((root / kind).glob('*.y*ml')):
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    doc = yaml.load(f, Loader=Loader)
+            except (OSError, yaml.YAMLError) as e:
+                log.warning('catalog: skipping %s: %s', path, e)
+                continue
+            if not isinstance(doc, dict) or not doc.get('id'):
+                log.warning('catalog: skipping %s: no id', path)
+                continue
+            entity_id = str(doc['id'])
+            if entity_id in entities[kind]:
+                log.warning('catalog: duplicate %s id %s in %s', kind, entity_id, path)
+            # Round-trip through JSON so dates and other YAML types serve as they hash
+            entities[kind][entity_id] = json.loads(_canonical(doc))
+    return entities
+
+
+def _reconcile(cur, snapshot):
+    """Record the snapshot's differences from the last published catalog; returns the catalog version"""
+    cur.execute("SELECT pg_advisory_xact_lock(%s)", (ADVISORY_LOCK_ID,))
+    cur.execute("SELECT kind, entity_id, content_hash FROM catalog_entities")
+    published = {(row['kind'], row['entity_id']): row['content_hash'] for row in cur.fetchall()}
+    current = {(kind, entity_id): content_hash
+               for kind, hashes in snapshot.hashes.items() for entity_id, content_hash in hashes.items()}
+
+    upserts = sorted(key for key, content_hash in current.items() if published.get(key) != content_hash)
+    deletes = sorted(key for key in published if key not in current)
+    cur.execute("SELECT COALESCE(MAX(version), 0) AS version FROM catalog_changes")
+    version = cur.fetchone()['version']
+    if not upserts and not deletes:
+        return version
+
+    version += 1
+    for kind, entity_id in upserts:
+        cur.execute(
+            "INSERT INTO catalog_entities (kind, entity_id, content_hash, version) VALUES (%s, %s, %s, %s) "
+            "ON CONFLICT (kind, entity_id) DO UPDATE SET content_hash = EXCLUDED.content_hash, "
+            "version = EXCLUDED.version",
+            (kind, entity_id, current[(kind, entity_id)], version)
+        )
+        cur.execute("INSERT INTO catalog_changes (version, kind, entity_id, op) VALUES (%s, %s, %s, 'upsert')",
+                    (version, kind, entity_id))
+    for kind, entity_id in deletes:
+        cur.execute("DELETE FROM catalog_entities WHERE kind = %s AND entity_id = %s", (kind, entity_id))
+        cur.execute("INSERT INTO catalog_changes (version, kind, entity_id, op) VALUES (%s, %s, %s, 'delete')",
+                    (version, kind, entity_id))
+    log.info('catalog version %d: %d upserted, %d deleted', version, len(upserts), len(deletes))
+    return version
+
+
+class Catalog:
+    def __init__(self, root=DATA_DIR, reload_interval=RELOAD_INTERVAL):
+        self.root = Path(root)
+        self.reload_interval = reload_interval
+        self._snapshot = None
+        self._signature = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def snapshot(self):
+        """Current snapshot, reloading first if the tree changed since the last check"""
+        snapshot = self._snapshot
+        if snapshot is not None and time.monotonic() - self._checked_at < self.reload_interval:
+            return snapshot
+        with self._lock:
+            if self._snapshot is None or time.monotonic() - self._checked_at >= self.reload_interval:
+                self._refresh()
+            return self._snapshot
+
+    def reload(self):
+        with self._lock:
+            self._signature = None
+            self._refresh()
+            return self._snapshot
+
+    def _refresh(self):
+        signature = _scan(self.root)
+        if signature != self._signature or self._snapshot is None:
+            snapshot = Snapshot(_load(self.root))
+            with get_db() as conn, conn.cursor() as cur:
+                snapshot.version = _reconcile(cur, snapshot)
+            self._snapshot = snapshot
+            self._signature = signature
+        self._checked_at = time.monotonic()
+
+    def changes(self, since, kinds=KINDS):
+        """Entities changed after version `since`, newest state only"""
+        snapshot = self.snapshot()
+        with get_db() as conn, conn.cursor() as cur:
+            cur.execute(
+                "SELECT DISTINCT ON (kind, entity_id) kind, entity_id, op, version FROM catalog_changes "
+                "WHERE version > %s AND version <= %s AND kind = ANY(%s) "
+                "ORDER BY kind, entity_id, version DESC",
+                (since, snapshot.version, list(kinds))
+            )
+            rows = cur.fetchall()
+        changes = []
+        for row in rows:
+            doc = snapshot.entities[row['kind']].get(row['entity_id'])
+            if row['op'] == 'delete' or doc is None:
+                changes.append({'kind': row['kind'], 'id': row['entity_id'], 'op': 'delete',
+                                'version': row['version']})
+            else:
+                changes.append({'kind': row['kind'], 'id': row['entity_id'], 'op': 'upsert',
+                                'version': row['version'], 'data': doc})
+        return snapshot, changes
+
+
+catalog = Catalog()
@@ -0,0 +1,210 @@
+"""gzip/zstd support for request bodies, responses and stored saves.
+
+Request bodies are decoded as a stream by a WSGI middleware, so views keep
+using `request.json`/`request.stream` unchanged. Both the compressed size
+(REQUEST_MAX_BYTES) and the decoded size (REQUEST_MAX_DECODED_BYTES) are
+bounded, and decoding never inflates more than one read's worth at a time,
+which keeps small compression bombs from exhausting memory.
+
+zstd is optional: without the `zstandard` package only gzip/deflate are
+offered and zstd bodies are answered with 415.
+"""
+
+import gzip
+import io
+import json
+import os
+import zlib
+
+from flask import request
+from werkzeug.exceptions import BadRequest, RequestEntityTooLarge
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover - optional dependency
+    zstandard = None
+
+REQUEST_MAX_BYTES = int(os.getenv('REQUEST_MAX_BYTES', str(8 * 1024 * 1024)))
+REQUEST_MAX_DECODED_BYTES = int(os.getenv('REQUEST_MAX_DECODED_BYTES', str(32 * 1024 * 1024)))
+RESPONSE_COMPRESS_MIN_BYTES = int(os.getenv('RESPONSE_COMPRESS_MIN_BYTES', '1024'))
+RESPONSE_COMPRESS_LEVEL = int(os.getenv('RESPONSE_COMPRESS_LEVEL', '5'))
+STORAGE_COMPRESS_LEVEL = int(os.getenv('STORAGE_COMPRESS_LEVEL', '6'))
+
+COMPRESSIBLE_MIMETYPES = {'application/json', 'application/x-ndjson', 'text/plain', 'text/csv'}
+CHUNK_SIZE = 64 * 1024
+
+
+def available_encodings():
+    encodings = ['gzip']
+    if zstandard is not None:
+        encodings.insert(0, 'zstd')
+    return encodings
+
+
+def compress(data, encoding, level=STORAGE_COMPRESS_LEVEL):
+    if encoding == 'gzip':
+        return gzip.compress(data, compresslevel=level, mtime=0)
+    if encoding == 'zstd' and zstandard is not None:
+        return zstandard.ZstdCompressor(level=level).compress(data)
+    raise ValueError(f'unsupported encoding {encoding!r}')
+
+
+def decompress(data, encoding):
+    if encoding == 'gzip':
+        return gzip.decompress(data)
+    if encoding == 'zstd' and zstandard is not None:
+        return zstandard.ZstdDecompressor().decompressobj().decompress(bytes(data))
+    raise ValueError(f'unsupported encoding {encoding!r}')
+
+
+class _CountingReader:
+    """Raw request stream that refuses to yield more than `limit` bytes"""
+
+    def __init__(self, raw, length, limit):
+        self._raw = raw
+        self._remaining = length
+        self._limit = limit
+        self.count = 0
+
+    def read(self, size=CHUNK_SIZE):
+        if self._remaining is not None:
+            if self._remaining <= 0:
+                return b''
+            size = min(size, self._remaining)
+        chunk = self._raw.read(size)
+        self.count += len(chunk)
+        if self._remaining is not None:
+            self._remaining -= len(chunk)
+        if self.count > self._limit:
+            raise RequestEntityTooLarge(f'Compressed body exceeds {self._limit} bytes')
+        return chunk
+
+
+class _ZlibReader:
+    def __init__(self, raw, wbits):
+        self._raw = raw
+        self._wbits = wbits
+        self._decoder = zlib.decompressobj(wbits)
+        self._eof = False
+
+    def read(self, size):
+        while not self._eof:
+            data = self._decoder.unconsumed_tail
+            if not data:
+                if self._decoder.eof and self._decoder.unused_data:
+                    # Concatenated gzip members
+                    data = self._decoder.unused_data
+                    self._decoder = zlib.decompressobj(self._wbits)
+                else:
+                    data = self._raw.read(CHUNK_SIZE)
+                    if not data:
+                        self._eof = True
+                        return self._decoder.flush()
+            try:
+                out = self._decoder.decompress(data, size)
+            except zlib.error as e:
+                raise BadRequest(f'Invalid compressed body: {e}')
+            if out:
+                return out
+        return b''
+
+
+class _DecodingStream(io.RawIOBase):
+    def __init__(self, reader, limit):
+        self._reader = reader
+        self._limit = limit
+        self._pending = b''
+        self._decoded = 0
+
+    def readable(self):
+        return True
+
+    def _read(self, size):
+        try:
+            return self._reader.read(size)
+        except (BadRequest, RequestEntityTooLarge):
+            raise
+        except Exception as e:
+            raise BadRequest(f'Invalid compressed body: {e}')
+
+    def readinto(self, buffer):
+        if not self._pending:
+            self._pending = self._read(len(buffer))
+            self._decoded += len(self._pending)
+            # Werkzeug stops reading quietly once MAX_CONTENT_LENGTH bytes have
+            # arrived, so look one byte ahead to fail instead of truncating.
+            if self._decoded > self._limit or (self._decoded == self._limit and self._read(1)):
+                raise RequestEntityTooLarge(f'Decoded body exceeds {self._limit} bytes')
+        size = min(len(buffer), len(self._pending))
+        buffer[:size] = self._pending[:size]
+        self._pending = self._pending[size:]
+        return size
+
+
+def _error(start_response, status, message):
+    body = json.dumps({'error': message}).encode()
+    start_response(status, [('Content-Type', 'application/json'), ('Content-Length', str(len(body)))])
+    return [body]
+
+
+class DecompressMiddleware:
+    """Transparently decode Content-Encoding: gzip/deflate/zstd request bodies"""
+
+    def __init__(self, wsgi_app, max_bytes=REQUEST_MAX_BYTES, max_decoded_bytes=REQUEST_MAX_DECODED_BYTES):
+        self.wsgi_app = wsgi_app
+        self.max_bytes = max_bytes
+        self.max_decoded_bytes = max_decoded_bytes
+
+    def __call__(self, environ, start_response):
+        encoding = environ.get('HTTP_CONTENT_ENCODING', '').strip().lower()
+        if encoding in ('', 'identity'):
+            return self.wsgi_app(environ, start_response)
+
+        try:
+            length = int(environ['CONTENT_LENGTH']) if environ.get('CONTENT_LENGTH') else None
+        except ValueError:
+            return _error(start_response, '400 BAD REQUEST', 'Invalid Content-Length')
+        if length is None and not environ.get('wsgi.input_terminated'):
+            return _error(start_response, '411 LENGTH REQUIRED', 'Compressed bodies need a Content-Length')
+        if length is not None and length > self.max_bytes:
+            return _error(start_response, '413 REQUEST ENTITY TOO LARGE',
+                          f'Compressed body exceeds {self.max_bytes} bytes')
+
+        raw = _CountingReader(environ['wsgi.input'], length, self.max_bytes)
+        if encoding in ('gzip', 'x-gzip'):
+            reader = _ZlibReader(raw, 16 + zlib.MAX_WBITS)
+        elif encoding == 'deflate':
+            reader = _ZlibReader(raw, zlib.MAX_WBITS)
+        elif encoding == 'zstd' and zstandard is not None:
+            reader = zstandard.ZstdDecompressor().stream_reader(raw, read_size=CHUNK_SIZE)
+        else:
+            return _error(start_response, '415 UNSUPPORTED MEDIA TYPE',
+                          f'Unsupported Content-Encoding: {encoding}')
+
+        environ['wsgi.input'] = _DecodingStream(reader, self.max_decoded_bytes)
+        environ['wsgi.input_terminated'] = True
+        environ['ed.request_encoding'] = encoding
+        environ.pop('CONTENT_LENGTH', None)
+        del environ['HTTP_CONTENT_ENCODING']
+        return self.wsgi_app(environ, start_response)
+
+
+def compress_response(response):
+    """after_request hook: compress large JSON responses the client accepts"""
+    if (response.direct_passthrough or response.is_streamed
+            or response.status_code < 200 or response.status_code in (204, 304)
+            or 'Content-Encoding' in response.headers
+            or response.mimetype not in COMPRESSIBLE_MIMETYPES):
+        return response
+    response.vary.add('Accept-Encoding')
+    encoding = request.accept_encodings.best_match(available_encodings())
+    if not encoding or response.content_length is None or response.content_length < RESPONSE_COMPRESS_MIN_BYTES:
+        return response
+
+    response.set_data(compress(response.get_data(), encoding, RESPONSE_COMPRESS_LEVEL))
+    response.headers['Content-Encoding'] = encoding
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        # The compressed representation is not byte-identical to the original
+        response.set_etag(etag, weak=True)
+    return response
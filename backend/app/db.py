@@ -0,0 +1,365 @@
+"""PostgreSQL connection pool for the Executive Disorder backend.
+
+One pool per process. Connections are checked out for the duration of a
+`with get_db() as conn` block and returned afterwards, so a request no
+longer pays a TCP + auth handshake. The pool is fork-aware: a child process
+(e.g. a gunicorn worker forked from a preloaded master) never reuses the
+sockets it inherited from its parent.
+"""
+
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+import psycopg2
+from psycopg2 import extensions
+from psycopg2.extras import RealDictCursor
+
+import metrics
+
+DB_CONFIG = {
+    'host': os.getenv('DB_HOST', 'localhost'),
+    'database': os.getenv('DB_NAME', 'executive_disorder'),
+    'user': os.getenv('DB_USER', 'postgres'),
+    'password': os.getenv('DB_PASSWORD', 'postgres'),
+    'port': os.getenv('DB_PORT', '5432')
+}
+
+# Size the pool so that DB_POOL_MAX * workers * replicas stays below the
+# Postgres max_connections (100 by default in infrastructure/docker-compose.yml).
+POOL_CONFIG = {
+    'minconn': int(os.getenv('DB_POOL_MIN', '1')),
+    'maxconn': int(os.getenv('DB_POOL_MAX', '10')),
+    # Seconds a request waits for a free connection before failing.
+    'timeout': float(os.getenv('DB_POOL_TIMEOUT', '5')),
+    # Idle connections older than this are pinged before being handed out.
+    'health_check_after': float(os.getenv('DB_POOL_HEALTH_CHECK_AFTER', '30')),
+    # Idle connections above minconn are closed after this many seconds.
+    'max_idle': float(os.getenv('DB_POOL_MAX_IDLE', '300')),
+    # Connections are recycled after this many seconds regardless of use.
+    'max_lifetime': float(os.getenv('DB_POOL_MAX_LIFETIME', '3600')),
+}
+
+
+class TimedCursor(RealDictCursor):
+    """RealDictCursor that reports time spent in Postgres to metrics"""
+
+    def execute(self, query, vars=None):
+        start = time.perf_counter()
+        try:
+            return super().execute(query, vars)
+        finally:
+            metrics.observe_db(time.perf_counter() - start)
+
+    def executemany(self, query, vars_list):
+        start = time.perf_counter()
+        try:
+            return super().executemany(query, vars_list)
+        finally:
+            metrics.observe_db(time.perf_counter() - start)
+
+    def copy_expert(self, sql, file, size=8192):
+        start = time.perf_counter()
+        try:
+            return super().copy_expert(sql, file, size)
+        finally:
+            metrics.observe_db(time.perf_counter() - start, 'copy')
+
+
+class PoolTimeout(Exception):
+    """Raised when no connection could be checked out within the timeout"""
+
+
+class _Slot:
+    __slots__ = ('conn', 'created_at', 'last_used')
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.created_at = time.monotonic()
+        self.last_used = self.created_at
+
+
+class ConnectionPool:
+    """Thread-safe bounded pool of psycopg2 connections with metrics"""
+
+    def __init__(self, connect_kwargs, minconn=1, maxconn=10, timeout=5.0,
+                 health_check_after=30.0, max_idle=300.0, max_lifetime=3600.0):
+        if minconn < 0 or maxconn < 1 or minconn > maxconn:
+            raise ValueError(f'invalid pool size min={minconn} max={maxconn}')
+        self.connect_kwargs = dict(connect_kwargs)
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self.timeout = timeout
+        self.health_check_after = health_check_after
+        self.max_idle = max_idle
+        self.max_lifetime = max_lifetime
+
+        self._cond = threading.Condition()
+        self._reset_state()
+
+    def _reset_state(self):
+        self._pid = os.getpid()
+        self._idle = deque()
+        self._in_use = {}
+        self._size = 0
+        self._closed = False
+        self._metrics = {
+            'checkouts': 0,
+            'checkout_waits': 0,
+            'checkout_failures': 0,
+            'wait_time_total': 0.0,
+            'wait_time_max': 0.0,
+            'connections_created': 0,
+            'connections_discarded': 0,
+            'health_check_failures': 0,
+        }
+
+    def _check_fork(self):
+        if self._pid == os.getpid():
+            return
+        # The inherited sockets belong to the parent; closing them here would
+        # send a Terminate message on the parent's session. Keep references so
+        # the objects are never finalized in the child and start from scratch.
+        inherited = [slot.conn for slot in self._idle]
+        inherited.extend(slot.conn for slot in self._in_use.values())
+        _orphaned_connections.extend(inherited)
+        self._reset_state()
+
+    def _connect(self):
+        conn = psycopg2.connect(**self.connect_kwargs, cursor_factory=TimedCursor)
+        with self._cond:
+            self._metrics['connections_created'] += 1
+        return _Slot(conn)
+
+    def _discard(self, slot):
+        self._metrics['connections_discarded'] += 1
+        self._size -= 1
+        try:
+            slot.conn.close()
+        except Exception:
+            pass
+
+    def _is_usable(self, slot, now):
+        """Called without the lock held; may run a round trip to the server"""
+        conn = slot.conn
+        if conn.closed:
+            return False
+        if self.max_lifetime and now - slot.created_at > self.max_lifetime:
+            return False
+        if self.health_check_after and now - slot.last_used > self.health_check_after:
+            try:
+                with conn.cursor() as cur:
+                    cur.execute('SELECT 1')
+                conn.rollback()
+            except Exception:
+                with self._cond:
+                    self._metrics['health_check_failures'] += 1
+                return False
+        return True
+
+    def getconn(self, timeout=None):
+        """Check out a connection, waiting up to `timeout` seconds for one"""
+        timeout = self.timeout if timeout is None else timeout
+        start = time.monotonic()
+        deadline = start + timeout
+        waited = False
+
+        while True:
+            slot = None
+            create = False
+            with self._cond:
+                self._check_fork()
+                if self._closed:
+                    raise psycopg2.InterfaceError('connection pool is closed')
+                while not self._idle and self._size >= self.maxconn:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._metrics['checkout_failures'] += 1
+                        raise PoolTimeout(
+                            f'no database connection available within {timeout:.1f}s '
+                            f'(pool max {self.maxconn})'
+                        )
+                    waited = True
+                    self._cond.wait(remaining)
+                if self._idle:
+                    # LIFO keeps a warm working set; the tail ages out via max_idle.
+                    slot = self._idle.pop()
+                else:
+                    self._size += 1
+                    create = True
+
+            if create:
+                try:
+                    slot = self._connect()
+                except Exception:
+                    with self._cond:
+                        self._size -= 1
+                        self._metrics['checkout_failures'] += 1
+                        self._cond.notify()
+                    raise
+            elif not self._is_usable(slot, time.monotonic()):
+                with self._cond:
+                    self._discard(slot)
+                    self._cond.notify()
+                continue
+
+            wait = time.monotonic() - start
+            with self._cond:
+                self._in_use[id(slot.conn)] = slot
+                self._metrics['checkouts'] += 1
+                self._metrics['wait_time_total'] += wait
+                self._metrics['wait_time_max'] = max(self._metrics['wait_time_max'], wait)
+                if waited:
+                    self._metrics['checkout_waits'] += 1
+            return slot.conn
+
+    def putconn(self, conn, discard=False):
+        """Return a checked-out connection to the pool"""
+        with self._cond:
+            if self._pid != os.getpid():
+                # Checked out before a fork; the pool has been reset since.
+                return
+            slot = self._in_use.pop(id(conn), None)
+            if slot is None:
+                return
+
+        if not discard and not conn.closed:
+            status = conn.info.transaction_status
+            if status == extensions.TRANSACTION_STATUS_UNKNOWN:
+                discard = True
+            elif status != extensions.TRANSACTION_STATUS_IDLE:
+                try:
+                    conn.rollback()
+                except Exception:
+                    discard = True
+
+        with self._cond:
+            if discard or conn.closed or self._closed:
+                self._discard(slot)
+            else:
+                slot.last_used = time.monotonic()
+                self._idle.append(slot)
+                self._prune_idle(slot.last_used)
+            self._cond.notify()
+
+    def _prune_idle(self, now):
+        while len(self._idle) > self.minconn and now - self._idle[0].last_used > self.max_idle:
+            self._discard(self._idle.popleft())
+
+    @contextmanager
+    def connection(self, timeout=None):
+        """Check out a connection; commit on success, roll back on error"""
+        start = time.perf_counter()
+        conn = self.getconn(timeout)
+        metrics.observe_db(time.perf_counter() - start, 'checkout')
+        broken = False
+        try:
+            yield conn
+            start = time.perf_counter()
+            conn.commit()
+            metrics.observe_db(time.perf_counter() - start, 'commit')
+        except BaseException as exc:
+            broken = isinstance(exc, (psycopg2.OperationalError, psycopg2.InterfaceError))
+            if not conn.closed:
+                try:
+                    conn.rollback()
+                except Exception:
+                    broken = True
+            raise
+        finally:
+            self.putconn(conn, discard=broken)
+
+    def warm(self):
+        """Open connections up to minconn so the first requests do not pay for them"""
+        conns = []
+        try:
+            with self._cond:
+                self._check_fork()
+                missing = self.minconn - self._size
+            for _ in range(max(missing, 0)):
+                conns.append(self.getconn())
+        finally:
+            for conn in conns:
+                self.putconn(conn)
+
+    def closeall(self):
+        with self._cond:
+            self._check_fork()
+            self._closed = True
+            while self._idle:
+                self._discard(self._idle.popleft())
+            self._cond.notify_all()
+
+    def stats(self):
+        with self._cond:
+            self._check_fork()
+            m = dict(self._metrics)
+            checkouts = m['checkouts']
+            return {
+                'pid': self._pid,
+                'min': self.minconn,
+                'max': self.maxconn,
+                'size': self._size,
+                'idle': len(self._idle),
+                'in_use': len(self._in_use),
+                'checkouts': checkouts,
+                'checkout_waits': m['checkout_waits'],
+                'checkout_failures': m['checkout_failures'],
+                'wait_time_total_ms': round(m['wait_time_total'] * 1000, 3),
+                'wait_time_avg_ms': round(m['wait_time_total'] * 1000 / checkouts, 3) if checkouts else 0.0,
+                'wait_time_max_ms': round(m['wait_time_max'] * 1000, 3),
+                'connections_created': m['connections_created'],
+                'connections_discarded': m['connections_discarded'],
+                'health_check_failures': m['health_check_failures'],
+            }
+
+
+# Connections inherited across fork(); referenced only so they are never
+# closed from the child process.
+_orphaned_connections = []
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool(DB_CONFIG, **POOL_CONFIG)
+    return _pool
+
+
+def get_db():
+    """Context manager yielding a pooled connection (RealDictCursor rows)"""
+    return get_pool().connection()
+
+
+def pool_stats():
+    return get_pool().stats()
+
+
+def reset_pool():
+    """Drop the process pool; the next get_db() builds a fresh one"""
+    global _pool
+    with _pool_lock:
+        if _pool is not None and _pool._pid == os.getpid():
+            _pool.closeall()
+        _pool = None
+
+
+def _after_fork_in_child():
+    global _pool_lock
+    _pool_lock = threading.Lock()
+    if _pool is not None:
+        # Only this thread survives the fork, so a lock held by another
+        # parent thread would never be released: replace it outright.
+        _pool._cond = threading.Condition()
+        _pool._check_fork()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_after_fork_in_child)
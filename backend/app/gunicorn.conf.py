@@ -0,0 +1,102 @@
+"""gunicorn settings for the production backend.
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+The app is imported once in the master (preload_app) and workers are forked
+from it, so they start in milliseconds and share the imported code pages.
+Each worker serves GUNICORN_THREADS requests concurrently (gthread) and owns
+its own database pool, rebuilt right after fork.
+
+Sizing: every worker holds up to DB_POOL_MAX connections, so keep
+GUNICORN_WORKERS * DB_POOL_MAX below the Postgres max_connections
+(DB_MAX_CONNECTIONS here, 100 in infrastructure/docker-compose.yml), and
+DB_POOL_MAX at least GUNICORN_THREADS plus the background threads
+(write-behind flusher, AI job workers) that use the database.
+
+State that lives in one process cannot be shared between workers: with more
+than one worker the master refuses to start unless AI_JOB_STORE=postgres,
+and refuses SAVE_WRITE_BEHIND altogether.
+
+Reloading: `kill -HUP <master>` re-reads this file and replaces the workers
+gracefully (in-flight requests finish within GUNICORN_GRACEFUL_TIMEOUT).
+Because the app is preloaded, new code needs a new master: `kill -USR2
+<master>` starts one alongside the old, then `kill -WINCH` / `kill -QUIT`
+the old master once the new workers are up.
+"""
+
+import logging
+import os
+
+log = logging.getLogger('gunicorn.error')
+
+_cpus = os.cpu_count() or 1
+
+bind = os.getenv('GUNICORN_BIND', f"0.0.0.0:{os.getenv('PORT', '8000')}")
+workers = int(os.getenv('GUNICORN_WORKERS', str(min(_cpus * 2, 8))))
+threads = int(os.getenv('GUNICORN_THREADS', '4'))
+worker_class = 'gthread' if threads > 1 else 'sync'
+preload_app = True
+
+# Non-streaming AI calls can take tens of seconds
+timeout = int(os.getenv('GUNICORN_TIMEOUT', '120'))
+graceful_timeout = int(os.getenv('GUNICORN_GRACEFUL_TIMEOUT', '30'))
+keepalive = int(os.getenv('GUNICORN_KEEPALIVE', '5'))
+backlog = int(os.getenv('GUNICORN_BACKLOG', '2048'))
+
+# Recycle workers periodically to bound memory growth (0 disables)
+max_requests = int(os.getenv('GUNICORN_MAX_REQUESTS', '0'))
+max_requests_jitter = int(os.getenv('GUNICORN_MAX_REQUESTS_JITTER', str(max_requests // 10)))
+
+accesslog = os.getenv('GUNICORN_ACCESS_LOG') or None
+errorlog = '-'
+loglevel = os.getenv('GUNICORN_LOG_LEVEL', 'info')
+
+
+def when_ready(server):
+    import db
+    import jobs
+    import write_behind
+
+    if workers > 1 and jobs.JOB_STORE == 'memory':
+        raise RuntimeError(f'AI_JOB_STORE=memory keeps jobs per process; with {workers} workers a poll can '
+                           'reach a worker that does not know the job. Set AI_JOB_STORE=postgres.')
+    if workers > 1 and write_behind.WRITE_BEHIND_ENABLED:
+        raise RuntimeError(f'SAVE_WRITE_BEHIND buffers saves per process; with {workers} workers a listing '
+                           'served by another worker misses accepted saves. Run one worker or disable it.')
+    pool_max = db.POOL_CONFIG['maxconn']
+    budget = int(os.getenv('DB_MAX_CONNECTIONS', '100'))
+    if workers * pool_max > budget:
+        log.warning('%d workers x DB_POOL_MAX=%d exceeds DB_MAX_CONNECTIONS=%d',
+                    workers, pool_max, budget)
+    if pool_max < threads:
+        log.warning('DB_POOL_MAX=%d is below GUNICORN_THREADS=%d; requests will queue for connections',
+                    pool_max, threads)
+    # Anything the preloaded app opened belongs to the master, not the workers
+    db.reset_pool()
+
+
+def post_fork(server, worker):
+    import db
+
+    db.reset_pool()
+
+
+def post_worker_init(worker):
+    import db
+
+    try:
+        db.get_pool().warm()
+    except Exception:
+        log.exception('could not warm the database pool; connecting on demand')
+
+    import retention
+
+    retention.compactor.start()
+
+
+def worker_exit(server, worker):
+    import retention
+    import write_behind
+
+    retention.compactor.stop()
+    write_behind.buffer.close()
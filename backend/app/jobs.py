@@ -0,0 +1,344 @@
+"""Asynchronous AI generation jobs.
+
+Submitting a job returns immediately with an id; a bounded thread pool runs
+the generation against the configured provider, retrying transient provider
+failures with exponential backoff and jitter. Jobs can be polled and
+cancelled. A queued job is cancelled outright; a running one finishes its
+current provider call, but the result is discarded and no retry is made.
+
+Job state lives in memory by default. With several worker processes set
+AI_JOB_STORE=postgres so any worker can answer status polls and cancels.
+"""
+
+import logging
+import os
+import random
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from psycopg2.extras import Json
+
+from db import get_db
+from providers import ProviderError, get_provider
+
+log = logging.getLogger(__name__)
+
+JOB_WORKERS = int(os.getenv('AI_JOB_WORKERS', '4'))
+JOB_MAX_QUEUED = int(os.getenv('AI_JOB_MAX_QUEUED', '100'))
+JOB_MAX_ATTEMPTS = int(os.getenv('AI_JOB_MAX_ATTEMPTS', '3'))
+JOB_BACKOFF_BASE = float(os.getenv('AI_JOB_BACKOFF_BASE', '1'))
+JOB_BACKOFF_MAX = float(os.getenv('AI_JOB_BACKOFF_MAX', '30'))
+JOB_TTL = float(os.getenv('AI_JOB_TTL', '3600'))
+JOB_STORE = os.getenv('AI_JOB_STORE', 'memory')
+
+QUEUED, RUNNING, SUCCEEDED, FAILED, CANCELLED = 'queued', 'running', 'succeeded', 'failed', 'cancelled'
+FINISHED = (SUCCEEDED, FAILED, CANCELLED)
+
+
+class QueueFull(Exception):
+    pass
+
+
+class InvalidJob(ValueError):
+    pass
+
+
+def _cards_params(params):
+    try:
+        count = int(params.get('count', 1))
+    except (TypeError, ValueError):
+        raise InvalidJob('count must be an integer')
+    if not 1 <= count <= 20:
+        raise InvalidJob('count must be between 1 and 20')
+    return {'theme': str(params.get('theme', 'General Policy')), 'count': count}
+
+
+def _image_params(params):
+    prompt = str(params.get('prompt', '')).strip()
+    if not prompt:
+        raise InvalidJob('prompt is required')
+    return {'prompt': prompt}
+
+
+def _run_cards(provider, params):
+    return {'cards': provider.generate_cards(params['theme'], params['count']), 'count': params['count']}
+
+
+def _run_image(provider, params):
+    return {'image_url': provider.generate_image(params['prompt'])}
+
+
+# kind -> (parameter validator, runner)
+JOB_KINDS = {
+    'cards': (_cards_params, _run_cards),
+    'image': (_image_params, _run_image),
+}
+
+
+class Job:
+    def __init__(self, kind, params):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.params = params
+        self.status = QUEUED
+        self.attempts = 0
+        self.result = None
+        self.error = None
+        self.cancel_requested = False
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'kind': self.kind,
+            'params': self.params,
+            'status': self.status,
+            'attempts': self.attempts,
+            'result': self.result,
+            'error': self.error,
+            'created_at': self.created_at,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at,
+        }
+
+
+class MemoryJobStore:
+    def __init__(self, ttl=JOB_TTL):
+        self.ttl = ttl
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def add(self, job):
+        with self._lock:
+            self._prune()
+            self._jobs[job.id] = job
+
+    def update(self, job):
+        pass  # jobs are shared objects
+
+    def get(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return job.to_dict() if job else None
+
+    def request_cancel(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return False
+            job.cancel_requested = True
+            return True
+
+    def cancel_requested(self, job):
+        return job.cancel_requested
+
+    def _prune(self):
+        cutoff = time.time() - self.ttl
+        expired = [job_id for job_id, job in self._jobs.items()
+                   if job.finished_at and job.finished_at < cutoff]
+        for job_id in expired:
+            del self._jobs[job_id]
+
+
+class PostgresJobStore:
+    """Job state in the ai_jobs table, shared by every worker process"""
+
+    def __init__(self, ttl=JOB_TTL):
+        self.ttl = ttl
+
+    def add(self, job):
+        with get_db() as conn, conn.cursor() as cur:
+            cur.execute(
+                "DELETE FROM ai_jobs WHERE finished_at < now() - make_interval(secs => %s)",
+                (self.ttl,)
+            )
+            cur.execute(
+                "INSERT INTO ai_jobs (id, kind, params, status) VALUES (%s, %s, %s, %s)",
+                (job.id, job.kind, Json(job.params), job.status)
+            )
+
+    def update(self, job):
+        with get_db() as conn, conn.cursor() as cur:
+            cur.execute(
+                "UPDATE ai_jobs SET status = %s, attempts = %s, result = %s, error = %s, "
+                "started_at = to_timestamp(%s), finished_at = to_timestamp(%s) WHERE id = %s",
+                (job.status, job.attempts, Json(job.result), job.error,
+                 job.started_at, job.finished_at, job.id)
+            )
+
+    def get(self, job_id):
+        with get_db() as conn, conn.cursor() as cur:
+            cur.execute(
+                "SELECT id, kind, params, status, attempts, result, error, "
+                "extract(epoch FROM created_at) AS created_at, "
+                "extract(epoch FROM started_at) AS started_at, "
+                "extract(epoch FROM finished_at) AS finished_at "
+                "FROM ai_jobs WHERE id = %s",
+                (job_id,)
+            )
+            row = cur.fetchone()
+        if row is None:
+            return None
+        for key in ('created_at', 'started_at', 'finished_at'):
+            row[key] = float(row[key]) if row[key] is not None else None
+        return dict(row)
+
+    def request_cancel(self, job_id):
+        with get_db() as conn, conn.cursor() as cur:
+            cur.execute("UPDATE ai_jobs SET cancel_requested = TRUE WHERE id = %s", (job_id,))
+            return cur.rowcount > 0
+
+    def cancel_requested(self, job):
+        if job.cancel_requested:
+            return True
+        with get_db() as conn, conn.cursor() as cur:
+            cur.execute("SELECT cancel_requested FROM ai_jobs WHERE id = %s", (job.id,))
+            row = cur.fetchone()
+        job.cancel_requested = bool(row and row['cancel_requested'])
+        return job.cancel_requested
+
+
+JOB_STORES = {
+    'memory': MemoryJobStore,
+    'postgres': PostgresJobStore,
+}
+
+
+class JobQueue:
+    def __init__(self, store, workers=JOB_WORKERS, max_queued=JOB_MAX_QUEUED,
+                 max_attempts=JOB_MAX_ATTEMPTS, backoff_base=JOB_BACKOFF_BASE,
+                 backoff_max=JOB_BACKOFF_MAX, provider=None):
+        self.store = store
+        self.workers = workers
+        self.max_queued = max_queued
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.provider = provider
+
+        self._lock = threading.Lock()
+        self._executor = None
+        self._pid = None
+        self._active = {}
+        self._stats = {'submitted': 0, 'rejected': 0, 'retries': 0,
+                       SUCCEEDED: 0, FAILED: 0, CANCELLED: 0}
+
+    def _get_executor(self):
+        # Worker threads do not survive fork(); build the pool in the process
+        # that runs the jobs.
+        if self._executor is None or self._pid != os.getpid():
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='ai-job')
+            self._pid = os.getpid()
+            self._active = {}
+        return self._executor
+
+    def submit(self, kind, params):
+        if kind not in JOB_KINDS:
+            raise InvalidJob(f'unknown job kind {kind!r}')
+        validate, _ = JOB_KINDS[kind]
+        job = Job(kind, validate(params or {}))
+        with self._lock:
+            executor = self._get_executor()
+            if len(self._active) >= self.max_queued:
+                self._stats['rejected'] += 1
+                raise QueueFull(f'{len(self._active)} jobs already queued or running')
+            self._active[job.id] = (job, threading.Event())
+            self._stats['submitted'] += 1
+        try:
+            self.store.add(job)
+            executor.submit(self._run, job)
+        except Exception:
+            with self._lock:
+                self._active.pop(job.id, None)
+            raise
+        return job.to_dict()
+
+    def get(self, job_id):
+        return self.store.get(job_id)
+
+    def cancel(self, job_id):
+        """Request cancellation; returns the job state, or None if unknown"""
+        with self._lock:
+            active = self._active.get(job_id)
+            queued = active is not None and active[0].status == QUEUED
+            if active is not None:
+                active[0].cancel_requested = True
+                if queued:
+                    # Claim it so no worker starts it
+                    active[0].status = CANCELLED
+        if active is not None:
+            active[1].set()
+            if queued:
+                self._finish(active[0], CANCELLED)
+        elif not self.store.request_cancel(job_id):
+            return None
+        return self.store.get(job_id)
+
+    def _finish(self, job, status, result=None, error=None):
+        job.status = status
+        job.result = result
+        job.error = error
+        job.finished_at = time.time()
+        self.store.update(job)
+        with self._lock:
+            self._active.pop(job.id, None)
+            self._stats[status] += 1
+
+    def _backoff(self, attempt):
+        delay = min(self.backoff_max, self.backoff_base * 2 ** (attempt - 1))
+        return delay / 2 + random.uniform(0, delay / 2)
+
+    def _run(self, job):
+        _, run = JOB_KINDS[job.kind]
+        with self._lock:
+            if job.status != QUEUED:
+                return
+            job.status = RUNNING
+            wake = self._active[job.id][1]
+        if self.store.cancel_requested(job):
+            self._finish(job, CANCELLED)
+            return
+        provider = self.provider or get_provider()
+        job.started_at = time.time()
+        self.store.update(job)
+
+        while True:
+            job.attempts += 1
+            try:
+                result = run(provider, job.params)
+            except ProviderError as e:
+                if not e.retryable or job.attempts >= self.max_attempts:
+                    self._finish(job, FAILED, error=str(e))
+                    return
+                error = str(e)
+            except Exception as e:
+                log.exception('AI job %s failed', job.id)
+                self._finish(job, FAILED, error=str(e))
+                return
+            else:
+                if self.store.cancel_requested(job):
+                    self._finish(job, CANCELLED)
+                else:
+                    self._finish(job, SUCCEEDED, result=result)
+                return
+
+            job.error = error
+            self.store.update(job)
+            with self._lock:
+                self._stats['retries'] += 1
+            wake.wait(self._backoff(job.attempts))
+            if self.store.cancel_requested(job):
+                self._finish(job, CANCELLED, error=error)
+                return
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats, active=len(self._active), workers=self.workers,
+                        max_queued=self.max_queued)
+
+
+queue = JobQueue(JOB_STORES[JOB_STORE]())
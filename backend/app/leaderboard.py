@@ -0,0 +1,212 @@
+"""Leaderboards and player stats from the stats extracted at save time.
+
+saves.record_stats writes one save_stats row per save (days survived, final
+approval/economy/absurdity/reputation/panic, leader) and keeps each player's
+best save per leader, and over all leaders, in player_bests. Both happen in
+the save's own transaction and only touch that player's rows, so a save
+never waits on a shared counter. Top-N queries are forward scans of
+idx_player_bests_rank and never touch save_data.
+
+Per-leader and global totals are folded in incrementally instead: rows are
+inserted into save_stats as pending and refresh_totals() moves a batch of
+them into save_stat_totals (claimed with SKIP LOCKED, so concurrent
+refreshes split the backlog). Reads refresh when the last refresh in this
+process is older than LEADERBOARD_REFRESH_INTERVAL seconds. Totals count
+every save ever recorded, including saves pruned by retention later.
+
+Saves written before save_stats existed are indexed from their stored
+summary with:
+
+    python leaderboard.py backfill
+"""
+
+import argparse
+import json
+import os
+import threading
+import time
+
+from db import get_db
+from saves import SUMMARY_STATS, record_stats
+
+REFRESH_INTERVAL = float(os.getenv('LEADERBOARD_REFRESH_INTERVAL', '2'))
+REFRESH_BATCH = int(os.getenv('LEADERBOARD_REFRESH_BATCH', '50000'))
+DEFAULT_LIMIT = 10
+MAX_LIMIT = 100
+ALL_LEADERS = ''
+
+_STAT_SUMS = ', '.join(f"count({stat}) AS {stat}_count, COALESCE(sum({stat}), 0) AS {stat}_sum"
+                       for stat in SUMMARY_STATS)
+_TOTAL_COLUMNS = ['saves', 'days_count', 'days_sum', 'days_max'] + [
+    f'{stat}_{part}' for stat in SUMMARY_STATS for part in ('count', 'sum')]
+
+# Claim a batch of pending rows and add them to the leader and '' totals
+REFRESH_SQL = f"""
+WITH claimed AS (
+    UPDATE save_stats s SET pending = FALSE
+    FROM (SELECT save_id FROM save_stats WHERE pending ORDER BY save_id LIMIT %s FOR UPDATE SKIP LOCKED) p
+    WHERE s.save_id = p.save_id
+    RETURNING s.*
+), grouped AS (
+    SELECT COALESCE(leader_id, '') AS leader_id, count(*) AS saves, count(days_survived) AS days_count,
+           COALESCE(sum(days_survived), 0) AS days_sum, max(days_survived) AS days_max, {_STAT_SUMS}
+    FROM claimed WHERE leader_id IS NOT NULL GROUP BY leader_id
+    UNION ALL
+    SELECT '', count(*), count(days_survived), COALESCE(sum(days_survived), 0), max(days_survived), {_STAT_SUMS}
+    FROM claimed HAVING count(*) > 0
+), upserted AS (
+    INSERT INTO save_stat_totals AS t (leader_id, {', '.join(_TOTAL_COLUMNS)})
+    SELECT leader_id, {', '.join(_TOTAL_COLUMNS)} FROM grouped ORDER BY leader_id
+    ON CONFLICT (leader_id) DO UPDATE SET
+        {', '.join(f'{c} = t.{c} + EXCLUDED.{c}' for c in _TOTAL_COLUMNS if c != 'days_max')},
+        days_max = GREATEST(t.days_max, EXCLUDED.days_max),
+        updated_at = now()
+)
+SELECT count(*) AS folded FROM claimed
+"""
+
+
+class _Refresher:
+    def __init__(self, interval=REFRESH_INTERVAL):
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._refreshed_at = 0.0
+
+    def maybe_refresh(self):
+        if time.monotonic() - self._refreshed_at < self.interval:
+            return
+        # One refreshing request per process; others serve the current totals
+        if not self._lock.acquire(blocking=False):
+            return
+        try:
+            with get_db() as conn, conn.cursor() as cur:
+                refresh_totals(cur)
+            self._refreshed_at = time.monotonic()
+        finally:
+            self._lock.release()
+
+
+_refresher = _Refresher()
+
+
+def refresh_totals(cur, batch=REFRESH_BATCH):
+    """Fold up to `batch` pending save_stats rows into save_stat_totals;
+    returns how many were folded"""
+    cur.execute(REFRESH_SQL, (batch,))
+    return cur.fetchone()['folded']
+
+
+def _clamp(limit):
+    return max(1, min(int(limit), MAX_LIMIT))
+
+
+def _entry(rank, row):
+    return {
+        'rank': rank,
+        'user_id': row['user_id'],
+        'username': row['username'],
+        'leader_id': row['leader_id'] or None,
+        'days_survived': row['best_days'],
+        'save_id': row['best_save_id'],
+        'stats': {stat: row[stat] for stat in SUMMARY_STATS if row[stat] is not None},
+        'saves': row['saves'],
+        'achieved_at': row['achieved_at'].isoformat(),
+    }
+
+
+def top_players(cur, leader_id=None, limit=DEFAULT_LIMIT):
+    """Players with the most days survived in a single save, best first"""
+    cur.execute(
+        "SELECT b.*, u.username FROM player_bests b JOIN users u ON u.id = b.user_id "
+        "WHERE b.leader_id = %s AND b.best_days IS NOT NULL "
+        "ORDER BY b.best_days DESC, b.achieved_at, b.user_id LIMIT %s",
+        (leader_id or ALL_LEADERS, _clamp(limit))
+    )
+    return [_entry(rank, row) for rank, row in enumerate(cur.fetchall(), 1)]
+
+
+def player_stats(cur, user_id):
+    """A player's best save overall and per leader, with their rank on each board"""
+    cur.execute(
+        # Two index range counts: strictly more days, and equal days reached earlier
+        "SELECT b.*, u.username, 1 + (SELECT count(*) FROM player_bests o "
+        "WHERE o.leader_id = b.leader_id AND o.best_days > b.best_days) + (SELECT count(*) FROM player_bests o "
+        "WHERE o.leader_id = b.leader_id AND o.best_days = b.best_days "
+        "AND (o.achieved_at, o.user_id) < (b.achieved_at, b.user_id)) AS position "
+        "FROM player_bests b JOIN users u ON u.id = b.user_id WHERE b.user_id = %s "
+        "ORDER BY b.leader_id",
+        (user_id,)
+    )
+    rows = cur.fetchall()
+    boards = [_entry(row['position'] if row['best_days'] is not None else None, row) for row in rows]
+    overall = next((board for board in boards if board['leader_id'] is None), None)
+    return {'user_id': user_id, 'overall': overall,
+            'leaders': [board for board in boards if board['leader_id'] is not None]}
+
+
+def _describe_totals(row):
+    def mean(total, count):
+        return round(total / count, 2) if count else None
+    return {
+        'saves': row['saves'],
+        'avg_days_survived': mean(row['days_sum'], row['days_count']),
+        'max_days_survived': row['days_max'],
+        'avg_stats': {stat: mean(row[f'{stat}_sum'], row[f'{stat}_count']) for stat in SUMMARY_STATS},
+    }
+
+
+def totals(cur):
+    """Global and per-leader save aggregates (refreshed incrementally)"""
+    _refresher.maybe_refresh()
+    cur.execute("SELECT t.*, (SELECT count(*) FROM player_bests b WHERE b.leader_id = t.leader_id) AS players "
+                "FROM save_stat_totals t ORDER BY t.saves DESC, t.leader_id")
+    result = {'global': None, 'leaders': []}
+    for row in cur.fetchall():
+        entry = dict(_describe_totals(row), players=row['players'])
+        if row['leader_id'] == ALL_LEADERS:
+            result['global'] = entry
+        else:
+            result['leaders'].append(dict(entry, leader_id=row['leader_id']))
+    return result
+
+
+def backfill(cur, batch=10000):
+    """Index saves that have no save_stats row yet from their stored summary;
+    returns the number indexed"""
+    done, after = 0, 0
+    while True:
+        cur.execute(
+            "SELECT g.id, g.user_id, g.summary, g.created_at FROM game_saves g WHERE g.id > %s AND g.summary IS NOT NULL "
+            "AND NOT EXISTS (SELECT 1 FROM save_stats s WHERE s.save_id = g.id) ORDER BY g.id LIMIT %s",
+            (after, batch)
+        )
+        rows = cur.fetchall()
+        if not rows:
+            return done
+        record_stats(cur, [(row['id'], row['user_id'], row['summary'], row['created_at']) for row in rows])
+        cur.connection.commit()
+        done += len(rows)
+        after = rows[-1]['id']
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('command', choices=('backfill', 'refresh'))
+    args = parser.parse_args()
+    with get_db() as conn, conn.cursor() as cur:
+        if args.command == 'backfill':
+            result = {'indexed': backfill(cur)}
+        else:
+            folded = 0
+            while True:
+                n = refresh_totals(cur)
+                conn.commit()
+                if not n:
+                    break
+                folded += n
+            result = {'folded': folded}
+    print(json.dumps(result))
+
+
+if __name__ == '__main__':
+    main()
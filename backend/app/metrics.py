@@ -0,0 +1,344 @@
+"""Request instrumentation exposed in Prometheus text format on /metrics.
+
+Per route: request latency, time spent in Postgres (queries, commits and
+pool waits on the get_db path), time spent in upstream AI calls, and request
+and response payload sizes. With METRICS_SLOW_REQUEST_MS set, requests
+slower than that are logged together with the most frequent stacks seen by a
+sampling profiler while they ran (METRICS_PROFILE_SAMPLE_RATE of requests
+are sampled, every METRICS_PROFILE_INTERVAL_MS).
+
+Metrics are kept per process; with several gunicorn workers each scrape
+sees the worker that answered it, so aggregate with sum() across the `pid`
+label of the process_info gauge or scrape workers individually.
+"""
+
+import logging
+import os
+import random
+import sys
+import threading
+import time
+from bisect import bisect_left
+from collections import Counter
+from contextlib import contextmanager
+
+from flask import Response, request
+
+log = logging.getLogger(__name__)
+
+METRICS_ENABLED = os.getenv('METRICS', '1').lower() not in ('0', 'false', 'no')
+SLOW_REQUEST_MS = float(os.getenv('METRICS_SLOW_REQUEST_MS', '0'))
+PROFILE_INTERVAL_MS = float(os.getenv('METRICS_PROFILE_INTERVAL_MS', '5'))
+PROFILE_SAMPLE_RATE = float(os.getenv('METRICS_PROFILE_SAMPLE_RATE', '1'))
+PROFILE_TOP_STACKS = 5
+PROFILE_MAX_DEPTH = 40
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+SIZE_BUCKETS = (128, 512, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names, values, extra=None):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+class Histogram:
+    def __init__(self, name, help, labels=(), buckets=LATENCY_BUCKETS, lock=None):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = buckets
+        self._series = {}
+        self._lock = lock or threading.Lock()
+
+    def observe(self, value, *label_values):
+        with self._lock:
+            self.observe_locked(value, label_values)
+
+    def observe_locked(self, value, label_values):
+        """observe() for callers already holding the histogram's lock"""
+        series = self._series.get(label_values)
+        if series is None:
+            series = self._series[label_values] = [[0] * (len(self.buckets) + 1), 0.0]
+        series[0][bisect_left(self.buckets, value)] += 1
+        series[1] += value
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            series = [(key, list(counts), total) for key, (counts, total) in self._series.items()]
+        for key, counts, total in sorted(series):
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                le = f'le="{bound}"'
+                lines.append(f'{self.name}_bucket{_labels(self.labels, key, le)} {cumulative}')
+            cumulative += counts[-1]
+            le = 'le="+Inf"'
+            lines.append(f'{self.name}_bucket{_labels(self.labels, key, le)} {cumulative}')
+            lines.append(f'{self.name}_sum{_labels(self.labels, key)} {total}')
+            lines.append(f'{self.name}_count{_labels(self.labels, key)} {cumulative}')
+        return lines
+
+
+# The per-request histograms share one lock so a finished request is recorded in a single acquisition
+_request_lock = threading.Lock()
+REQUEST_SECONDS = Histogram('http_request_duration_seconds', 'Request latency',
+                            ('method', 'route', 'status'), lock=_request_lock)
+REQUEST_DB_SECONDS = Histogram('http_request_db_seconds', 'Time per request spent in Postgres',
+                               ('method', 'route'), lock=_request_lock)
+REQUEST_UPSTREAM_SECONDS = Histogram('http_request_upstream_seconds',
+                                     'Time per request spent in upstream AI calls', ('method', 'route'),
+                                     lock=_request_lock)
+REQUEST_BYTES = Histogram('http_request_size_bytes', 'Request body size as received',
+                          ('method', 'route'), SIZE_BUCKETS, lock=_request_lock)
+RESPONSE_BYTES = Histogram('http_response_size_bytes', 'Response body size as sent',
+                           ('method', 'route'), SIZE_BUCKETS, lock=_request_lock)
+DB_SECONDS = Histogram('db_operation_duration_seconds', 'Postgres operations on the get_db path',
+                       ('operation',))
+UPSTREAM_SECONDS = Histogram('ai_upstream_duration_seconds', 'Upstream AI provider calls',
+                             ('provider', 'operation', 'outcome'))
+
+HISTOGRAMS = [REQUEST_SECONDS, REQUEST_DB_SECONDS, REQUEST_UPSTREAM_SECONDS, REQUEST_BYTES,
+              RESPONSE_BYTES, DB_SECONDS, UPSTREAM_SECONDS]
+
+# prefix -> callable returning {name: number}, rendered as gauges at scrape time
+_gauges = {}
+_local = threading.local()
+
+
+def register_gauges(prefix, collect, help=''):
+    _gauges[prefix] = (collect, help)
+
+
+class _RequestState:
+    __slots__ = ('start', 'db', 'db_ops', 'upstream', 'thread_id', 'stacks', 'streamed', 'finished')
+
+    def __init__(self, profiled):
+        self.start = time.perf_counter()
+        self.db = 0.0
+        self.db_ops = 0
+        self.upstream = 0.0
+        self.thread_id = threading.get_ident()
+        self.stacks = Counter() if profiled else None
+        self.streamed = False
+        self.finished = False
+
+
+def observe_db(seconds, operation='query'):
+    if not METRICS_ENABLED:
+        return
+    DB_SECONDS.observe(seconds, operation)
+    state = getattr(_local, 'request', None)
+    if state is not None:
+        state.db += seconds
+        state.db_ops += 1
+
+
+def observe_upstream(seconds, provider, operation, outcome='ok'):
+    if not METRICS_ENABLED:
+        return
+    UPSTREAM_SECONDS.observe(seconds, provider, operation, outcome)
+    state = getattr(_local, 'request', None)
+    if state is not None:
+        state.upstream += seconds
+
+
+@contextmanager
+def upstream_timer(provider, operation):
+    start = time.perf_counter()
+    outcome = 'error'
+    try:
+        yield
+        outcome = 'ok'
+    finally:
+        observe_upstream(time.perf_counter() - start, provider, operation, outcome)
+
+
+def timed_iter(iterable, provider, operation):
+    """Iterate a streamed upstream response, counting only time spent waiting on it"""
+    waited = 0.0
+    outcome = 'error'
+    iterator = iter(iterable)
+    try:
+        while True:
+            start = time.perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                waited += time.perf_counter() - start
+                outcome = 'ok'
+                return
+            waited += time.perf_counter() - start
+            yield item
+    except GeneratorExit:
+        outcome = 'cancelled'
+        raise
+    finally:
+        observe_upstream(waited, provider, operation, outcome)
+
+
+class _Sampler:
+    """Samples the stacks of in-flight profiled requests from a background thread"""
+
+    def __init__(self, interval):
+        self.interval = interval
+        self._requests = {}
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+        self._pid = None
+
+    def add(self, state):
+        with self._lock:
+            self._requests[state.thread_id] = state
+            if self._thread is None or self._pid != os.getpid():
+                self._pid = os.getpid()
+                self._thread = threading.Thread(target=self._run, name='metrics-profiler', daemon=True)
+                self._thread.start()
+        self._wake.set()
+
+    def remove(self, state):
+        with self._lock:
+            if self._requests.get(state.thread_id) is state:
+                del self._requests[state.thread_id]
+
+    def _run(self):
+        while True:
+            with self._lock:
+                active = list(self._requests.values())
+            if not active:
+                self._wake.wait()
+                self._wake.clear()
+                continue
+            frames = sys._current_frames()
+            for state in active:
+                frame = frames.get(state.thread_id)
+                if frame is not None and not state.finished:
+                    state.stacks[_collapse(frame)] += 1
+            time.sleep(self.interval)
+
+
+def _collapse(frame):
+    parts = []
+    while frame is not None and len(parts) < PROFILE_MAX_DEPTH:
+        code = frame.f_code
+        parts.append(f'{os.path.basename(code.co_filename)}:{code.co_name}:{frame.f_lineno}')
+        frame = frame.f_back
+    return ';'.join(reversed(parts))
+
+
+_sampler = _Sampler(PROFILE_INTERVAL_MS / 1000)
+
+
+def _before_request():
+    profiled = SLOW_REQUEST_MS > 0 and random.random() < PROFILE_SAMPLE_RATE
+    state = _local.request = _RequestState(profiled)
+    if profiled:
+        _sampler.add(state)
+
+
+def _finish(state, method, route, status, request_bytes, response_bytes):
+    if state.finished:
+        return
+    state.finished = True
+    if getattr(_local, 'request', None) is state:
+        _local.request = None
+    elapsed = time.perf_counter() - state.start
+    key = (method, route)
+    with _request_lock:
+        REQUEST_SECONDS.observe_locked(elapsed, (method, route, status))
+        REQUEST_DB_SECONDS.observe_locked(state.db, key)
+        REQUEST_UPSTREAM_SECONDS.observe_locked(state.upstream, key)
+        if request_bytes is not None:
+            REQUEST_BYTES.observe_locked(request_bytes, key)
+        if response_bytes is not None:
+            RESPONSE_BYTES.observe_locked(response_bytes, key)
+    if state.stacks is not None:
+        _sampler.remove(state)
+    if SLOW_REQUEST_MS and elapsed * 1000 >= SLOW_REQUEST_MS:
+        stacks = ''
+        if state.stacks:
+            samples = sum(state.stacks.values())
+            stacks = ''.join(f'\n  {count}/{samples} {stack}'
+                             for stack, count in state.stacks.most_common(PROFILE_TOP_STACKS))
+        log.warning('slow request %s %s -> %s in %.1fms (db %.1fms over %d ops, upstream %.1fms)%s',
+                    method, route, status, elapsed * 1000, state.db * 1000, state.db_ops,
+                    state.upstream * 1000, stacks)
+
+
+def _after_request(response):
+    state = getattr(_local, 'request', None)
+    if state is None:
+        return response
+    req = request._get_current_object()
+    environ = req.environ
+    method = environ['REQUEST_METHOD']
+    rule = req.url_rule
+    route = rule.rule if rule is not None else 'unmatched'
+    length = environ.get('CONTENT_LENGTH')
+    request_bytes = int(length) if length and length.isdigit() else None
+    status = str(response.status_code)
+    if response.is_streamed:
+        # Streamed bodies are produced after this hook (and after teardown);
+        # finish when the server closes them
+        state.streamed = True
+        response.call_on_close(lambda: _finish(state, method, route, status, request_bytes, None))
+    else:
+        _finish(state, method, route, status, request_bytes, response.content_length)
+    return response
+
+
+def _teardown_request(exc):
+    state = getattr(_local, 'request', None)
+    if state is None or state.streamed:
+        return
+    _local.request = None
+    if state.stacks is not None and exc is not None:
+        _sampler.remove(state)
+
+
+def render():
+    lines = []
+    for histogram in HISTOGRAMS:
+        lines.extend(histogram.render())
+    lines.append('# TYPE process_info gauge')
+    lines.append(f'process_info{{pid="{os.getpid()}"}} 1')
+    for prefix, (collect, help) in sorted(_gauges.items()):
+        try:
+            values = collect()
+        except Exception:
+            log.exception('metrics collector %s failed', prefix)
+            continue
+        for name, value in sorted(values.items()):
+            if isinstance(value, bool) or not isinstance(value, (int, float)):
+                continue
+            if help:
+                lines.append(f'# HELP {prefix}_{name} {help}')
+            lines.append(f'# TYPE {prefix}_{name} gauge')
+            lines.append(f'{prefix}_{name} {value}')
+    return '\n'.join(lines) + '\n'
+
+
+def metrics_view():
+    return Response(render(), mimetype='text/plain; version=0.0.4')
+
+
+def init_app(app):
+    """Install the request hooks and the /metrics route.
+
+    Call before other after_request hooks (e.g. compression) are registered:
+    Flask runs them in reverse order, so this one then sees the final body.
+    """
+    if not METRICS_ENABLED:
+        return
+    app.before_request(_before_request)
+    app.after_request(_after_request)
+    app.teardown_request(_teardown_request)
+    app.add_url_rule('/metrics', 'metrics', metrics_view, methods=['GET'])
@@ -0,0 +1,222 @@
+"""Pluggable AI content providers.
+
+The backend talks to content generators only through this interface, so the
+OpenAI client can be swapped for the deterministic FakeProvider in tests and
+benchmarks (AI_PROVIDER=fake). The openai package is imported on first use.
+Providers returned by get_provider() answer repeated requests from the
+response cache in ai_cache (disable with AI_CACHE=0).
+"""
+
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+
+import ai_cache
+import metrics
+
+CARD_SYSTEM_PROMPT = ("You are a creative writer for a political simulation game. "
+                      "Generate balanced, realistic decision cards.")
+
+CARD_PROMPT = """Generate {count} decision cards for Executive Disorder, a political simulation game.
+
+Theme: {theme}
+
+For each card, provide:
+1. Title (10-15 words)
+2. Description (30-50 words)
+3. 2-3 choices with consequences for: Popularity, Stability, MediaTrust, EconomicHealth (values -20 to +20)
+
+Format as JSON array."""
+
+
+class ProviderError(Exception):
+    """Generation failed; `retryable` marks transient failures (rate limits, timeouts)"""
+
+    def __init__(self, message, retryable=False):
+        super().__init__(message)
+        self.retryable = retryable
+
+
+class AIProvider:
+    name = 'base'
+
+    def generate_cards(self, theme, count):
+        """Raw model output for `count` cards (a JSON array as text)"""
+        raise NotImplementedError
+
+    def stream_cards(self, theme, count):
+        """Same output as generate_cards, yielded as text fragments while it is produced"""
+        yield self.generate_cards(theme, count)
+
+    def generate_image(self, prompt):
+        """URL of a generated image"""
+        raise NotImplementedError
+
+
+class OpenAIProvider(AIProvider):
+    name = 'openai'
+
+    def __init__(self, api_key=None, card_model='gpt-4', image_model='dall-e-3'):
+        self.api_key = api_key or os.getenv('OPENAI_API_KEY')
+        self.card_model = card_model
+        self.image_model = image_model
+        self._client = None
+        self._lock = threading.Lock()
+
+    def _get_client(self):
+        if not self.api_key:
+            raise ProviderError('OpenAI API key not configured')
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    import openai
+                    self._client = openai.OpenAI(api_key=self.api_key)
+        return self._client
+
+    def _call(self, operation, fn, **kwargs):
+        import openai
+        try:
+            with metrics.upstream_timer(self.name, operation):
+                return fn(**kwargs)
+        except (openai.RateLimitError, openai.APITimeoutError,
+                openai.APIConnectionError, openai.InternalServerError) as e:
+            raise ProviderError(str(e), retryable=True)
+        except openai.OpenAIError as e:
+            raise ProviderError(str(e))
+
+    def _card_request(self, theme, count, **kwargs):
+        client = self._get_client()
+        return self._call(
+            'cards_stream' if kwargs.get('stream') else 'cards',
+            client.chat.completions.create,
+            model=self.card_model,
+            messages=[
+                {"role": "system", "content": CARD_SYSTEM_PROMPT},
+                {"role": "user", "content": CARD_PROMPT.format(count=count, theme=theme)}
+            ],
+            max_tokens=1500,
+            temperature=0.8,
+            **kwargs
+        )
+
+    def generate_cards(self, theme, count):
+        return self._card_request(theme, count).choices[0].message.content
+
+    def stream_cards(self, theme, count):
+        import openai
+        stream = self._card_request(theme, count, stream=True)
+        try:
+            for chunk in metrics.timed_iter(stream, self.name, 'cards_stream_body'):
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+        except openai.OpenAIError as e:
+            raise ProviderError(str(e), retryable=isinstance(e, openai.APIConnectionError))
+        finally:
+            stream.close()
+
+    def generate_image(self, prompt):
+        client = self._get_client()
+        response = self._call(
+            'image',
+            client.images.generate,
+            model=self.image_model,
+            prompt=prompt,
+            size="1024x1024",
+            quality="standard",
+            n=1
+        )
+        return response.data[0].url
+
+
+class FakeProvider(AIProvider):
+    """Deterministic local stand-in: output depends only on the inputs.
+
+    `latency` seconds are slept per call and `failure_rate` of the calls
+    raise a retryable ProviderError, to exercise queueing and retries.
+    Streamed output arrives in `chunk_size` character fragments with
+    `token_latency` seconds between them.
+    """
+
+    name = 'fake'
+
+    def __init__(self, latency=None, failure_rate=None, token_latency=None, chunk_size=4):
+        self.latency = float(os.getenv('FAKE_AI_LATENCY', '0.05')) if latency is None else latency
+        self.failure_rate = float(os.getenv('FAKE_AI_FAILURE_RATE', '0')) if failure_rate is None else failure_rate
+        self.token_latency = (float(os.getenv('FAKE_AI_TOKEN_LATENCY', '0.002'))
+                              if token_latency is None else token_latency)
+        self.chunk_size = chunk_size
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def _begin(self, operation):
+        with self._lock:
+            self.calls += 1
+        with metrics.upstream_timer(self.name, operation):
+            if self.latency:
+                time.sleep(self.latency)
+            if self.failure_rate and random.random() < self.failure_rate:
+                raise ProviderError('fake provider: simulated rate limit', retryable=True)
+
+    @staticmethod
+    def fake_cards(theme, count):
+        cards = []
+        for index in range(count):
+            digest = hashlib.sha256(f'{theme}:{index}'.encode()).digest()
+            cards.append({
+                'title': f'{theme} decree #{index + 1}: a bold and entirely reasonable policy shift',
+                'description': f'Advisors propose a sweeping {theme.lower()} measure. '
+                               'The press is already drafting headlines.',
+                'choices': [
+                    {'text': 'Approve it', 'effects': {'Popularity': digest[0] % 41 - 20,
+                                                        'Stability': digest[1] % 41 - 20}},
+                    {'text': 'Veto it', 'effects': {'MediaTrust': digest[2] % 41 - 20,
+                                                     'EconomicHealth': digest[3] % 41 - 20}},
+                ],
+            })
+        return cards
+
+    def generate_cards(self, theme, count):
+        self._begin('cards')
+        return json.dumps(self.fake_cards(theme, count))
+
+    def stream_cards(self, theme, count):
+        self._begin('cards_stream')
+        text = json.dumps(self.fake_cards(theme, count), indent=2)
+        yield from metrics.timed_iter(self._tokens(text), self.name, 'cards_stream_body')
+
+    def _tokens(self, text):
+        for start in range(0, len(text), self.chunk_size):
+            if self.token_latency:
+                time.sleep(self.token_latency)
+            yield text[start:start + self.chunk_size]
+
+    def generate_image(self, prompt):
+        self._begin('image')
+        digest = hashlib.sha256(prompt.encode()).hexdigest()[:16]
+        return f'https://images.invalid/fake/{digest}.png'
+
+
+PROVIDERS = {
+    'openai': OpenAIProvider,
+    'fake': FakeProvider,
+}
+
+_providers = {}
+_providers_lock = threading.Lock()
+
+
+def get_provider(name=None):
+    """Process-wide provider instance selected by name or AI_PROVIDER"""
+    name = name or os.getenv('AI_PROVIDER', 'openai')
+    if name not in PROVIDERS:
+        raise ValueError(f'unknown AI provider {name!r}')
+    with _providers_lock:
+        if name not in _providers:
+            provider = PROVIDERS[name]()
+            if ai_cache.CACHE_ENABLED:
+                provider = ai_cache.CachingProvider(provider, ai_cache.cache)
+            _providers[name] = provider
+        return _providers[name]
@@ -0,0 +1,477 @@
+"""Per-user retention for game_saves and the background compaction job.
+
+Policy (SAVE_RETENTION_KEEP_LAST > 0 enables it): for every user keep
+
+* the newest SAVE_RETENTION_KEEP_LAST saves,
+* the newest save of each calendar day, for SAVE_RETENTION_DAILY_DAYS days
+  (0 = every day, forever),
+* anything younger than SAVE_RETENTION_MIN_AGE_HOURS,
+* every snapshot that a kept delta save is a patch against,
+
+and prune the rest. Compaction walks users in batches of
+SAVE_COMPACTION_USER_BATCH and deletes at most SAVE_COMPACTION_ROW_BATCH rows
+per transaction, pausing SAVE_COMPACTION_PAUSE seconds between transactions,
+so it only ever holds row locks on the rows it deletes, for one short
+transaction. Candidates are locked FOR UPDATE SKIP LOCKED and the delta
+references are checked again after locking; saves.insert_save key-share
+locks the snapshot of a new delta, so the two cannot race into a delta
+without its snapshot. Space is reclaimed by (auto)vacuum as usual.
+
+With the partitioned schema (see schema.sql) each pass also creates the
+monthly partitions up to SAVE_PARTITION_MONTHS_AHEAD months ahead, moves
+rows that landed in game_saves_default into their month, and drops past
+partitions that retention has emptied. A partition is detached before it is
+dropped. With the default partition schema.sql creates, Postgres only allows
+the plain DETACH, which holds ACCESS EXCLUSIVE on game_saves: that
+transaction waits at most SAVE_COMPACTION_LOCK_TIMEOUT_MS for the lock and
+commits right after the detach, and the DROP runs in its own transaction on
+the detached table. Without a default partition the detach is CONCURRENTLY
+and does not block reads or writes.
+
+Every gunicorn worker runs the job every SAVE_COMPACTION_INTERVAL seconds
+(0 disables it); a session advisory lock lets only one pass run at a time.
+One-off passes:
+
+    python retention.py [--dry-run]
+"""
+
+import argparse
+import json
+import logging
+import os
+import threading
+import time
+from datetime import date
+
+from psycopg2 import errors
+
+from db import get_db
+
+log = logging.getLogger(__name__)
+
+KEEP_LAST = int(os.getenv('SAVE_RETENTION_KEEP_LAST', '0'))
+DAILY_DAYS = int(os.getenv('SAVE_RETENTION_DAILY_DAYS', '0'))
+MIN_AGE_HOURS = float(os.getenv('SAVE_RETENTION_MIN_AGE_HOURS', '24'))
+RETENTION_ENABLED = KEEP_LAST > 0
+
+COMPACTION_INTERVAL = float(os.getenv('SAVE_COMPACTION_INTERVAL', '3600'))
+USER_BATCH = int(os.getenv('SAVE_COMPACTION_USER_BATCH', '200'))
+ROW_BATCH = int(os.getenv('SAVE_COMPACTION_ROW_BATCH', '1000'))
+PAUSE = float(os.getenv('SAVE_COMPACTION_PAUSE', '0.05'))
+LOCK_TIMEOUT_MS = int(os.getenv('SAVE_COMPACTION_LOCK_TIMEOUT_MS', '2000'))
+MONTHS_AHEAD = int(os.getenv('SAVE_PARTITION_MONTHS_AHEAD', '2'))
+
+ADVISORY_LOCK_ID = 0x5a7e5c0d  # pg_try_advisory_lock key for compaction passes
+PARTITION_PREFIX = 'game_saves_p'
+DEFAULT_PARTITION = 'game_saves_default'
+
+STORED_BYTES = ("COALESCE(pg_column_size(g.save_data), 0) + COALESCE(pg_column_size(g.save_blob), 0) "
+                "+ COALESCE(pg_column_size(g.summary), 0)")
+
+# Rows of the given users that the policy no longer keeps, oldest first.
+# Snapshots referenced by a kept delta are never candidates.
+CANDIDATES_SQL = """
+WITH ranked AS (
+    SELECT id, created_at, base_id,
+           row_number() OVER (PARTITION BY user_id ORDER BY created_at DESC, id DESC) AS rn,
+           row_number() OVER (PARTITION BY user_id, date_trunc('day', created_at)
+                              ORDER BY created_at DESC, id DESC) AS day_rn
+    FROM game_saves WHERE user_id = ANY(%(users)s)
+), marked AS (
+    SELECT id, created_at, base_id,
+           rn <= %(keep_last)s
+           OR created_at >= LOCALTIMESTAMP - make_interval(secs => %(min_age)s)
+           OR (day_rn = 1 AND (%(daily_days)s = 0
+                               OR created_at >= LOCALTIMESTAMP - make_interval(days => %(daily_days)s)))
+           AS keep
+    FROM ranked
+)
+SELECT g.id, g.created_at FROM game_saves g JOIN marked m ON m.id = g.id AND m.created_at = g.created_at
+WHERE NOT m.keep
+  AND g.id NOT IN (SELECT base_id FROM marked WHERE keep AND base_id IS NOT NULL)
+ORDER BY g.created_at, g.id
+LIMIT %(limit)s
+FOR UPDATE OF g SKIP LOCKED
+"""
+
+# Re-checked after locking: a delta committed since the candidates were
+# chosen still protects its snapshot.
+DELETE_SQL = f"""
+DELETE FROM game_saves g
+USING unnest(%(ids)s::int[], %(created)s::timestamp[]) AS c(id, created_at)
+WHERE g.id = c.id AND g.created_at = c.created_at
+  AND NOT EXISTS (SELECT 1 FROM game_saves d WHERE d.base_id = g.id AND d.id <> ALL(%(ids)s))
+RETURNING g.id, {STORED_BYTES} AS bytes
+"""
+
+
+def _month_start(day, offset=0):
+    months = day.year * 12 + day.month - 1 + offset
+    return date(months // 12, months % 12 + 1, 1)
+
+
+def is_partitioned(cur):
+    cur.execute("SELECT EXISTS (SELECT 1 FROM pg_partitioned_table WHERE partrelid = 'game_saves'::regclass) AS p")
+    return cur.fetchone()['p']
+
+
+def _partitions(cur):
+    """{month start: partition name} of the monthly partitions"""
+    cur.execute(
+        "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+        "WHERE i.inhparent = 'game_saves'::regclass AND c.relname LIKE %s",
+        (PARTITION_PREFIX + '%',)
+    )
+    months = {}
+    for row in cur.fetchall():
+        suffix = row['relname'][len(PARTITION_PREFIX):]
+        if len(suffix) == 6 and suffix.isdigit():
+            months[date(int(suffix[:4]), int(suffix[4:]), 1)] = row['relname']
+    return months
+
+
+def _move_parked(conn, cur, name, bounds, row_batch=ROW_BATCH, pause=PAUSE):
+    """Move the rows parked in the default partition for one month into the
+    partition `name` and attach it. The rows are copied into the standalone
+    table in batches of `row_batch`, one short transaction each, while they stay
+    visible in the default partition; the last transaction copies stragglers,
+    drops rows pruned meanwhile, deletes the originals and attaches."""
+    cur.execute(f"CREATE TABLE IF NOT EXISTS {name} (LIKE game_saves INCLUDING ALL)")
+    # Resume after the rows an interrupted pass already copied
+    cur.execute(f"SELECT created_at, id FROM {name} ORDER BY created_at DESC, id DESC LIMIT 1")
+    last = cur.fetchone()
+    after = (last['created_at'], last['id']) if last else (bounds[0], 0)
+    conn.commit()
+    while True:
+        cur.execute(f"INSERT INTO {name} SELECT * FROM {DEFAULT_PARTITION} "
+                    "WHERE created_at >= %s AND created_at < %s AND (created_at, id) > (%s, %s) "
+                    "ORDER BY created_at, id LIMIT %s RETURNING created_at, id", (*bounds, *after, row_batch))
+        copied = cur.fetchall()
+        conn.commit()
+        if len(copied) < row_batch:
+            break
+        after = max((row['created_at'], row['id']) for row in copied)
+        time.sleep(pause)
+
+    cur.execute("SET LOCAL lock_timeout = %s", (LOCK_TIMEOUT_MS,))
+    # ATTACH takes this lock on the default partition anyway; taking it first
+    # keeps the rows from changing between the statements below.
+    cur.execute(f"LOCK TABLE {DEFAULT_PARTITION} IN ACCESS EXCLUSIVE MODE")
+    cur.execute(f"INSERT INTO {name} SELECT * FROM {DEFAULT_PARTITION} d "
+                "WHERE d.created_at >= %s AND d.created_at < %s "
+                f"AND NOT EXISTS (SELECT 1 FROM {name} n WHERE n.id = d.id AND n.created_at = d.created_at)", bounds)
+    cur.execute(f"DELETE FROM {name} n WHERE NOT EXISTS (SELECT 1 FROM {DEFAULT_PARTITION} d "
+                "WHERE d.id = n.id AND d.created_at = n.created_at)")
+    cur.execute(f"DELETE FROM {DEFAULT_PARTITION} WHERE created_at >= %s AND created_at < %s", bounds)
+    cur.execute(f"ALTER TABLE game_saves ATTACH PARTITION {name} FOR VALUES FROM (%s) TO (%s)", bounds)
+    conn.commit()
+
+
+def ensure_partitions(conn, cur, months_ahead=MONTHS_AHEAD):
+    """Create missing monthly partitions from the oldest row parked in the
+    default partition up to `months_ahead` months from now, moving those
+    rows into them (see _move_parked). Each partition is created in its own
+    transaction, waiting at most LOCK_TIMEOUT_MS for the locks on game_saves;
+    one that cannot get them is left for the next pass. Returns the names
+    created. No-op when unpartitioned."""
+    if not is_partitioned(cur):
+        return []
+    existing = _partitions(cur)
+    cur.execute(f"SELECT MIN(created_at) AS oldest, MAX(created_at) AS newest FROM {DEFAULT_PARTITION}")
+    parked = cur.fetchone()
+    conn.commit()
+    today = date.today()
+    first = _month_start(min(parked['oldest'].date(), today)) if parked['oldest'] else _month_start(today)
+    last = _month_start(max(parked['newest'].date(), today) if parked['newest'] else today, months_ahead)
+
+    current = _month_start(today)
+    created = []
+    month = first
+    while month <= last:
+        upper = _month_start(month, 1)
+        name = f'{PARTITION_PREFIX}{month:%Y%m}'
+        bounds = (month.isoformat(), upper.isoformat())
+        if month not in existing:
+            try:
+                cur.execute(f"SELECT EXISTS (SELECT 1 FROM {DEFAULT_PARTITION} "
+                            "WHERE created_at >= %s AND created_at < %s) AS parked", bounds)
+                if cur.fetchone()['parked']:
+                    # Attaching a range the default partition still has rows for
+                    # fails, so build the partition standalone and attach it.
+                    _move_parked(conn, cur, name, bounds)
+                    created.append(name)
+                else:
+                    # Staging table of an interrupted move whose rows were pruned since
+                    cur.execute(f"DROP TABLE IF EXISTS {name}")
+                    if month >= current:
+                        cur.execute("SET LOCAL lock_timeout = %s", (LOCK_TIMEOUT_MS,))
+                        cur.execute(f"CREATE TABLE {name} PARTITION OF game_saves FOR VALUES FROM (%s) TO (%s)",
+                                    bounds)
+                        created.append(name)
+                    conn.commit()
+            except errors.LockNotAvailable:
+                conn.rollback()
+                log.info('game_saves is busy; creating partition %s on the next pass', name)
+        month = upper
+    if created:
+        log.info('created game_saves partitions %s', ', '.join(created))
+    return created
+
+
+def _has_default_partition(cur):
+    cur.execute("SELECT partdefid <> 0 AS has_default FROM pg_partitioned_table "
+                "WHERE partrelid = 'game_saves'::regclass")
+    return cur.fetchone()['has_default']
+
+
+def _pending_detach(cur):
+    """Partitions left half-detached by an interrupted DETACH ... CONCURRENTLY"""
+    cur.execute("SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+                "WHERE i.inhparent = 'game_saves'::regclass AND i.inhdetachpending")
+    return {row['relname'] for row in cur.fetchall()}
+
+
+def _detach_concurrently(conn, cur, name, finalize=False):
+    """DETACH ... CONCURRENTLY only takes SHARE UPDATE EXCLUSIVE on game_saves,
+    so reads and writes go on; it cannot run in a transaction block."""
+    conn.commit()
+    conn.autocommit = True
+    try:
+        cur.execute("SET lock_timeout = %s", (LOCK_TIMEOUT_MS,))
+        cur.execute(f"ALTER TABLE game_saves DETACH PARTITION {name} {'FINALIZE' if finalize else 'CONCURRENTLY'}")
+    finally:
+        cur.execute("RESET lock_timeout")
+        conn.autocommit = False
+
+
+def drop_empty_partitions(conn, cur):
+    """Detach past monthly partitions that hold no rows, then drop them in a
+    separate transaction that only locks the detached table; returns (names,
+    bytes). A partition whose lock is busy is left for the next pass."""
+    current = _month_start(date.today())
+    concurrently = not _has_default_partition(cur)
+    pending = _pending_detach(cur) if concurrently else set()
+    conn.commit()
+    dropped, reclaimed = [], 0
+    for month, name in sorted(_partitions(cur).items()):
+        if month >= current:
+            continue
+        cur.execute(f"SELECT EXISTS (SELECT 1 FROM {name}) AS used, pg_total_relation_size(%s) AS bytes", (name,))
+        row = cur.fetchone()
+        conn.commit()
+        if row['used']:
+            continue
+        try:
+            if concurrently:
+                _detach_concurrently(conn, cur, name, finalize=name in pending)
+                # A late insert may have reached the partition before it was detached
+                cur.execute(f"SELECT EXISTS (SELECT 1 FROM {name}) AS used")
+                if cur.fetchone()['used']:
+                    # Without a default partition ATTACH does not block reads or writes either
+                    cur.execute(f"ALTER TABLE game_saves ATTACH PARTITION {name} FOR VALUES FROM (%s) TO (%s)",
+                                (month.isoformat(), _month_start(month, 1).isoformat()))
+                    conn.commit()
+                    continue
+            else:
+                cur.execute("SET LOCAL lock_timeout = %s", (LOCK_TIMEOUT_MS,))
+                cur.execute(f"ALTER TABLE game_saves DETACH PARTITION {name}")
+                # Checked under the lock: a late insert undoes the detach
+                cur.execute(f"SELECT EXISTS (SELECT 1 FROM {name}) AS used")
+                if cur.fetchone()['used']:
+                    conn.rollback()
+                    continue
+                conn.commit()
+        except errors.LockNotAvailable:
+            conn.rollback()
+            log.info('game_saves partition %s is busy; dropping it on the next pass', name)
+            continue
+        # Detached, so nothing but this pass can reach the table any more
+        cur.execute(f"DROP TABLE {name}")
+        conn.commit()
+        dropped.append(name)
+        reclaimed += row['bytes']
+    return dropped, reclaimed
+
+
+def prune_users(cur, user_ids, limit=ROW_BATCH, keep_last=KEEP_LAST, daily_days=DAILY_DAYS,
+                min_age_hours=MIN_AGE_HOURS):
+    """Delete up to `limit` prunable saves of `user_ids` in the current
+    transaction. Returns (candidates, rows deleted, bytes of their payloads)."""
+    cur.execute(CANDIDATES_SQL, {'users': list(user_ids), 'keep_last': max(keep_last, 1),
+                                 'daily_days': daily_days, 'min_age': min_age_hours * 3600, 'limit': limit})
+    candidates = cur.fetchall()
+    if not candidates:
+        return 0, 0, 0
+    cur.execute(DELETE_SQL, {'ids': [row['id'] for row in candidates],
+                             'created': [row['created_at'] for row in candidates]})
+    deleted = cur.fetchall()
+    return len(candidates), len(deleted), sum(row['bytes'] for row in deleted)
+
+
+class Compactor:
+    """Runs compaction passes in a background thread and keeps their stats"""
+
+    def __init__(self, interval=COMPACTION_INTERVAL):
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._manual = None
+        self._pid = None
+        self._last = None
+        self._totals = {'passes': 0, 'passes_skipped': 0, 'failures': 0,
+                        'rows_deleted': 0, 'bytes_reclaimed': 0, 'partitions_dropped': 0}
+
+    def start(self):
+        """Start the background thread (once per process; after fork again)"""
+        if self.interval <= 0 or not RETENTION_ENABLED:
+            return
+        with self._lock:
+            if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+                return
+            self._pid = os.getpid()
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name='save-compaction', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.run_once()
+            except Exception:
+                log.exception('save compaction pass failed')
+                with self._lock:
+                    self._totals['failures'] += 1
+
+    def trigger(self, dry_run=False):
+        """Start a pass in a background thread (for the admin endpoint, whose
+        request would otherwise outlive the gunicorn timeout). False if this
+        process is already running one; the report lands in last_report()."""
+        with self._lock:
+            if self._manual is not None and self._manual.is_alive():
+                return False
+            self._manual = threading.Thread(target=self._run_manual, args=(dry_run,),
+                                            name='save-compaction-manual', daemon=True)
+            self._manual.start()
+            return True
+
+    def _run_manual(self, dry_run):
+        try:
+            if self.run_once(dry_run=dry_run) is None:
+                log.info('manual save compaction skipped: another pass is running')
+        except Exception:
+            log.exception('manual save compaction pass failed')
+            with self._lock:
+                self._totals['failures'] += 1
+
+    def run_once(self, dry_run=False, user_batch=USER_BATCH, row_batch=ROW_BATCH, pause=PAUSE):
+        """One full pass over all users. Returns its report, or None if another
+        process is running a pass right now."""
+        started = time.perf_counter()
+        report = {'dry_run': dry_run, 'users_scanned': 0, 'batches': 0, 'rows_deleted': 0,
+                  'bytes_reclaimed': 0, 'snapshots_deferred': 0, 'lock_timeouts': 0,
+                  'partitions_created': [], 'partitions_dropped': [], 'partition_bytes_dropped': 0}
+        with get_db() as conn, conn.cursor() as cur:
+            cur.execute("SELECT pg_try_advisory_lock(%s) AS locked", (ADVISORY_LOCK_ID,))
+            if not cur.fetchone()['locked']:
+                with self._lock:
+                    self._totals['passes_skipped'] += 1
+                return None
+            try:
+                partitioned = is_partitioned(cur)
+                conn.commit()
+                if partitioned and not dry_run:
+                    report['partitions_created'] = ensure_partitions(conn, cur)
+                self._prune_all(conn, cur, report, dry_run, user_batch, row_batch, pause)
+                if partitioned and not dry_run:
+                    report['partitions_dropped'], report['partition_bytes_dropped'] = \
+                        drop_empty_partitions(conn, cur)
+            finally:
+                # A broken connection is discarded by the pool, which releases the lock
+                if not conn.closed:
+                    conn.rollback()
+                    cur.execute("SELECT pg_advisory_unlock(%s)", (ADVISORY_LOCK_ID,))
+        report['duration_s'] = round(time.perf_counter() - started, 3)
+        log.info('save compaction%s: %d rows, %d bytes reclaimed in %.1fs',
+                 ' (dry run)' if dry_run else '', report['rows_deleted'], report['bytes_reclaimed'],
+                 report['duration_s'])
+        with self._lock:
+            self._last = dict(report, finished_at=time.time())
+            if not dry_run:
+                self._totals['passes'] += 1
+                self._totals['rows_deleted'] += report['rows_deleted']
+                self._totals['bytes_reclaimed'] += report['bytes_reclaimed'] + report['partition_bytes_dropped']
+                self._totals['partitions_dropped'] += len(report['partitions_dropped'])
+        return report
+
+    def _prune_all(self, conn, cur, report, dry_run, user_batch, row_batch, pause):
+        after = 0
+        while not self._stop.is_set():
+            cur.execute("SELECT id FROM users WHERE id > %s ORDER BY id LIMIT %s", (after, user_batch))
+            user_ids = [row['id'] for row in cur.fetchall()]
+            conn.commit()
+            if not user_ids:
+                return
+            after = user_ids[-1]
+            report['users_scanned'] += len(user_ids)
+            while True:
+                try:
+                    cur.execute("SET LOCAL lock_timeout = %s", (LOCK_TIMEOUT_MS,))
+                    # A dry run deletes everything at once and rolls back
+                    candidates, deleted, size = prune_users(cur, user_ids, None if dry_run else row_batch)
+                except errors.LockNotAvailable:
+                    conn.rollback()
+                    report['lock_timeouts'] += 1
+                    break
+                if dry_run:
+                    conn.rollback()
+                else:
+                    conn.commit()
+                report['batches'] += 1
+                report['rows_deleted'] += deleted
+                report['bytes_reclaimed'] += size
+                report['snapshots_deferred'] += candidates - deleted
+                if dry_run or candidates < row_batch or not deleted:
+                    break
+                time.sleep(pause)
+            if pause:
+                time.sleep(pause)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._totals, enabled=RETENTION_ENABLED, interval_s=self.interval,
+                         keep_last=KEEP_LAST, daily_days=DAILY_DAYS,
+                         manual_running=self._manual is not None and self._manual.is_alive())
+            if self._last is not None:
+                stats['last_rows_deleted'] = self._last['rows_deleted']
+                stats['last_bytes_reclaimed'] = self._last['bytes_reclaimed']
+                stats['last_duration_s'] = self._last['duration_s']
+                stats['last_finished_at'] = self._last['finished_at']
+            return stats
+
+    def last_report(self):
+        with self._lock:
+            return dict(self._last) if self._last else None
+
+
+compactor = Compactor()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--dry-run', action='store_true', help='report what would be pruned, delete nothing')
+    args = parser.parse_args()
+    if not RETENTION_ENABLED:
+        parser.exit(1, 'error: set SAVE_RETENTION_KEEP_LAST to enable retention\n')
+    logging.basicConfig(level=logging.INFO)
+    report = compactor.run_once(dry_run=args.dry_run)
+    if report is None:
+        parser.exit(1, 'error: another compaction pass is running\n')
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,279 @@
+"""Bulk export/import of game_saves as compressed NDJSON shards.
+
+Each line is one game_saves row rendered by Postgres (`row_to_json`): the
+payload columns are exported exactly as stored (JSONB document or patch,
+compressed save_blob as a hex string), so a delta row still points at its
+snapshot through base_id and a restore is bit-for-bit.
+
+Export runs one `COPY ... TO STDOUT` per shard of SHARD_ROWS rows in id
+order and writes it through gzip/zstd straight to disk; import feeds each
+shard back with `COPY ... FROM STDIN` into a staging table and inserts from
+there. Neither side holds more than a copy buffer in memory, whatever the
+size of the table.
+
+Both directions are resumable. The export directory holds a manifest that
+is rewritten after every finished shard (with the id it reached and the
+upper id bound fixed when the export started); import records finished
+shards in import-state.json, and ids that already exist are skipped, so
+replaying a shard is harmless.
+
+    python save_archive.py export /backups/saves [--user 42 ...]
+    python save_archive.py import /backups/saves [--user 42 ...]
+
+The same NDJSON is served one batch at a time by the admin endpoints in
+app.py, through a server-side cursor instead of COPY.
+"""
+
+import argparse
+import gzip
+import json
+import os
+import sys
+import time
+from pathlib import Path
+
+import retention
+from db import get_db
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover - optional dependency
+    zstandard = None
+
+SHARD_ROWS = int(os.getenv('SAVE_ARCHIVE_SHARD_ROWS', '50000'))
+COMPRESS_LEVEL = int(os.getenv('SAVE_ARCHIVE_COMPRESS_LEVEL', '6'))
+FETCH_ROWS = 1000
+
+COLUMNS = ('id, user_id, save_data, save_blob, save_encoding, summary, save_size, '
+           'save_kind, base_id, created_at, updated_at')
+MANIFEST = 'manifest.json'
+IMPORT_STATE = 'import-state.json'
+FORMAT_VERSION = 1
+
+# One JSON document per line, without COPY's text-format backslash escaping:
+# CSV with quote and delimiter characters that JSON output never contains raw.
+COPY_OPTIONS = "(FORMAT csv, QUOTE E'\\x01', DELIMITER E'\\x02')"
+
+CODECS = {'gzip': '.ndjson.gz'}
+if zstandard is not None:
+    CODECS['zstd'] = '.ndjson.zst'
+
+
+class ArchiveError(Exception):
+    pass
+
+
+def _open_shard(path, mode, codec):
+    if codec == 'gzip':
+        return gzip.open(path, mode, compresslevel=COMPRESS_LEVEL) if 'w' in mode else gzip.open(path, mode)
+    if codec == 'zstd' and zstandard is not None:
+        if 'w' in mode:
+            return zstandard.open(path, mode, cctx=zstandard.ZstdCompressor(level=COMPRESS_LEVEL))
+        return zstandard.open(path, mode)
+    raise ArchiveError(f'unsupported codec {codec!r}')
+
+
+def _write_json(path, data):
+    tmp = path.with_suffix('.tmp')
+    tmp.write_text(json.dumps(data, indent=2, sort_keys=True))
+    os.replace(tmp, path)
+
+
+def _where(user_ids):
+    """WHERE clause over an id range, optionally restricted to some users"""
+    clause = 'id > %s AND id <= %s'
+    if user_ids:
+        clause += ' AND user_id = ANY(%s)'
+    return clause
+
+
+def _params(after_id, upto_id, user_ids):
+    return (after_id, upto_id, list(user_ids)) if user_ids else (after_id, upto_id)
+
+
+def max_id(cur):
+    cur.execute("SELECT COALESCE(MAX(id), 0) AS id FROM game_saves")
+    return cur.fetchone()['id']
+
+
+def next_batch(cur, after_id, upto_id, limit, user_ids=None):
+    """(rows, last id) of the next `limit` saves after `after_id`"""
+    cur.execute(
+        f"SELECT count(*) AS rows, COALESCE(MAX(id), %s) AS last_id FROM ("
+        f"SELECT id FROM game_saves WHERE {_where(user_ids)} ORDER BY id LIMIT %s) batch",
+        (after_id, *_params(after_id, upto_id, user_ids), limit)
+    )
+    row = cur.fetchone()
+    return row['rows'], row['last_id']
+
+
+def _select(user_ids):
+    return (f"SELECT row_to_json(s)::text AS doc FROM (SELECT {COLUMNS} FROM game_saves "
+            f"WHERE {_where(user_ids)} ORDER BY id) s")
+
+
+def iter_ndjson(after_id, upto_id, user_ids=None, fetch_rows=FETCH_ROWS):
+    """NDJSON lines (bytes) of the saves in (after_id, upto_id], read through a
+    server-side cursor so only `fetch_rows` rows are in memory at a time"""
+    with get_db() as conn, conn.cursor(name='save_export') as cur:
+        cur.itersize = fetch_rows
+        cur.execute(_select(user_ids), _params(after_id, upto_id, user_ids))
+        for row in cur:
+            yield row['doc'].encode() + b'\n'
+
+
+def _insert_sql(user_ids):
+    # Rows of unknown users, and deltas whose snapshot is neither present
+    # nor part of this batch, are skipped rather than failing the batch.
+    user_filter = ' AND r.user_id = ANY(%s)' if user_ids else ''
+    return (
+        "WITH rows AS (SELECT r.* FROM save_import i, "
+        "LATERAL jsonb_populate_record(NULL::game_saves, i.doc) r WHERE i.doc IS NOT NULL) "
+        f"INSERT INTO game_saves ({COLUMNS}) SELECT {COLUMNS} FROM rows r "
+        f"WHERE EXISTS (SELECT 1 FROM users u WHERE u.id = r.user_id){user_filter} "
+        "AND (r.base_id IS NULL OR r.base_id IN (SELECT id FROM rows) "
+        "OR EXISTS (SELECT 1 FROM game_saves g WHERE g.id = r.base_id)) "
+        "ORDER BY r.id ON CONFLICT DO NOTHING"
+    )
+
+
+def _bump_sequence(cur):
+    """Move the id sequence past imported ids, never backwards"""
+    cur.execute("SELECT pg_get_serial_sequence('game_saves', 'id') AS seq")
+    seq = cur.fetchone()['seq']
+    cur.execute(
+        f"SELECT setval(%s, m.id) FROM (SELECT MAX(id) AS id FROM game_saves) m, {seq} s "
+        "WHERE m.id > s.last_value",
+        (seq,)
+    )
+
+
+def import_stream(stream, user_ids=None):
+    """COPY one NDJSON stream (a file-like object with read()) into
+    game_saves in a single transaction. Returns row counts."""
+    with get_db() as conn, conn.cursor() as cur:
+        cur.execute("CREATE TEMP TABLE save_import (doc jsonb) ON COMMIT DROP")
+        cur.copy_expert(f"COPY save_import (doc) FROM STDIN WITH {COPY_OPTIONS}", stream)
+        cur.execute("SELECT count(*) AS rows FROM save_import WHERE doc IS NOT NULL")
+        rows = cur.fetchone()['rows']
+        cur.execute(_insert_sql(user_ids), (list(user_ids),) if user_ids else None)
+        inserted = cur.rowcount
+        _bump_sequence(cur)
+    return {'rows': rows, 'inserted': inserted, 'skipped': rows - inserted}
+
+
+def export(out_dir, user_ids=None, shard_rows=SHARD_ROWS, codec='gzip', log=print):
+    """Write (or continue writing) an export into `out_dir`; returns the manifest"""
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    manifest_path = out_dir / MANIFEST
+    user_ids = sorted(set(user_ids or ()))
+
+    if manifest_path.exists():
+        manifest = json.loads(manifest_path.read_text())
+        if manifest['user_ids'] != user_ids:
+            raise ArchiveError(f'{out_dir} holds an export for users {manifest["user_ids"]}, not {user_ids}')
+        if manifest['complete']:
+            return manifest
+        codec = manifest['codec']
+        log(f'resuming after id {manifest["last_id"]} ({len(manifest["shards"])} shards done)')
+    else:
+        with get_db() as conn, conn.cursor() as cur:
+            upto = max_id(cur)
+        manifest = {
+            'format': FORMAT_VERSION, 'codec': codec, 'user_ids': user_ids, 'columns': COLUMNS,
+            'max_id': upto, 'last_id': 0, 'rows': 0, 'shards': [], 'complete': False,
+        }
+    if codec not in CODECS:
+        raise ArchiveError(f'unsupported codec {codec!r}')
+
+    while True:
+        start = time.perf_counter()
+        with get_db() as conn, conn.cursor() as cur:
+            rows, last_id = next_batch(cur, manifest['last_id'], manifest['max_id'], shard_rows, user_ids)
+            if not rows:
+                break
+            name = f'saves-{len(manifest["shards"]):05d}{CODECS[codec]}'
+            part = out_dir / (name + '.part')
+            with _open_shard(part, 'wb', codec) as f:
+                cur.copy_expert(
+                    cur.mogrify(f"COPY ({_select(user_ids)}) TO STDOUT WITH {COPY_OPTIONS}",
+                                _params(manifest['last_id'], last_id, user_ids)).decode(),
+                    f
+                )
+        os.replace(part, out_dir / name)
+        manifest['shards'].append({'file': name, 'rows': rows, 'first_after': manifest['last_id'],
+                                   'last_id': last_id, 'bytes': (out_dir / name).stat().st_size})
+        manifest['last_id'] = last_id
+        manifest['rows'] += rows
+        _write_json(manifest_path, manifest)
+        elapsed = time.perf_counter() - start
+        log(f'{name}: {rows} rows up to id {last_id} in {elapsed:.2f}s ({rows / max(elapsed, 1e-9):.0f} rows/s)')
+
+    manifest['complete'] = True
+    _write_json(manifest_path, manifest)
+    return manifest
+
+
+def restore(in_dir, user_ids=None, log=print):
+    """Import every shard of an export directory not yet imported; returns totals"""
+    in_dir = Path(in_dir)
+    manifest_path = in_dir / MANIFEST
+    if not manifest_path.exists():
+        raise ArchiveError(f'no {MANIFEST} in {in_dir}')
+    manifest = json.loads(manifest_path.read_text())
+    if manifest.get('format') != FORMAT_VERSION:
+        raise ArchiveError(f'unsupported export format {manifest.get("format")!r}')
+    if not manifest['complete']:
+        log('warning: the export is incomplete; importing the shards written so far')
+
+    state_path = in_dir / IMPORT_STATE
+    state = json.loads(state_path.read_text()) if state_path.exists() else {'done': []}
+    totals = {'rows': 0, 'inserted': 0, 'skipped': 0, 'shards': 0}
+    for shard in manifest['shards']:
+        if shard['file'] in state['done']:
+            continue
+        start = time.perf_counter()
+        with _open_shard(in_dir / shard['file'], 'rb', manifest['codec']) as f:
+            result = import_stream(f, user_ids)
+        state['done'].append(shard['file'])
+        _write_json(state_path, state)
+        for key in ('rows', 'inserted', 'skipped'):
+            totals[key] += result[key]
+        totals['shards'] += 1
+        log(f'{shard["file"]}: {result["inserted"]} inserted, {result["skipped"]} skipped '
+            f'in {time.perf_counter() - start:.2f}s')
+    if totals['inserted']:
+        # With partitioned saves, move rows parked in the default partition into their months
+        with get_db() as conn, conn.cursor() as cur:
+            totals['partitions_created'] = retention.ensure_partitions(conn, cur)
+    return totals
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('command', choices=('export', 'import'))
+    parser.add_argument('directory')
+    parser.add_argument('--user', type=int, action='append', dest='user_ids',
+                        help='only saves of this user (repeatable)')
+    parser.add_argument('--shard-rows', type=int, default=SHARD_ROWS)
+    parser.add_argument('--codec', choices=sorted(CODECS), default='gzip')
+    args = parser.parse_args()
+
+    def log(message):
+        print(message, file=sys.stderr)
+
+    try:
+        if args.command == 'export':
+            manifest = export(args.directory, args.user_ids, args.shard_rows, args.codec, log)
+            result = {key: manifest[key] for key in ('rows', 'last_id', 'max_id', 'complete')}
+            result['shards'] = len(manifest['shards'])
+        else:
+            result = restore(args.directory, args.user_ids, log)
+    except ArchiveError as e:
+        parser.exit(1, f'error: {e}\n')
+    print(json.dumps(result))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,81 @@
+"""JSON-patch style deltas between save documents.
+
+A subset of RFC 6902 (add/remove/replace with JSON pointer paths) that is
+enough to express the turn-to-turn changes of a save. Lists that grew or
+shrank at the end (turn logs, decks) get appends/removes; any other length
+change replaces the list wholesale rather than running a sequence diff.
+"""
+
+import copy
+
+
+def _escape(token):
+    return str(token).replace('~', '~0').replace('/', '~1')
+
+
+def _unescape(token):
+    return token.replace('~1', '/').replace('~0', '~')
+
+
+def make_patch(src, dst, path=''):
+    """Operations that turn `src` into `dst`"""
+    if type(src) is not type(dst):
+        return [{'op': 'replace', 'path': path, 'value': dst}]
+
+    if isinstance(src, dict):
+        ops = []
+        for key, value in src.items():
+            child = f'{path}/{_escape(key)}'
+            if key not in dst:
+                ops.append({'op': 'remove', 'path': child})
+            elif value != dst[key]:
+                ops.extend(make_patch(value, dst[key], child))
+        for key, value in dst.items():
+            if key not in src:
+                ops.append({'op': 'add', 'path': f'{path}/{_escape(key)}', 'value': value})
+        return ops
+
+    if isinstance(src, list):
+        if len(src) == len(dst):
+            ops = []
+            for index, (a, b) in enumerate(zip(src, dst)):
+                if a != b:
+                    ops.extend(make_patch(a, b, f'{path}/{index}'))
+            return ops
+        if len(dst) > len(src) and dst[:len(src)] == src:
+            return [{'op': 'add', 'path': f'{path}/-', 'value': value} for value in dst[len(src):]]
+        if len(dst) < len(src) and src[:len(dst)] == dst:
+            return [{'op': 'remove', 'path': f'{path}/{index}'}
+                    for index in range(len(src) - 1, len(dst) - 1, -1)]
+
+    if src != dst:
+        return [{'op': 'replace', 'path': path, 'value': dst}]
+    return []
+
+
+def apply_patch(doc, ops):
+    """New document with `ops` applied; `doc` is left untouched"""
+    doc = copy.deepcopy(doc)
+    for op in ops:
+        path = op['path']
+        if path == '':
+            doc = copy.deepcopy(op['value'])
+            continue
+        tokens = [_unescape(t) for t in path.split('/')[1:]]
+        parent = doc
+        for token in tokens[:-1]:
+            parent = parent[int(token)] if isinstance(parent, list) else parent[token]
+        last = tokens[-1]
+        if isinstance(parent, list):
+            if op['op'] == 'add':
+                parent.insert(len(parent) if last == '-' else int(last), copy.deepcopy(op['value']))
+            elif op['op'] == 'remove':
+                del parent[int(last)]
+            else:
+                parent[int(last)] = copy.deepcopy(op['value'])
+        else:
+            if op['op'] == 'remove':
+                del parent[last]
+            else:
+                parent[last] = copy.deepcopy(op['value'])
+    return doc
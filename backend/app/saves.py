@@ -0,0 +1,412 @@
+"""Storage helpers for game_saves.
+
+Listing is keyset-paginated over idx_user_saves and only touches the small
+`summary`/`save_size` columns written at insert time, so the cost of a page
+does not depend on how many (or how large) saves a user has.
+
+In `delta` mode a save is stored as a patch against the user's latest full
+snapshot (save_kind = 'delta', base_id -> snapshot row) and a new snapshot
+is written every SNAPSHOT_EVERY deltas. Reads reconstruct transparently;
+every delta applies to its snapshot directly, so reconstruction is one
+patch regardless of chain length.
+
+Independently of the save mode, the payload (document or patch) is stored
+either as JSONB or as a gzip/zstd compressed BYTEA (`save_blob`, with the
+codec in `save_encoding`), which keeps large saves out of TOAST compression.
+"""
+
+import base64
+import json
+import os
+import threading
+from collections import OrderedDict
+from datetime import datetime
+
+import psycopg2
+from psycopg2.extras import Json, execute_values
+
+from compression import available_encodings, compress, decompress
+from save_delta import apply_patch, make_patch
+
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+SAVE_MODES = ('full', 'delta')
+SAVE_MODE = os.getenv('SAVE_MODE', 'full')
+SNAPSHOT_EVERY = int(os.getenv('SAVE_SNAPSHOT_EVERY', '10'))
+# A delta larger than this fraction of the full document is stored as a
+# snapshot instead.
+DELTA_MAX_RATIO = float(os.getenv('SAVE_DELTA_MAX_RATIO', '0.5'))
+BASE_CACHE_SIZE = int(os.getenv('SAVE_BASE_CACHE_SIZE', '1024'))
+
+STORAGE_FORMATS = ('jsonb',) + tuple(available_encodings())
+SAVE_STORAGE = os.getenv('SAVE_STORAGE', 'jsonb')
+
+PAYLOAD_COLUMNS = 'save_data, save_blob, save_encoding'
+
+# Extract per-save stats into save_stats/player_bests (read by leaderboard.py)
+SAVE_STATS_ENABLED = os.getenv('SAVE_STATS', '1').lower() in ('1', 'true', 'yes')
+
+# Scalar fields copied from save_data into the listing summary. Nested stat
+# blocks are looked up under any of SUMMARY_STAT_CONTAINERS.
+SUMMARY_FIELDS = {
+    'leader_id': ('leader_id', 'leaderId', 'leader'),
+    'day': ('days_survived', 'daysSurvived', 'day', 'turn'),
+    'season': ('season',),
+}
+SUMMARY_STAT_CONTAINERS = ('stats', 'resources', 'baseStats')
+SUMMARY_STATS = ('approval', 'economy', 'absurdity', 'reputation', 'panic')
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+class _BaseCache:
+    """Per-process LRU of each user's current snapshot, so delta writes do
+    not read the base blob back from Postgres. Snapshot rows are immutable,
+    so a stale entry only means a delta against an older (still valid) base.
+    The number of deltas against a snapshot is not cached: other workers
+    write deltas too, so insert_save counts them in the table."""
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, user_id):
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None:
+                self._entries.move_to_end(user_id)
+            return entry
+
+    def put(self, user_id, base_id, doc):
+        with self._lock:
+            self._entries[user_id] = {'id': base_id, 'doc': doc}
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.capacity:
+                self._entries.popitem(last=False)
+
+    def discard(self, user_id):
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+
+_base_cache = _BaseCache(BASE_CACHE_SIZE)
+
+
+def _dumps(data):
+    return json.dumps(data, separators=(',', ':'))
+
+
+def _encode_payload(text, storage):
+    """(save_data, save_blob, save_encoding) column values for a payload"""
+    if storage == 'jsonb':
+        return text, None, None
+    return None, compress(text.encode(), storage), storage
+
+
+def _payload(row):
+    """Parsed payload (document or patch) of a row in any storage format"""
+    if row.get('save_encoding'):
+        return json.loads(decompress(row['save_blob'], row['save_encoding']))
+    return row['save_data']
+
+
+def _payload_text(row):
+    if row.get('save_encoding'):
+        return decompress(row['save_blob'], row['save_encoding']).decode()
+    return row['body']
+
+
+def _first(data, keys):
+    for key in keys:
+        value = data.get(key)
+        if isinstance(value, (str, int, float, bool)):
+            return value
+    return None
+
+
+def summarize(save_data):
+    """Small, listing-friendly digest of a save blob"""
+    if not isinstance(save_data, dict):
+        return {}
+    summary = {}
+    for field, keys in SUMMARY_FIELDS.items():
+        value = _first(save_data, keys)
+        if value is not None:
+            summary[field] = value
+
+    stats = {}
+    for container in SUMMARY_STAT_CONTAINERS:
+        block = save_data.get(container)
+        if isinstance(block, dict):
+            for stat in SUMMARY_STATS:
+                value = block.get(stat)
+                if isinstance(value, (int, float)) and stat not in stats:
+                    stats[stat] = value
+    for stat in SUMMARY_STATS:
+        value = save_data.get(stat)
+        if isinstance(value, (int, float)) and stat not in stats:
+            stats[stat] = value
+    if stats:
+        summary['stats'] = stats
+    return summary
+
+
+def _number(value):
+    return value if isinstance(value, (int, float)) and not isinstance(value, bool) else None
+
+
+def _stat_row(save_id, user_id, summary, created_at=None):
+    leader = summary.get('leader_id')
+    days = _number(summary.get('day'))
+    stats = summary.get('stats', {})
+    return (save_id, user_id, str(leader)[:64] or None if leader is not None else None,
+            int(days) if days is not None else None, *(_number(stats.get(stat)) for stat in SUMMARY_STATS),
+            created_at)
+
+
+def _improves(candidate, best):
+    return candidate[3] is not None and (best[3] is None or candidate[3] > best[3])
+
+
+def record_stats(cur, rows):
+    """Index the summaries of newly inserted saves: one save_stats row each,
+    folded into the player's best save per leader and overall (leader '').
+
+    `rows` are (save_id, user_id, summary[, created_at]) tuples, summary as
+    from summarize(); created_at defaults to now.
+    """
+    if not SAVE_STATS_ENABLED or not rows:
+        return
+    stat_rows = [_stat_row(*row) for row in rows]
+    execute_values(
+        cur,
+        f"INSERT INTO save_stats (save_id, user_id, leader_id, days_survived, {', '.join(SUMMARY_STATS)}, "
+        "created_at) VALUES %s ON CONFLICT (save_id) DO NOTHING",
+        stat_rows,
+        template=f"({', '.join(['%s'] * (4 + len(SUMMARY_STATS)))}, COALESCE(%s::timestamp, CURRENT_TIMESTAMP))"
+    )
+
+    # One upsert row per (user, leader): ON CONFLICT cannot touch a row twice
+    bests = {}
+    for row in stat_rows:
+        for leader in {row[2] or '', ''}:
+            key = (row[1], leader)
+            count, best = bests.get(key, (0, None))
+            bests[key] = (count + 1, row if best is None or _improves(row, best) else best)
+    improved = ' AND '.join(['EXCLUDED.best_days IS NOT NULL',
+                             '(player_bests.best_days IS NULL OR EXCLUDED.best_days > player_bests.best_days)'])
+    columns = ('best_days', 'best_save_id') + SUMMARY_STATS + ('achieved_at',)
+    execute_values(
+        cur,
+        f"INSERT INTO player_bests (user_id, leader_id, saves, best_save_id, best_days, {', '.join(SUMMARY_STATS)}, "
+        "achieved_at) VALUES %s ON CONFLICT (user_id, leader_id) DO UPDATE SET "
+        "saves = player_bests.saves + EXCLUDED.saves, "
+        + ', '.join(f"{column} = CASE WHEN {improved} THEN EXCLUDED.{column} ELSE player_bests.{column} END"
+                    for column in columns),
+        # Sorted so concurrent saves lock player rows in the same order
+        [(user_id, leader, count, best[0], *best[3:])
+         for (user_id, leader), (count, best) in sorted(bests.items())],
+        template=f"({', '.join(['%s'] * (5 + len(SUMMARY_STATS)))}, COALESCE(%s::timestamp, CURRENT_TIMESTAMP))"
+    )
+
+
+def encode_cursor(created_at, save_id):
+    raw = f'{created_at.isoformat()}|{save_id}'.encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        created_at, save_id = base64.urlsafe_b64decode(padded).decode().split('|')
+        return datetime.fromisoformat(created_at), int(save_id)
+    except Exception:
+        raise InvalidCursor(f'invalid cursor: {cursor!r}')
+
+
+def _latest_base(cur, user_id):
+    base = _base_cache.get(user_id)
+    if base is not None:
+        return base
+    cur.execute(
+        f"SELECT id, {PAYLOAD_COLUMNS} FROM game_saves WHERE user_id = %s AND save_kind = 'full' "
+        "ORDER BY created_at DESC, id DESC LIMIT 1",
+        (user_id,)
+    )
+    row = cur.fetchone()
+    if row is None:
+        return None
+    _base_cache.put(user_id, row['id'], _payload(row))
+    return _base_cache.get(user_id)
+
+
+def _lock_base(cur, base_id):
+    """Key-share lock the snapshot a delta is about to reference, so retention
+    (which takes FOR UPDATE on rows it prunes) cannot delete it underneath.
+    Returns how many deltas (from any process) already reference it, or None
+    if the snapshot no longer exists."""
+    cur.execute(
+        "SELECT (SELECT count(*) FROM game_saves d WHERE d.base_id = b.id) AS deltas "
+        "FROM game_saves b WHERE b.id = %s FOR KEY SHARE OF b",
+        (base_id,)
+    )
+    row = cur.fetchone()
+    return None if row is None else row['deltas']
+
+
+def insert_save(cur, user_id, save_data, mode=None, storage=None):
+    """Insert one save; returns the new row's id"""
+    mode = mode or SAVE_MODE
+    storage = storage or SAVE_STORAGE
+    if mode not in SAVE_MODES:
+        raise ValueError(f'unknown save mode {mode!r}')
+    if storage not in STORAGE_FORMATS:
+        raise ValueError(f'unknown save storage {storage!r}')
+    body = _dumps(save_data)
+    digest = summarize(save_data)
+    summary = Json(digest)
+    size = len(body.encode())
+
+    if mode == 'delta':
+        base = _latest_base(cur, user_id)
+        deltas = _lock_base(cur, base['id']) if base is not None else None
+        if base is not None and deltas is None:
+            # Pruned by retention since it was cached
+            _base_cache.discard(user_id)
+            base = None
+        if base is not None and deltas < SNAPSHOT_EVERY:
+            patch = _dumps(make_patch(base['doc'], save_data))
+            if len(patch) <= DELTA_MAX_RATIO * len(body):
+                try:
+                    cur.execute(
+                        f"INSERT INTO game_saves (user_id, {PAYLOAD_COLUMNS}, summary, save_size, save_kind, base_id) "
+                        "VALUES (%s, %s, %s, %s, %s, %s, 'delta', %s) RETURNING id",
+                        (user_id, *_encode_payload(patch, storage), summary, size, base['id'])
+                    )
+                except psycopg2.IntegrityError:
+                    _base_cache.discard(user_id)
+                    raise
+                save_id = cur.fetchone()['id']
+                record_stats(cur, [(save_id, user_id, digest)])
+                return save_id
+
+    cur.execute(
+        f"INSERT INTO game_saves (user_id, {PAYLOAD_COLUMNS}, summary, save_size) "
+        "VALUES (%s, %s, %s, %s, %s, %s) RETURNING id",
+        (user_id, *_encode_payload(body, storage), summary, size)
+    )
+    save_id = cur.fetchone()['id']
+    record_stats(cur, [(save_id, user_id, digest)])
+    if mode == 'delta':
+        _base_cache.put(user_id, save_id, save_data)
+    return save_id
+
+
+def insert_saves_batch(cur, items, page_size=500):
+    """Insert full snapshots as multi-row INSERTs; returns the new ids.
+
+    `items` are (user_id, save_data, storage, age_seconds) tuples, where age
+    is how long ago the save was accepted, so created_at keeps the order in
+    which clients saved rather than the order of the flush.
+    """
+    rows, digests = [], []
+    for user_id, save_data, storage, age in items:
+        storage = storage or SAVE_STORAGE
+        body = _dumps(save_data)
+        digests.append(summarize(save_data))
+        rows.append((user_id, *_encode_payload(body, storage), Json(digests[-1]),
+                     len(body.encode()), age))
+        # The user's newest row is now a snapshot the cache does not know about.
+        _base_cache.discard(user_id)
+    result = execute_values(
+        cur,
+        f"INSERT INTO game_saves (user_id, {PAYLOAD_COLUMNS}, summary, save_size, created_at) "
+        "VALUES %s RETURNING id",
+        rows,
+        template="(%s, %s, %s, %s, %s, %s, CURRENT_TIMESTAMP - make_interval(secs => %s))",
+        page_size=page_size,
+        fetch=True
+    )
+    ids = [row['id'] for row in result]
+    record_stats(cur, [(save_id, item[0], digest) for save_id, item, digest in zip(ids, items, digests)])
+    return ids
+
+
+def _fetch_bases(cur, base_ids):
+    if not base_ids:
+        return {}
+    cur.execute(f"SELECT id, {PAYLOAD_COLUMNS} FROM game_saves WHERE id = ANY(%s)", (list(base_ids),))
+    return {row['id']: _payload(row) for row in cur.fetchall()}
+
+
+def reconstruct(rows, bases):
+    """Replace delta payloads in `rows` with full documents"""
+    for row in rows:
+        if row.get('save_kind') == 'delta':
+            row['save_data'] = apply_patch(bases[row['base_id']], row['save_data'])
+    return rows
+
+
+def list_saves_full(cur, user_id):
+    """Every save of a user with full save_data, newest first"""
+    cur.execute("SELECT * FROM game_saves WHERE user_id = %s ORDER BY created_at DESC", (user_id,))
+    rows = cur.fetchall()
+    for row in rows:
+        row['save_data'] = _payload(row)
+        del row['save_blob'], row['save_encoding']
+    known = {row['id']: row['save_data'] for row in rows if row['save_kind'] == 'full'}
+    missing = {row['base_id'] for row in rows if row['save_kind'] == 'delta'} - known.keys()
+    known.update(_fetch_bases(cur, missing))
+    return reconstruct(rows, known)
+
+
+def list_save_meta(cur, user_id, limit=DEFAULT_PAGE_SIZE, cursor=None):
+    """One page of save metadata, newest first. Returns (rows, next_cursor)"""
+    limit = max(1, min(int(limit), MAX_PAGE_SIZE))
+    # pg_column_size reads the TOAST pointer only; it is a fallback for rows
+    # written before save_size existed.
+    columns = ("id, user_id, created_at, updated_at, summary, "
+               "COALESCE(save_size, pg_column_size(save_data), pg_column_size(save_blob)) AS size")
+    if cursor:
+        created_at, save_id = decode_cursor(cursor)
+        cur.execute(
+            f"SELECT {columns} FROM game_saves "
+            "WHERE user_id = %s AND (created_at, id) < (%s, %s) "
+            "ORDER BY created_at DESC, id DESC LIMIT %s",
+            (user_id, created_at, save_id, limit + 1)
+        )
+    else:
+        cur.execute(
+            f"SELECT {columns} FROM game_saves WHERE user_id = %s "
+            "ORDER BY created_at DESC, id DESC LIMIT %s",
+            (user_id, limit + 1)
+        )
+    rows = cur.fetchall()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1]['created_at'], rows[-1]['id'])
+    for row in rows:
+        row['summary'] = row['summary'] or {}
+    return rows, next_cursor
+
+
+def fetch_save_text(cur, user_id, save_id):
+    """Serialized save_data for one save, or None. Full snapshots are returned
+    as stored (rendered by Postgres, or decompressed) without being parsed."""
+    cur.execute(
+        "SELECT save_kind, base_id, save_data::text AS body, save_blob, save_encoding "
+        "FROM game_saves WHERE id = %s AND user_id = %s",
+        (save_id, user_id)
+    )
+    row = cur.fetchone()
+    if row is None:
+        return None
+    if row['save_kind'] != 'delta':
+        return _payload_text(row)
+    base = _fetch_bases(cur, [row['base_id']])[row['base_id']]
+    return _dumps(apply_patch(base, json.loads(_payload_text(row))))
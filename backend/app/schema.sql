@@ -5,12 +5,207 @@ CREATE TABLE IF NOT EXISTS users (
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );
 
+-- Optional layout: monthly range partitions on created_at, for large
+-- deployments where idx_user_saves bloat and vacuum cost on one huge table
+-- show up in get_saves latency. Chosen when the database is created, e.g.
+--   PGOPTIONS='-c executive_disorder.partitioned_saves=on' psql -f schema.sql
+-- The partition key has to be part of every unique constraint, so the
+-- primary key is (id, created_at) and base_id cannot be a foreign key;
+-- saves.insert_save and retention.py lock base rows instead. Monthly
+-- partitions are created ahead of time by retention.ensure_partitions;
+-- rows outside them land in game_saves_default and are moved out later.
+DO $$
+BEGIN
+    IF current_setting('executive_disorder.partitioned_saves', true) = 'on'
+            AND to_regclass('game_saves') IS NULL THEN
+        CREATE TABLE game_saves (
+            id SERIAL,
+            user_id INTEGER REFERENCES users(id) ON DELETE CASCADE,
+            save_data JSONB,
+            save_blob BYTEA,
+            save_encoding VARCHAR(8),
+            summary JSONB,
+            save_size INTEGER,
+            save_kind VARCHAR(8) NOT NULL DEFAULT 'full',
+            base_id INTEGER,
+            created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (id, created_at),
+            CONSTRAINT game_saves_payload CHECK (save_data IS NOT NULL OR save_blob IS NOT NULL)
+        ) PARTITION BY RANGE (created_at);
+        CREATE TABLE game_saves_default PARTITION OF game_saves DEFAULT;
+    END IF;
+END $$;
+
 CREATE TABLE IF NOT EXISTS game_saves (
     id SERIAL PRIMARY KEY,
     user_id INTEGER REFERENCES users(id) ON DELETE CASCADE,
-    save_data JSONB NOT NULL,
+    -- Payload as JSONB, or compressed into save_blob with its codec in save_encoding
+    save_data JSONB,
+    save_blob BYTEA,
+    save_encoding VARCHAR(8),
+    summary JSONB,
+    save_size INTEGER,
+    -- 'full' snapshot, or 'delta' holding a JSON patch against base_id
+    save_kind VARCHAR(8) NOT NULL DEFAULT 'full',
+    base_id INTEGER REFERENCES game_saves(id),
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    CONSTRAINT game_saves_payload CHECK (save_data IS NOT NULL OR save_blob IS NOT NULL)
+);
+
+CREATE INDEX IF NOT EXISTS idx_user_saves ON game_saves(user_id, created_at DESC);
+
+-- Upgrades for databases created from an earlier version of this file
+ALTER TABLE game_saves ADD COLUMN IF NOT EXISTS summary JSONB;
+ALTER TABLE game_saves ADD COLUMN IF NOT EXISTS save_size INTEGER;
+ALTER TABLE game_saves ADD COLUMN IF NOT EXISTS save_kind VARCHAR(8) NOT NULL DEFAULT 'full';
+ALTER TABLE game_saves ADD COLUMN IF NOT EXISTS base_id INTEGER REFERENCES game_saves(id);
+ALTER TABLE game_saves ADD COLUMN IF NOT EXISTS save_blob BYTEA;
+ALTER TABLE game_saves ADD COLUMN IF NOT EXISTS save_encoding VARCHAR(8);
+ALTER TABLE game_saves ALTER COLUMN save_data DROP NOT NULL;
+
+-- Compressed payloads are stored out of line without a second pglz pass
+ALTER TABLE game_saves ALTER COLUMN save_blob SET STORAGE EXTERNAL;
+
+CREATE INDEX IF NOT EXISTS idx_save_base ON game_saves(base_id) WHERE base_id IS NOT NULL;
+
+-- Stats extracted from every save at insert time (see saves.record_stats).
+-- Rows outlive retention pruning of the save itself, hence no FK to game_saves.
+CREATE TABLE IF NOT EXISTS save_stats (
+    save_id INTEGER PRIMARY KEY,
+    user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    leader_id VARCHAR(64),
+    days_survived INTEGER,
+    approval REAL,
+    economy REAL,
+    absurdity REAL,
+    reputation REAL,
+    panic REAL,
+    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    -- Not yet folded into save_stat_totals
+    pending BOOLEAN NOT NULL DEFAULT TRUE
+);
+
+CREATE INDEX IF NOT EXISTS idx_save_stats_user ON save_stats(user_id, created_at DESC);
+CREATE INDEX IF NOT EXISTS idx_save_stats_pending ON save_stats(save_id) WHERE pending;
+
+-- Each player's best save (most days survived) per leader, and over all
+-- leaders with leader_id = ''; upserted in the same transaction as the save
+CREATE TABLE IF NOT EXISTS player_bests (
+    user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    leader_id VARCHAR(64) NOT NULL,
+    saves BIGINT NOT NULL,
+    best_days INTEGER,
+    best_save_id INTEGER NOT NULL,
+    approval REAL,
+    economy REAL,
+    absurdity REAL,
+    reputation REAL,
+    panic REAL,
+    achieved_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (user_id, leader_id)
+);
+
+-- Top-N per leader (and overall) is a forward scan of this index
+CREATE INDEX IF NOT EXISTS idx_player_bests_rank
+    ON player_bests(leader_id, best_days DESC, achieved_at, user_id) WHERE best_days IS NOT NULL;
+
+-- Running totals per leader ('' = all saves), folded in from pending save_stats
+CREATE TABLE IF NOT EXISTS save_stat_totals (
+    leader_id VARCHAR(64) PRIMARY KEY,
+    saves BIGINT NOT NULL,
+    days_count BIGINT NOT NULL,
+    days_sum BIGINT NOT NULL,
+    days_max INTEGER,
+    approval_count BIGINT NOT NULL,
+    approval_sum DOUBLE PRECISION NOT NULL,
+    economy_count BIGINT NOT NULL,
+    economy_sum DOUBLE PRECISION NOT NULL,
+    absurdity_count BIGINT NOT NULL,
+    absurdity_sum DOUBLE PRECISION NOT NULL,
+    reputation_count BIGINT NOT NULL,
+    reputation_sum DOUBLE PRECISION NOT NULL,
+    panic_count BIGINT NOT NULL,
+    panic_sum DOUBLE PRECISION NOT NULL,
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+
+-- AI generation jobs (used with AI_JOB_STORE=postgres)
+CREATE TABLE IF NOT EXISTS ai_jobs (
+    id VARCHAR(32) PRIMARY KEY,
+    kind VARCHAR(16) NOT NULL,
+    params JSONB NOT NULL,
+    status VARCHAR(16) NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    result JSONB,
+    error TEXT,
+    cancel_requested BOOLEAN NOT NULL DEFAULT FALSE,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+    started_at TIMESTAMPTZ,
+    finished_at TIMESTAMPTZ
 );
 
-CREATE INDEX idx_user_saves ON game_saves(user_id, created_at DESC);
+CREATE INDEX IF NOT EXISTS idx_ai_jobs_finished ON ai_jobs(finished_at) WHERE finished_at IS NOT NULL;
+
+-- AI response cache second tier (used with AI_CACHE_TIER=postgres)
+CREATE TABLE IF NOT EXISTS ai_cache (
+    key CHAR(64) PRIMARY KEY,
+    value JSONB NOT NULL,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+    expires_at TIMESTAMPTZ NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS idx_ai_cache_expires ON ai_cache(expires_at);
+
+-- Balance telemetry from ML-Agents runs
+CREATE TABLE IF NOT EXISTS balance_results (
+    id BIGSERIAL PRIMARY KEY,
+    run_id VARCHAR(64),
+    leader_id VARCHAR(64),
+    won BOOLEAN NOT NULL,
+    days_survived INTEGER NOT NULL,
+    cards TEXT[] NOT NULL DEFAULT '{}',
+    final_stats JSONB,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+
+CREATE INDEX IF NOT EXISTS idx_balance_results_run ON balance_results(run_id, created_at);
+
+-- Running totals per scope ('global' with key '', 'leader', 'card')
+CREATE TABLE IF NOT EXISTS balance_aggregates (
+    scope VARCHAR(8) NOT NULL,
+    key VARCHAR(64) NOT NULL,
+    episodes BIGINT NOT NULL,
+    wins BIGINT NOT NULL,
+    days_sum BIGINT NOT NULL,
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+    PRIMARY KEY (scope, key)
+);
+
+-- Survival-day distribution, one bin per day (global and per leader)
+CREATE TABLE IF NOT EXISTS balance_day_histogram (
+    scope VARCHAR(8) NOT NULL,
+    key VARCHAR(64) NOT NULL,
+    day INTEGER NOT NULL,
+    episodes BIGINT NOT NULL,
+    PRIMARY KEY (scope, key, day)
+);
+
+-- Content catalog versions (see catalog.py)
+CREATE TABLE IF NOT EXISTS catalog_entities (
+    kind VARCHAR(16) NOT NULL,
+    entity_id VARCHAR(128) NOT NULL,
+    content_hash CHAR(64) NOT NULL,
+    version INTEGER NOT NULL,
+    PRIMARY KEY (kind, entity_id)
+);
+
+CREATE TABLE IF NOT EXISTS catalog_changes (
+    version INTEGER NOT NULL,
+    kind VARCHAR(16) NOT NULL,
+    entity_id VARCHAR(128) NOT NULL,
+    op VARCHAR(8) NOT NULL,
+    changed_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+    PRIMARY KEY (version, kind, entity_id)
+);
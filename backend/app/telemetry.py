@@ -0,0 +1,293 @@
+"""Balance telemetry from ML-Agents runs.
+
+Episode results arrive as NDJSON (or the original {"results": [...]} body)
+and are processed in batches of TELEMETRY_BATCH records: each batch is
+inserted into balance_results and folded into precomputed aggregates in the
+same transaction, so dashboards never scan raw rows.
+
+Aggregates are kept per scope -- 'global', 'leader' and 'card' -- as episode,
+win and survival-day sums in balance_aggregates, plus a one-day-per-bin
+survival histogram (global and per leader) in balance_day_histogram from
+which percentiles are derived. Batch reductions and percentile/histogram
+queries are done with NumPy, imported on first use so workers that only
+serve saves never load it.
+
+A single request is still bounded by MAX_CONTENT_LENGTH; send long runs as
+several requests with the same run_id.
+"""
+
+import json
+import os
+
+from psycopg2.extras import Json, execute_values
+
+from db import get_db
+
+BATCH_SIZE = int(os.getenv('TELEMETRY_BATCH', '5000'))
+MAX_DAY = int(os.getenv('TELEMETRY_MAX_DAY', '1000'))  # survival days above this share the last bin
+# Longer episodes are rejected; balance_results.days_survived is an INTEGER
+MAX_DAYS_SURVIVED = min(int(os.getenv('TELEMETRY_MAX_DAYS_SURVIVED', '100000')), 2**31 - 1)
+MAX_ERRORS_REPORTED = 10
+READ_CHUNK = 64 * 1024
+PERCENTILES = (50, 90, 95, 99)
+
+GLOBAL, LEADER, CARD = 'global', 'leader', 'card'
+
+LEADER_FIELDS = ('leader_id', 'leaderId', 'leader')
+DAYS_FIELDS = ('days_survived', 'daysSurvived', 'days')
+CARDS_FIELDS = ('cards_played', 'cardsPlayed', 'cards')
+STATS_FIELDS = ('final_stats', 'finalStats', 'stats')
+
+
+class InvalidRecord(ValueError):
+    pass
+
+
+def _first(record, names):
+    for name in names:
+        if record.get(name) is not None:
+            return record[name]
+    return None
+
+
+def parse_record(record, run_id=None):
+    """Normalize one episode result; raises InvalidRecord"""
+    if not isinstance(record, dict):
+        raise InvalidRecord('record is not an object')
+    try:
+        days = int(_first(record, DAYS_FIELDS) or 0)
+    except (TypeError, ValueError, OverflowError):
+        raise InvalidRecord('days_survived must be an integer')
+    if days < 0:
+        raise InvalidRecord('days_survived must not be negative')
+    if days > MAX_DAYS_SURVIVED:
+        raise InvalidRecord(f'days_survived must be at most {MAX_DAYS_SURVIVED}')
+    won = record.get('won')
+    # ML-Agents exporters send 1/0 rather than JSON booleans
+    if won is not None and not (isinstance(won, int) and won in (0, 1)):
+        raise InvalidRecord('won must be true, false, 1 or 0')
+    cards = _first(record, CARDS_FIELDS) or []
+    if not isinstance(cards, list):
+        raise InvalidRecord('cards_played must be a list')
+    cards = [str(card.get('id') if isinstance(card, dict) else card)[:64] for card in cards]
+    leader = _first(record, LEADER_FIELDS)
+    return {
+        'run_id': str(record.get('run_id') or run_id or '')[:64] or None,
+        'leader_id': str(leader)[:64] if leader is not None else None,
+        'won': bool(won),
+        'days_survived': days,
+        'cards': sorted(set(cards)),
+        'final_stats': _first(record, STATS_FIELDS),
+    }
+
+
+def iter_ndjson(stream):
+    """Yield decoded lines of an NDJSON byte stream without reading it whole"""
+    pending = b''
+    while True:
+        chunk = stream.read(READ_CHUNK)
+        if not chunk:
+            break
+        lines = (pending + chunk).split(b'\n')
+        pending = lines.pop()
+        for line in lines:
+            if line.strip():
+                yield line
+    if pending.strip():
+        yield pending
+
+
+def _group_sums(keys, won, days):
+    """Per distinct key: (key, episodes, wins, days_sum)"""
+    import numpy as np
+    uniq, idx = np.unique(np.asarray(keys, dtype=object).astype(str), return_inverse=True)
+    episodes = np.bincount(idx, minlength=len(uniq))
+    wins = np.bincount(idx, weights=won, minlength=len(uniq))
+    days_sum = np.bincount(idx, weights=days, minlength=len(uniq))
+    return [(str(key), int(n), int(w), int(d)) for key, n, w, d in zip(uniq, episodes, wins, days_sum)]
+
+
+def _day_counts(keys, days):
+    """Per (key, day bin): episode count"""
+    import numpy as np
+    uniq, idx = np.unique(np.asarray(keys, dtype=object).astype(str), return_inverse=True)
+    codes = idx.astype(np.int64) * (MAX_DAY + 1) + np.minimum(days, MAX_DAY)
+    cells, counts = np.unique(codes, return_counts=True)
+    return [(str(uniq[code // (MAX_DAY + 1)]), int(code % (MAX_DAY + 1)), int(n))
+            for code, n in zip(cells, counts)]
+
+
+def _write_batch(cur, batch):
+    import numpy as np
+    execute_values(
+        cur,
+        "INSERT INTO balance_results (run_id, leader_id, won, days_survived, cards, final_stats) VALUES %s",
+        [(r['run_id'], r['leader_id'], r['won'], r['days_survived'], r['cards'], Json(r['final_stats']))
+         for r in batch],
+        page_size=1000
+    )
+
+    won = np.fromiter((r['won'] for r in batch), dtype=np.int64, count=len(batch))
+    days = np.fromiter((r['days_survived'] for r in batch), dtype=np.int64, count=len(batch))
+    has_leader = np.fromiter((r['leader_id'] is not None for r in batch), dtype=bool, count=len(batch))
+    leaders = [r['leader_id'] for r in batch if r['leader_id'] is not None]
+
+    aggregates = [(GLOBAL, '', len(batch), int(won.sum()), int(days.sum()))]
+    histogram = [(GLOBAL, '', day, n) for _, day, n in _day_counts([''] * len(batch), days)]
+    if leaders:
+        aggregates += [(LEADER,) + row for row in _group_sums(leaders, won[has_leader], days[has_leader])]
+        histogram += [(LEADER,) + row for row in _day_counts(leaders, days[has_leader])]
+
+    # One row per (episode, card played) so each card gets the outcomes of the episodes it appeared in
+    episode_of_card = np.fromiter((i for i, r in enumerate(batch) for _ in r['cards']), dtype=np.int64)
+    if len(episode_of_card):
+        cards = [card for r in batch for card in r['cards']]
+        aggregates += [(CARD,) + row for row in
+                       _group_sums(cards, won[episode_of_card], days[episode_of_card])]
+
+    # Sorted upserts take row locks in a consistent order across concurrent ingests
+    aggregates.sort()
+    histogram.sort()
+    execute_values(
+        cur,
+        "INSERT INTO balance_aggregates (scope, key, episodes, wins, days_sum) VALUES %s "
+        "ON CONFLICT (scope, key) DO UPDATE SET "
+        "episodes = balance_aggregates.episodes + EXCLUDED.episodes, "
+        "wins = balance_aggregates.wins + EXCLUDED.wins, "
+        "days_sum = balance_aggregates.days_sum + EXCLUDED.days_sum, "
+        "updated_at = now()",
+        aggregates,
+        page_size=1000
+    )
+    execute_values(
+        cur,
+        "INSERT INTO balance_day_histogram (scope, key, day, episodes) VALUES %s "
+        "ON CONFLICT (scope, key, day) DO UPDATE SET "
+        "episodes = balance_day_histogram.episodes + EXCLUDED.episodes",
+        histogram,
+        page_size=1000
+    )
+    return len(batch), int(won.sum()), int(days.sum())
+
+
+def ingest(records, run_id=None, batch_size=BATCH_SIZE):
+    """Persist and aggregate an iterable of raw records (dicts or NDJSON lines).
+
+    Every batch commits on its own; returns totals for this request plus the
+    first few rejected records.
+    """
+    totals = {'ingested': 0, 'wins': 0, 'days_sum': 0, 'rejected': 0, 'errors': []}
+
+    def flush(batch):
+        with get_db() as conn, conn.cursor() as cur:
+            n, wins, days = _write_batch(cur, batch)
+        totals['ingested'] += n
+        totals['wins'] += wins
+        totals['days_sum'] += days
+
+    batch = []
+    for lineno, raw in enumerate(records, 1):
+        try:
+            record = json.loads(raw) if isinstance(raw, (bytes, str)) else raw
+            batch.append(parse_record(record, run_id))
+        except (ValueError, InvalidRecord) as e:
+            totals['rejected'] += 1
+            if len(totals['errors']) < MAX_ERRORS_REPORTED:
+                totals['errors'].append({'record': lineno, 'error': str(e)})
+            continue
+        if len(batch) >= batch_size:
+            flush(batch)
+            batch = []
+    if batch:
+        flush(batch)
+    return totals
+
+
+def histogram_percentiles(counts, percentiles=PERCENTILES):
+    """Nearest-rank percentiles of a one-day-per-bin histogram"""
+    import numpy as np
+    counts = np.asarray(counts, dtype=np.int64)
+    total = int(counts.sum())
+    if total == 0:
+        return {f'p{q}': None for q in percentiles}
+    cdf = np.cumsum(counts)
+    ranks = np.ceil(np.asarray(percentiles, dtype=float) / 100 * total).clip(1, total)
+    days = np.searchsorted(cdf, ranks, side='left')
+    return {f'p{q}': int(day) for q, day in zip(percentiles, days)}
+
+
+def _dense_histogram(cur, scope, key):
+    import numpy as np
+    cur.execute("SELECT day, episodes FROM balance_day_histogram WHERE scope = %s AND key = %s",
+                (scope, key))
+    rows = cur.fetchall()
+    counts = np.zeros(MAX_DAY + 1, dtype=np.int64)
+    if rows:
+        counts[np.array([row['day'] for row in rows])] = [row['episodes'] for row in rows]
+    return counts
+
+
+def rebin(counts, bin_width):
+    """Merge one-day bins into bins of `bin_width` days, trimming the empty tail"""
+    import numpy as np
+    nonzero = np.flatnonzero(counts)
+    if not len(nonzero):
+        return []
+    counts = counts[:nonzero[-1] + 1]
+    return np.add.reduceat(counts, np.arange(0, len(counts), bin_width)).tolist()
+
+
+def _describe(row):
+    episodes = row['episodes']
+    return {
+        'episodes': episodes,
+        'wins': row['wins'],
+        'win_rate': round(row['wins'] / episodes, 4) if episodes else 0.0,
+        'avg_survival_days': round(row['days_sum'] / episodes, 2) if episodes else 0.0,
+    }
+
+
+def summary(cur, leader_id=None, bin_width=1):
+    """Global (or one leader's) outcome summary with survival percentiles and histogram"""
+    scope, key = (LEADER, leader_id) if leader_id else (GLOBAL, '')
+    cur.execute("SELECT episodes, wins, days_sum FROM balance_aggregates WHERE scope = %s AND key = %s",
+                (scope, key))
+    row = cur.fetchone() or {'episodes': 0, 'wins': 0, 'days_sum': 0}
+    counts = _dense_histogram(cur, scope, key)
+    result = dict(_describe(row), survival_days=histogram_percentiles(counts),
+                  histogram={'bin_width': bin_width, 'counts': rebin(counts, bin_width)})
+    if leader_id:
+        result['leader_id'] = leader_id
+    return result
+
+
+def leader_breakdown(cur):
+    import numpy as np
+    cur.execute("SELECT key, episodes, wins, days_sum FROM balance_aggregates WHERE scope = %s "
+                "ORDER BY episodes DESC", (LEADER,))
+    leaders = cur.fetchall()
+    cur.execute("SELECT key, day, episodes FROM balance_day_histogram WHERE scope = %s", (LEADER,))
+    by_leader = {}
+    for row in cur.fetchall():
+        by_leader.setdefault(row['key'], np.zeros(MAX_DAY + 1, dtype=np.int64))[row['day']] = row['episodes']
+    empty = np.zeros(MAX_DAY + 1, dtype=np.int64)
+    return [dict(_describe(row), leader_id=row['key'],
+                 survival_days=histogram_percentiles(by_leader.get(row['key'], empty)))
+            for row in leaders]
+
+
+CARD_SORTS = {
+    'episodes': 'episodes DESC',
+    'win_rate': 'wins::float / episodes DESC',
+    'lose_rate': 'wins::float / episodes ASC',
+    'survival': 'days_sum::float / episodes DESC',
+}
+
+
+def card_breakdown(cur, sort='episodes', limit=50, min_episodes=1):
+    cur.execute(
+        "SELECT key, episodes, wins, days_sum FROM balance_aggregates "
+        f"WHERE scope = %s AND episodes >= %s ORDER BY {CARD_SORTS[sort]}, key LIMIT %s",
+        (CARD, min_episodes, limit)
+    )
+    return [dict(_describe(row), card_id=row['key']) for row in cur.fetchall()]
@@ -0,0 +1,195 @@
+"""Write-behind buffer that coalesces autosave bursts.
+
+With SAVE_WRITE_BEHIND=1, POST /api/saves only records the save in memory.
+A newer save from the same user within the coalescing window replaces the
+pending one, and a background thread flushes due saves as batched multi-row
+INSERTs. Durability bounds:
+
+* a save is written at most SAVE_COALESCE_WINDOW + SAVE_FLUSH_INTERVAL
+  seconds after it was accepted (plus flush time);
+* at most SAVE_MAX_PENDING users are buffered; beyond that the submitting
+  request flushes synchronously;
+* the buffer is flushed on interpreter shutdown (atexit) and when a
+  gunicorn worker exits (worker_exit in gunicorn.conf.py). Saves still
+  pending when the process is killed with SIGKILL are lost, which is the
+  trade-off this mode accepts.
+
+The buffer lives in one process. Reads flush the requesting user's pending
+save first, which gives read-your-writes only when the same process serves
+the save and the read, so gunicorn.conf.py refuses this mode with more than
+one worker.
+"""
+
+import atexit
+import logging
+import os
+import threading
+import time
+
+import saves
+from db import get_db
+
+log = logging.getLogger(__name__)
+
+WRITE_BEHIND_ENABLED = os.getenv('SAVE_WRITE_BEHIND', '0').lower() in ('1', 'true', 'yes')
+COALESCE_WINDOW = float(os.getenv('SAVE_COALESCE_WINDOW', '2'))
+FLUSH_INTERVAL = float(os.getenv('SAVE_FLUSH_INTERVAL', '0.5'))
+MAX_PENDING = int(os.getenv('SAVE_MAX_PENDING', '10000'))
+BATCH_SIZE = int(os.getenv('SAVE_FLUSH_BATCH', '500'))
+
+
+class _Pending:
+    __slots__ = ('save_data', 'storage', 'first_seen', 'last_seen')
+
+    def __init__(self, save_data, storage, now):
+        self.save_data = save_data
+        self.storage = storage
+        self.first_seen = now
+        self.last_seen = now
+
+
+class WriteBehindBuffer:
+    """Per-user coalescing buffer flushed by a background thread"""
+
+    def __init__(self, window=COALESCE_WINDOW, interval=FLUSH_INTERVAL,
+                 max_pending=MAX_PENDING, batch_size=BATCH_SIZE):
+        self.window = window
+        self.interval = interval
+        self.max_pending = max_pending
+        self.batch_size = batch_size
+
+        self._lock = threading.Lock()
+        # Held from taking saves out of _pending until they are committed, so
+        # flush_user()/discard() wait for a batch in flight instead of missing it.
+        # Reentrant because flush_user() writes through _write().
+        self._flush_lock = threading.RLock()
+        self._pending = {}
+        self._stop = threading.Event()
+        self._thread = None
+        self._pid = None
+        self._stats = {
+            'submitted': 0,
+            'coalesced': 0,
+            'flushed': 0,
+            'flush_batches': 0,
+            'flush_failures': 0,
+            'max_lag_ms': 0.0,
+        }
+
+    def _ensure_thread(self):
+        # Started lazily (and again after fork) so preloaded masters never
+        # own a flusher thread.
+        if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+            return
+        self._pid = os.getpid()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='save-write-behind', daemon=True)
+        self._thread.start()
+
+    def submit(self, user_id, save_data, storage=None):
+        """Buffer a save, replacing any pending save of the same user"""
+        now = time.monotonic()
+        with self._lock:
+            self._ensure_thread()
+            self._stats['submitted'] += 1
+            entry = self._pending.get(user_id)
+            if entry is None:
+                self._pending[user_id] = _Pending(save_data, storage, now)
+            else:
+                self._stats['coalesced'] += 1
+                entry.save_data = save_data
+                entry.storage = storage
+                entry.last_seen = now
+            overflow = len(self._pending) > self.max_pending
+        if overflow:
+            self.flush(force=True)
+
+    def discard(self, user_id):
+        """Drop a pending save that a synchronous write is about to supersede.
+        Waits for a flush in progress, which may hold the user's older save"""
+        with self._flush_lock, self._lock:
+            if self._pending.pop(user_id, None) is not None:
+                self._stats['coalesced'] += 1
+
+    def flush_user(self, user_id):
+        """Write a user's pending save held by this process before a read of their
+        saves, after any flush in progress has committed"""
+        with self._flush_lock:
+            with self._lock:
+                entry = self._pending.pop(user_id, None)
+            if entry is not None:
+                self._write({user_id: entry})
+
+    def flush(self, force=False):
+        """Write every save whose coalescing window has elapsed (all if forced)"""
+        with self._flush_lock:
+            now = time.monotonic()
+            with self._lock:
+                if force:
+                    due, self._pending = self._pending, {}
+                else:
+                    due = {user_id: entry for user_id, entry in self._pending.items()
+                           if now - entry.last_seen >= self.window
+                           or now - entry.first_seen >= self.window * 2}
+                    for user_id in due:
+                        del self._pending[user_id]
+            if due:
+                self._write(due)
+        return len(due)
+
+    def _write(self, due):
+        with self._flush_lock:
+            now = time.monotonic()
+            items = [(user_id, entry.save_data, entry.storage, now - entry.last_seen)
+                     for user_id, entry in due.items()]
+            written = 0
+            try:
+                for start in range(0, len(items), self.batch_size):
+                    with get_db() as conn, conn.cursor() as cur:
+                        saves.insert_saves_batch(cur, items[start:start + self.batch_size])
+                    written = start + self.batch_size
+                    with self._lock:
+                        self._stats['flush_batches'] += 1
+            except Exception:
+                log.exception('write-behind flush of %d saves failed', len(items) - written)
+                with self._lock:
+                    self._stats['flush_failures'] += 1
+                    self._stats['flushed'] += written
+                    # Re-queue what was not committed unless a newer save arrived meanwhile.
+                    for user_id, *_ in items[written:]:
+                        self._pending.setdefault(user_id, due[user_id])
+                return
+            lag = max(now - entry.first_seen for entry in due.values()) * 1000
+            with self._lock:
+                self._stats['flushed'] += len(items)
+                self._stats['max_lag_ms'] = max(self._stats['max_lag_ms'], round(lag, 3))
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.flush()
+            except Exception:
+                log.exception('write-behind flusher error')
+
+    def close(self):
+        """Stop the flusher and write everything still pending"""
+        self._stop.set()
+        if self._thread is not None and self._pid == os.getpid():
+            self._thread.join(timeout=self.interval * 2)
+        self.flush(force=True)
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats, pending=len(self._pending), enabled=WRITE_BEHIND_ENABLED,
+                        window_s=self.window, max_pending=self.max_pending)
+
+
+buffer = WriteBehindBuffer()
+
+
+def _shutdown():
+    if buffer._pid == os.getpid():
+        buffer.close()
+
+
+atexit.register(_shutdown)
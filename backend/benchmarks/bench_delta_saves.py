@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""Full-row vs delta-encoded autosaves against a real Postgres.
+
+Simulates players autosaving every turn and compares, per save mode, the
+bytes Postgres stored for save_data and the insert+commit latency.
+
+    DB_HOST=localhost python backend/benchmarks/bench_delta_saves.py --players 20 --turns 200
+
+Requires backend/app/schema.sql to be applied. Output is JSON on stdout.
+"""
+
+import argparse
+import json
+import random
+import statistics
+import sys
+import time
+import uuid
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / 'app'))
+
+import saves  # noqa: E402
+from db import get_db  # noqa: E402
+
+STATS = ('approval', 'economy', 'absurdity', 'reputation', 'panic')
+
+
+def initial_save(rng, leader):
+    return {
+        'leaderId': leader,
+        'day': 0,
+        'stats': {stat: rng.randint(30, 70) for stat in STATS},
+        'deck': [
+            {'id': f'card_{rng.randint(1, 500):03d}', 'level': 1, 'uses': 0, 'exhausted': False}
+            for _ in range(60)
+        ],
+        'hand': [],
+        'unlocked': [f'card_{i:03d}' for i in rng.sample(range(1, 500), k=200)],
+        'achievements': {f'achievement_{i:02d}': {'progress': 0, 'done': False} for i in range(50)},
+        'factions': {f'faction_{i:02d}': {'influence': rng.randint(40, 70), 'mood': 'neutral'} for i in range(10)},
+        'flags': {f'flag_{i}': False for i in range(40)},
+        'history': [],
+    }
+
+
+def next_turn(rng, save):
+    save = json.loads(json.dumps(save))
+    save['day'] += 1
+    for stat in rng.sample(STATS, k=rng.randint(1, 3)):
+        save['stats'][stat] = max(0, min(100, save['stats'][stat] + rng.randint(-9, 9)))
+    save['hand'] = [card['id'] for card in rng.sample(save['deck'], k=5)]
+    played = rng.choice(save['deck'])
+    played['uses'] += 1
+    save['achievements'][rng.choice(list(save['achievements']))]['progress'] += 1
+    faction = rng.choice(list(save['factions']))
+    save['factions'][faction]['influence'] += rng.randint(-5, 5)
+    if rng.random() < 0.1:
+        save['flags'][rng.choice(list(save['flags']))] = True
+    save['history'].append({'day': save['day'], 'card': rng.choice(save['hand']), 'crisis': None})
+    return save
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def run(mode, players, turns, seed):
+    rng = random.Random(seed)
+    latencies = []
+    with get_db() as conn, conn.cursor() as cur:
+        user_ids = []
+        for _ in range(players):
+            cur.execute(
+                "INSERT INTO users (username, password_hash) VALUES (%s, %s) RETURNING id",
+                (f'bench_{uuid.uuid4().hex[:16]}', 'x' * 64)
+            )
+            user_ids.append(cur.fetchone()['id'])
+
+    state = {user_id: initial_save(rng, f'leader_{i % 4 + 1:02d}') for i, user_id in enumerate(user_ids)}
+    payload_bytes = 0
+    for _ in range(turns):
+        for user_id in user_ids:
+            state[user_id] = next_turn(rng, state[user_id])
+            payload_bytes += len(json.dumps(state[user_id], separators=(',', ':')))
+            start = time.perf_counter()
+            with get_db() as conn, conn.cursor() as cur:
+                saves.insert_save(cur, user_id, state[user_id], mode)
+            latencies.append(time.perf_counter() - start)
+
+    with get_db() as conn, conn.cursor() as cur:
+        cur.execute(
+            "SELECT count(*) AS rows, sum(pg_column_size(save_data)) AS stored, "
+            "count(*) FILTER (WHERE save_kind = 'full') AS snapshots "
+            "FROM game_saves WHERE user_id = ANY(%s)",
+            (user_ids,)
+        )
+        totals = cur.fetchone()
+        cur.execute("DELETE FROM users WHERE id = ANY(%s)", (user_ids,))
+
+    return {
+        'mode': mode,
+        'saves': totals['rows'],
+        'snapshots': totals['snapshots'],
+        'logical_bytes': payload_bytes,
+        'stored_bytes': int(totals['stored']),
+        'write_ms_p50': round(statistics.median(latencies) * 1000, 3),
+        'write_ms_p99': round(percentile(latencies, 99) * 1000, 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--players', type=int, default=10)
+    parser.add_argument('--turns', type=int, default=100)
+    parser.add_argument('--seed', type=int, default=7)
+    args = parser.parse_args()
+
+    results = [run(mode, args.players, args.turns, args.seed) for mode in saves.SAVE_MODES]
+    full, delta = results
+    print(json.dumps({
+        'players': args.players,
+        'turns': args.turns,
+        'snapshot_every': saves.SNAPSHOT_EVERY,
+        'results': results,
+        'stored_bytes_ratio': round(delta['stored_bytes'] / full['stored_bytes'], 4),
+        'p99_ratio': round(delta['write_ms_p99'] / full['write_ms_p99'], 4),
+    }, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,446 @@
+#!/usr/bin/env python3
+"""Mixed-workload load test of the backend against a local Postgres.
+
+Starts the app (gunicorn by default, see bench_server.py for the modes)
+against the Postgres configured by DB_* -- e.g. the one from
+`docker compose up postgres` -- or, with --temp-cluster, a throwaway
+cluster created with initdb in a temporary directory and removed
+afterwards. It seeds one user each with 10, 1k and 10k saves plus a pool of
+players, then runs every scenario for --duration seconds with --clients
+client processes (one keep-alive connection each):
+
+* create_user      -- POST /api/users
+* autosave_burst   -- bursts of --burst POST /api/saves per player
+* list_10/1k/10k   -- GET /api/saves/<id>?view=meta for 10/1k/10k saves
+* list_full_10     -- GET /api/saves/<id> (full documents, 10 saves)
+* telemetry        -- POST /api/ai/test-balance with 100 episode results
+* ai_cards         -- POST /api/ai/generate-cards, unique themes (fake provider)
+* ai_cards_cached  -- the same with five recurring themes
+* mixed            -- all of the above, weighted like production traffic
+
+Each scenario reports requests, errors, throughput, p50/p95/p99/max latency
+(overall and per operation) and Postgres usage sampled from
+pg_stat_activity (connections total/active/idle in transaction) and
+pg_stat_database (commits per second). The report carries the git commit
+and settings; --baseline adds the change against an earlier report.
+
+    DB_HOST=localhost python backend/benchmarks/bench_load.py --duration 10 > load.json
+    python backend/benchmarks/bench_load.py --temp-cluster --baseline load.json
+
+Telemetry posts are folded into the balance aggregates and cannot be
+removed afterwards, so point it at a scratch database (or --temp-cluster).
+Output is JSON on stdout.
+"""
+
+import argparse
+import http.client
+import json
+import multiprocessing
+import os
+import random
+import shutil
+import signal
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from pathlib import Path
+
+from bench_server import APP_DIR, MODES, wait_ready
+
+REPO_DIR = APP_DIR.parents[1]
+LEADERS = ('rex_scaleston', 'donna_trumpet', 'kim_jong_fun', 'vladimir_putinov')
+STATS = ('approval', 'economy', 'absurdity', 'reputation', 'panic')
+LIST_SIZES = {'list_10': 10, 'list_1k': 1000, 'list_10k': 10000}
+
+# scenario -> [(weight, operation)]
+SCENARIOS = {
+    'create_user': [(1, 'create_user')],
+    'autosave_burst': [(1, 'autosave_burst')],
+    'list_10': [(1, 'list_10')],
+    'list_1k': [(1, 'list_1k')],
+    'list_10k': [(1, 'list_10k')],
+    'list_full_10': [(1, 'list_full_10')],
+    'telemetry': [(1, 'telemetry')],
+    'ai_cards': [(1, 'ai_cards')],
+    'ai_cards_cached': [(1, 'ai_cards_cached')],
+    'mixed': [(40, 'autosave_burst'), (10, 'list_10'), (8, 'list_1k'), (4, 'list_10k'),
+              (5, 'list_full_10'), (10, 'create_user'), (8, 'telemetry'), (5, 'ai_cards'),
+              (10, 'ai_cards_cached')],
+}
+
+
+def save_doc(rng, day, leader):
+    return {
+        'leaderId': leader,
+        'day': day,
+        'stats': {stat: rng.randint(0, 100) for stat in STATS},
+        'hand': [f'card_{rng.randint(1, 500):03d}' for _ in range(5)],
+        'factions': {f'faction_{i:02d}': rng.randint(0, 100) for i in range(10)},
+        'flags': {f'flag_{i}': rng.random() < 0.2 for i in range(20)},
+        'history': [{'day': d, 'card': f'card_{rng.randint(1, 500):03d}'} for d in range(max(0, day - 10), day)],
+    }
+
+
+def episode(rng):
+    return {
+        'leader_id': rng.choice(LEADERS),
+        'won': rng.random() < 0.3,
+        'days_survived': rng.randint(1, 300),
+        'cards_played': [f'card_{rng.randint(1, 100):03d}' for _ in range(rng.randint(5, 30))],
+        'final_stats': {stat: rng.randint(0, 100) for stat in STATS},
+    }
+
+
+# Operations: (rng, ctx) -> [(method, path, body)]; a burst is several requests
+
+def op_create_user(rng, ctx):
+    return [('POST', '/api/users', {'username': f"{ctx['prefix']}{uuid.uuid4().hex[:12]}", 'password': 'x'})]
+
+
+def op_autosave_burst(rng, ctx):
+    user_id = rng.choice(ctx['players'])
+    day = rng.randint(1, 200)
+    leader = LEADERS[user_id % len(LEADERS)]
+    return [('POST', '/api/saves', {'user_id': user_id, 'save_data': save_doc(rng, day + i, leader)})
+            for i in range(ctx['burst'])]
+
+
+def _op_list(name):
+    def op(rng, ctx):
+        return [('GET', f"/api/saves/{ctx['list_users'][name]}?view=meta&limit=20", None)]
+    return op
+
+
+def op_list_full_10(rng, ctx):
+    return [('GET', f"/api/saves/{ctx['list_users']['list_10']}", None)]
+
+
+def op_telemetry(rng, ctx):
+    return [('POST', f"/api/ai/test-balance?run_id={ctx['prefix']}",
+             {'results': [episode(rng) for _ in range(100)]})]
+
+
+def op_ai_cards(rng, ctx):
+    return [('POST', '/api/ai/generate-cards', {'theme': f'Bench {uuid.uuid4().hex}', 'count': 3})]
+
+
+def op_ai_cards_cached(rng, ctx):
+    return [('POST', '/api/ai/generate-cards', {'theme': f'Bench theme {rng.randint(1, 5)}', 'count': 3})]
+
+
+OPERATIONS = {
+    'create_user': op_create_user,
+    'autosave_burst': op_autosave_burst,
+    'list_full_10': op_list_full_10,
+    'telemetry': op_telemetry,
+    'ai_cards': op_ai_cards,
+    'ai_cards_cached': op_ai_cards_cached,
+}
+OPERATIONS.update({name: _op_list(name) for name in LIST_SIZES})
+
+
+def client(args):
+    port, scenario, duration, seed, ctx = args
+    rng = random.Random(seed)
+    weights, names = zip(*SCENARIOS[scenario])
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+    latencies, errors = {}, {}
+    deadline = time.perf_counter() + duration
+    while time.perf_counter() < deadline:
+        name = rng.choices(names, weights)[0]
+        for method, path, body in OPERATIONS[name](rng, ctx):
+            headers = {'Content-Type': 'application/json'} if body is not None else {}
+            start = time.perf_counter()
+            try:
+                conn.request(method, path, body=json.dumps(body) if body is not None else None, headers=headers)
+                response = conn.getresponse()
+                response.read()
+                ok = response.status < 400
+            except (OSError, http.client.HTTPException):
+                ok = False
+                conn.close()
+                conn = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+            if ok:
+                latencies.setdefault(name, []).append(time.perf_counter() - start)
+            else:
+                errors[name] = errors.get(name, 0) + 1
+    conn.close()
+    return latencies, errors
+
+
+def summarize(latencies, errors, elapsed):
+    ordered = sorted(latencies)
+    q = statistics.quantiles(ordered, n=100, method='inclusive') if len(ordered) > 1 else [ordered[0] if ordered else 0] * 99
+    return {
+        'requests': len(ordered),
+        'errors': errors,
+        'rps': round(len(ordered) / elapsed, 1),
+        'p50_ms': round(q[49] * 1000, 2),
+        'p95_ms': round(q[94] * 1000, 2),
+        'p99_ms': round(q[98] * 1000, 2),
+        'max_ms': round(ordered[-1] * 1000, 2) if ordered else 0,
+    }
+
+
+class ConnectionSampler:
+    """Polls pg_stat_activity for the app's connections while a scenario runs"""
+
+    def __init__(self, connect, interval=0.1):
+        self.connect = connect
+        self.interval = interval
+        self.samples = []
+        self._stop = threading.Event()
+        self._thread = None
+
+    def __enter__(self):
+        self._conn = self.connect()
+        self._conn.autocommit = True
+        self._commits = self._xacts()
+        self._started = time.perf_counter()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def _xacts(self):
+        with self._conn.cursor() as cur:
+            cur.execute("SELECT xact_commit + xact_rollback FROM pg_stat_database WHERE datname = current_database()")
+            return cur.fetchone()[0]
+
+    def _run(self):
+        with self._conn.cursor() as cur:
+            while not self._stop.wait(self.interval):
+                cur.execute(
+                    "SELECT count(*), count(*) FILTER (WHERE state = 'active'), "
+                    "count(*) FILTER (WHERE state LIKE 'idle in transaction%') FROM pg_stat_activity "
+                    "WHERE datname = current_database() AND pid <> pg_backend_pid() "
+                    "AND backend_type = 'client backend'"
+                )
+                self.samples.append(cur.fetchone())
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        elapsed = time.perf_counter() - self._started
+        # pg_stat_database is updated by backends with some delay
+        time.sleep(0.6)
+        transactions = self._xacts() - self._commits
+        self._conn.close()
+        samples = self.samples or [(0, 0, 0)]
+        self.report = {
+            'connections_max': max(s[0] for s in samples),
+            'connections_avg': round(statistics.fmean(s[0] for s in samples), 1),
+            'active_max': max(s[1] for s in samples),
+            'active_avg': round(statistics.fmean(s[1] for s in samples), 2),
+            'idle_in_transaction_max': max(s[2] for s in samples),
+            'transactions_per_s': round(transactions / elapsed, 1),
+        }
+
+
+class TempCluster:
+    """initdb + pg_ctl in a temporary directory, reachable over a unix socket"""
+
+    def __init__(self, bindir, port):
+        self.bindir = Path(bindir)
+        self.port = port
+        self.dir = Path(tempfile.mkdtemp(prefix='ed-bench-pg-'))
+
+    def __enter__(self):
+        if hasattr(os, 'geteuid') and os.geteuid() == 0:
+            raise SystemExit('initdb refuses to run as root; run as another user or use DB_HOST')
+        data = self.dir / 'data'
+        subprocess.run([self.bindir / 'initdb', '-D', data, '-U', 'postgres', '-A', 'trust', '-E', 'UTF8'],
+                       check=True, stdout=subprocess.DEVNULL)
+        options = f"-k {self.dir} -c listen_addresses='' -p {self.port} -c max_connections=200 -c fsync=off"
+        subprocess.run([self.bindir / 'pg_ctl', '-D', data, '-l', self.dir / 'log', '-o', options, '-w', 'start'],
+                       check=True, stdout=subprocess.DEVNULL)
+        subprocess.run([self.bindir / 'createdb', '-h', self.dir, '-p', str(self.port), '-U', 'postgres',
+                        'executive_disorder'], check=True)
+        os.environ.update(DB_HOST=str(self.dir), DB_PORT=str(self.port), DB_NAME='executive_disorder',
+                          DB_USER='postgres', DB_PASSWORD='')
+        return self
+
+    def __exit__(self, *exc):
+        subprocess.run([self.bindir / 'pg_ctl', '-D', self.dir / 'data', '-m', 'fast', 'stop'],
+                       stdout=subprocess.DEVNULL)
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+
+def _pg_bindir(explicit):
+    if explicit:
+        return explicit
+    initdb = shutil.which('initdb')
+    if initdb:
+        return str(Path(initdb).parent)
+    try:
+        return subprocess.run(['pg_config', '--bindir'], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        raise SystemExit('--temp-cluster needs initdb on PATH or --pg-bin')
+
+
+def seed(prefix, players, rng):
+    """Create the bench users and their saves; returns the client context"""
+    import saves
+    from db import get_db
+
+    def make_user(cur, name):
+        cur.execute("INSERT INTO users (username, password_hash) VALUES (%s, %s) RETURNING id",
+                    (f'{prefix}{name}', 'x' * 64))
+        return cur.fetchone()['id']
+
+    ctx = {'prefix': prefix, 'list_users': {}, 'players': []}
+    with get_db() as conn, conn.cursor() as cur:
+        for name, count in LIST_SIZES.items():
+            user_id = make_user(cur, name)
+            ctx['list_users'][name] = user_id
+            leader = rng.choice(LEADERS)
+            for start in range(0, count, 500):
+                saves.insert_saves_batch(cur, [(user_id, save_doc(rng, day, leader), None, count - day)
+                                               for day in range(start, min(start + 500, count))])
+            conn.commit()
+        ctx['players'] = [make_user(cur, f'player_{i}') for i in range(players)]
+    return ctx
+
+
+def cleanup(prefix):
+    from db import get_db
+
+    with get_db() as conn, conn.cursor() as cur:
+        cur.execute("DELETE FROM users WHERE username LIKE %s", (prefix + '%',))
+        cur.execute("DELETE FROM balance_results WHERE run_id = %s", (prefix,))
+
+
+def git_revision():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=REPO_DIR, capture_output=True,
+                                text=True, check=True).stdout.strip()
+        dirty = bool(subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=REPO_DIR,
+                                    capture_output=True, text=True).stdout.strip())
+        return {'commit': commit, 'dirty': dirty}
+    except (OSError, subprocess.CalledProcessError):
+        return {'commit': None, 'dirty': None}
+
+
+def compare(report, baseline):
+    changes = {}
+    for name, result in report['scenarios'].items():
+        before = baseline.get('scenarios', {}).get(name)
+        if not before:
+            continue
+        changes[name] = {
+            metric: round((result[metric] / before[metric] - 1) * 100, 1) if before[metric] else None
+            for metric in ('rps', 'p50_ms', 'p95_ms', 'p99_ms')
+        }
+    return {'commit': baseline.get('git', {}).get('commit'), 'change_pct': changes}
+
+
+def run(args, prefix):
+    import psycopg2
+    from db import DB_CONFIG, get_db
+
+    with get_db() as conn, conn.cursor() as cur:
+        cur.execute(Path(APP_DIR / 'schema.sql').read_text())
+        cur.execute("SHOW server_version")
+        server_version = cur.fetchone()['server_version']
+
+    rng = random.Random(args.seed)
+    started = time.perf_counter()
+    ctx = seed(prefix, args.clients * 4, rng)
+    ctx['burst'] = args.burst
+    seeded = time.perf_counter() - started
+
+    env = dict(os.environ, PORT=str(args.port), FLASK_DEBUG='0', GUNICORN_ACCESS_LOG='',
+               AI_PROVIDER='fake', FAKE_AI_LATENCY=str(args.ai_latency), FAKE_AI_FAILURE_RATE='0',
+               SAVE_WRITE_BEHIND='1' if args.write_behind else '0')
+    if args.workers:
+        env['GUNICORN_WORKERS'] = str(args.workers)
+    proc = subprocess.Popen(MODES[args.mode], cwd=APP_DIR, env=env, start_new_session=True,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    scenarios = {}
+    try:
+        startup = wait_ready(args.port, proc)
+        with multiprocessing.Pool(args.clients) as pool:
+            for name in args.scenarios:
+                with ConnectionSampler(lambda: psycopg2.connect(**DB_CONFIG)) as sampler:
+                    start = time.perf_counter()
+                    runs = pool.map(client, [(args.port, name, args.duration, args.seed * 1000 + i, ctx)
+                                             for i in range(args.clients)])
+                    elapsed = time.perf_counter() - start
+                per_op = {}
+                for latencies, errors in runs:
+                    for op, values in latencies.items():
+                        per_op.setdefault(op, ([], 0))[0].extend(values)
+                    for op, count in errors.items():
+                        values, failed = per_op.get(op, ([], 0))
+                        per_op[op] = (values, failed + count)
+                result = summarize([v for values, _ in per_op.values() for v in values],
+                                   sum(failed for _, failed in per_op.values()), elapsed)
+                if len(per_op) > 1:
+                    result['operations'] = {op: summarize(values, failed, elapsed)
+                                            for op, (values, failed) in sorted(per_op.items())}
+                result['db'] = sampler.report
+                scenarios[name] = result
+                print(f'{name}: {result["rps"]} req/s, p95 {result["p95_ms"]} ms, '
+                      f'{result["errors"]} errors', file=sys.stderr)
+    finally:
+        os.killpg(proc.pid, signal.SIGTERM)
+        try:
+            proc.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            os.killpg(proc.pid, signal.SIGKILL)
+
+    return {
+        'git': git_revision(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+        'environment': {'cpus': os.cpu_count(), 'python': sys.version.split()[0], 'postgres': server_version},
+        'settings': {key: getattr(args, key) for key in ('mode', 'workers', 'clients', 'duration', 'burst',
+                                                         'ai_latency', 'write_behind', 'seed')},
+        'startup_s': round(startup, 3),
+        'seed_s': round(seeded, 2),
+        'scenarios': scenarios,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--scenarios', nargs='+', default=list(SCENARIOS), choices=list(SCENARIOS))
+    parser.add_argument('--mode', default='gunicorn', choices=list(MODES))
+    parser.add_argument('--workers', type=int, default=0, help='GUNICORN_WORKERS (default: gunicorn.conf.py)')
+    parser.add_argument('--clients', type=int, default=8)
+    parser.add_argument('--duration', type=float, default=10)
+    parser.add_argument('--burst', type=int, default=5, help='saves per autosave burst')
+    parser.add_argument('--ai-latency', type=float, default=0.05, help='fake provider latency (s)')
+    parser.add_argument('--write-behind', action='store_true', help='run with SAVE_WRITE_BEHIND=1')
+    parser.add_argument('--port', type=int, default=18100)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--temp-cluster', action='store_true', help='run against a throwaway initdb cluster')
+    parser.add_argument('--pg-bin', help='directory with initdb/pg_ctl for --temp-cluster')
+    parser.add_argument('--pg-port', type=int, default=55432)
+    parser.add_argument('--baseline', type=Path, help='earlier report to compare against')
+    parser.add_argument('--keep-data', action='store_true', help='leave the seeded users in place')
+    args = parser.parse_args()
+
+    prefix = f'bench_{uuid.uuid4().hex[:8]}_'
+    cluster = TempCluster(_pg_bindir(args.pg_bin), args.pg_port) if args.temp_cluster else None
+    if cluster:
+        cluster.__enter__()
+    try:
+        sys.path.insert(0, str(APP_DIR))
+        try:
+            report = run(args, prefix)
+        finally:
+            if not args.keep_data and not cluster:
+                cleanup(prefix)
+    finally:
+        if cluster:
+            cluster.__exit__(None, None, None)
+    if args.baseline:
+        report['baseline'] = compare(report, json.loads(args.baseline.read_text()))
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""Request cost with and without the /metrics instrumentation.
+
+Times in-process requests through the Flask test client, so the numbers
+isolate the framework + instrumentation path rather than network I/O. The
+hooks are switched on and off inside one process and the configurations are
+interleaved round by round (best round kept), which keeps CPU frequency and
+background load from masquerading as overhead:
+
+* off      -- no request hooks, DB/upstream timing disabled
+* on       -- histograms, DB and upstream timing
+* profiled -- as `on`, plus slow-request stack sampling of every request
+
+Routes: GET /health (no I/O) and GET /api/saves/<id>?view=meta (one pooled
+Postgres query), so the per-query timing is exercised too.
+
+    DB_HOST=localhost python backend/benchmarks/bench_metrics_overhead.py --requests 2000 --rounds 10
+
+Requires backend/app/schema.sql to be applied. Output is JSON on stdout.
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+import uuid
+from pathlib import Path
+
+os.environ['METRICS'] = '1'
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / 'app'))
+
+import metrics  # noqa: E402
+from app import app  # noqa: E402
+from db import get_db  # noqa: E402
+
+HOOKS = (
+    (app.before_request_funcs, metrics._before_request),
+    (app.after_request_funcs, metrics._after_request),
+    (app.teardown_request_funcs, metrics._teardown_request),
+)
+
+
+def configure(mode):
+    metrics.METRICS_ENABLED = mode != 'off'
+    metrics.SLOW_REQUEST_MS = 60000 if mode == 'profiled' else 0
+    for registry, hook in HOOKS:
+        funcs = registry.setdefault(None, [])
+        if mode == 'off' and hook in funcs:
+            funcs.remove(hook)
+        elif mode != 'off' and hook not in funcs:
+            # Flask runs after_request hooks in reverse: keep metrics last to run
+            funcs.insert(0, hook)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--rounds', type=int, default=10)
+    args = parser.parse_args()
+
+    client = app.test_client()
+    user_id = client.post('/api/users', json={'username': f'bench_{uuid.uuid4().hex[:16]}',
+                                              'password': 'x'}).json['id']
+    client.post('/api/saves', json={'user_id': user_id, 'save_data': {'day': 1}})
+    routes = {'health': '/health', 'save_meta': f'/api/saves/{user_id}?view=meta'}
+    modes = ('off', 'on', 'profiled')
+    best = {mode: {route: float('inf') for route in routes} for mode in modes}
+
+    try:
+        for route, url in routes.items():
+            for _ in range(200):
+                client.get(url)
+            for _ in range(args.rounds):
+                for mode in modes:
+                    configure(mode)
+                    start = time.perf_counter()
+                    for _ in range(args.requests):
+                        client.get(url)
+                    us = (time.perf_counter() - start) / args.requests * 1e6
+                    best[mode][route] = min(best[mode][route], us)
+    finally:
+        configure('on')
+        with get_db() as conn, conn.cursor() as cur:
+            cur.execute("DELETE FROM users WHERE id = %s", (user_id,))
+
+    report = {
+        'requests_per_round': args.requests,
+        'rounds': args.rounds,
+        'us_per_request': {mode: {route: round(us, 1) for route, us in runs.items()}
+                           for mode, runs in best.items()},
+    }
+    for mode in ('on', 'profiled'):
+        report[f'overhead_{mode}'] = {
+            route: {
+                'us': round(best[mode][route] - best['off'][route], 1),
+                'pct': round((best[mode][route] / best['off'][route] - 1) * 100, 1),
+            }
+            for route in routes
+        }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
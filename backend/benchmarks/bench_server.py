@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+"""Startup time and throughput: Flask dev server vs. gunicorn.
+
+Starts each server mode on a local port, measures the time until GET /health
+first answers, then drives it with --clients client processes (one
+keep-alive HTTP connection each) for --duration seconds per route:
+
+* dev      -- `python app.py` (Flask's dev server, debug + reloader, as the
+              Dockerfile used to run it)
+* gunicorn -- `gunicorn -c gunicorn.conf.py wsgi:app` (preload, gthread)
+
+Routes: GET /health and GET /api/saves/<id>?view=meta (one Postgres query).
+
+    DB_HOST=localhost python backend/benchmarks/bench_server.py --clients 16 --duration 10
+
+Requires backend/app/schema.sql to be applied. Output is JSON on stdout.
+"""
+
+import argparse
+import http.client
+import json
+import multiprocessing
+import os
+import signal
+import statistics
+import subprocess
+import sys
+import time
+import uuid
+from pathlib import Path
+
+APP_DIR = Path(__file__).resolve().parents[1] / 'app'
+
+MODES = {
+    'dev': [sys.executable, 'app.py'],
+    'gunicorn': [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', 'wsgi:app'],
+}
+
+
+def request(conn, method, path, body=None):
+    headers = {'Content-Type': 'application/json'} if body is not None else {}
+    conn.request(method, path, body=json.dumps(body) if body is not None else None, headers=headers)
+    response = conn.getresponse()
+    data = response.read()
+    return response.status, data
+
+
+def wait_ready(port, proc, timeout=60):
+    start = time.perf_counter()
+    while time.perf_counter() - start < timeout:
+        if proc.poll() is not None:
+            raise RuntimeError(f'server exited with {proc.returncode}')
+        try:
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=1)
+            if request(conn, 'GET', '/health')[0] == 200:
+                return time.perf_counter() - start
+        except OSError:
+            time.sleep(0.01)
+    raise RuntimeError('server did not become ready')
+
+
+def client(args):
+    port, path, duration = args
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+    latencies, errors = [], 0
+    deadline = time.perf_counter() + duration
+    while True:
+        start = time.perf_counter()
+        if start >= deadline:
+            break
+        try:
+            status, _ = request(conn, 'GET', path)
+            if status != 200:
+                errors += 1
+        except (OSError, http.client.HTTPException):
+            errors += 1
+            conn.close()
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+            continue
+        latencies.append(time.perf_counter() - start)
+    return latencies, errors
+
+
+def run_mode(name, port, clients, duration):
+    env = dict(os.environ, PORT=str(port), FLASK_DEBUG='1', GUNICORN_ACCESS_LOG='')
+    proc = subprocess.Popen(MODES[name], cwd=APP_DIR, env=env, start_new_session=True,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        startup = wait_ready(port, proc)
+        conn = http.client.HTTPConnection('127.0.0.1', port, timeout=10)
+        _, body = request(conn, 'POST', '/api/users',
+                          {'username': f'bench_{uuid.uuid4().hex[:16]}', 'password': 'x'})
+        user_id = json.loads(body)['id']
+        request(conn, 'POST', '/api/saves', {'user_id': user_id, 'save_data': {'day': 1}})
+
+        routes = {'health': '/health', 'save_meta': f'/api/saves/{user_id}?view=meta'}
+        result = {'startup_s': round(startup, 3)}
+        with multiprocessing.Pool(clients) as pool:
+            for route, path in routes.items():
+                start = time.perf_counter()
+                runs = pool.map(client, [(port, path, duration)] * clients)
+                elapsed = time.perf_counter() - start
+                latencies = sorted(l for run_latencies, _ in runs for l in run_latencies)
+                q = statistics.quantiles(latencies, n=100) if len(latencies) > 1 else [0] * 99
+                result[route] = {
+                    'requests': len(latencies),
+                    'errors': sum(errors for _, errors in runs),
+                    'rps': round(len(latencies) / elapsed, 1),
+                    'p50_ms': round(q[49] * 1000, 2),
+                    'p99_ms': round(q[98] * 1000, 2),
+                }
+        return result, user_id
+    finally:
+        os.killpg(proc.pid, signal.SIGTERM)
+        try:
+            proc.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            os.killpg(proc.pid, signal.SIGKILL)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--clients', type=int, default=16)
+    parser.add_argument('--duration', type=float, default=10)
+    parser.add_argument('--port', type=int, default=18000)
+    parser.add_argument('--modes', nargs='+', default=list(MODES), choices=list(MODES))
+    args = parser.parse_args()
+
+    sys.path.insert(0, str(APP_DIR))
+    from db import get_db
+
+    report = {'clients': args.clients, 'duration_s': args.duration, 'cpus': os.cpu_count()}
+    user_ids = []
+    try:
+        for offset, name in enumerate(args.modes):
+            report[name], user_id = run_mode(name, args.port + offset, args.clients, args.duration)
+            user_ids.append(user_id)
+    finally:
+        with get_db() as conn, conn.cursor() as cur:
+            cur.execute("DELETE FROM users WHERE id = ANY(%s)", (user_ids,))
+    if 'dev' in report and 'gunicorn' in report:
+        report['speedup'] = {route: round(report['gunicorn'][route]['rps'] / report['dev'][route]['rps'], 2)
+                             for route in ('health', 'save_meta') if report['dev'][route]['rps']}
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
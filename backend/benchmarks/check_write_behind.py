@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+"""Correctness check of the write-behind save buffer against a real Postgres.
+
+Concurrent players autosave in bursts through POST /api/saves with
+SAVE_WRITE_BEHIND=1. Afterwards every player's newest stored save must be
+the last one they sent, no player may have more rows than saves sent, and
+the buffer must have reported the difference as coalesced writes.
+
+It then checks the reads and synchronous saves that overlap a flush: while a
+(deliberately slowed) batch holding a player's save is being written, a read
+must still return that save, and a synchronous save must stay the newest.
+
+    DB_HOST=localhost python backend/benchmarks/check_write_behind.py --players 50 --saves 40
+
+Exits non-zero on a mismatch. Output is JSON on stdout.
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import threading
+import time
+import uuid
+from pathlib import Path
+
+os.environ.setdefault('SAVE_WRITE_BEHIND', '1')
+os.environ.setdefault('SAVE_COALESCE_WINDOW', '0.2')
+os.environ.setdefault('SAVE_FLUSH_INTERVAL', '0.05')
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / 'app'))
+
+import saves  # noqa: E402
+import write_behind  # noqa: E402
+from app import app  # noqa: E402
+from db import get_db  # noqa: E402
+
+
+def play(client, user_id, saves_to_send, seed, last_sent):
+    rng = random.Random(seed)
+    for turn in range(saves_to_send):
+        save = {'day': turn, 'stats': {'approval': rng.randint(0, 100)}, 'nonce': uuid.uuid4().hex}
+        response = client.post('/api/saves', json={'user_id': user_id, 'save_data': save})
+        assert response.status_code == 202, response.data
+        last_sent[user_id] = save
+        # Bursty autosaves: mostly back to back, sometimes a pause longer than the window
+        time.sleep(rng.choice([0, 0, 0, 0.01, write_behind.COALESCE_WINDOW * 1.5]))
+
+
+def newest_save(client, user_id):
+    response = client.get(f'/api/saves/{user_id}')
+    assert response.status_code == 200, response.data
+    return response.json[0]['save_data'] if response.json else None
+
+
+def check_in_flight(client, user_id, delay=0.5):
+    """Reads and synchronous saves issued while a flush of the user's save is
+    still writing; returns failure messages"""
+    insert = saves.insert_saves_batch
+    started = threading.Event()
+
+    def slow_insert(cur, items, *args, **kwargs):
+        ids = insert(cur, items, *args, **kwargs)
+        started.set()
+        time.sleep(delay)  # the batch is inserted but not yet committed
+        return ids
+
+    def flush_in_background():
+        started.clear()
+        thread = threading.Thread(target=write_behind.buffer.flush, kwargs={'force': True})
+        thread.start()
+        assert started.wait(10), 'flush did not start'
+        return thread
+
+    failures = []
+    # Only the forced flushes below may write, not the background flusher
+    window, write_behind.buffer.window = write_behind.buffer.window, 3600
+    saves.insert_saves_batch = slow_insert
+    try:
+        buffered = {'day': 1, 'nonce': uuid.uuid4().hex}
+        client.post('/api/saves', json={'user_id': user_id, 'save_data': buffered})
+        thread = flush_in_background()
+        if newest_save(client, user_id) != buffered:
+            failures.append('read during a flush missed the save being flushed')
+        thread.join()
+
+        client.post('/api/saves', json={'user_id': user_id, 'save_data': {'day': 2, 'nonce': uuid.uuid4().hex}})
+        thread = flush_in_background()
+        synchronous = {'day': 3, 'nonce': uuid.uuid4().hex}
+        response = client.post('/api/saves', json={'user_id': user_id, 'save_data': synchronous},
+                               headers={'X-Save-Sync': '1'})
+        assert response.status_code == 201, response.data
+        thread.join()
+        if newest_save(client, user_id) != synchronous:
+            failures.append('a flush in progress committed over a newer synchronous save')
+    finally:
+        saves.insert_saves_batch = insert
+        write_behind.buffer.window = window
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--players', type=int, default=20)
+    parser.add_argument('--saves', type=int, default=30)
+    args = parser.parse_args()
+
+    client = app.test_client()
+    user_ids = []
+    for _ in range(args.players + 1):
+        response = client.post('/api/users', json={'username': f'wb_{uuid.uuid4().hex[:16]}', 'password': 'x'})
+        user_ids.append(response.json['id'])
+    in_flight_user = user_ids.pop()
+
+    last_sent = {}
+    start = time.perf_counter()
+    threads = [threading.Thread(target=play, args=(app.test_client(), user_id, args.saves, i, last_sent))
+               for i, user_id in enumerate(user_ids)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    write_behind.buffer.close()
+    stats = write_behind.buffer.stats()
+
+    failures = check_in_flight(client, in_flight_user)
+    with get_db() as conn, conn.cursor() as cur:
+        cur.execute(
+            "SELECT DISTINCT ON (user_id) user_id, save_data FROM game_saves WHERE user_id = ANY(%s) "
+            "ORDER BY user_id, created_at DESC, id DESC",
+            (user_ids,)
+        )
+        newest = {row['user_id']: row['save_data'] for row in cur.fetchall()}
+        cur.execute("SELECT user_id, count(*) AS n FROM game_saves WHERE user_id = ANY(%s) GROUP BY user_id",
+                    (user_ids,))
+        counts = {row['user_id']: row['n'] for row in cur.fetchall()}
+        stored = sum(counts.values())
+        cur.execute("DELETE FROM users WHERE id = ANY(%s)", (user_ids + [in_flight_user],))
+
+    for user_id in user_ids:
+        if newest.get(user_id) != last_sent[user_id]:
+            failures.append(f'user {user_id}: newest stored save is not the last one sent')
+        if counts.get(user_id, 0) > args.saves:
+            failures.append(f'user {user_id}: {counts[user_id]} rows for {args.saves} saves')
+    sent = args.players * args.saves
+    if stats['coalesced'] != sent - stored:
+        failures.append(f"coalesced={stats['coalesced']} but {sent - stored} saves were not stored")
+
+    print(json.dumps({
+        'players': args.players,
+        'saves_sent': sent,
+        'rows_written': stored,
+        'submit_rate_per_s': round(sent / elapsed, 1),
+        'buffer': stats,
+        'failures': failures,
+    }, indent=2))
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -38,13 +38,9 @@ if command -v python3 &> /dev/null; then
     echo -e "${BLUE}  → Generating content data...${NC}"
     python3 tools/gen_content.py theme.json 2>/dev/null || echo "  ⚠️  Content generation skipped"
     
-    # Generate images
-    echo -e "${BLUE}  → Generating images...${NC}"
-    python3 tools/gen_images.py 2>/dev/null || echo "  ⚠️  Image generation skipped"
-    
-    # Generate audio
-    echo -e "${BLUE}  → Generating audio...${NC}"
-    python3 tools/gen_audio.py 2>/dev/null || echo "  ⚠️  Audio generation skipped"
+    # Generate images, audio and portraits in one scheduled pass
+    echo -e "${BLUE}  → Generating assets...${NC}"
+    python3 tools/gen_assets.py --progress 0 2>/dev/null || echo "  ⚠️  Asset generation incomplete (rerun to resume)"
     
     echo -e "${GREEN}  ✓ Content generation complete${NC}"
 else
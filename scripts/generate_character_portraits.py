@@ -6,13 +6,17 @@ Requires: Flask backend running with DALL-E 3 integration
 
 import requests
 import json
+import sys
 import time
 from pathlib import Path
 
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "tools"))
+from asset_cache import AssetStore, asset_key
+from content_manifest import write_atomic
+
 # Configuration
 API_BASE_URL = "https://your-replit-url.repl.co"  # UPDATE THIS
 OUTPUT_DIR = Path("../unity/Assets/Art/Characters/Generated")
-OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
 
 # Character portrait specifications
 CHARACTERS = [
@@ -58,14 +62,41 @@ CHARACTERS = [
     }
 ]
 
-def generate_portrait(character):
-    """Generate a single character portrait"""
+class PortraitError(Exception):
+    """The backend did not return a portrait (the reason is already printed)"""
+
+def portrait_key(character):
+    """Asset cache key: the backend always renders with DALL-E 3"""
+    return asset_key("portrait", character["prompt"], provider="backend",
+                     params={"endpoint": "/api/generate-character-portrait", "model": "dall-e-3"})
+
+def generate_portrait(character, output_dir=None, api_base_url=None, assets=None):
+    """Generate a single character portrait (also run by tools/gen_assets.py)
+    assets: AssetStore consulted before calling the backend"""
+    output_dir = Path(output_dir or OUTPUT_DIR)
+    api_base_url = api_base_url or API_BASE_URL
+    output_dir.mkdir(parents=True, exist_ok=True)
+    
     print(f"\n{'='*60}")
     print(f"Generating portrait for: {character['name']}")
     print(f"{'='*60}")
     
+    output_path = output_dir / character["filename"]
+    try:
+        if assets is None:
+            request_portrait(character, output_path, api_base_url)
+        elif assets.fetch_or_create("portrait", portrait_key(character), output_path,
+                                    lambda: request_portrait(character, output_path, api_base_url),
+                                    {"name": character["name"]}):
+            print(f"♻️  CACHED: Portrait linked to {output_path}")
+        return True
+    except PortraitError:
+        return False
+
+def request_portrait(character, output_path, api_base_url):
+    """Ask the backend for a portrait and save it to output_path"""
     # Prepare request
-    url = f"{API_BASE_URL}/api/generate-character-portrait"
+    url = f"{api_base_url}/api/generate-character-portrait"
     payload = {
         "character_name": character["name"],
         "description": character["prompt"]
@@ -84,24 +115,24 @@ def generate_portrait(character):
         )
         
         if response.status_code == 200:
-            # Save image
-            output_path = OUTPUT_DIR / character["filename"]
-            with open(output_path, 'wb') as f:
-                f.write(response.content)
+            # Save image (replaced, not rewritten: the old file may be a link into the asset store)
+            write_atomic(output_path, response.content)
             
             print(f"✅ SUCCESS: Portrait saved to {output_path}")
-            return True
+            return output_path
         else:
             print(f"❌ ERROR: Status {response.status_code}")
             print(f"Response: {response.text[:200]}")
-            return False
+            raise PortraitError(f"status {response.status_code}")
             
+    except PortraitError:
+        raise
     except requests.exceptions.Timeout:
         print(f"❌ ERROR: Request timed out (60s)")
-        return False
+        raise PortraitError("timeout")
     except Exception as e:
         print(f"❌ ERROR: {str(e)}")
-        return False
+        raise PortraitError(str(e))
 
 def main():
     print("="*60)
@@ -127,18 +158,20 @@ def main():
         return
     
     # Generate portraits
+    assets = AssetStore()
     results = []
     for i, character in enumerate(CHARACTERS, 1):
         print(f"\n[{i}/{len(CHARACTERS)}] Processing {character['name']}...")
-        success = generate_portrait(character)
+        hits = assets.hits("portrait")
+        success = generate_portrait(character, assets=assets)
         results.append({
             "name": character["name"],
             "success": success,
             "filename": character["filename"]
         })
         
-        # Wait between requests to avoid rate limiting
-        if i < len(CHARACTERS):
+        # Wait between requests to avoid rate limiting (cache hits made none)
+        if i < len(CHARACTERS) and assets.hits("portrait") == hits:
             print("\nWaiting 5 seconds before next request...")
             time.sleep(5)
     
@@ -153,6 +186,8 @@ def main():
     print(f"\nTotal: {len(results)}")
     print(f"✅ Successful: {successful}")
     print(f"❌ Failed: {failed}")
+    assets.finish()
+    print(f"♻️  Asset cache: {assets.report()}")
     
     if successful > 0:
         print("\n✅ Successfully generated:")
@@ -0,0 +1,296 @@
+"""Content-addressed store of generated assets.
+
+Before calling a provider, the generators ask the store for an asset with
+the same key: the sha256 of the asset kind, the normalized prompt (NFKC,
+case-folded, whitespace collapsed), the negative prompt, the style preset,
+the provider and its model parameters. On a hit the stored file is
+hard-linked to the output path (copied where links are not possible), so
+cards that share a prompt, and reruns that reproduce the same prompts from
+the same seed, cost no provider call and no extra disk space. On a miss the
+generated file is linked into the store.
+
+Layout (.cache/assets/store under the repository root by default, so the
+scripts in scripts/ share it; ASSET_CACHE_DIR overrides it):
+
+    objects/ab/ab12...ef.png    one file per key
+    index.json                  {key: {"ext", "size", "created", "used", "hits", "meta"}}
+
+The object path is derived from the key, so a lookup only needs the file
+to exist; the index records use times for eviction and is merged into the
+file on save. After each run the store evicts entries unused for longer
+than ASSET_CACHE_MAX_DAYS (default 30), then the least recently used ones
+until it is under ASSET_CACHE_MAX_MB (default 2048). Outputs stay valid
+after eviction: a hard link keeps its data.
+"""
+
+import hashlib
+import json
+import os
+import re
+import shutil
+import threading
+import time
+import unicodedata
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, Dict, Optional
+
+from content_manifest import write_atomic
+
+ROOT = Path(__file__).resolve().parents[1]
+STORE_PATH = ROOT / ".cache" / "assets" / "store"
+INDEX_FILE = "index.json"
+STORE_VERSION = 1
+
+
+def normalize_prompt(prompt: str) -> str:
+    return re.sub(
+        r"\s+", " ", unicodedata.normalize("NFKC", prompt or "").casefold()
+    ).strip()
+
+
+def asset_key(
+    kind: str,
+    prompt: str,
+    negative: str = "",
+    style=None,
+    provider: str = "",
+    params: Optional[Dict] = None,
+) -> str:
+    payload = {
+        "version": STORE_VERSION,
+        "kind": kind,
+        "prompt": normalize_prompt(prompt),
+        "negative": normalize_prompt(negative),
+        "style": style,
+        "provider": provider,
+        "params": params or {},
+    }
+    canonical = json.dumps(
+        payload, sort_keys=True, separators=(",", ":"), ensure_ascii=False
+    )
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+def link_or_copy(source: Path, dest: Path):
+    """Make dest a hard link to source (a copy across devices), replacing dest atomically"""
+    try:
+        if os.path.samefile(source, dest):
+            return  # rename() between two links to one file is a no-op and would leave tmp behind
+    except FileNotFoundError:
+        if not source.exists():
+            raise
+    dest.parent.mkdir(parents=True, exist_ok=True)
+    tmp = dest.with_name(f"{dest.name}.{threading.get_ident()}.link")
+    try:
+        os.link(source, tmp)
+    except OSError:
+        shutil.copyfile(source, tmp)
+    os.replace(tmp, dest)
+
+
+@dataclass
+class KindStats:
+    lookups: int = 0
+    hits: int = 0
+    stored: int = 0
+    bytes_saved: int = 0
+
+    @property
+    def hit_rate(self) -> float:
+        return self.hits / self.lookups if self.lookups else 0.0
+
+    def to_dict(self) -> Dict:
+        return {
+            "lookups": self.lookups,
+            "hits": self.hits,
+            "stored": self.stored,
+            "hit_rate": round(self.hit_rate, 3),
+            "bytes_saved": self.bytes_saved,
+        }
+
+
+class AssetStore:
+    def __init__(
+        self,
+        root: Optional[Path] = None,
+        max_bytes: Optional[int] = None,
+        max_age: Optional[float] = None,
+    ):
+        self.root = Path(root or os.getenv("ASSET_CACHE_DIR", STORE_PATH))
+        self.max_bytes = (
+            max_bytes
+            if max_bytes is not None
+            else int(float(os.getenv("ASSET_CACHE_MAX_MB", "2048")) * 2**20)
+        )
+        self.max_age = (
+            max_age
+            if max_age is not None
+            else float(os.getenv("ASSET_CACHE_MAX_DAYS", "30")) * 86400
+        )
+        self.index: Dict[str, Dict] = self._read_index()
+        self.stats: Dict[str, KindStats] = {}
+        self._lock = threading.Lock()
+        self._in_flight: Dict[str, threading.Event] = {}
+
+    def _read_index(self) -> Dict[str, Dict]:
+        try:
+            index = json.loads((self.root / INDEX_FILE).read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return {}
+        return index.get("entries", {}) if index.get("version") == STORE_VERSION else {}
+
+    def object_path(self, key: str, ext: str) -> Path:
+        return self.root / "objects" / key[:2] / f"{key}{ext}"
+
+    def _kind(self, kind: str) -> KindStats:
+        return self.stats.setdefault(kind, KindStats())
+
+    def hits(self, kind: str) -> int:
+        with self._lock:
+            return self._kind(kind).hits
+
+    def fetch(self, kind: str, key: str, dest: Path) -> bool:
+        """Link the stored asset for key to dest; False when there is none"""
+        source = self.object_path(key, dest.suffix)
+        with self._lock:
+            self._kind(kind).lookups += 1
+        try:
+            link_or_copy(source, dest)
+        except FileNotFoundError:
+            return False
+        size = source.stat().st_size
+        with self._lock:
+            stats = self._kind(kind)
+            stats.hits += 1
+            stats.bytes_saved += size
+            entry = self.index.setdefault(
+                key,
+                {
+                    "ext": dest.suffix,
+                    "size": size,
+                    "created": time.time(),
+                    "hits": 0,
+                    "meta": {"kind": kind},
+                },
+            )
+            entry["used"] = time.time()
+            entry["hits"] = entry.get("hits", 0) + 1
+        return True
+
+    def store(self, kind: str, key: str, source: Path, meta: Optional[Dict] = None):
+        """Add a generated file under key (linked, so it takes no extra space)"""
+        target = self.object_path(key, source.suffix)
+        link_or_copy(source, target)
+        now = time.time()
+        with self._lock:
+            self._kind(kind).stored += 1
+            self.index[key] = {
+                "ext": source.suffix,
+                "size": target.stat().st_size,
+                "created": now,
+                "used": now,
+                "hits": 0,
+                "meta": {"kind": kind, **(meta or {})},
+            }
+
+    def fetch_or_create(
+        self,
+        kind: str,
+        key: str,
+        dest: Path,
+        create: Callable[[], Path],
+        meta: Optional[Dict] = None,
+    ) -> bool:
+        """Link the stored asset to dest, or run create() (which returns the generated
+        file) and store its result. Concurrent callers with the same key wait for the
+        first one instead of calling the provider again. True on a hit.
+
+        dest may be a hard link to a stored object, so create() must replace it
+        (write elsewhere and os.replace) rather than write into it in place."""
+        while True:
+            with self._lock:
+                pending = self._in_flight.get(key)
+                if pending is None:
+                    self._in_flight[key] = threading.Event()
+                    break
+            pending.wait()
+        try:
+            if self.fetch(kind, key, dest):
+                return True
+            path = create()
+            self.store(kind, key, path, meta)
+            if Path(path) != Path(dest):
+                link_or_copy(self.object_path(key, Path(path).suffix), dest)
+            return False
+        finally:
+            with self._lock:
+                self._in_flight.pop(key).set()
+
+    def evict(self) -> Dict:
+        """Drop entries past max_age, then least recently used ones until under max_bytes"""
+        now = time.time()
+        objects = {}
+        for path in (self.root / "objects").glob("*/*"):
+            if path.name.endswith(".link"):
+                continue
+            key = path.stem
+            st = path.stat()
+            entry = self.index.get(key, {})
+            objects[key] = (entry.get("used", st.st_mtime), st.st_size, path)
+        total = sum(size for _, size, _ in objects.values())
+        evicted = freed = 0
+        for key, (used, size, path) in sorted(
+            objects.items(), key=lambda item: item[1][0]
+        ):
+            if now - used <= self.max_age and total <= self.max_bytes:
+                break
+            path.unlink(missing_ok=True)
+            self.index.pop(key, None)
+            total -= size
+            evicted += 1
+            freed += size
+        return {
+            "objects": len(objects) - evicted,
+            "bytes": total,
+            "evicted": evicted,
+            "freed": freed,
+        }
+
+    def save(self):
+        """Merge this run's index changes into the index file"""
+        with self._lock:
+            merged = self._read_index()
+            for key, entry in self.index.items():
+                if entry.get("used", 0) >= merged.get(key, {}).get("used", 0):
+                    merged[key] = entry
+            merged = {
+                key: entry
+                for key, entry in merged.items()
+                if self.object_path(key, entry.get("ext", "")).exists()
+            }
+            self.index = merged
+            write_atomic(
+                self.root / INDEX_FILE,
+                json.dumps({"version": STORE_VERSION, "entries": merged}).encode(
+                    "utf-8"
+                ),
+            )
+
+    def finish(self) -> Dict:
+        """Evict and save at the end of a run; returns the eviction summary"""
+        summary = self.evict()
+        self.save()
+        return summary
+
+    def report(self) -> str:
+        with self._lock:
+            parts = [
+                f"{kind} {stats.hits}/{stats.lookups} ({stats.hit_rate * 100:.0f}%)"
+                for kind, stats in sorted(self.stats.items())
+                if stats.lookups
+            ]
+            saved = sum(stats.bytes_saved for stats in self.stats.values())
+        if not parts:
+            return "no lookups"
+        return f"{', '.join(parts)} hits, {saved / 2**20:.1f} MB reused"
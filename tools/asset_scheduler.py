@@ -0,0 +1,401 @@
+"""Task-graph scheduler for the asset pipeline (tools/gen_assets.py).
+
+Tasks run on bounded worker pools, one pool per provider, so the build is
+limited by how much each provider can take rather than by the order the
+stages are written in. Within a pool, ready tasks run lowest priority value
+first, then in graph order. A task becomes ready once all its dependencies
+have succeeded; when one fails, everything depending on it is reported as
+blocked instead of run.
+
+Completed tasks are appended to a checkpoint (JSON lines with the task id,
+its fingerprint and its result). A later run skips every task whose
+fingerprint matches and whose recorded outputs are still on disk (with
+their recorded size), so an interrupted or partly failed build resumes where
+it stopped, and a task whose inputs changed (and so its fingerprint) or whose
+output was deleted or truncated runs again. Tasks without a fingerprint
+always run.
+"""
+
+import heapq
+import json
+import sys
+import threading
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Union
+
+from content_manifest import write_atomic
+
+
+@dataclass
+class Task:
+    id: str
+    stage: str
+    pool: str
+    run: Callable[[], object]
+    priority: int = 0
+    deps: List[str] = field(default_factory=list)
+    fingerprint: Optional[str] = None
+    # Files a recorded result stands for, as {path: expected size or None}
+    outputs: Optional[Callable[[object], Dict[Union[str, Path], Optional[int]]]] = None
+
+
+@dataclass
+class Pool:
+    name: str
+    workers: int
+    # Minimum seconds between task starts, for providers that throttle
+    interval: float = 0.0
+
+
+@dataclass
+class StageStats:
+    total: int = 0
+    done: int = 0
+    resumed: int = 0
+    failed: int = 0
+    blocked: int = 0
+    busy: float = 0.0
+    first_start: Optional[float] = None
+    last_end: Optional[float] = None
+
+    @property
+    def wall(self) -> float:
+        if self.first_start is None or self.last_end is None:
+            return 0.0
+        return self.last_end - self.first_start
+
+    @property
+    def throughput(self) -> float:
+        return self.done / self.wall if self.wall > 0 else 0.0
+
+    def to_dict(self) -> Dict:
+        return {
+            "total": self.total,
+            "done": self.done,
+            "resumed": self.resumed,
+            "failed": self.failed,
+            "blocked": self.blocked,
+            "busy_s": round(self.busy, 3),
+            "wall_s": round(self.wall, 3),
+            "per_s": round(self.throughput, 2),
+        }
+
+
+@dataclass
+class RunReport:
+    seconds: float
+    stages: Dict[str, StageStats]
+    pools: Dict[str, Dict]
+    failures: Dict[str, str]
+    interrupted: bool = False
+
+    @property
+    def ok(self) -> bool:
+        return not (
+            self.failures
+            or self.interrupted
+            or any(stats.blocked for stats in self.stages.values())
+        )
+
+    def to_dict(self) -> Dict:
+        return {
+            "seconds": round(self.seconds, 3),
+            "ok": self.ok,
+            "interrupted": self.interrupted,
+            "stages": {name: stats.to_dict() for name, stats in self.stages.items()},
+            "pools": self.pools,
+            "failures": self.failures,
+        }
+
+    def format(self) -> str:
+        lines = [
+            f"{'stage':<10} {'total':>7} {'done':>7} {'resumed':>8} {'failed':>7} {'blocked':>8} {'per s':>9}"
+        ]
+        for name, stats in self.stages.items():
+            lines.append(
+                f"{name:<10} {stats.total:>7} {stats.done:>7} {stats.resumed:>8} {stats.failed:>7} "
+                f"{stats.blocked:>8} {stats.throughput:>9.1f}"
+            )
+        for name, pool in self.pools.items():
+            lines.append(
+                f"pool {name}: {pool['workers']} workers, {pool['utilization'] * 100:.0f}% busy"
+            )
+        lines.append(f"total {self.seconds:.2f}s")
+        return "\n".join(lines)
+
+
+class Checkpoint:
+    """Completed tasks of previous runs, as JSON lines of
+    {"task": id, "fingerprint": ..., "result": ...}; the last line per task wins"""
+
+    def __init__(self, path: Optional[Path], fresh: bool = False):
+        self.path = Path(path) if path else None
+        self.entries: Dict[str, Dict] = {}
+        self._file = None
+        self._lock = threading.Lock()
+        if not self.path:
+            return
+        lines = 0
+        if self.path.exists() and not fresh:
+            with open(self.path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:  # torn last line of an interrupted run
+                        continue
+                    self.entries[entry["task"]] = entry
+                    lines += 1
+        if fresh or lines > len(self.entries):
+            # Start over, or drop superseded lines
+            write_atomic(
+                self.path,
+                "".join(
+                    json.dumps(entry) + "\n" for entry in self.entries.values()
+                ).encode("utf-8"),
+            )
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._file = open(self.path, "a", encoding="utf-8")
+
+    def completed(self, task: Task) -> bool:
+        entry = self.entries.get(task.id)
+        if (
+            task.fingerprint is None
+            or entry is None
+            or entry["fingerprint"] != task.fingerprint
+        ):
+            return False
+        if task.outputs is None:
+            return True
+        try:
+            outputs = task.outputs(entry.get("result"))
+        except (KeyError, TypeError, AttributeError):  # a result from an older layout
+            return False
+        for path, size in outputs.items():
+            try:
+                actual = Path(path).stat().st_size
+            except OSError:
+                return False
+            if size is not None and actual != size:
+                return False
+        return True
+
+    def result(self, task_id: str):
+        entry = self.entries.get(task_id)
+        return entry.get("result") if entry else None
+
+    def record(self, task: Task, result):
+        if task.fingerprint is None:
+            return
+        entry = {"task": task.id, "fingerprint": task.fingerprint, "result": result}
+        with self._lock:
+            self.entries[task.id] = entry
+            if self._file:
+                self._file.write(json.dumps(entry) + "\n")
+                self._file.flush()
+
+    def close(self):
+        if self._file:
+            self._file.close()
+            self._file = None
+
+
+class Scheduler:
+    def __init__(
+        self,
+        pools: Dict[str, Pool],
+        checkpoint: Optional[Checkpoint] = None,
+        progress_interval: float = 0.0,
+    ):
+        self.pools = pools
+        self.checkpoint = checkpoint or Checkpoint(None)
+        self.progress_interval = progress_interval
+        # Results of succeeded and resumed tasks, by id (tasks may read their deps' results)
+        self.results: Dict[str, object] = {}
+
+    def run(self, tasks: List[Task]) -> RunReport:
+        by_id = self._validate(tasks)
+        order = {task.id: idx for idx, task in enumerate(tasks)}
+        dependents: Dict[str, List[str]] = {task.id: [] for task in tasks}
+        waiting = {task.id: len(task.deps) for task in tasks}
+        for task in tasks:
+            for dep in task.deps:
+                dependents[dep].append(task.id)
+
+        stages: Dict[str, StageStats] = {}
+        for task in tasks:
+            stages.setdefault(task.stage, StageStats()).total += 1
+        failures: Dict[str, str] = {}
+        queues: Dict[str, List] = {name: [] for name in self.pools}
+        lock = threading.Lock()
+        ready = {name: threading.Condition(lock) for name in self.pools}
+        next_start = {name: 0.0 for name in self.pools}
+        busy = {name: 0.0 for name in self.pools}
+        state = {"pending": len(tasks), "stop": False}
+
+        def finish(task_id: str):
+            state["pending"] -= 1
+            for dependent in dependents[task_id]:
+                waiting[dependent] -= 1
+                if waiting[dependent] == 0:
+                    release(by_id[dependent])
+            if state["pending"] == 0:
+                for condition in ready.values():
+                    condition.notify_all()
+
+        def release(task: Task):
+            if self.checkpoint.completed(task):
+                stages[task.stage].resumed += 1
+                self.results[task.id] = self.checkpoint.result(task.id)
+                finish(task.id)
+                return
+            heapq.heappush(queues[task.pool], (task.priority, order[task.id], task.id))
+            ready[task.pool].notify()
+
+        def block(task_id: str):
+            for dependent in dependents[task_id]:
+                if waiting[dependent] > 0:
+                    waiting[dependent] = -1
+                    stages[by_id[dependent].stage].blocked += 1
+                    state["pending"] -= 1
+                    block(dependent)
+
+        def worker(pool: Pool):
+            queue = queues[pool.name]
+            while True:
+                with lock:
+                    while not queue and state["pending"] and not state["stop"]:
+                        ready[pool.name].wait()
+                    if not queue or state["stop"]:
+                        return
+                    _, _, task_id = heapq.heappop(queue)
+                    now = time.monotonic()
+                    delay = max(0.0, next_start[pool.name] - now)
+                    next_start[pool.name] = now + delay + pool.interval
+                if delay:
+                    time.sleep(delay)
+                task = by_id[task_id]
+                start = time.monotonic()
+                try:
+                    result, error = task.run(), None
+                    self.checkpoint.record(task, result)
+                except Exception as exc:
+                    result, error = None, f"{type(exc).__name__}: {exc}"
+                end = time.monotonic()
+                with lock:
+                    stats = stages[task.stage]
+                    stats.busy += end - start
+                    busy[pool.name] += end - start
+                    stats.first_start = (
+                        start
+                        if stats.first_start is None
+                        else min(stats.first_start, start)
+                    )
+                    stats.last_end = (
+                        end if stats.last_end is None else max(stats.last_end, end)
+                    )
+                    if error is None:
+                        stats.done += 1
+                        self.results[task.id] = result
+                        finish(task.id)
+                    else:
+                        stats.failed += 1
+                        failures[task.id] = error
+                        block(task.id)
+                        finish(task.id)
+
+        started = time.monotonic()
+        with lock:
+            for task in tasks:
+                if not task.deps:
+                    release(task)
+        threads = [
+            threading.Thread(
+                target=worker, args=(pool,), name=f"{pool.name}-{idx}", daemon=True
+            )
+            for pool in self.pools.values()
+            for idx in range(pool.workers)
+        ]
+        for thread in threads:
+            thread.start()
+        interrupted = False
+        last_progress = started
+        try:
+            while any(thread.is_alive() for thread in threads):
+                for thread in threads:
+                    thread.join(timeout=0.2)
+                if (
+                    self.progress_interval
+                    and time.monotonic() - last_progress >= self.progress_interval
+                ):
+                    last_progress = time.monotonic()
+                    self._print_progress(stages, lock)
+        except KeyboardInterrupt:
+            # Running tasks finish and are checkpointed; nothing new starts
+            interrupted = True
+            with lock:
+                state["stop"] = True
+                for condition in ready.values():
+                    condition.notify_all()
+            for thread in threads:
+                thread.join()
+        finally:
+            self.checkpoint.close()
+        seconds = time.monotonic() - started
+        pools = {
+            name: {
+                "workers": pool.workers,
+                "busy_s": round(busy[name], 3),
+                "utilization": (
+                    round(busy[name] / (pool.workers * seconds), 3) if seconds else 0.0
+                ),
+            }
+            for name, pool in self.pools.items()
+        }
+        return RunReport(seconds, stages, pools, failures, interrupted)
+
+    def _validate(self, tasks: List[Task]) -> Dict[str, Task]:
+        by_id: Dict[str, Task] = {}
+        for task in tasks:
+            if task.id in by_id:
+                raise ValueError(f"duplicate task id {task.id!r}")
+            if task.pool not in self.pools:
+                raise ValueError(f"task {task.id!r} uses unknown pool {task.pool!r}")
+            by_id[task.id] = task
+        for task in tasks:
+            for dep in task.deps:
+                if dep not in by_id:
+                    raise ValueError(
+                        f"task {task.id!r} depends on unknown task {dep!r}"
+                    )
+        # Kahn's algorithm: every task must be reachable from the roots
+        waiting = {task.id: len(task.deps) for task in tasks}
+        dependents: Dict[str, List[str]] = {task.id: [] for task in tasks}
+        for task in tasks:
+            for dep in task.deps:
+                dependents[dep].append(task.id)
+        frontier = [task_id for task_id, count in waiting.items() if count == 0]
+        seen = 0
+        while frontier:
+            task_id = frontier.pop()
+            seen += 1
+            for dependent in dependents[task_id]:
+                waiting[dependent] -= 1
+                if waiting[dependent] == 0:
+                    frontier.append(dependent)
+        if seen != len(tasks):
+            raise ValueError("task graph has a cycle")
+        for pool in self.pools.values():
+            if pool.workers < 1:
+                raise ValueError(f"pool {pool.name!r} needs at least one worker")
+        return by_id
+
+    @staticmethod
+    def _print_progress(stages: Dict[str, StageStats], lock: threading.Lock):
+        with lock:
+            parts = [
+                f"{name} {stats.done + stats.resumed}/{stats.total}"
+                for name, stats in stages.items()
+            ]
+        print("  ⏳ " + ", ".join(parts), file=sys.stderr)
@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+"""Benchmark the asset pipeline scheduler against sequential scripts.
+
+Builds the gen_assets.py task graph for generated content, with providers
+replaced by sleeps of a fixed latency per asset kind, and measures:
+
+* sequential -- every image, then every audio asset, then the character
+  portraits, one at a time (what running gen_images.py, gen_audio.py and
+  generate_character_portraits.py in turn amounts to)
+* pipeline   -- the scheduler with the given pool sizes
+
+The pipeline's lower bound is the busiest pool: its total latency divided
+by its workers. Output is JSON on stdout.
+
+    python tools/benchmarks/bench_asset_pipeline.py --cards 300 --pool image=8 --pool audio=4
+"""
+
+import argparse
+import json
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+TOOLS_DIR = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(TOOLS_DIR))
+
+import gen_assets  # noqa: E402
+import gen_content  # noqa: E402
+from asset_scheduler import Checkpoint, Pool, Scheduler  # noqa: E402
+from gen_audio import AudioGenerator  # noqa: E402
+from gen_images import ImageGenerator  # noqa: E402
+
+LATENCY = {"image": 0.02, "music": 0.1, "sfx": 0.005, "voice": 0.02, "character": 0.05}
+
+
+def placeholder(directory: Path, asset_id: str) -> dict:
+    """Write placeholder metadata like the mock generators, so resumes can check it"""
+    metadata = {
+        "id": asset_id,
+        "status": "placeholder",
+        "path": str(directory / f"{asset_id}.png"),
+    }
+    directory.mkdir(parents=True, exist_ok=True)
+    (directory / f"{asset_id}.json").write_text(json.dumps(metadata), encoding="utf-8")
+    return metadata
+
+
+class SleepingImages(ImageGenerator):
+    def __init__(self, root: Path):
+        self.provider = "bench"
+        self.output_dir = root / "images"
+
+    def generate_image(self, content_id, style, prompt):
+        time.sleep(LATENCY["image"])
+        return placeholder(self.output_dir, content_id)
+
+
+class SleepingAudio(AudioGenerator):
+    def __init__(self, root: Path):
+        self.provider = "bench"
+        self.music_dir, self.sfx_dir, self.voice_dir = (
+            root / "music",
+            root / "sfx",
+            root / "voice",
+        )
+
+    def generate(self, kind, *args):
+        time.sleep(LATENCY[kind])
+        return placeholder(getattr(self, f"{kind}_dir"), args[0])
+
+
+def sleeping_portrait(character):
+    time.sleep(LATENCY["character"])
+    return {"id": character["filename"], "status": "placeholder"}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--cards", type=int, default=300)
+    parser.add_argument(
+        "--pool",
+        type=gen_assets.parse_pool,
+        action="append",
+        default=[],
+        metavar="NAME=WORKERS[:INTERVAL]",
+    )
+    args = parser.parse_args()
+
+    theme = gen_content.load_theme(None)
+    theme.counts["cards"] = args.cards
+    cards, _ = gen_content.generate_cards(theme, 42)
+    leaders, _ = gen_content.generate_leaders(theme, 42, [card["id"] for card in cards])
+    crises, _ = gen_content.generate_crises(theme, 42, cards)
+    factions, _ = gen_content.generate_factions(theme, 42, cards)
+    entities = cards + leaders + crises + factions
+    characters = gen_assets.load_characters()
+
+    pools = {
+        name: Pool(name, workers)
+        for name, workers in gen_assets.DEFAULT_WORKERS.items()
+    }
+    for name, workers, interval in args.pool:
+        pools[name].workers = workers
+        pools[name].interval = interval or 0.0
+    with tempfile.TemporaryDirectory() as tmp:
+        images, audio = SleepingImages(Path(tmp)), SleepingAudio(Path(tmp))
+        scheduler = Scheduler(pools, Checkpoint(Path(tmp) / "checkpoint.jsonl"))
+        tasks = gen_assets.build_tasks(
+            entities,
+            images,
+            audio,
+            characters,
+            sleeping_portrait,
+            "bench",
+            gen_assets.DEFAULT_PRIORITIES,
+            scheduler.results,
+            Path(tmp) / "manifest.json",
+        )
+
+        start = time.perf_counter()
+        for pool in ("image", "audio", "portrait"):
+            for task in tasks:
+                if task.pool == pool and task.stage != "manifest":
+                    task.run()
+        sequential = time.perf_counter() - start
+
+        report = scheduler.run(tasks)
+        resumed = Scheduler(pools, Checkpoint(Path(tmp) / "checkpoint.jsonl")).run(
+            gen_assets.build_tasks(
+                entities,
+                images,
+                audio,
+                characters,
+                sleeping_portrait,
+                "bench",
+                gen_assets.DEFAULT_PRIORITIES,
+                {},
+                None,
+            )
+        )
+
+    print(
+        json.dumps(
+            {
+                "tasks": len(tasks),
+                "pools": {name: pool.workers for name, pool in pools.items()},
+                "sequential_s": round(sequential, 3),
+                "pipeline_s": round(report.seconds, 3),
+                "bound_s": round(
+                    max(
+                        pool["busy_s"] / pool["workers"]
+                        for pool in report.pools.values()
+                    ),
+                    3,
+                ),
+                "speedup": round(sequential / report.seconds, 2),
+                "resume_s": round(resumed.seconds, 3),
+                "report": report.to_dict(),
+            },
+            indent=2,
+        )
+    )
+
+
+if __name__ == "__main__":
+    main()
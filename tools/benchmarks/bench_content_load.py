@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+"""Benchmark loading content from YAML, JSON and the binary bundle.
+
+For each count it generates that many cards (plus the theme's leaders,
+crises and factions) into a temporary directory as YAML files, the JSON
+aggregates and data/content.bundle, then measures in a fresh process per
+method the time and the resident memory added (with the loaded content
+still referenced) by:
+
+* yaml_all      -- parse every YAML file with the libyaml loader
+* json_all      -- json.load the four aggregates
+* bundle_lookup -- open the bundle and decode one card by id
+* bundle_all    -- open the bundle and decode every entity
+
+Output is JSON on stdout.
+
+    python tools/benchmarks/bench_content_load.py --counts 1000 10000 100000
+"""
+
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+TOOLS_DIR = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(TOOLS_DIR))
+
+METHODS = ["yaml_all", "json_all", "bundle_lookup", "bundle_all"]
+
+
+def generate(root: Path, count: int) -> str:
+    """Write `count` cards of content under root; returns a card id to look up"""
+    import content_bundle
+    import gen_content
+    import json_bundle
+    from content_manifest import ContentWriter
+
+    theme = gen_content.load_theme(None)
+    theme.counts["cards"] = count
+    yaml_cards, json_cards = gen_content.generate_cards(theme, 42)
+    card_ids = [card["id"] for card in yaml_cards]
+    content = {
+        "cards": (yaml_cards, json_cards),
+        "leaders": gen_content.generate_leaders(theme, 42, card_ids),
+        "crises": gen_content.generate_crises(theme, 42, yaml_cards),
+        "factions": gen_content.generate_factions(theme, 42, yaml_cards),
+    }
+    writer = ContentWriter(root, root / "manifest.json")
+    for kind, (yaml_entities, json_entities) in content.items():
+        for idx, text in enumerate(gen_content.render_yaml_all(yaml_entities)):
+            writer.add_file(
+                root / "data" / kind / f"generated_{idx + 1:06d}.yaml", text
+            )
+        json_bundle.write_document(
+            writer, root / "json" / f"{kind}.json", kind, json_entities
+        )
+    with writer.open_file(root / "data" / "content.bundle") as f:
+        f.write_bytes(
+            content_bundle.build(
+                {kind: yaml_entities for kind, (yaml_entities, _) in content.items()}
+            )
+        )
+    return card_ids[len(card_ids) // 2]
+
+
+def rss_mb() -> float:
+    """Current resident set size (ru_maxrss would include the parent's peak,
+    which a child inherits across fork/exec)"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def child(method: str, root: Path, card_id: str):
+    import yaml
+
+    import content_bundle
+
+    loader = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+    before = rss_mb()
+    start = time.perf_counter()
+    if method == "yaml_all":
+        entities = []
+        for path in sorted((root / "data").glob("*/*.yaml")):
+            with open(path, "r", encoding="utf-8") as f:
+                entities.append(yaml.load(f, Loader=loader))
+        found = next(entity for entity in entities if entity["id"] == card_id)
+    elif method == "json_all":
+        documents = {}
+        for kind in ("cards", "leaders", "crises", "factions"):
+            with open(root / "json" / f"{kind}.json", "r", encoding="utf-8") as f:
+                documents[kind] = json.load(f)[kind]
+        found = next(entity for entity in documents["cards"] if entity["id"] == card_id)
+    else:
+        bundle = content_bundle.ContentBundle(root / "data" / "content.bundle")
+        if method == "bundle_lookup":
+            found = bundle["cards"].get(card_id).to_dict()
+        else:
+            entities = [entity.to_dict() for kind in bundle for entity in bundle[kind]]
+            found = next(entity for entity in entities if entity["id"] == card_id)
+    elapsed = time.perf_counter() - start
+    print(
+        json.dumps(
+            {
+                "seconds": round(elapsed, 4),
+                "rss_added_mb": round(rss_mb() - before, 1),
+                "found": found["id"] == card_id,
+            }
+        )
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--counts", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--methods", nargs="+", choices=METHODS, default=METHODS)
+    parser.add_argument(
+        "--child", nargs=3, metavar=("METHOD", "ROOT", "ID"), help=argparse.SUPPRESS
+    )
+    args = parser.parse_args()
+
+    if args.child:
+        child(args.child[0], Path(args.child[1]), args.child[2])
+        return
+
+    results = []
+    for count in args.counts:
+        with tempfile.TemporaryDirectory() as tmp:
+            root = Path(tmp).resolve()
+            card_id = generate(root, count)
+            result = {
+                "cards": count,
+                "bytes": {
+                    "yaml": sum(
+                        path.stat().st_size for path in (root / "data").glob("*/*.yaml")
+                    ),
+                    "json": sum(
+                        path.stat().st_size for path in (root / "json").glob("*.json")
+                    ),
+                    "bundle": (root / "data" / "content.bundle").stat().st_size,
+                },
+            }
+            for method in args.methods:
+                output = subprocess.run(
+                    [sys.executable, __file__, "--child", method, str(root), card_id],
+                    check=True,
+                    capture_output=True,
+                    text=True,
+                ).stdout
+                result[method] = json.loads(output)
+        results.append(result)
+        print(json.dumps(result), file=sys.stderr)
+    print(json.dumps({"cpus": os.cpu_count(), "results": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""Benchmark the image provider client against the fake provider server.
+
+Starts tools/benchmarks/fake_image_server.py in-process and, for each
+provider mode (api, local) and concurrency level, generates `--images`
+images into a temporary directory, reporting wall time, images per second
+and how many requests were throttled (429) and retried. A final scenario
+runs against a server that allows only `--server-rate` generations per
+second, without and with the client's token bucket set to that rate.
+
+    python tools/benchmarks/bench_image_client.py --images 64 --concurrency 1 2 4 8 16 32
+"""
+
+import argparse
+import json
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from fake_image_server import FakeImageServer  # noqa: E402
+from image_providers import ClientConfig, ImageClient, ImageJob  # noqa: E402
+
+
+def run(server: FakeImageServer, mode: str, images: int, config: ClientConfig) -> dict:
+    options = {"base_url": server.url}
+    if mode == "api":
+        options["api_key"] = "bench"
+    with tempfile.TemporaryDirectory() as tmp:
+        client = ImageClient(mode, Path(tmp), config, **options)
+        jobs = [ImageJob(f"bench_{idx:04d}", f"prompt {idx}") for idx in range(images)]
+        start = time.perf_counter()
+        results = client.generate_many(jobs)
+        seconds = time.perf_counter() - start
+        client.close()
+        failed = sum(1 for _, result in results if isinstance(result, Exception))
+        written = len(list(Path(tmp).glob("*.png")))
+    return {
+        "mode": mode,
+        "concurrency": config.concurrency,
+        "rate": config.rate,
+        "seconds": round(seconds, 3),
+        "per_s": round(images / seconds, 2),
+        "written": written,
+        "failed": failed,
+        **client.stats.to_dict(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--images", type=int, default=64)
+    parser.add_argument(
+        "--concurrency", type=int, nargs="+", default=[1, 2, 4, 8, 16, 32]
+    )
+    parser.add_argument(
+        "--latency", type=float, default=0.2, help="Server seconds per generation"
+    )
+    parser.add_argument(
+        "--capacity", type=int, default=8, help="Server concurrent generations"
+    )
+    parser.add_argument("--server-rate", type=float, default=10.0)
+    parser.add_argument("--image-kb", type=int, default=256)
+    args = parser.parse_args()
+
+    results = []
+    server = FakeImageServer(
+        latency=args.latency,
+        capacity=args.capacity,
+        image_kb=args.image_kb,
+        retry_after=args.latency,
+    )
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    for mode in ("api", "local"):
+        for concurrency in args.concurrency:
+            config = ClientConfig(
+                concurrency=concurrency,
+                backoff_base=0.05,
+                poll_interval=args.latency / 4,
+            )
+            results.append(run(server, mode, args.images, config))
+            print(json.dumps(results[-1]), file=sys.stderr)
+    server.shutdown()
+
+    limited = FakeImageServer(
+        latency=args.latency,
+        capacity=args.capacity * 4,
+        rate=args.server_rate,
+        image_kb=args.image_kb,
+        retry_after=1.0,
+    )
+    thread = threading.Thread(target=limited.serve_forever, daemon=True)
+    thread.start()
+    concurrency = max(args.concurrency)
+    for rate in (0.0, args.server_rate):
+        config = ClientConfig(
+            concurrency=concurrency, rate=rate, burst=1, backoff_base=0.05
+        )
+        results.append(
+            {
+                "server_rate": args.server_rate,
+                **run(limited, "api", args.images, config),
+            }
+        )
+        print(json.dumps(results[-1]), file=sys.stderr)
+    limited.shutdown()
+
+    print(
+        json.dumps(
+            {
+                "latency": args.latency,
+                "capacity": args.capacity,
+                "images": args.images,
+                "results": results,
+            },
+            indent=2,
+        )
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""Benchmark YAML emission of gen_content.py at growing entity counts.
+
+For each count it generates that many cards and times rendering them with
+the pure-Python SafeDumper (the old per-file path), with libyaml's
+CSafeDumper in-process, and with CSafeDumper across a process pool, then
+writes the files into a temporary directory. Every path is checked to
+produce byte-identical text. Output is JSON on stdout.
+
+    python tools/benchmarks/bench_yaml_emit.py --counts 1000 10000 100000 --workers 4
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+import yaml  # noqa: E402
+
+import gen_content  # noqa: E402
+from content_manifest import write_atomic  # noqa: E402
+
+
+def timed(fn, *args, **kwargs):
+    start = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+def pure_python(payloads):
+    return [
+        yaml.safe_dump(payload, sort_keys=False, allow_unicode=False)
+        for payload in payloads
+    ]
+
+
+def write_all(directory, texts):
+    for idx, text in enumerate(texts):
+        write_atomic(
+            directory / f"generated_card_{idx + 1:06d}.yaml", text.encode("utf-8")
+        )
+
+
+def bench(count, workers, skip_python_above):
+    theme = gen_content.load_theme(None)
+    theme.counts["cards"] = count
+    (payloads, _), generated = timed(gen_content.generate_cards, theme, 42)
+    result = {
+        "entities": count,
+        "generate_s": round(generated, 3),
+        "libyaml": gen_content.YamlDumper.__name__ == "CSafeDumper",
+    }
+
+    reference = None
+    if count <= skip_python_above:
+        reference, elapsed = timed(pure_python, payloads)
+        result["python_s"] = round(elapsed, 3)
+    sequential, elapsed = timed(gen_content.render_yaml_all, payloads, workers=1)
+    result["sequential_s"] = round(elapsed, 3)
+    parallel, elapsed = timed(gen_content.render_yaml_all, payloads, workers=workers)
+    result["parallel_s"] = round(elapsed, 3)
+    result["identical"] = parallel == sequential and (
+        reference is None or reference == sequential
+    )
+
+    with tempfile.TemporaryDirectory() as tmp:
+        _, elapsed = timed(write_all, Path(tmp), parallel)
+    result["write_s"] = round(elapsed, 3)
+    baseline = result.get("python_s")
+    if baseline:
+        result["speedup_sequential"] = round(baseline / result["sequential_s"], 2)
+        result["speedup_parallel"] = round(baseline / result["parallel_s"], 2)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--counts", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--workers", type=int, default=gen_content.default_workers())
+    parser.add_argument(
+        "--skip-python-above",
+        type=int,
+        default=100000,
+        help="Skip the pure-Python baseline above this many entities",
+    )
+    args = parser.parse_args()
+
+    results = []
+    for count in args.counts:
+        results.append(bench(count, args.workers, args.skip_python_above))
+        print(json.dumps(results[-1]), file=sys.stderr)
+    print(
+        json.dumps(
+            {"cpus": os.cpu_count(), "workers": args.workers, "results": results},
+            indent=2,
+        )
+    )
+
+
+if __name__ == "__main__":
+    main()
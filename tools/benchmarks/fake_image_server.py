@@ -0,0 +1,266 @@
+#!/usr/bin/env python3
+"""Local stand-in for the image providers in tools/image_providers.py.
+
+Serves both protocols on one port:
+
+* api   -- POST /v1/images/generations holds the request for the generation
+  latency and answers {"data": [{"url": ".../files/<id>.png"}]}. More than
+  `capacity` generations at once, or more than `rate` per second, get a 429
+  with Retry-After, like a hosted API's limits.
+* local -- POST /prompt queues the job on `capacity` simulated GPUs (it is
+  never rejected, like ComfyUI), GET /history/<id> stays {} until the job
+  is done (and keeps answering for it afterwards), and GET /view streams
+  the image.
+
+Images are `image_kb` of PNG-signed random bytes, streamed in chunks with a
+Content-Length over keep-alive connections. `error_rate` turns a share of
+requests into 503s. Point the generators at it with
+
+    python tools/benchmarks/fake_image_server.py --port 8188 --latency 0.5 &
+    IMG_PROVIDER=local COMFYUI_URL=http://127.0.0.1:8188 python tools/gen_images.py
+    IMG_PROVIDER=api IMG_API_URL=http://127.0.0.1:8188 python tools/gen_images.py
+"""
+
+import argparse
+import json
+import os
+import random
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+CHUNK_SIZE = 64 * 1024
+
+
+class FakeImageServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 128
+
+    def __init__(
+        self,
+        address=("127.0.0.1", 0),
+        latency: float = 0.2,
+        jitter: float = 0.25,
+        capacity: int = 4,
+        rate: float = 0.0,
+        error_rate: float = 0.0,
+        image_kb: int = 256,
+        retry_after: float = 0.5,
+    ):
+        super().__init__(address, FakeImageHandler)
+        self.latency, self.jitter = latency, jitter
+        self.capacity, self.rate, self.error_rate = capacity, rate, error_rate
+        self.retry_after = retry_after
+        self.image = PNG_SIGNATURE + os.urandom(image_kb * 1024 - len(PNG_SIGNATURE))
+        self.lock = threading.Lock()
+        self.active = 0
+        self.window = []  # start times of api generations in the last second
+        self.gpus = [0.0] * capacity  # when each simulated ComfyUI worker is free
+        self.jobs = {}  # prompt_id -> ready time
+        self.stats = {
+            "requests": 0,
+            "generated": 0,
+            "throttled": 0,
+            "errors": 0,
+            "max_active": 0,
+        }
+
+    @property
+    def url(self) -> str:
+        return f"http://{self.server_address[0]}:{self.server_address[1]}"
+
+    def generation_time(self) -> float:
+        return self.latency * random.uniform(1 - self.jitter, 1 + self.jitter)
+
+    def admit(self) -> bool:
+        """Take an api generation slot, or refuse (429)"""
+        with self.lock:
+            now = time.monotonic()
+            self.window = [start for start in self.window if now - start < 1.0]
+            if self.active >= self.capacity or (
+                self.rate and len(self.window) >= self.rate
+            ):
+                self.stats["throttled"] += 1
+                return False
+            self.active += 1
+            self.window.append(now)
+            self.stats["max_active"] = max(self.stats["max_active"], self.active)
+            return True
+
+    def release(self):
+        with self.lock:
+            self.active -= 1
+            self.stats["generated"] += 1
+
+    def queue(self) -> str:
+        """Schedule a ComfyUI job on the earliest free simulated GPU"""
+        with self.lock:
+            now = time.monotonic()
+            gpu = min(range(len(self.gpus)), key=self.gpus.__getitem__)
+            self.gpus[gpu] = max(now, self.gpus[gpu]) + self.generation_time()
+            prompt_id = uuid.uuid4().hex
+            self.jobs[prompt_id] = self.gpus[gpu]
+            self.stats["generated"] += 1
+            return prompt_id
+
+
+class FakeImageHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server: FakeImageServer
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_json(self, status: int, payload, headers=None):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_image(self):
+        image = self.server.image
+        self.send_response(200)
+        self.send_header("Content-Type", "image/png")
+        self.send_header("Content-Length", str(len(image)))
+        self.end_headers()
+        for offset in range(0, len(image), CHUNK_SIZE):
+            self.wfile.write(image[offset : offset + CHUNK_SIZE])
+
+    def failed(self) -> bool:
+        server = self.server
+        with server.lock:
+            server.stats["requests"] += 1
+        if server.error_rate and random.random() < server.error_rate:
+            with server.lock:
+                server.stats["errors"] += 1
+            self.send_json(503, {"error": "simulated outage"})
+            return True
+        return False
+
+    def read_json(self):
+        length = int(self.headers.get("Content-Length", 0))
+        return json.loads(self.rfile.read(length) or b"{}")
+
+    def do_POST(self):
+        path = urlparse(self.path).path
+        payload = self.read_json()
+        if self.failed():
+            return
+        server = self.server
+        if path == "/v1/images/generations":
+            if not payload.get("prompt"):
+                self.send_json(400, {"error": "prompt is required"})
+                return
+            if not server.admit():
+                self.send_json(
+                    429,
+                    {"error": "rate limited"},
+                    {"Retry-After": str(server.retry_after)},
+                )
+                return
+            try:
+                time.sleep(server.generation_time())
+            finally:
+                server.release()
+            self.send_json(
+                200, {"data": [{"url": f"{server.url}/files/{uuid.uuid4().hex}.png"}]}
+            )
+        elif path == "/prompt":
+            if "prompt" not in payload:
+                self.send_json(400, {"error": "prompt is required"})
+                return
+            self.send_json(
+                200, {"prompt_id": server.queue(), "number": len(server.jobs)}
+            )
+        else:
+            self.send_json(404, {"error": "not found"})
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if self.failed():
+            return
+        server = self.server
+        if url.path.startswith("/files/"):
+            self.send_image()
+        elif url.path.startswith("/history/"):
+            prompt_id = url.path.rsplit("/", 1)[1]
+            ready = server.jobs.get(prompt_id)
+            if ready is None or time.monotonic() < ready:
+                self.send_json(200, {})
+                return
+            self.send_json(
+                200,
+                {
+                    prompt_id: {
+                        "status": {"status_str": "success", "completed": True},
+                        "outputs": {
+                            "9": {
+                                "images": [
+                                    {
+                                        "filename": f"{prompt_id}.png",
+                                        "subfolder": "",
+                                        "type": "output",
+                                    }
+                                ]
+                            }
+                        },
+                    }
+                },
+            )
+        elif url.path == "/view":
+            if not parse_qs(url.query).get("filename"):
+                self.send_json(400, {"error": "filename is required"})
+                return
+            self.send_image()
+        else:
+            self.send_json(404, {"error": "not found"})
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--port", type=int, default=8188)
+    parser.add_argument(
+        "--latency", type=float, default=0.5, help="Seconds per generation"
+    )
+    parser.add_argument(
+        "--capacity", type=int, default=4, help="Concurrent generations"
+    )
+    parser.add_argument(
+        "--rate",
+        type=float,
+        default=0.0,
+        help="api generations per second (0: no limit)",
+    )
+    parser.add_argument(
+        "--error-rate",
+        type=float,
+        default=0.0,
+        help="Share of requests answered with 503",
+    )
+    parser.add_argument("--image-kb", type=int, default=256)
+    args = parser.parse_args()
+
+    server = FakeImageServer(
+        ("127.0.0.1", args.port),
+        args.latency,
+        capacity=args.capacity,
+        rate=args.rate,
+        error_rate=args.error_rate,
+        image_kb=args.image_kb,
+    )
+    print(f"Fake image provider on {server.url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print(json.dumps(server.stats))
+
+
+if __name__ == "__main__":
+    main()
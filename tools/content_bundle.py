@@ -0,0 +1,495 @@
+"""Compact binary content bundle with a memory-mapped, lazily decoding reader.
+
+gen_content.py writes every generated entity (the YAML authoring form) into
+one file, data/content.bundle, so tools and tests can look up content
+without parsing thousands of YAML files or a pretty-printed JSON aggregate.
+All integers are little-endian; sections start on 8-byte boundaries:
+
+    header      magic "EDCB", version, kind count, string count, and the
+                offsets of the sections below
+    strings     u32 offsets[count + 1] into a UTF-8 blob; every string
+                (ids, names, prompts, tags, JSON of nested values) is
+                interned once and referred to by index
+    lists       u32 string indexes; a string-list field is (start, count)
+    effects     (u32 type string, i32 value) pairs; an effect-list field
+                is (start, count)
+    kinds       per kind: name, entity count, record size and the offsets
+                of its field table, records and id index
+    fields      per kind: (name string, type) of each record field
+    records     fixed-width: a u32 presence mask, then one slot per field
+    id index    (id string, record number) pairs sorted by id bytes, for
+                binary search
+
+Field types are string, int (i32), string list, effect list ({"type",
+"value"} with int values) and JSON (any other value, stored as compact JSON
+text). Keys an entity has beyond its kind's schema go into a trailing
+"extra" JSON field, so any mapping round-trips.
+
+The reader maps the file and decodes nothing up front: bundle["cards"].get(id)
+binary-searches the index and returns an EntityView that decodes each field
+on first access.
+"""
+
+import json
+import mmap
+import struct
+from collections.abc import Mapping
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+MAGIC = b"EDCB"
+VERSION = 1
+NONE = 0xFFFFFFFF
+
+STRING, INT, STRINGS, EFFECTS, JSON = range(5)
+_SLOT_FORMATS = {STRING: "I", INT: "i", STRINGS: "II", EFFECTS: "II", JSON: "I"}
+
+HEADER = struct.Struct("<4sHHIIQQQQQ")
+KIND = struct.Struct("<IIIIQQQ")
+FIELD = struct.Struct("<IB3x")
+EFFECT = struct.Struct("<Ii")
+INDEX_ENTRY = struct.Struct("<II")
+U32 = struct.Struct("<I")
+
+EXTRA_FIELD = "extra"
+
+# Schema of the entities gen_content.py writes, in YAML key order
+SCHEMAS: Dict[str, List[Tuple[str, int]]] = {
+    "cards": [
+        ("id", STRING),
+        ("name", STRING),
+        ("description", STRING),
+        ("cost", INT),
+        ("rarity", STRING),
+        ("tags", STRINGS),
+        ("effects", EFFECTS),
+        ("synergies", JSON),
+        ("artStyle", STRING),
+        ("artPrompt", STRING),
+        ("sfxKey", STRING),
+        ("voLine", STRING),
+    ],
+    "leaders": [
+        ("id", STRING),
+        ("name", STRING),
+        ("title", STRING),
+        ("archetype", STRING),
+        ("baseStats", JSON),
+        ("traitTags", STRINGS),
+        ("ability", JSON),
+        ("startingDeck", STRINGS),
+        ("portraitStyle", STRING),
+        ("portraitPrompt", STRING),
+        ("voiceStyle", STRING),
+        ("theme_music", STRING),
+    ],
+    "crises": [
+        ("id", STRING),
+        ("name", STRING),
+        ("type", STRING),
+        ("category", STRING),
+        ("headline", STRING),
+        ("triggerConditions", JSON),
+        ("options", JSON),
+        ("chainEvents", JSON),
+        ("newsImage", STRING),
+        ("imagePrompt", STRING),
+    ],
+    "factions": [
+        ("id", STRING),
+        ("name", STRING),
+        ("type", STRING),
+        ("baseInfluence", INT),
+        ("volatility", INT),
+        ("mechanics", JSON),
+        ("unlockableCards", STRINGS),
+        ("iconStyle", STRING),
+        ("iconPrompt", STRING),
+    ],
+}
+
+
+class BundleError(Exception):
+    pass
+
+
+def _pad(buffer: bytearray):
+    buffer.extend(b"\0" * (-len(buffer) % 8))
+
+
+def _compact_json(value) -> str:
+    return json.dumps(value, separators=(",", ":"), sort_keys=False, ensure_ascii=False)
+
+
+class _Builder:
+    def __init__(self):
+        self.strings: Dict[str, int] = {}
+        self.lists: List[int] = []
+        self.effects: List[Tuple[int, int]] = []
+
+    def string(self, value: Optional[str]) -> int:
+        if value is None:
+            return NONE
+        if not isinstance(value, str):
+            raise BundleError(f"expected a string, got {value!r}")
+        index = self.strings.get(value)
+        if index is None:
+            index = self.strings[value] = len(self.strings)
+        return index
+
+    def slot(self, kind: int, value) -> Tuple:
+        if kind == STRING:
+            return (self.string(value),)
+        if kind == INT:
+            if (
+                not isinstance(value, int)
+                or isinstance(value, bool)
+                or not -(2**31) <= value < 2**31
+            ):
+                raise BundleError(f"expected a 32-bit int, got {value!r}")
+            return (value,)
+        if kind == STRINGS:
+            start = len(self.lists)
+            self.lists.extend(self.string(item) for item in value)
+            return start, len(value)
+        if kind == EFFECTS:
+            start = len(self.effects)
+            for effect in value:
+                if set(effect) != {"type", "value"}:
+                    raise BundleError(f"effect {effect!r} is not {{type, value}}")
+                self.effects.append(
+                    (self.string(effect["type"]), self.slot(INT, effect["value"])[0])
+                )
+            return start, len(value)
+        return (self.string(_compact_json(value)),)
+
+
+def build(
+    content: Dict[str, Sequence[Dict]],
+    schemas: Dict[str, List[Tuple[str, int]]] = SCHEMAS,
+) -> bytes:
+    """Encode {kind: [entity, ...]} into bundle bytes; ids must be unique per kind"""
+    builder = _Builder()
+    kinds = []
+    for kind, entities in content.items():
+        fields = list(schemas.get(kind, [("id", STRING)])) + [(EXTRA_FIELD, JSON)]
+        if len(fields) > 32:
+            raise BundleError(f"{kind}: at most 31 schema fields")
+        record = struct.Struct("<I" + "".join(_SLOT_FORMATS[t] for _, t in fields))
+        names = {name for name, _ in fields[:-1]}
+        records = bytearray()
+        index = []
+        for number, entity in enumerate(entities):
+            mask, values = 0, []
+            for bit, (name, field_type) in enumerate(fields[:-1]):
+                if name in entity:
+                    value = entity[name]
+                    if value is None and field_type not in (STRING, JSON):
+                        raise BundleError(f"{kind}/{entity.get('id')}: {name} is null")
+                    mask |= 1 << bit
+                    values.extend(builder.slot(field_type, value))
+                else:
+                    values.extend((0,) * len(_SLOT_FORMATS[field_type]))
+            extra = {key: value for key, value in entity.items() if key not in names}
+            if extra:
+                mask |= 1 << (len(fields) - 1)
+                values.append(builder.string(_compact_json(extra)))
+            else:
+                values.append(NONE)
+            records.extend(record.pack(mask, *values))
+            if not isinstance(entity.get("id"), str):
+                raise BundleError(f"{kind}: entity {number} has no string id")
+            index.append(
+                (entity["id"].encode("utf-8"), builder.string(entity["id"]), number)
+            )
+        index.sort()
+        for (left, *_), (right, *_) in zip(index, index[1:]):
+            if left == right:
+                raise BundleError(f"{kind}: duplicate id {left.decode()!r}")
+        kinds.append(
+            (builder.string(kind), fields, record.size, len(entities), records, index)
+        )
+
+    field_names = [
+        [builder.string(name) for name, _ in fields] for _, fields, *_ in kinds
+    ]
+
+    out = bytearray(HEADER.size)
+    _pad(out)
+    blobs = [value.encode("utf-8") for value in builder.strings]
+    strings_pos = len(out)
+    offset = 0
+    for blob in blobs:
+        out.extend(U32.pack(offset))
+        offset += len(blob)
+    out.extend(U32.pack(offset))
+    _pad(out)
+    data_pos = len(out)
+    for blob in blobs:
+        out.extend(blob)
+    _pad(out)
+    lists_pos = len(out)
+    out.extend(struct.pack(f"<{len(builder.lists)}I", *builder.lists))
+    _pad(out)
+    effects_pos = len(out)
+    for effect in builder.effects:
+        out.extend(EFFECT.pack(*effect))
+    _pad(out)
+
+    kinds_pos = len(out)
+    out.extend(b"\0" * (KIND.size * len(kinds)))
+    _pad(out)
+    for number, (
+        (name, fields, record_size, count, records, index),
+        names,
+    ) in enumerate(zip(kinds, field_names)):
+        fields_pos = len(out)
+        for name_index, (_, field_type) in zip(names, fields):
+            out.extend(FIELD.pack(name_index, field_type))
+        _pad(out)
+        records_pos = len(out)
+        out.extend(records)
+        _pad(out)
+        index_pos = len(out)
+        for _, id_index, record_number in index:
+            out.extend(INDEX_ENTRY.pack(id_index, record_number))
+        _pad(out)
+        KIND.pack_into(
+            out,
+            kinds_pos + number * KIND.size,
+            name,
+            count,
+            record_size,
+            len(fields),
+            fields_pos,
+            records_pos,
+            index_pos,
+        )
+
+    HEADER.pack_into(
+        out,
+        0,
+        MAGIC,
+        VERSION,
+        len(kinds),
+        len(blobs),
+        0,
+        strings_pos,
+        data_pos,
+        lists_pos,
+        effects_pos,
+        kinds_pos,
+    )
+    return bytes(out)
+
+
+class ContentBundle(Mapping):
+    """Memory-mapped bundle: {kind: KindView}"""
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        with open(self.path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            (
+                magic,
+                version,
+                kind_count,
+                self._string_count,
+                _,
+                self._strings_pos,
+                self._data_pos,
+                self._lists_pos,
+                self._effects_pos,
+                kinds_pos,
+            ) = HEADER.unpack_from(self._mm, 0)
+        except struct.error:
+            self._mm.close()
+            raise BundleError(f"{self.path} is not a content bundle")
+        if magic != MAGIC or version != VERSION:
+            self._mm.close()
+            raise BundleError(
+                f"{self.path}: unsupported bundle (magic {magic!r}, version {version})"
+            )
+        self._kinds: Dict[str, KindView] = {}
+        for number in range(kind_count):
+            entry = KIND.unpack_from(self._mm, kinds_pos + number * KIND.size)
+            view = KindView(self, *entry[1:])
+            self._kinds[self.string(entry[0])] = view
+
+    def close(self):
+        self._mm.close()
+
+    def __enter__(self) -> "ContentBundle":
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __getitem__(self, kind: str) -> "KindView":
+        return self._kinds[kind]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._kinds)
+
+    def __len__(self) -> int:
+        return len(self._kinds)
+
+    def string_bytes(self, index: int) -> bytes:
+        start, end = struct.unpack_from("<II", self._mm, self._strings_pos + 4 * index)
+        return self._mm[self._data_pos + start : self._data_pos + end]
+
+    def string(self, index: int) -> Optional[str]:
+        if index == NONE:
+            return None
+        return self.string_bytes(index).decode("utf-8")
+
+    def string_list(self, start: int, count: int) -> List[str]:
+        indexes = struct.unpack_from(
+            f"<{count}I", self._mm, self._lists_pos + 4 * start
+        )
+        return [self.string(index) for index in indexes]
+
+    def effect_list(self, start: int, count: int) -> List[Dict]:
+        base = self._effects_pos + EFFECT.size * start
+        return [
+            {"type": self.string(type_index), "value": value}
+            for type_index, value in (
+                EFFECT.unpack_from(self._mm, base + EFFECT.size * i)
+                for i in range(count)
+            )
+        ]
+
+
+class KindView(Sequence):
+    """The entities of one kind, in generation order; decoded on access"""
+
+    def __init__(
+        self,
+        bundle: ContentBundle,
+        count: int,
+        record_size: int,
+        field_count: int,
+        fields_pos: int,
+        records_pos: int,
+        index_pos: int,
+    ):
+        self.bundle = bundle
+        self.count = count
+        self.records_pos = records_pos
+        self.record_size = record_size
+        self.index_pos = index_pos
+        self.fields = []
+        formats = "I"
+        for number in range(field_count):
+            name_index, field_type = FIELD.unpack_from(
+                bundle._mm, fields_pos + number * FIELD.size
+            )
+            self.fields.append((bundle.string(name_index), field_type, len(formats)))
+            formats += _SLOT_FORMATS[field_type]
+        self.record = struct.Struct("<" + formats)
+        self.positions = {
+            name: number for number, (name, _, _) in enumerate(self.fields)
+        }
+
+    def __len__(self) -> int:
+        return self.count
+
+    def __getitem__(self, number):
+        if isinstance(number, slice):
+            return [self[i] for i in range(*number.indices(self.count))]
+        if number < 0:
+            number += self.count
+        if not 0 <= number < self.count:
+            raise IndexError(number)
+        return EntityView(self, number)
+
+    def find(self, entity_id: str) -> Optional[int]:
+        """Record number of `entity_id` (binary search over the id index)"""
+        key = entity_id.encode("utf-8")
+        mm, lo, hi = self.bundle._mm, 0, self.count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            id_index, number = INDEX_ENTRY.unpack_from(
+                mm, self.index_pos + mid * INDEX_ENTRY.size
+            )
+            probe = self.bundle.string_bytes(id_index)
+            if probe < key:
+                lo = mid + 1
+            elif probe > key:
+                hi = mid
+            else:
+                return number
+        return None
+
+    def get(self, entity_id: str, default=None):
+        number = self.find(entity_id)
+        return default if number is None else EntityView(self, number)
+
+    def __contains__(self, entity_id) -> bool:
+        return isinstance(entity_id, str) and self.find(entity_id) is not None
+
+    def ids(self) -> Iterator[str]:
+        for number in range(self.count):
+            yield self[number]["id"]
+
+
+class EntityView(Mapping):
+    """One entity; each field is decoded the first time it is read"""
+
+    def __init__(self, kind: KindView, number: int):
+        self._kind = kind
+        self._slots = kind.record.unpack_from(
+            kind.bundle._mm, kind.records_pos + number * kind.record_size
+        )
+        self._cache: Dict[str, object] = {}
+        self._extra: Optional[Dict] = None
+
+    def _present(self, position: int) -> bool:
+        return bool(self._slots[0] >> position & 1)
+
+    def _extra_fields(self) -> Dict:
+        if self._extra is None:
+            position = len(self._kind.fields) - 1
+            text = self._kind.bundle.string(self._slots[self._kind.fields[position][2]])
+            self._extra = json.loads(text) if self._present(position) else {}
+        return self._extra
+
+    def _decode(self, position: int):
+        _, field_type, slot = self._kind.fields[position]
+        bundle, value = self._kind.bundle, self._slots[slot]
+        if field_type == STRING:
+            return bundle.string(value)
+        if field_type == INT:
+            return value
+        if field_type == STRINGS:
+            return bundle.string_list(value, self._slots[slot + 1])
+        if field_type == EFFECTS:
+            return bundle.effect_list(value, self._slots[slot + 1])
+        return json.loads(bundle.string(value))
+
+    def __getitem__(self, key: str):
+        if key in self._cache:
+            return self._cache[key]
+        position = self._kind.positions.get(key)
+        if position is None or key == EXTRA_FIELD:
+            return self._extra_fields()[key]
+        if not self._present(position):
+            raise KeyError(key)
+        value = self._cache[key] = self._decode(position)
+        return value
+
+    def __iter__(self) -> Iterator[str]:
+        for position, (name, _, _) in enumerate(self._kind.fields[:-1]):
+            if self._present(position):
+                yield name
+        yield from self._extra_fields()
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self)
+
+    def to_dict(self) -> Dict:
+        return {key: self[key] for key in self}
+
+    def __repr__(self) -> str:
+        return f"EntityView({self.to_dict()!r})"
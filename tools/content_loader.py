@@ -0,0 +1,183 @@
+"""Parsed-content cache shared by the asset generators.
+
+gen_images.py and gen_audio.py read their entities through load_entities()
+instead of parsing the YAML themselves. Files are parsed with libyaml's
+CSafeLoader (SafeLoader when PyYAML was built without it), in a process
+pool when there are many of them, and every parsed entity is stored in an
+on-disk cache (.cache/content/parsed.pickle under the repository root by
+default) keyed by the file's absolute path, mtime and size. A file is
+parsed again only when one of those changes, so after the first generator
+has run the second one, and every later run on unchanged content, does no
+YAML parsing at all.
+
+The cache is a local build artifact (gitignored) and is rebuilt from the
+YAML whenever it is missing, unreadable or from another CACHE_VERSION.
+"""
+
+import glob
+import os
+import pickle
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import yaml
+
+try:
+    from yaml import CSafeLoader as YamlLoader
+except ImportError:  # PyYAML built without libyaml
+    from yaml import SafeLoader as YamlLoader
+
+from content_manifest import write_atomic
+
+CACHE_VERSION = 1
+ROOT = Path(__file__).resolve().parents[1]
+CACHE_PATH = ROOT / ".cache" / "content" / "parsed.pickle"
+PARALLEL_MIN_FILES = 1000
+PARSE_BATCH = 250
+
+# (mtime_ns, size, entity)
+CacheEntry = Tuple[int, int, object]
+
+
+@dataclass
+class LoadStats:
+    files: int = 0
+    cached: int = 0
+    parsed: int = 0
+    seconds: float = 0.0
+
+    def __str__(self) -> str:
+        return (
+            f"{self.files} content files ({self.cached} from cache, {self.parsed} parsed) "
+            f"in {self.seconds:.2f}s"
+        )
+
+
+def parse_file(path: str) -> object:
+    with open(path, "r", encoding="utf-8") as f:
+        return yaml.load(f, Loader=YamlLoader)
+
+
+def _parse_batch(paths: List[str]) -> List[Tuple[str, CacheEntry]]:
+    parsed = []
+    for path in paths:
+        # Stat before reading: if the file changes meanwhile the next run sees a new stamp
+        st = os.stat(path)
+        parsed.append((path, (st.st_mtime_ns, st.st_size, parse_file(path))))
+    return parsed
+
+
+def default_workers() -> int:
+    return min(os.cpu_count() or 1, 8)
+
+
+def parse_all(
+    paths: List[str], workers: int = 0, batch_size: int = PARSE_BATCH
+) -> List[Tuple[str, CacheEntry]]:
+    """Parse files into cache entries, in a process pool when there are
+    enough of them (in-process if the pool cannot be started)"""
+    workers = workers or default_workers()
+    if workers <= 1 or len(paths) < PARALLEL_MIN_FILES:
+        return _parse_batch(paths)
+    batches = [paths[i : i + batch_size] for i in range(0, len(paths), batch_size)]
+    try:
+        with ProcessPoolExecutor(max_workers=min(workers, len(batches))) as pool:
+            return [
+                entry for batch in pool.map(_parse_batch, batches) for entry in batch
+            ]
+    except (OSError, NotImplementedError):
+        return _parse_batch(paths)
+
+
+def content_files(data_dir: str = "data") -> List[str]:
+    return sorted(glob.glob(f"{data_dir}/**/*.yaml", recursive=True))
+
+
+class ContentCache:
+    """Parsed entities keyed by absolute path, valid while mtime and size match"""
+
+    def __init__(self, path: Optional[Path] = CACHE_PATH):
+        self.path = Path(path) if path else None
+        self.entries: Dict[str, CacheEntry] = {}
+        self.dirty = False
+        if self.path and self.path.exists():
+            try:
+                with open(self.path, "rb") as f:
+                    cached = pickle.load(f)
+                if cached.get("version") == CACHE_VERSION:
+                    self.entries = cached["entries"]
+            except Exception:  # corrupt or foreign cache; rebuild it
+                self.entries = {}
+
+    def lookup(self, path: str) -> Tuple[bool, object]:
+        entry = self.entries.get(path)
+        if entry is None:
+            return False, None
+        try:
+            st = os.stat(path)
+        except OSError:
+            return False, None
+        if (st.st_mtime_ns, st.st_size) != entry[:2]:
+            return False, None
+        return True, entry[2]
+
+    def update(self, parsed: Iterable[Tuple[str, CacheEntry]]):
+        for path, entry in parsed:
+            self.entries[path] = entry
+            self.dirty = True
+
+    def prune(self):
+        """Drop entries whose file no longer exists"""
+        missing = [path for path in self.entries if not os.path.exists(path)]
+        for path in missing:
+            del self.entries[path]
+        self.dirty = self.dirty or bool(missing)
+
+    def save(self):
+        if not (self.path and self.dirty):
+            return
+        write_atomic(
+            self.path,
+            pickle.dumps(
+                {"version": CACHE_VERSION, "entries": self.entries},
+                protocol=pickle.HIGHEST_PROTOCOL,
+            ),
+        )
+        self.dirty = False
+
+
+def load_entities(
+    yaml_files: Optional[List[str]] = None,
+    data_dir: str = "data",
+    cache_path: Optional[Path] = CACHE_PATH,
+    workers: int = 0,
+) -> Tuple[List[Tuple[str, object]], LoadStats]:
+    """(path, entity) for each YAML file, in order; all of data_dir when
+    yaml_files is None. Pass cache_path=None to parse without the cache."""
+    start = time.perf_counter()
+    if yaml_files is None:
+        yaml_files = content_files(data_dir)
+    cache = ContentCache(cache_path)
+    stats = LoadStats(files=len(yaml_files))
+    keys = [os.path.abspath(path) for path in yaml_files]
+    entities: Dict[str, object] = {}
+    misses = []
+    for key in dict.fromkeys(keys):
+        hit, entity = cache.lookup(key)
+        if hit:
+            entities[key] = entity
+        else:
+            misses.append(key)
+    stats.cached = len(keys) - len(misses)
+    if misses:
+        parsed = parse_all(misses, workers)
+        cache.update(parsed)
+        entities.update((path, entry[2]) for path, entry in parsed)
+        stats.parsed = len(parsed)
+    cache.prune()
+    cache.save()
+    stats.seconds = time.perf_counter() - start
+    return [(path, entities[key]) for path, key in zip(yaml_files, keys)], stats
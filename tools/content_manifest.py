@@ -0,0 +1,244 @@
+"""Content-hash manifest for incremental content generation.
+
+gen_content.py writes every output file through a ContentWriter. Files are
+streamed to a temporary file while being hashed and only replace the
+existing file when the bytes differ (per the manifest of the previous run,
+or by comparing with the file on disk); generated files the run no longer
+produces are deleted at the end.
+
+The manifest (data/content-manifest.json) records:
+
+    {"version": 1, "seed": 42,
+     "files": {"data/cards/generated_card_001.yaml": "<sha256>", ...},
+     "entities": {"cards": {"card_ban_birds_forever": {"hash": "<sha256>",
+                                                       "file": "data/cards/..."}}}}
+
+Each run also writes a change list (data/content-changes.json) with the ids
+added, modified and removed per kind, the files written and deleted, and
+the entity files whose content changed, so the Unity importer and the asset
+generators can limit themselves to what changed (gen_images.py and
+gen_audio.py take it as --changes).
+"""
+
+import filecmp
+import hashlib
+import json
+import os
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional
+
+MANIFEST_VERSION = 1
+
+
+def sha256_text(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def content_hash(*payloads) -> str:
+    """Stable hash of JSON-serializable payloads (key order does not matter)"""
+    canonical = json.dumps(
+        payloads, sort_keys=True, separators=(",", ":"), ensure_ascii=False
+    )
+    return sha256_text(canonical)
+
+
+def changed_files(changes_path: Path, root: Path) -> List[Path]:
+    """Entity files added or modified by the run that wrote `changes_path`"""
+    changes = json.loads(Path(changes_path).read_text(encoding="utf-8"))
+    return [root / rel for rel in changes.get("changed_files", [])]
+
+
+def write_atomic(path: Path, data: bytes):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(path.name + ".tmp")
+    with open(tmp, "wb") as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+
+@dataclass
+class ChangeSet:
+    added: Dict[str, List[str]] = field(default_factory=dict)
+    modified: Dict[str, List[str]] = field(default_factory=dict)
+    removed: Dict[str, List[str]] = field(default_factory=dict)
+    written: List[str] = field(default_factory=list)
+    deleted: List[str] = field(default_factory=list)
+    unchanged: int = 0
+    changed_files: List[str] = field(default_factory=list)
+
+    @property
+    def empty(self) -> bool:
+        return not (
+            self.written
+            or self.deleted
+            or any(self.added.values())
+            or any(self.modified.values())
+            or any(self.removed.values())
+        )
+
+    def to_dict(self, seed: Optional[int] = None) -> Dict:
+        return {
+            "version": MANIFEST_VERSION,
+            "seed": seed,
+            "added": self.added,
+            "modified": self.modified,
+            "removed": self.removed,
+            "files": {
+                "written": self.written,
+                "deleted": self.deleted,
+                "unchanged": self.unchanged,
+            },
+            "changed_files": self.changed_files,
+        }
+
+
+class _HashingFile:
+    """Sink that writes text (as UTF-8) or bytes to a temporary file while hashing it"""
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.handle = open(path, "wb")
+        self.sha = hashlib.sha256()
+        self.size = 0
+        self.digest: Optional[str] = None
+
+    def write(self, text: str):
+        self.write_bytes(text.encode("utf-8"))
+
+    def write_bytes(self, data: bytes):
+        self.handle.write(data)
+        self.sha.update(data)
+        self.size += len(data)
+
+
+class ContentWriter:
+    """Writes a run's output files as they are produced, skipping unchanged ones,
+    and records the files and entities for the manifest"""
+
+    def __init__(self, root: Path, manifest_path: Path, force: bool = False):
+        self.root = root
+        self.manifest_path = manifest_path
+        self.force = force
+        self.previous = self._load(manifest_path)
+        self.digests: Dict[str, str] = {}
+        self.entities: Dict[str, Dict[str, Dict[str, str]]] = {}
+        self.changes = ChangeSet()
+
+    @staticmethod
+    def _load(path: Path) -> Dict:
+        try:
+            manifest = json.loads(path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return {"files": {}, "entities": {}}
+        if manifest.get("version") != MANIFEST_VERSION:
+            return {"files": {}, "entities": {}}
+        return manifest
+
+    def _relative(self, path: Path) -> str:
+        return path.resolve().relative_to(self.root).as_posix()
+
+    @contextmanager
+    def open_file(self, path: Path) -> Iterator[_HashingFile]:
+        """Stream one output file; it replaces `path` on close only if its
+        content differs from what is there"""
+        rel = self._relative(path)
+        if rel in self.digests:
+            raise ValueError(f"{rel} is produced twice")
+        path.parent.mkdir(parents=True, exist_ok=True)
+        sink = _HashingFile(path.with_name(path.name + ".tmp"))
+        try:
+            try:
+                yield sink
+            finally:
+                sink.handle.close()
+            digest = sink.digest = sink.sha.hexdigest()
+            if self._unchanged(rel, digest, sink):
+                sink.path.unlink()
+                self.changes.unchanged += 1
+            else:
+                os.replace(sink.path, path)
+                self.changes.written.append(rel)
+            self.digests[rel] = digest
+        except BaseException:
+            sink.path.unlink(missing_ok=True)
+            raise
+
+    def add_file(self, path: Path, text: str):
+        with self.open_file(path) as f:
+            f.write(text)
+
+    def add_entity(self, kind: str, entity_id: str, path: Path, text: str, *payloads):
+        """Write one entity's file; its hash covers `text` and any extra payloads
+        (e.g. the entity's JSON aggregate record)"""
+        entities = self.entities.setdefault(kind, {})
+        if entity_id in entities:
+            raise ValueError(f"duplicate {kind} id {entity_id!r}")
+        self.add_file(path, text)
+        entities[entity_id] = {
+            "hash": content_hash(text, *payloads),
+            "file": self._relative(path),
+        }
+
+    def _unchanged(self, rel: str, digest: str, sink: _HashingFile) -> bool:
+        path = self.root / rel
+        if self.force or not path.is_file() or path.stat().st_size != sink.size:
+            return False
+        if self.previous["files"].get(rel) == digest:
+            return True
+        # No (or a stale) manifest entry: compare with what is on disk
+        return filecmp.cmp(sink.path, path, shallow=False)
+
+    def _remove_empty_dirs(self, directory: Path):
+        while directory != self.root and self.root in directory.parents:
+            try:
+                directory.rmdir()
+            except OSError:  # not empty
+                return
+            directory = directory.parent
+
+    def commit(
+        self, stale: Iterable[Path] = (), seed: Optional[int] = None
+    ) -> ChangeSet:
+        """Delete generated files no longer produced (previous manifest entries
+        plus `stale` candidates), diff the entities and save the manifest"""
+        changes = self.changes
+        changes.written.sort()
+        candidates = set(self.previous["files"]) | {
+            self._relative(path) for path in stale
+        }
+        for rel in sorted(candidates - set(self.digests)):
+            path = self.root / rel
+            if path.is_file():
+                path.unlink()
+                changes.deleted.append(rel)
+                self._remove_empty_dirs(path.parent)
+
+        previous_entities = self.previous.get("entities", {})
+        for kind in sorted(set(self.entities) | set(previous_entities)):
+            before = previous_entities.get(kind, {})
+            after = self.entities.get(kind, {})
+            changes.added[kind] = sorted(set(after) - set(before))
+            changes.removed[kind] = sorted(set(before) - set(after))
+            changes.modified[kind] = sorted(
+                entity_id
+                for entity_id in set(after) & set(before)
+                if after[entity_id]["hash"] != before[entity_id]["hash"]
+            )
+            changes.changed_files.extend(
+                after[entity_id]["file"]
+                for entity_id in changes.added[kind] + changes.modified[kind]
+            )
+        changes.changed_files.sort()
+
+        manifest = {
+            "version": MANIFEST_VERSION,
+            "seed": seed,
+            "files": self.digests,
+            "entities": self.entities,
+        }
+        data = (json.dumps(manifest, indent=2, sort_keys=True) + "\n").encode("utf-8")
+        if not self.manifest_path.is_file() or self.manifest_path.read_bytes() != data:
+            write_atomic(self.manifest_path, data)
+        return changes
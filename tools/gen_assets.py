@@ -0,0 +1,391 @@
+#!/usr/bin/env python3
+"""Single-pass asset pipeline for Executive Disorder.
+
+Replaces running gen_images.py, gen_audio.py and
+scripts/generate_character_portraits.py one after another: content is read
+once (through the shared parsed-content cache) and turned into one task
+graph, entity -> image, portrait, music, sfx and voice tasks, plus the
+character portraits and a final asset manifest that depends on all of them.
+Tasks run on one bounded pool per provider (asset_scheduler.py):
+
+    image     IMG_PROVIDER: card art and leader portraits
+    audio     AUDIO_PROVIDER: music, sfx and voice lines
+    portrait  PORTRAIT_PROVIDER (mock or api, via the Flask backend at
+              PORTRAIT_API_URL): the character portraits
+
+so a season build is bounded by provider capacity, not script order.
+Completed tasks are checkpointed to .cache/assets/checkpoint.jsonl; rerunning
+resumes an interrupted build and redoes only tasks whose inputs changed or
+whose output files are missing or truncated (--fresh starts over). Generated
+files are shared through the content-addressed asset store (asset_cache.py),
+so an identical prompt is rendered once. Per-stage throughput and cache hit rates are printed at the end.
+
+    python3 tools/gen_assets.py --pool image=8 --pool audio=4 --report artifacts/asset-run.json
+"""
+
+import argparse
+import json
+import os
+import sys
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+from asset_cache import AssetStore
+from asset_scheduler import Checkpoint, Pool, Scheduler, Task
+from content_loader import CACHE_PATH, load_entities
+from content_manifest import content_hash, write_atomic
+from gen_audio import AudioGenerator
+from gen_images import ImageGenerator
+
+ROOT = Path(__file__).resolve().parents[1]
+CHECKPOINT_PATH = ROOT / ".cache" / "assets" / "checkpoint.jsonl"
+MANIFEST_PATH = Path("artifacts/asset-manifest.json")
+CHARACTER_DIR = Path("unity/Assets/Art/Characters/Generated")
+
+DEFAULT_WORKERS = {"image": 4, "audio": 4, "portrait": 1}
+# generate_character_portraits.py waited 5s between backend requests
+PORTRAIT_API_INTERVAL = 5.0
+# Lower runs first within a pool; the long-running kinds go first so they
+# do not trail at the end of the build
+DEFAULT_PRIORITIES = {
+    "portrait": 0,
+    "image": 1,
+    "music": 0,
+    "voice": 1,
+    "sfx": 2,
+    "manifest": 0,
+}
+IMAGE_STAGES = ("image", "portrait")
+
+
+def parse_pool(spec: str) -> Tuple[str, int, Optional[float]]:
+    """NAME=WORKERS[:INTERVAL]"""
+    try:
+        name, value = spec.split("=", 1)
+        workers, _, interval = value.partition(":")
+        return name, int(workers), float(interval) if interval else None
+    except ValueError:
+        raise argparse.ArgumentTypeError(
+            f"expected NAME=WORKERS[:INTERVAL], got {spec!r}"
+        )
+
+
+def parse_priority(spec: str) -> Tuple[str, int]:
+    try:
+        stage, value = spec.split("=", 1)
+        return stage, int(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected STAGE=PRIORITY, got {spec!r}")
+
+
+def load_characters() -> List[Dict]:
+    """Character specs from scripts/generate_character_portraits.py"""
+    sys.path.insert(0, str(ROOT / "scripts"))
+    try:
+        import generate_character_portraits
+    except ImportError as exc:  # the script needs `requests`
+        print(f"⚠️  Character portraits skipped: {exc}")
+        return []
+    return generate_character_portraits.CHARACTERS
+
+
+def written_files(
+    metadata_dir: Optional[Path],
+) -> Callable[[Dict], Dict[Path, Optional[int]]]:
+    """What a generator's metadata result stands for: the metadata JSON in
+    metadata_dir (if it writes one) and, unless it is a placeholder, the asset
+    at result["path"] with its recorded size"""
+
+    def outputs(result: Dict) -> Dict[Path, Optional[int]]:
+        files: Dict[Path, Optional[int]] = {}
+        if metadata_dir is not None:
+            files[metadata_dir / f"{result['id']}.json"] = None
+        if result["status"] != "placeholder":
+            files[Path(result["path"])] = result.get("bytes")
+        return files
+
+    return outputs
+
+
+def character_portrait_runner(
+    provider: str,
+    api_url: Optional[str],
+    output_dir: Path,
+    assets: Optional[AssetStore] = None,
+) -> Callable[[Dict], Dict]:
+    def run(character: Dict) -> Dict:
+        stem = Path(character["filename"]).stem
+        metadata = {
+            "id": stem,
+            "name": character["name"],
+            "path": str(output_dir / character["filename"]),
+            "provider": provider,
+        }
+        if provider == "mock":
+            output_dir.mkdir(parents=True, exist_ok=True)
+            metadata["status"] = "placeholder"
+            with open(output_dir / f"{stem}.json", "w") as f:
+                json.dump(metadata, f, indent=2)
+            return metadata
+        from generate_character_portraits import generate_portrait
+
+        if not generate_portrait(character, output_dir, api_url, assets=assets):
+            raise RuntimeError(f"portrait request for {character['name']!r} failed")
+        metadata["status"] = "generated"
+        return metadata
+
+    return run
+
+
+def build_tasks(
+    entities: List[Dict],
+    images: ImageGenerator,
+    audio: AudioGenerator,
+    characters: List[Dict],
+    portrait_runner: Callable[[Dict], Dict],
+    portrait_provider: str,
+    priorities: Dict[str, int],
+    results: Dict[str, object],
+    manifest_path: Optional[Path],
+) -> List[Task]:
+    """One task per asset, in entity order, plus the manifest task"""
+    tasks: List[Task] = []
+
+    def add(
+        stage: str,
+        key: str,
+        pool: str,
+        provider: str,
+        run: Callable[[], object],
+        inputs,
+        outputs,
+    ):
+        tasks.append(
+            Task(
+                id=f"{stage}:{key}",
+                stage=stage,
+                pool=pool,
+                run=run,
+                priority=priorities.get(stage, 0),
+                fingerprint=content_hash(stage, provider, inputs),
+                outputs=outputs,
+            )
+        )
+
+    image_outputs = written_files(images.output_dir)
+
+    for data in entities:
+        request = images.image_request(data)
+        if request:
+            add(
+                "image",
+                request[0],
+                "image",
+                images.provider,
+                lambda r=request: images.generate_image(*r),
+                request,
+                image_outputs,
+            )
+        request = images.portrait_request(data)
+        if request:
+            add(
+                "portrait",
+                request[0],
+                "image",
+                images.provider,
+                lambda r=request: images.generate_image(*r),
+                request,
+                image_outputs,
+            )
+        for kind, args in audio.audio_requests(data):
+            add(
+                kind,
+                args[0],
+                "audio",
+                audio.provider,
+                lambda k=kind, a=args: audio.generate(k, *a),
+                args,
+                written_files(getattr(audio, f"{kind}_dir")),
+            )
+    # Only the mock runner writes metadata next to the portraits
+    character_outputs = written_files(
+        CHARACTER_DIR if portrait_provider == "mock" else None
+    )
+    for character in characters:
+        add(
+            "portrait",
+            f"character:{Path(character['filename']).stem}",
+            "portrait",
+            portrait_provider,
+            lambda c=character: portrait_runner(c),
+            character,
+            character_outputs,
+        )
+
+    if manifest_path:
+        asset_ids = [task.id for task in tasks]
+
+        def write_manifest():
+            manifest = {"images": [], "audio": []}
+            for task_id in asset_ids:
+                stage = task_id.split(":", 1)[0]
+                manifest["images" if stage in IMAGE_STAGES else "audio"].append(
+                    results[task_id]
+                )
+            data = (json.dumps(manifest, indent=2) + "\n").encode("utf-8")
+            if not manifest_path.exists() or manifest_path.read_bytes() != data:
+                write_atomic(manifest_path, data)
+            return str(manifest_path)
+
+        tasks.append(
+            Task(
+                id="manifest",
+                stage="manifest",
+                pool="image",
+                run=write_manifest,
+                priority=priorities.get("manifest", 0),
+                deps=asset_ids,
+            )
+        )
+    return tasks
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument(
+        "--data-dir", default="data", help="Content YAML root (default: data)"
+    )
+    parser.add_argument(
+        "--cache",
+        type=Path,
+        default=CACHE_PATH,
+        help=f"Parsed-content cache (default: {CACHE_PATH})",
+    )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Parse every YAML file, ignoring the cache",
+    )
+    parser.add_argument(
+        "--checkpoint",
+        type=Path,
+        default=CHECKPOINT_PATH,
+        help=f"Completed-task checkpoint (default: {CHECKPOINT_PATH})",
+    )
+    parser.add_argument(
+        "--fresh", action="store_true", help="Ignore the checkpoint and redo every task"
+    )
+    parser.add_argument(
+        "--pool",
+        type=parse_pool,
+        action="append",
+        default=[],
+        metavar="NAME=WORKERS[:INTERVAL]",
+        help="Workers (and optional seconds between task starts) of a provider pool: "
+        "image, audio or portrait",
+    )
+    parser.add_argument(
+        "--priority",
+        type=parse_priority,
+        action="append",
+        default=[],
+        metavar="STAGE=N",
+        help="Priority of a stage within its pool, lower first "
+        "(image, portrait, music, voice, sfx)",
+    )
+    parser.add_argument(
+        "--manifest",
+        type=Path,
+        default=MANIFEST_PATH,
+        help=f"Asset manifest written when every task succeeded (default: {MANIFEST_PATH})",
+    )
+    parser.add_argument(
+        "--no-asset-cache",
+        action="store_true",
+        help="Call the providers for every asset, bypassing the asset store",
+    )
+    parser.add_argument(
+        "--report",
+        type=Path,
+        help="Write the run report (per-stage throughput) as JSON",
+    )
+    parser.add_argument(
+        "--progress",
+        type=float,
+        default=5.0,
+        help="Seconds between progress lines, 0 to disable (default: 5)",
+    )
+    args = parser.parse_args()
+
+    portrait_provider = os.getenv("PORTRAIT_PROVIDER", "mock")
+    pools = {name: Pool(name, workers) for name, workers in DEFAULT_WORKERS.items()}
+    if portrait_provider != "mock":
+        pools["portrait"].interval = PORTRAIT_API_INTERVAL
+    for name, workers, interval in args.pool:
+        if name not in pools:
+            parser.error(f"unknown pool {name!r} (expected one of {', '.join(pools)})")
+        pools[name].workers = workers
+        if interval is not None:
+            pools[name].interval = interval
+    priorities = dict(DEFAULT_PRIORITIES)
+    priorities.update(args.priority)
+
+    print("🏭 Asset Pipeline")
+    print("=" * 50)
+    loaded, stats = load_entities(
+        None, args.data_dir, None if args.no_cache else args.cache
+    )
+    print(f"  📂 {stats}")
+
+    assets = None if args.no_asset_cache else AssetStore()
+    images = ImageGenerator(os.getenv("IMG_PROVIDER", "mock"), assets=assets)
+    audio = AudioGenerator(os.getenv("AUDIO_PROVIDER", "mock"))
+    scheduler = Scheduler(
+        pools,
+        Checkpoint(args.checkpoint, fresh=args.fresh),
+        progress_interval=args.progress,
+    )
+    tasks = build_tasks(
+        [data for _, data in loaded],
+        images,
+        audio,
+        load_characters(),
+        character_portrait_runner(
+            portrait_provider, os.getenv("PORTRAIT_API_URL"), CHARACTER_DIR, assets
+        ),
+        portrait_provider,
+        priorities,
+        scheduler.results,
+        args.manifest,
+    )
+    print(
+        f"  🧩 {len(tasks)} tasks on pools "
+        + ", ".join(f"{pool.name}={pool.workers}" for pool in pools.values())
+    )
+
+    report = scheduler.run(tasks)
+    print()
+    print(report.format())
+    summary = report.to_dict()
+    if assets:
+        eviction = assets.finish()
+        print(f"  ♻️  Asset cache: {assets.report()}")
+        summary["asset_cache"] = {
+            "kinds": {
+                kind: stats.to_dict() for kind, stats in sorted(assets.stats.items())
+            },
+            "store": eviction,
+        }
+    for task_id, error in list(report.failures.items())[:20]:
+        print(f"  ❌ {task_id}: {error}")
+    if args.report:
+        write_atomic(
+            args.report, (json.dumps(summary, indent=2) + "\n").encode("utf-8")
+        )
+    if report.interrupted:
+        print("⏸️  Interrupted; rerun to resume from the checkpoint")
+    sys.exit(0 if report.ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -2,13 +2,19 @@
 """
 Audio Asset Generator for Executive Disorder
 Generates music, SFX, and voice lines
+
+No audio provider is wired up yet: every sound is written as placeholder
+metadata, so the asset store (asset_cache.py) is not consulted for audio.
 """
 
 import json
 import os
-import sys
 from pathlib import Path
-from typing import Dict, List
+from typing import Dict, List, Optional, Tuple
+
+from content_loader import CACHE_PATH, load_entities, parse_file
+from content_manifest import changed_files
+
 
 class AudioGenerator:
     def __init__(self, provider: str = "mock"):
@@ -17,115 +23,177 @@ class AudioGenerator:
         self.music_dir = Path("unity/Assets/Audio/Music/Generated")
         self.sfx_dir = Path("unity/Assets/Audio/SFX/Generated")
         self.voice_dir = Path("unity/Assets/Audio/Voice/Generated")
-        
+
         for dir_path in [self.music_dir, self.sfx_dir, self.voice_dir]:
             dir_path.mkdir(parents=True, exist_ok=True)
-    
-    def generate_from_yaml(self, data_dir: str = "data"):
-        """Generate audio from YAML content files"""
+
+    def generate_from_yaml(
+        self,
+        data_dir: str = "data",
+        yaml_files: Optional[List[str]] = None,
+        cache_path: Optional[Path] = CACHE_PATH,
+        workers: int = 0,
+    ):
+        """Generate audio from YAML content files (parsed through the shared content cache)"""
         print("🎵 Audio Generator")
         print("=" * 50)
-        
-        import glob
-        yaml_files = glob.glob(f"{data_dir}/**/*.yaml", recursive=True)
-        
+
+        entities, stats = load_entities(yaml_files, data_dir, cache_path, workers)
+        print(f"  📂 {stats}")
+
         music_count = 0
         sfx_count = 0
         voice_count = 0
-        
-        for yaml_file in yaml_files:
-            m, s, v = self.process_yaml(yaml_file)
+
+        for _, data in entities:
+            m, s, v = self.process_entity(data)
             music_count += m
             sfx_count += s
             voice_count += v
-        
+
         print()
         print(f"✅ Generated:")
         print(f"   🎼 {music_count} music tracks")
         print(f"   🔊 {sfx_count} sound effects")
         print(f"   🎤 {voice_count} voice lines")
-    
+
     def process_yaml(self, filepath: str):
-        """Extract audio requirements from YAML"""
-        import yaml
-        
-        with open(filepath, 'r') as f:
-            data = yaml.safe_load(f)
-        
-        content_id = data['id']
-        music = sfx = voice = 0
-        
+        """Extract audio requirements from one YAML file"""
+        return self.process_entity(parse_file(filepath))
+
+    def process_entity(self, data: Dict):
+        """Extract audio requirements from a parsed entity"""
+        counts = {"music": 0, "sfx": 0, "voice": 0}
+        for kind, args in self.audio_requests(data):
+            self.generate(kind, *args)
+            counts[kind] += 1
+
+        return counts["music"], counts["sfx"], counts["voice"]
+
+    def audio_requests(self, data: Dict) -> List[Tuple[str, Tuple]]:
+        """(kind, generate_<kind> arguments) for each audio asset an entity needs"""
+        if not isinstance(data, dict):
+            return []
+
+        content_id = data["id"]
+        requests = []
+
         # Music theme
-        if 'theme_music' in data:
-            self.generate_music(content_id, data['theme_music'])
-            music = 1
-        
+        if "theme_music" in data:
+            requests.append(("music", (content_id, data["theme_music"])))
+
         # Sound effects
-        if 'sfxKey' in data:
-            self.generate_sfx(content_id, data['sfxKey'])
-            sfx = 1
-        
+        if "sfxKey" in data:
+            requests.append(("sfx", (content_id, data["sfxKey"])))
+
         # Voice lines
-        if 'voLine' in data:
-            voice_style = data.get('voiceStyle', 'neutral')
-            self.generate_voice(content_id, data['voLine'], voice_style)
-            voice = 1
-        
-        return music, sfx, voice
-    
+        if "voLine" in data:
+            voice_style = data.get("voiceStyle", "neutral")
+            requests.append(("voice", (content_id, data["voLine"], voice_style)))
+
+        return requests
+
+    def generate(self, kind: str, *args):
+        """Generate one asset (kind is 'music', 'sfx' or 'voice'); returns its metadata"""
+        return getattr(self, f"generate_{kind}")(*args)
+
     def generate_music(self, content_id: str, theme: str):
         """Generate music track"""
         output_file = self.music_dir / f"{content_id}_theme.json"
-        
+        asset_path = f"unity/Assets/Audio/Music/Generated/{content_id}_theme.mp3"
+
         metadata = {
             "id": f"{content_id}_theme",
             "theme": theme,
             "duration": 120,  # 2 minutes loop
             "status": "placeholder",
-            "path": f"unity/Assets/Audio/Music/Generated/{content_id}_theme.mp3",
-            "provider": self.provider
+            "path": asset_path,
+            "provider": self.provider,
         }
-        
-        with open(output_file, 'w') as f:
+
+        with open(output_file, "w") as f:
             json.dump(metadata, f, indent=2)
-    
+        return metadata
+
     def generate_sfx(self, content_id: str, sfx_key: str):
         """Generate sound effect"""
         output_file = self.sfx_dir / f"{content_id}_{sfx_key}.json"
-        
+        asset_path = f"unity/Assets/Audio/SFX/Generated/{content_id}_{sfx_key}.wav"
+
         metadata = {
             "id": f"{content_id}_{sfx_key}",
             "sfxKey": sfx_key,
             "duration": 2,
             "status": "placeholder",
-            "path": f"unity/Assets/Audio/SFX/Generated/{content_id}_{sfx_key}.wav",
-            "provider": self.provider
+            "path": asset_path,
+            "provider": self.provider,
         }
-        
-        with open(output_file, 'w') as f:
+
+        with open(output_file, "w") as f:
             json.dump(metadata, f, indent=2)
-    
+        return metadata
+
     def generate_voice(self, content_id: str, line: str, style: str):
         """Generate voice line"""
         output_file = self.voice_dir / f"{content_id}_vo.json"
-        
+        asset_path = f"unity/Assets/Audio/Voice/Generated/{content_id}_vo.mp3"
+
         metadata = {
             "id": f"{content_id}_vo",
             "text": line,
             "style": style,
             "duration": len(line) * 0.1,  # Rough estimate
             "status": "placeholder",
-            "path": f"unity/Assets/Audio/Voice/Generated/{content_id}_vo.mp3",
-            "provider": self.provider
+            "path": asset_path,
+            "provider": self.provider,
         }
-        
-        with open(output_file, 'w') as f:
+
+        with open(output_file, "w") as f:
             json.dump(metadata, f, indent=2)
+        return metadata
+
 
 def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument(
+        "--changes",
+        help="Only process entities added or modified in this change list "
+        "(data/content-changes.json from gen_content.py)",
+    )
+    parser.add_argument(
+        "--cache",
+        type=Path,
+        default=CACHE_PATH,
+        help=f"Parsed-content cache shared with gen_images.py (default: {CACHE_PATH})",
+    )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Parse every YAML file, ignoring the cache",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=0,
+        help="Processes for parsing YAML on a cold cache (default: CPU count, up to 8)",
+    )
+    args = parser.parse_args()
+
     provider = os.getenv("AUDIO_PROVIDER", "mock")
     generator = AudioGenerator(provider)
-    generator.generate_from_yaml()
+    yaml_files = (
+        [str(path) for path in changed_files(Path(args.changes), Path.cwd())]
+        if args.changes
+        else None
+    )
+    generator.generate_from_yaml(
+        yaml_files=yaml_files,
+        cache_path=None if args.no_cache else args.cache,
+        workers=args.workers,
+    )
+
 
 if __name__ == "__main__":
     main()
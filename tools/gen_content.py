@@ -4,21 +4,61 @@
 Reads a theme JSON file (optional), produces YAML authoring files under
 `data/` and companion JSON aggregations for the Unity importer under
 `unity/Assets/Game/Data/`.
+
+Every entity draws from its own generator seeded by (seed, kind, index), so
+changing a count leaves the existing entities of that kind, and of the kinds
+not derived from it, as they were. Crises and factions are derived from the
+card list, so adding or changing cards can modify them too.
+Files are written through content_manifest.ContentWriter: only files whose
+content changed are rewritten, and the ids added, modified and removed are
+listed in `data/content-changes.json` for incremental imports and asset
+generation.
+
+YAML is rendered with libyaml's CSafeDumper when PyYAML was built with it
+(the output is byte-identical to the pure-Python SafeDumper for this
+content, just several times faster) and, for large runs, in batches across
+a process pool (--workers).
 """
 
 import argparse
+import hashlib
 import json
+import os
 import random
-import string
-from dataclasses import dataclass
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
 from pathlib import Path
-from typing import Dict, List, Optional, Tuple
+from typing import Dict, Iterator, List, Optional, Tuple
 
 import yaml
 
+try:
+    from yaml import CSafeDumper as YamlDumper
+except ImportError:  # PyYAML without libyaml
+    from yaml import SafeDumper as YamlDumper
+
+import content_bundle
+import json_bundle
+from content_manifest import ContentWriter
+from name_engine import (
+    DEFAULT_CARD_PATTERNS,
+    DEFAULT_CARD_WORDS,
+    NameGrammar,
+    NameSampler,
+)
+
 ROOT = Path(__file__).resolve().parents[1]
 YAML_ROOT = ROOT / "data"
 JSON_ROOT = ROOT / "unity" / "Assets" / "Game" / "Data"
+MANIFEST_PATH = YAML_ROOT / "content-manifest.json"
+CHANGES_PATH = YAML_ROOT / "content-changes.json"
+BUNDLE_PATH = YAML_ROOT / "content.bundle"
+
+CONTENT_KINDS = ["cards", "leaders", "crises", "factions"]
+
+# Below this many entities a process pool costs more than it saves
+PARALLEL_MIN_ENTITIES = 2000
+RENDER_BATCH = 500
 
 
 DEFAULT_THEME = {
@@ -103,6 +143,7 @@ class Theme:
     sfx_style: str
     voice_style: str
     tone: str
+    card_names: Dict = field(default_factory=dict)
 
 
 def load_theme(theme_path: Optional[Path]) -> Theme:
@@ -119,21 +160,44 @@ def load_theme(theme_path: Optional[Path]) -> Theme:
     return Theme(
         counts={
             "cards": int(counts.get("cards", DEFAULT_THEME["content_counts"]["cards"])),
-            "leaders": int(counts.get("leaders", DEFAULT_THEME["content_counts"]["leaders"])),
-            "crises": int(counts.get("crises", DEFAULT_THEME["content_counts"]["crises"])),
-            "factions": int(counts.get("factions", DEFAULT_THEME["content_counts"]["factions"])),
+            "leaders": int(
+                counts.get("leaders", DEFAULT_THEME["content_counts"]["leaders"])
+            ),
+            "crises": int(
+                counts.get("crises", DEFAULT_THEME["content_counts"]["crises"])
+            ),
+            "factions": int(
+                counts.get("factions", DEFAULT_THEME["content_counts"]["factions"])
+            ),
         },
         primary_theme=str(themes.get("primary", DEFAULT_THEME["themes"]["primary"])),
-        secondary_themes=list(themes.get("secondary", DEFAULT_THEME["themes"]["secondary"])),
-        satire_level=str(themes.get("satire_level", DEFAULT_THEME["themes"]["satire_level"])),
-        card_style=str(art.get("card_style", DEFAULT_THEME["art_direction"]["card_style"])),
-        leader_style=str(art.get("leader_style", DEFAULT_THEME["art_direction"]["leader_style"])),
-        crisis_style=str(art.get("crisis_style", DEFAULT_THEME["art_direction"]["crisis_style"])),
+        secondary_themes=list(
+            themes.get("secondary", DEFAULT_THEME["themes"]["secondary"])
+        ),
+        satire_level=str(
+            themes.get("satire_level", DEFAULT_THEME["themes"]["satire_level"])
+        ),
+        card_style=str(
+            art.get("card_style", DEFAULT_THEME["art_direction"]["card_style"])
+        ),
+        leader_style=str(
+            art.get("leader_style", DEFAULT_THEME["art_direction"]["leader_style"])
+        ),
+        crisis_style=str(
+            art.get("crisis_style", DEFAULT_THEME["art_direction"]["crisis_style"])
+        ),
         palette=list(art.get("palette", DEFAULT_THEME["art_direction"]["palette"])),
-        music_style=str(audio.get("music_style", DEFAULT_THEME["audio_direction"]["music_style"])),
-        sfx_style=str(audio.get("sfx_style", DEFAULT_THEME["audio_direction"]["sfx_style"])),
-        voice_style=str(audio.get("voice_style", DEFAULT_THEME["audio_direction"]["voice_style"])),
+        music_style=str(
+            audio.get("music_style", DEFAULT_THEME["audio_direction"]["music_style"])
+        ),
+        sfx_style=str(
+            audio.get("sfx_style", DEFAULT_THEME["audio_direction"]["sfx_style"])
+        ),
+        voice_style=str(
+            audio.get("voice_style", DEFAULT_THEME["audio_direction"]["voice_style"])
+        ),
         tone=str(data.get("tone", DEFAULT_THEME["tone"])),
+        card_names=dict(data.get("card_names", {})),
     )
 
 
@@ -145,57 +209,124 @@ def slugify(name: str) -> str:
     return slug.strip("_")
 
 
-def cleanup_generated_yaml():
-    for category in ["cards", "leaders", "crises", "factions"]:
-        directory = YAML_ROOT / category
-        directory.mkdir(parents=True, exist_ok=True)
-        for path in directory.glob("generated_*.yaml"):
-            path.unlink()
+def derive_seed(seed: int, *parts) -> int:
+    """64-bit seed for one stream of the run, stable across Python versions"""
+    key = ":".join(str(part) for part in (seed, *parts))
+    return int.from_bytes(hashlib.sha256(key.encode("utf-8")).digest()[:8], "big")
+
+
+def entity_rng(seed: int, kind: str, index: int) -> random.Random:
+    return random.Random(derive_seed(seed, kind, index))
+
+
+def generated_yaml_files() -> List[Path]:
+    """Generated YAML currently on disk (candidates for removal)"""
+    return [
+        path
+        for kind in CONTENT_KINDS
+        for path in (YAML_ROOT / kind).glob("generated_*.yaml")
+    ]
+
 
+def yaml_path(kind: str, index: int) -> Path:
+    singular = {
+        "cards": "card",
+        "leaders": "leader",
+        "crises": "crisis",
+        "factions": "faction",
+    }[kind]
+    width = 2 if kind in ("leaders", "factions") else 3
+    return YAML_ROOT / kind / f"generated_{singular}_{index + 1:0{width}d}.yaml"
 
-def save_yaml(path: Path, payload: Dict):
-    path.parent.mkdir(parents=True, exist_ok=True)
-    with open(path, "w", encoding="utf-8") as f:
-        yaml.safe_dump(payload, f, sort_keys=False, allow_unicode=False)
 
+def render_yaml(payload: Dict) -> str:
+    return yaml.dump(payload, Dumper=YamlDumper, sort_keys=False, allow_unicode=False)
 
-def write_json(path: Path, payload: Dict):
-    path.parent.mkdir(parents=True, exist_ok=True)
-    with open(path, "w", encoding="utf-8") as f:
-        json.dump(payload, f, indent=2)
 
+def _render_yaml_batch(payloads: List[Dict]) -> List[str]:
+    return [render_yaml(payload) for payload in payloads]
 
-def choose_palette_color(theme: Theme, rng: random.Random, index: int) -> str:
+
+def default_workers() -> int:
+    return min(os.cpu_count() or 1, 8)
+
+
+def render_yaml_all(
+    payloads: List[Dict], workers: int = 0, batch_size: int = RENDER_BATCH
+) -> List[str]:
+    """Render payloads to YAML text, in order.
+
+    With more than one worker and enough payloads the batches are rendered
+    in a process pool; the text is the same either way. If the pool cannot
+    be started (no fork/semaphores in some sandboxes) it renders in-process.
+    """
+    workers = workers or default_workers()
+    if workers <= 1 or len(payloads) < PARALLEL_MIN_ENTITIES:
+        return _render_yaml_batch(payloads)
+    batches = [
+        payloads[i : i + batch_size] for i in range(0, len(payloads), batch_size)
+    ]
+    try:
+        with ProcessPoolExecutor(max_workers=min(workers, len(batches))) as pool:
+            return [
+                text
+                for batch in pool.map(_render_yaml_batch, batches)
+                for text in batch
+            ]
+    except (OSError, NotImplementedError):
+        return _render_yaml_batch(payloads)
+
+
+def choose_palette_color(theme: Theme, index: int) -> str:
     if not theme.palette:
         return "#CCCCCC"
     return theme.palette[index % len(theme.palette)]
 
 
-def generate_card_name(theme: Theme, rng: random.Random, used: set) -> Tuple[str, str]:
-    verbs = ["Ban", "Privatize", "Tax", "Mandate", "Gamify", "Streamline", "Crowdsource", "Nationalize", "Outlaw", "Celebrate"]
-    subjects = [
-        "Birds", "Oxygen", "Memes", "Reality", "Hands", "Dance Battles", "Pigeons", "Conspiracies", "Bureaucracy", "Inflation"
-    ]
-    modifiers = ["Forever", "for Votes", "for Clout", "with Jazz", "on Tuesdays", "Underwater", "via Polls", "at Scale", "for Charity"]
+def card_name_sampler(theme: Theme, seed: int) -> NameSampler:
+    """Unique card names in seeded order; distinct names never share a slug"""
+    grammar = NameGrammar.from_config(
+        theme.card_names, DEFAULT_CARD_WORDS, DEFAULT_CARD_PATTERNS
+    )
+    return NameSampler(
+        grammar,
+        derive_seed(seed, "card_names"),
+        key=lambda name: slugify(f"card_{name}"),
+    )
+
 
-    while True:
-        name = f"{rng.choice(verbs)} {rng.choice(subjects)} {rng.choice(modifiers)}"
-        if name not in used:
-            used.add(name)
-            return name, slugify(f"card_{name}")
+def card_record(card: Dict) -> Dict:
+    """A card's record in the Unity JSON aggregate"""
+    return {
+        "id": card["id"],
+        "name": card["name"],
+        "description": card["description"],
+        "cost": card["cost"],
+        "rarity": card["rarity"],
+        "tags": card["tags"],
+        "effects": card["effects"],
+        "artKey": f"art/cards/{card['id']}",
+    }
 
 
-def generate_cards(theme: Theme, rng: random.Random) -> Tuple[List[Dict], List[Dict]]:
+def generate_cards(theme: Theme, seed: int) -> Tuple[List[Dict], Iterator[Dict]]:
+    """The cards' YAML entities, and their JSON records (made lazily from them)"""
     count = theme.counts["cards"]
-    used_names = set()
+    names = card_name_sampler(theme, seed).take(count)
     yaml_cards = []
-    json_cards = []
 
-    for idx in range(count):
-        name, slug = generate_card_name(theme, rng, used_names)
-        rarity = rng.choices(["common", "uncommon", "rare", "legendary"], weights=[60, 25, 12, 3])[0]
+    for idx, name in enumerate(names):
+        rng = entity_rng(seed, "cards", idx)
+        slug = slugify(f"card_{name}")
+        rarity = rng.choices(
+            ["common", "uncommon", "rare", "legendary"], weights=[60, 25, 12, 3]
+        )[0]
         cost = rng.randint(0, 4)
-        tag_pool = [theme.primary_theme] + theme.secondary_themes + ["absurd", "policy", "media", "economy", "panic"]
+        tag_pool = (
+            [theme.primary_theme]
+            + theme.secondary_themes
+            + ["absurd", "policy", "media", "economy", "panic"]
+        )
         tags = sorted(set(rng.sample(tag_pool, k=min(3, len(tag_pool)))))
 
         effects = []
@@ -207,7 +338,9 @@ def generate_cards(theme: Theme, rng: random.Random) -> Tuple[List[Dict], List[D
         synergies = []
         if rng.random() < 0.35:
             synergy_tag = rng.choice(tags)
-            synergies.append({"withTag": synergy_tag, "bonusAbsurdity": rng.randint(1, 4)})
+            synergies.append(
+                {"withTag": synergy_tag, "bonusAbsurdity": rng.randint(1, 4)}
+            )
 
         art_prompt = (
             f"{theme.tone} policy decree where {name.lower()}. "
@@ -233,32 +366,57 @@ def generate_cards(theme: Theme, rng: random.Random) -> Tuple[List[Dict], List[D
         }
         yaml_cards.append(yaml_card)
 
-        json_cards.append({
-            "id": slug,
-            "name": name,
-            "description": yaml_card["description"],
-            "cost": cost,
-            "rarity": rarity,
-            "tags": tags,
-            "effects": effects,
-            "artKey": f"art/cards/{slug}",
-        })
+    return yaml_cards, map(card_record, yaml_cards)
 
-        save_yaml(YAML_ROOT / "cards" / f"generated_card_{idx+1:03d}.yaml", yaml_card)
 
-    return yaml_cards, json_cards
+def leader_record(theme: Theme, leader: Dict) -> Dict:
+    return {
+        "id": leader["id"],
+        "name": leader["name"],
+        "bio": f"{leader['name']} — {leader['title']} of {theme.primary_theme.replace('_', ' ')}.",
+        "traitTags": leader["traitTags"],
+        "startingDeck": leader["startingDeck"],
+        "portraitKey": f"art/portraits/{leader['id']}",
+    }
 
 
-def generate_leaders(theme: Theme, rng: random.Random, card_ids: List[str]) -> Tuple[List[Dict], List[Dict]]:
+def generate_leaders(
+    theme: Theme, seed: int, card_ids: List[str]
+) -> Tuple[List[Dict], Iterator[Dict]]:
     count = theme.counts["leaders"]
     yaml_leaders = []
-    json_leaders = []
 
     for idx in range(count):
+        rng = entity_rng(seed, "leaders", idx)
         archetype_title, trait_tags = rng.choice(LEADER_ARCHETYPES)
-        honorifics = ["Supreme", "Grand", "Acting", "Virtual", "Provisional", "Executive"]
-        roles = ["Commander", "Director", "Chancellor", "Highlord", "Consultant", "Strategist"]
-        surnames = ["Magnifico", "Vector", "Flux", "Spin", "Memetrix", "Ledger", "Hyperion", "Cascade", "Quorum", "Vex"]
+        honorifics = [
+            "Supreme",
+            "Grand",
+            "Acting",
+            "Virtual",
+            "Provisional",
+            "Executive",
+        ]
+        roles = [
+            "Commander",
+            "Director",
+            "Chancellor",
+            "Highlord",
+            "Consultant",
+            "Strategist",
+        ]
+        surnames = [
+            "Magnifico",
+            "Vector",
+            "Flux",
+            "Spin",
+            "Memetrix",
+            "Ledger",
+            "Hyperion",
+            "Cascade",
+            "Quorum",
+            "Vex",
+        ]
         role = rng.choice(roles)
         surname = rng.choice(surnames)
         name = f"{rng.choice(honorifics)} {role} {surname}"
@@ -299,40 +457,50 @@ def generate_leaders(theme: Theme, rng: random.Random, card_ids: List[str]) -> T
         }
         yaml_leaders.append(yaml_leader)
 
-        json_leaders.append({
-            "id": slug,
-            "name": name,
-            "bio": f"{name} — {archetype_title} of {theme.primary_theme.replace('_', ' ')}.",
-            "traitTags": list(dict.fromkeys(trait_tags + [theme.primary_theme])),
-            "startingDeck": starting_deck,
-            "portraitKey": f"art/portraits/{slug}",
-        })
-
-        save_yaml(YAML_ROOT / "leaders" / f"generated_leader_{idx+1:02d}.yaml", yaml_leader)
-
-    return yaml_leaders, json_leaders
+    return yaml_leaders, (leader_record(theme, leader) for leader in yaml_leaders)
 
 
 def severity_from_type(crisis_type: str) -> int:
     return {"minor": 2, "major": 3, "catastrophic": 5}.get(crisis_type, 2)
 
 
-def generate_crises(theme: Theme, rng: random.Random, cards: List[Dict]) -> Tuple[List[Dict], List[Dict]]:
+def crisis_record(theme: Theme, crisis: Dict, panic: int) -> Dict:
+    return {
+        "id": crisis["id"],
+        "name": crisis["name"],
+        "description": crisis["headline"],
+        "severity": severity_from_type(crisis["type"]),
+        "tags": [crisis["category"], theme.primary_theme],
+        "effects": [{"type": "PanicDelta", "value": panic}],
+        "next": [event["nextCrisis"] for event in crisis["chainEvents"]],
+    }
+
+
+def generate_crises(
+    theme: Theme, seed: int, cards: List[Dict]
+) -> Tuple[List[Dict], Iterator[Dict]]:
     count = theme.counts["crises"]
     yaml_crises = []
-    json_crises = []
-
-    crisis_ids: List[str] = []
-    crisis_payloads: List[Tuple[Dict, Dict, Dict]] = []
+    panic: List[int] = []  # each JSON record's PanicDelta
 
     for idx in range(count):
+        rng = entity_rng(seed, "crises", idx)
         ctype, category = CRISIS_TYPES[idx % len(CRISIS_TYPES)]
-        subject = rng.choice([
-            "Pigeon", "Lobbyist", "Hashtag", "Inflation", "Algorithm", "Meme", "Diplomat", "Comedian", "Bureaucrat"
-        ])
+        subject = rng.choice(
+            [
+                "Pigeon",
+                "Lobbyist",
+                "Hashtag",
+                "Inflation",
+                "Algorithm",
+                "Meme",
+                "Diplomat",
+                "Comedian",
+                "Bureaucrat",
+            ]
+        )
         headline = f"{subject} {rng.choice(['Riots', 'Walkout', 'Takeover', 'Summit', 'Inquest', 'Flash Mob'])} Rocks Nation"
         slug = slugify(f"crisis_{idx+1:03d}_{subject.lower()}")
-        crisis_ids.append(slug)
 
         option_effect = [dict(effect) for effect in rng.choice(cards)["effects"]]
 
@@ -364,37 +532,43 @@ def generate_crises(theme: Theme, rng: random.Random, cards: List[Dict]) -> Tupl
             "newsImage": f"crisis/{slug}",
             "imagePrompt": f"{theme.crisis_style} photo capturing {headline.lower()}, dramatic lighting, {theme.tone} satire.",
         }
-        crisis_payloads.append((yaml_crisis, {
-            "id": slug,
-            "name": yaml_crisis["name"],
-            "description": headline,
-            "severity": severity_from_type(ctype),
-            "tags": [category, theme.primary_theme],
-            "effects": [{"type": "PanicDelta", "value": rng.randint(3, 8)}],
-            "next": [],
-        }, slug))
+        yaml_crises.append(yaml_crisis)
+        panic.append(rng.randint(3, 8))
 
     # Link crises sequentially for a simple chain
-    for idx, (yaml_crisis, json_crisis, crisis_id) in enumerate(crisis_payloads):
-        if idx < len(crisis_payloads) - 1:
-            next_id = crisis_payloads[idx + 1][2]
-            yaml_crisis["chainEvents"].append({"triggeredBy": "press_conference", "nextCrisis": next_id, "delay": 1})
-            json_crisis["next"].append(next_id)
+    for crisis, following in zip(yaml_crises, yaml_crises[1:]):
+        crisis["chainEvents"].append(
+            {
+                "triggeredBy": "press_conference",
+                "nextCrisis": following["id"],
+                "delay": 1,
+            }
+        )
+
+    return yaml_crises, (
+        crisis_record(theme, crisis, value) for crisis, value in zip(yaml_crises, panic)
+    )
 
-        yaml_crises.append(yaml_crisis)
-        json_crises.append(json_crisis)
-        save_yaml(YAML_ROOT / "crises" / f"generated_crisis_{idx+1:03d}.yaml", yaml_crisis)
 
-    return yaml_crises, json_crises
+def faction_record(theme: Theme, idx: int, faction: Dict) -> Dict:
+    return {
+        "id": faction["id"],
+        "name": faction["name"],
+        "description": f"Influence bloc obsessed with {theme.primary_theme.replace('_', ' ')}.",
+        "color": choose_palette_color(theme, idx),
+        "tags": FACTION_TYPES[idx % len(FACTION_TYPES)][1],
+    }
 
 
-def generate_factions(theme: Theme, rng: random.Random, cards: List[Dict]) -> Tuple[List[Dict], List[Dict]]:
+def generate_factions(
+    theme: Theme, seed: int, cards: List[Dict]
+) -> Tuple[List[Dict], Iterator[Dict]]:
     count = theme.counts["factions"]
     yaml_factions = []
-    json_factions = []
 
     for idx in range(count):
-        faction_name, tag_options = FACTION_TYPES[idx % len(FACTION_TYPES)]
+        rng = entity_rng(seed, "factions", idx)
+        faction_name, _ = FACTION_TYPES[idx % len(FACTION_TYPES)]
         slug = slugify(f"faction_{idx+1:02d}_{faction_name.split()[0].lower()}")
         primary_card = rng.choice(cards)
 
@@ -415,33 +589,94 @@ def generate_factions(theme: Theme, rng: random.Random, cards: List[Dict]) -> Tu
                     {
                         "threshold": rng.randint(60, 90),
                         "effect": "faction_support",
-                        "bonus": {"approvalMultiplier": round(rng.uniform(1.05, 1.3), 2)},
+                        "bonus": {
+                            "approvalMultiplier": round(rng.uniform(1.05, 1.3), 2)
+                        },
                     }
                 ],
             },
-            "unlockableCards": rng.sample([card["id"] for card in cards], k=min(5, len(cards))),
+            "unlockableCards": rng.sample(
+                [card["id"] for card in cards], k=min(5, len(cards))
+            ),
             "iconStyle": theme.card_style,
-            "iconPrompt": f"Faction emblem for {faction_name}, colors {choose_palette_color(theme, rng, idx)}, satire level {theme.satire_level}.",
+            "iconPrompt": f"Faction emblem for {faction_name}, colors {choose_palette_color(theme, idx)}, satire level {theme.satire_level}.",
         }
         yaml_factions.append(yaml_faction)
 
-        json_factions.append({
-            "id": slug,
-            "name": faction_name,
-            "description": f"Influence bloc obsessed with {theme.primary_theme.replace('_', ' ')}.",
-            "color": choose_palette_color(theme, rng, idx),
-            "tags": tag_options,
-        })
+    return yaml_factions, (
+        faction_record(theme, idx, faction) for idx, faction in enumerate(yaml_factions)
+    )
 
-        save_yaml(YAML_ROOT / "factions" / f"generated_faction_{idx+1:02d}.yaml", yaml_faction)
 
-    return yaml_factions, json_factions
+def stream_entities(
+    writer: ContentWriter,
+    kind: str,
+    yaml_entities: List[Dict],
+    records: Iterator[Dict],
+    texts: Iterator[str],
+) -> Iterator[Dict]:
+    """Write each entity's YAML file and yield its JSON record, so the JSON
+    aggregate is written as the records are made instead of from a list"""
+    for idx, (yaml_entity, record) in enumerate(zip(yaml_entities, records)):
+        writer.add_entity(
+            kind, yaml_entity["id"], yaml_path(kind, idx), next(texts), record
+        )
+        yield record
 
 
 def main():
-    parser = argparse.ArgumentParser(description="Generate Executive Disorder content from a theme file")
-    parser.add_argument("theme", nargs="?", help="Path to theme JSON (defaults to ./theme.json if present)")
+    parser = argparse.ArgumentParser(
+        description="Generate Executive Disorder content from a theme file"
+    )
+    parser.add_argument(
+        "theme",
+        nargs="?",
+        help="Path to theme JSON (defaults to ./theme.json if present)",
+    )
     parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument(
+        "--force",
+        action="store_true",
+        help="Rewrite every file even if its content is unchanged",
+    )
+    parser.add_argument(
+        "--changes",
+        type=Path,
+        default=CHANGES_PATH,
+        help=f"Where to write the change list (default: {CHANGES_PATH.relative_to(ROOT)})",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=0,
+        help="Processes rendering YAML (default: CPU count up to 8; 1 renders in-process)",
+    )
+    parser.add_argument(
+        "--json-layout",
+        choices=["single", "sharded"],
+        default="single",
+        help="One JSON file per kind, or shards plus an id index per kind",
+    )
+    parser.add_argument(
+        "--shard-size",
+        type=int,
+        default=json_bundle.DEFAULT_SHARD_SIZE,
+        help="Entities per shard with --json-layout sharded",
+    )
+    parser.add_argument(
+        "--compact-json", action="store_true", help="Write JSON without indentation"
+    )
+    parser.add_argument(
+        "--bundle",
+        type=Path,
+        default=BUNDLE_PATH,
+        help=f"Binary content bundle to write (default: {BUNDLE_PATH.relative_to(ROOT)})",
+    )
+    parser.add_argument(
+        "--no-bundle",
+        action="store_true",
+        help="Do not write the binary content bundle",
+    )
     args = parser.parse_args()
 
     theme_path: Optional[Path] = None
@@ -452,30 +687,88 @@ def main():
         if default_candidate.exists():
             theme_path = default_candidate
 
-    rng = random.Random(args.seed)
     theme = load_theme(theme_path)
 
-    cleanup_generated_yaml()
-
-    JSON_ROOT.mkdir(parents=True, exist_ok=True)
-
-    yaml_cards, json_cards = generate_cards(theme, rng)
-    yaml_leaders, json_leaders = generate_leaders(theme, rng, [card["id"] for card in json_cards])
-    yaml_crises, json_crises = generate_crises(theme, rng, json_cards)
-    yaml_factions, json_factions = generate_factions(theme, rng, json_cards)
-
-    write_json(JSON_ROOT / "cards.json", {"cards": json_cards})
-    write_json(JSON_ROOT / "leaders.json", {"leaders": json_leaders})
-    write_json(JSON_ROOT / "crises.json", {"crises": json_crises})
-    write_json(JSON_ROOT / "factions.json", {"factions": json_factions})
+    yaml_cards, json_cards = generate_cards(theme, args.seed)
+    yaml_leaders, json_leaders = generate_leaders(
+        theme, args.seed, [card["id"] for card in yaml_cards]
+    )
+    yaml_crises, json_crises = generate_crises(theme, args.seed, yaml_cards)
+    yaml_factions, json_factions = generate_factions(theme, args.seed, yaml_cards)
+
+    writer = ContentWriter(ROOT, MANIFEST_PATH, force=args.force)
+    content = {
+        "cards": (yaml_cards, json_cards),
+        "leaders": (yaml_leaders, json_leaders),
+        "crises": (yaml_crises, json_crises),
+        "factions": (yaml_factions, json_factions),
+    }
+    texts = iter(
+        render_yaml_all(
+            [
+                entity
+                for yaml_entities, _ in content.values()
+                for entity in yaml_entities
+            ],
+            workers=args.workers,
+        )
+    )
+    for kind, (yaml_entities, json_records) in content.items():
+        json_entities = stream_entities(
+            writer, kind, yaml_entities, json_records, texts
+        )
+        if args.json_layout == "sharded":
+            json_bundle.write_shards(
+                writer,
+                JSON_ROOT / kind,
+                kind,
+                json_entities,
+                args.shard_size,
+                args.compact_json,
+            )
+        else:
+            json_bundle.write_document(
+                writer,
+                JSON_ROOT / f"{kind}.json",
+                kind,
+                json_entities,
+                args.compact_json,
+            )
+    if not args.no_bundle:
+        with writer.open_file(args.bundle.resolve()) as f:
+            f.write_bytes(
+                content_bundle.build(
+                    {
+                        kind: yaml_entities
+                        for kind, (yaml_entities, _) in content.items()
+                    }
+                )
+            )
+    changes = writer.commit(stale=generated_yaml_files(), seed=args.seed)
+    args.changes.parent.mkdir(parents=True, exist_ok=True)
+    args.changes.write_text(
+        json.dumps(changes.to_dict(args.seed), indent=2) + "\n", encoding="utf-8"
+    )
 
     print("=== Content Generation Complete ===")
     if theme_path:
         print(f"Theme: {theme_path}")
-    print(f"Cards:   {len(json_cards)}")
-    print(f"Leaders: {len(json_leaders)}")
-    print(f"Crises:  {len(json_crises)}")
-    print(f"Factions:{len(json_factions)}")
+    print(f"Cards:   {len(yaml_cards)}")
+    print(f"Leaders: {len(yaml_leaders)}")
+    print(f"Crises:  {len(yaml_crises)}")
+    print(f"Factions:{len(yaml_factions)}")
+    for label, ids in (
+        ("Added", changes.added),
+        ("Modified", changes.modified),
+        ("Removed", changes.removed),
+    ):
+        print(
+            f"{label + ':':9}"
+            + ", ".join(f"{len(ids.get(kind, []))} {kind}" for kind in CONTENT_KINDS)
+        )
+    print(
+        f"Files:   {len(changes.written)} written, {len(changes.deleted)} deleted, {changes.unchanged} unchanged"
+    )
 
 
 if __name__ == "__main__":
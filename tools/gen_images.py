@@ -1,91 +1,254 @@
 #!/usr/bin/env python3
 """
-Image Asset Generator for Executive Disorder  
+Image Asset Generator for Executive Disorder
 Generates images via local Stable Diffusion or API
 """
 
 import json
 import os
-import sys
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import Dict, List
+from typing import Dict, List, Optional, Tuple
+
+from asset_cache import AssetStore, asset_key
+from content_loader import CACHE_PATH, load_entities, parse_file
+from content_manifest import changed_files
+from image_providers import ImageClient, ImageJob
+
 
 class ImageGenerator:
-    def __init__(self, provider: str = "mock"):
-        """provider: 'local' (ComfyUI), 'api' (DALL-E/SD), or 'mock' (placeholder)"""
+    def __init__(
+        self,
+        provider: str = "mock",
+        client: Optional[ImageClient] = None,
+        assets: Optional[AssetStore] = None,
+    ):
+        """provider: 'local' (ComfyUI), 'api' (DALL-E/SD), or 'mock' (placeholder)
+        assets: content-addressed store consulted before calling the provider"""
         self.provider = provider
+        self.assets = assets
         self.output_dir = Path("unity/Assets/Art/Generated")
         self.output_dir.mkdir(parents=True, exist_ok=True)
-        
+
+        # Shared by every thread generating images (see tools/image_providers.py)
+        self.client = client
+        if self.client is None and provider != "mock":
+            self.client = ImageClient(provider, self.output_dir)
+
         # Style presets for consistency
         self.styles = {
             "satirical_poster_v1": {
                 "prompt_suffix": ", 1950s propaganda poster style, bold colors, dramatic composition",
-                "negative": "realistic, photo, modern"
+                "negative": "realistic, photo, modern",
             },
             "professional_portrait": {
                 "prompt_suffix": ", professional portrait photograph, oval office background",
-                "negative": "cartoon, anime, painting"
-            }
+                "negative": "cartoon, anime, painting",
+            },
         }
-    
-    def generate_from_yaml(self, data_dir: str = "data"):
-        """Generate images from YAML content files"""
+
+    def generate_from_yaml(
+        self,
+        data_dir: str = "data",
+        yaml_files: Optional[List[str]] = None,
+        cache_path: Optional[Path] = CACHE_PATH,
+        workers: int = 0,
+    ):
+        """Generate images from YAML content files (parsed through the shared content cache)"""
         print("🎨 Image Generator")
         print("=" * 50)
-        
-        # Find all YAML files
-        import glob
-        yaml_files = glob.glob(f"{data_dir}/**/*.yaml", recursive=True)
-        
-        for yaml_file in yaml_files:
-            self.process_yaml(yaml_file)
-        
-        print(f"✅ Generated {len(yaml_files)} image requests")
-    
+
+        entities, stats = load_entities(yaml_files, data_dir, cache_path, workers)
+        print(f"  📂 {stats}")
+
+        if self.client is None:
+            for _, data in entities:
+                self.process_entity(data)
+            print(f"✅ Generated {len(entities)} image requests")
+            return
+
+        # Real providers: requests run concurrently, paced by the client's rate limit
+        requests = [
+            request
+            for _, data in entities
+            for request in [self.image_request(data)]
+            if request
+        ]
+        failures = []
+
+        def run(request):
+            try:
+                self.generate_image(*request)
+            except Exception as exc:
+                failures.append((request[0], exc))
+
+        with ThreadPoolExecutor(
+            max_workers=max(1, self.client.config.concurrency)
+        ) as pool:
+            list(pool.map(run, requests))
+
+        stats = self.client.stats
+        print(
+            f"✅ Generated {stats.images} images ({stats.bytes / 2**20:.1f} MB, "
+            f"{stats.retries} retries, {stats.throttled} throttled)"
+        )
+        if self.assets:
+            self.assets.finish()
+            print(f"  ♻️  Asset cache: {self.assets.report()}")
+        for content_id, exc in failures:
+            print(f"  ❌ {content_id}: {exc}")
+
     def process_yaml(self, filepath: str):
-        """Extract art prompts from YAML and generate"""
-        import yaml
-        
-        with open(filepath, 'r') as f:
-            data = yaml.safe_load(f)
-        
-        if 'artPrompt' in data:
-            content_id = data['id']
-            style = data.get('artStyle', 'satirical_poster_v1')
-            prompt = data['artPrompt']
-            
+        """Extract art prompts from one YAML file and generate"""
+        self.process_entity(parse_file(filepath))
+
+    def process_entity(self, data: Dict):
+        """Extract art prompts from a parsed entity and generate"""
+        request = self.image_request(data)
+        if request:
+            content_id, style, prompt = request
             print(f"  📝 {content_id}: {prompt[:60]}...")
-            
-            if self.provider == "mock":
-                self.generate_placeholder(content_id, style)
-            else:
-                self.generate_real(content_id, style, prompt)
-    
+            self.generate_image(content_id, style, prompt)
+
+    def image_request(self, data: Dict) -> Optional[Tuple[str, str, str]]:
+        """(content_id, style, prompt) of an entity's card art, if it has any"""
+        if isinstance(data, dict) and "artPrompt" in data:
+            return (
+                data["id"],
+                data.get("artStyle", "satirical_poster_v1"),
+                data["artPrompt"],
+            )
+        return None
+
+    def portrait_request(self, data: Dict) -> Optional[Tuple[str, str, str]]:
+        """(content_id, style, prompt) of a leader's portrait, if it has one"""
+        if isinstance(data, dict) and "portraitPrompt" in data:
+            return (
+                data["id"],
+                data.get("portraitStyle", "professional_portrait"),
+                data["portraitPrompt"],
+            )
+        return None
+
+    def generate_image(self, content_id: str, style: str, prompt: str):
+        """Generate one image; returns its metadata"""
+        if self.provider == "mock":
+            return self.generate_placeholder(content_id, style)
+        return self.generate_real(content_id, style, prompt)
+
     def generate_placeholder(self, content_id: str, style: str):
         """Create placeholder image metadata"""
         output_file = self.output_dir / f"{content_id}.json"
-        
+
         metadata = {
             "id": content_id,
             "style": style,
             "status": "placeholder",
             "path": f"unity/Assets/Art/Generated/{content_id}.png",
-            "provider": self.provider
+            "provider": self.provider,
         }
-        
-        with open(output_file, 'w') as f:
+
+        with open(output_file, "w") as f:
             json.dump(metadata, f, indent=2)
-    
+        return metadata
+
     def generate_real(self, content_id: str, style: str, prompt: str):
-        """TODO: Implement real generation"""
-        print(f"    ⚠️  Real generation not implemented yet")
-        self.generate_placeholder(content_id, style)
+        """Generate through the provider client and write the image's metadata"""
+        preset = self.styles.get(style, {})
+        job = ImageJob(
+            content_id,
+            prompt + preset.get("prompt_suffix", ""),
+            preset.get("negative", ""),
+            style,
+        )
+        output_file = self.output_dir / f"{content_id}.png"
+
+        key = None
+        if self.assets:
+            key = asset_key(
+                "image",
+                job.prompt,
+                job.negative,
+                preset,
+                self.provider,
+                self.client.provider.params(),
+            )
+            hit = self.assets.fetch_or_create(
+                "image",
+                key,
+                output_file,
+                lambda: self.client.generate(job).path,
+                {"id": content_id},
+            )
+        else:
+            hit = False
+            self.client.generate(job)
+        status, size = "cached" if hit else "generated", output_file.stat().st_size
+
+        metadata = {
+            "id": content_id,
+            "style": style,
+            "prompt": job.prompt,
+            "status": status,
+            "path": f"unity/Assets/Art/Generated/{content_id}.png",
+            "bytes": size,
+            "cacheKey": key,
+            "provider": self.provider,
+        }
+
+        with open(self.output_dir / f"{content_id}.json", "w") as f:
+            json.dump(metadata, f, indent=2)
+        return metadata
+
 
 def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument(
+        "--changes",
+        help="Only process entities added or modified in this change list "
+        "(data/content-changes.json from gen_content.py)",
+    )
+    parser.add_argument(
+        "--cache",
+        type=Path,
+        default=CACHE_PATH,
+        help=f"Parsed-content cache shared with gen_audio.py (default: {CACHE_PATH})",
+    )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Parse every YAML file, ignoring the cache",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=0,
+        help="Processes for parsing YAML on a cold cache (default: CPU count, up to 8)",
+    )
+    parser.add_argument(
+        "--no-asset-cache",
+        action="store_true",
+        help="Always call the provider instead of reusing images with the same prompt",
+    )
+    args = parser.parse_args()
+
     provider = os.getenv("IMG_PROVIDER", "mock")
-    generator = ImageGenerator(provider)
-    generator.generate_from_yaml()
+    generator = ImageGenerator(
+        provider, assets=None if args.no_asset_cache else AssetStore()
+    )
+    yaml_files = (
+        [str(path) for path in changed_files(Path(args.changes), Path.cwd())]
+        if args.changes
+        else None
+    )
+    generator.generate_from_yaml(
+        yaml_files=yaml_files,
+        cache_path=None if args.no_cache else args.cache,
+        workers=args.workers,
+    )
+
 
 if __name__ == "__main__":
     main()
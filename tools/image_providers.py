@@ -0,0 +1,567 @@
+"""Image provider clients for ImageGenerator.generate_real.
+
+Two providers, picked by IMG_PROVIDER:
+
+* local -- a ComfyUI server (COMFYUI_URL, default http://127.0.0.1:8188):
+  the prompt is queued as a txt2img workflow with POST /prompt, GET
+  /history/<id> is polled until the image is saved, and the image is
+  fetched from GET /view.
+* api -- an OpenAI-style images endpoint (IMG_API_URL, default
+  https://api.openai.com, with IMG_API_KEY): POST /v1/images/generations,
+  then the returned url is downloaded (or b64_json decoded).
+
+ImageClient is safe to share between threads, so gen_images.py and the
+gen_assets.py image pool can call it concurrently. It keeps one pooled
+HTTP session, limits generation requests with a token bucket shared by all
+threads (a 429's Retry-After pauses the whole bucket), retries 429/5xx and
+connection errors with jittered exponential backoff, halves its concurrency
+while the provider throttles (growing back as requests succeed), and streams
+images to a .part file next to the output that replaces it once complete.
+A retry repeats only the step that failed: once a prompt is queued (local)
+or an image generated (api), a failed poll or download polls or downloads
+again instead of queueing or paying for a second image.
+
+Settings come from the environment (ClientConfig.from_env): IMG_CONCURRENCY,
+IMG_RATE (generation requests per second, 0 for no limit), IMG_BURST,
+IMG_MAX_RETRIES, IMG_TIMEOUT, IMG_MODEL, IMG_SIZE, COMFYUI_CHECKPOINT.
+tools/benchmarks/fake_image_server.py stands in for either provider.
+"""
+
+import base64
+import hashlib
+import os
+import random
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+CHUNK_SIZE = 64 * 1024
+
+
+class ProviderError(Exception):
+    """A request failed for good (non-retryable status, or out of retries)"""
+
+    def __init__(
+        self,
+        message: str,
+        status: Optional[int] = None,
+        retry_after: Optional[float] = None,
+        resubmit: bool = False,
+    ):
+        super().__init__(message)
+        self.status = status
+        self.retry_after = retry_after
+        # The provider gave up on the submitted job, so a retry starts over
+        self.resubmit = resubmit
+
+    @property
+    def retryable(self) -> bool:
+        return self.status is None or self.status in RETRY_STATUSES
+
+
+class TokenBucket:
+    """Allows `rate` acquisitions per second on average, `burst` at once"""
+
+    def __init__(self, rate: float, burst: int = 1):
+        self.rate = rate
+        self.burst = max(1, burst)
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                if self.rate <= 0:
+                    if now >= self._paused_until:
+                        return
+                    wait = self._paused_until - now
+                else:
+                    self._tokens = min(
+                        self.burst, self._tokens + (now - self._updated) * self.rate
+                    )
+                    self._updated = now
+                    if now >= self._paused_until and self._tokens >= 1:
+                        self._tokens -= 1
+                        return
+                    wait = max(self._paused_until - now, (1 - self._tokens) / self.rate)
+            time.sleep(wait)
+
+    def pause(self, seconds: float):
+        """Hold every caller back for `seconds` (the provider asked us to slow down)"""
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+            self._tokens = 0.0
+
+
+class AdaptiveLimit:
+    """Concurrency limit that halves when the provider throttles and grows back
+    by one after each `limit` successes (AIMD), so requests settle at what the
+    provider can take instead of burning retries on 429s"""
+
+    def __init__(self, maximum: int):
+        self.maximum = max(1, maximum)
+        self.limit = self.maximum
+        self.active = 0
+        self._successes = 0
+        self._last_cut = 0.0
+        self._condition = threading.Condition()
+
+    def __enter__(self):
+        with self._condition:
+            while self.active >= self.limit:
+                self._condition.wait()
+            self.active += 1
+        return self
+
+    def __exit__(self, *exc):
+        with self._condition:
+            self.active -= 1
+            self._condition.notify()
+
+    def success(self):
+        with self._condition:
+            self._successes += 1
+            if self.limit < self.maximum and self._successes >= self.limit:
+                self._successes = 0
+                self.limit += 1
+                self._condition.notify()
+
+    def throttled(self, window: float):
+        """Halve the limit, at most once per `window` seconds (one burst of 429s is one signal)"""
+        with self._condition:
+            now = time.monotonic()
+            if now - self._last_cut >= window:
+                self._last_cut = now
+                self.limit = max(1, self.limit // 2)
+                self._successes = 0
+
+
+@dataclass
+class ClientConfig:
+    concurrency: int = 4
+    rate: float = 0.0
+    burst: int = 1
+    max_retries: int = 5
+    backoff_base: float = 0.5
+    backoff_cap: float = 30.0
+    timeout: float = 120.0
+    poll_interval: float = 0.5
+
+    @classmethod
+    def from_env(cls, provider: str) -> "ClientConfig":
+        # Hosted APIs meter per minute; a local GPU is bounded by concurrency instead
+        default_rate = "1" if provider == "api" else "0"
+        return cls(
+            concurrency=int(os.getenv("IMG_CONCURRENCY", "4")),
+            rate=float(os.getenv("IMG_RATE", default_rate)),
+            burst=int(os.getenv("IMG_BURST", "1")),
+            max_retries=int(os.getenv("IMG_MAX_RETRIES", "5")),
+            timeout=float(os.getenv("IMG_TIMEOUT", "120")),
+        )
+
+
+@dataclass
+class ImageJob:
+    content_id: str
+    prompt: str
+    negative: str = ""
+    style: str = ""
+
+
+@dataclass
+class ImageResult:
+    content_id: str
+    path: Path
+    bytes: int
+    attempts: int
+    seconds: float
+
+
+@dataclass
+class ClientStats:
+    requests: int = 0
+    images: int = 0
+    failed: int = 0
+    retries: int = 0
+    throttled: int = 0
+    bytes: int = 0
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    def add(self, **counts):
+        with self._lock:
+            for name, value in counts.items():
+                setattr(self, name, getattr(self, name) + value)
+
+    def to_dict(self) -> Dict:
+        return {
+            "requests": self.requests,
+            "images": self.images,
+            "failed": self.failed,
+            "retries": self.retries,
+            "throttled": self.throttled,
+            "bytes": self.bytes,
+        }
+
+
+def _retry_after(response) -> Optional[float]:
+    value = response.headers.get("Retry-After")
+    try:
+        return float(value) if value is not None else None
+    except ValueError:  # HTTP-date form; fall back to backoff
+        return None
+
+
+class Provider:
+    """Turns a job into a response streaming the image bytes, in two steps:
+    submit() starts the generation and fetch() retrieves its image, so a
+    retry of a failed fetch does not generate the image again"""
+
+    def __init__(self, client: "ImageClient"):
+        self.client = client
+
+    def check(self, response):
+        self.client.stats.add(requests=1)
+        if response.status_code >= 400:
+            status = response.status_code
+            retry_after = _retry_after(response)
+            text = response.text[:200]
+            response.close()
+            raise ProviderError(f"HTTP {status}: {text}", status, retry_after)
+        return response
+
+    def params(self) -> Dict:
+        """Model parameters that change the image for a given prompt (part of the asset cache key)"""
+        return {}
+
+    def submit(self, job: ImageJob):
+        """Start generating the job's image; returns a handle for fetch()"""
+        raise NotImplementedError
+
+    def fetch(self, handle):
+        """Response streaming the image of a submitted job (or its bytes)"""
+        raise NotImplementedError
+
+
+class ComfyUIProvider(Provider):
+    def __init__(
+        self,
+        client: "ImageClient",
+        base_url: Optional[str] = None,
+        checkpoint: Optional[str] = None,
+        width: int = 1024,
+        height: int = 1024,
+        steps: int = 25,
+    ):
+        super().__init__(client)
+        self.base_url = (
+            base_url or os.getenv("COMFYUI_URL", "http://127.0.0.1:8188")
+        ).rstrip("/")
+        self.checkpoint = checkpoint or os.getenv(
+            "COMFYUI_CHECKPOINT", "sd_xl_base_1.0.safetensors"
+        )
+        self.width, self.height, self.steps = width, height, steps
+        self.client_id = uuid.uuid4().hex
+
+    def params(self) -> Dict:
+        return {
+            "workflow": "txt2img",
+            "checkpoint": self.checkpoint,
+            "width": self.width,
+            "height": self.height,
+            "steps": self.steps,
+        }
+
+    def workflow(self, job: ImageJob) -> Dict:
+        """Default txt2img graph in ComfyUI's API format; the seed comes from the prompts, so
+        the same prompts give the same image"""
+        seed = int.from_bytes(
+            hashlib.sha256(f"{job.prompt}\0{job.negative}".encode("utf-8")).digest()[
+                :6
+            ],
+            "big",
+        )
+        return {
+            "3": {
+                "class_type": "KSampler",
+                "inputs": {
+                    "seed": seed,
+                    "steps": self.steps,
+                    "cfg": 7.0,
+                    "sampler_name": "euler",
+                    "scheduler": "normal",
+                    "denoise": 1.0,
+                    "model": ["4", 0],
+                    "positive": ["6", 0],
+                    "negative": ["7", 0],
+                    "latent_image": ["5", 0],
+                },
+            },
+            "4": {
+                "class_type": "CheckpointLoaderSimple",
+                "inputs": {"ckpt_name": self.checkpoint},
+            },
+            "5": {
+                "class_type": "EmptyLatentImage",
+                "inputs": {"width": self.width, "height": self.height, "batch_size": 1},
+            },
+            "6": {
+                "class_type": "CLIPTextEncode",
+                "inputs": {"text": job.prompt, "clip": ["4", 1]},
+            },
+            "7": {
+                "class_type": "CLIPTextEncode",
+                "inputs": {"text": job.negative, "clip": ["4", 1]},
+            },
+            "8": {
+                "class_type": "VAEDecode",
+                "inputs": {"samples": ["3", 0], "vae": ["4", 2]},
+            },
+            "9": {
+                "class_type": "SaveImage",
+                "inputs": {"filename_prefix": job.content_id, "images": ["8", 0]},
+            },
+        }
+
+    def submit(self, job: ImageJob):
+        session, config = self.client.session, self.client.config
+        self.client.bucket.acquire()
+        queued = self.check(
+            session.post(
+                f"{self.base_url}/prompt",
+                timeout=config.timeout,
+                json={"prompt": self.workflow(job), "client_id": self.client_id},
+            )
+        )
+        return {"prompt_id": queued.json()["prompt_id"], "image": None}
+
+    def fetch(self, handle):
+        session, config = self.client.session, self.client.config
+        prompt_id = handle["prompt_id"]
+        deadline = time.monotonic() + config.timeout
+        while handle["image"] is None:
+            history = self.check(
+                session.get(
+                    f"{self.base_url}/history/{prompt_id}", timeout=config.timeout
+                )
+            ).json()
+            entry = history.get(prompt_id)
+            if entry and entry.get("outputs"):
+                handle["image"] = next(
+                    image
+                    for output in entry["outputs"].values()
+                    for image in output.get("images", [])
+                )
+                break
+            if entry and entry.get("status", {}).get("status_str") == "error":
+                raise ProviderError(
+                    f"ComfyUI failed prompt {prompt_id}", status=500, resubmit=True
+                )
+            if time.monotonic() > deadline:
+                raise ProviderError(f"ComfyUI prompt {prompt_id} timed out")
+            time.sleep(config.poll_interval)
+        image = handle["image"]
+        return self.check(
+            session.get(
+                f"{self.base_url}/view",
+                stream=True,
+                timeout=config.timeout,
+                params={
+                    "filename": image["filename"],
+                    "subfolder": image.get("subfolder", ""),
+                    "type": image.get("type", "output"),
+                },
+            )
+        )
+
+
+class OpenAIImagesProvider(Provider):
+    def __init__(
+        self,
+        client: "ImageClient",
+        base_url: Optional[str] = None,
+        api_key: Optional[str] = None,
+        model: Optional[str] = None,
+        size: Optional[str] = None,
+    ):
+        super().__init__(client)
+        self.base_url = (
+            base_url or os.getenv("IMG_API_URL", "https://api.openai.com")
+        ).rstrip("/")
+        self.api_key = api_key if api_key is not None else os.getenv("IMG_API_KEY", "")
+        self.model = model or os.getenv("IMG_MODEL", "dall-e-3")
+        self.size = size or os.getenv("IMG_SIZE", "1024x1024")
+
+    def params(self) -> Dict:
+        return {"model": self.model, "size": self.size}
+
+    def submit(self, job: ImageJob):
+        session, config = self.client.session, self.client.config
+        self.client.bucket.acquire()
+        headers = {"Authorization": f"Bearer {self.api_key}"} if self.api_key else {}
+        response = self.check(
+            session.post(
+                f"{self.base_url}/v1/images/generations",
+                headers=headers,
+                timeout=config.timeout,
+                json={
+                    "model": self.model,
+                    "prompt": job.prompt,
+                    "n": 1,
+                    "size": self.size,
+                },
+            )
+        )
+        return response.json()["data"][0]
+
+    def fetch(self, image):
+        session, config = self.client.session, self.client.config
+        if "b64_json" in image:
+            return base64.b64decode(image["b64_json"])
+        return self.check(
+            session.get(image["url"], stream=True, timeout=config.timeout)
+        )
+
+
+PROVIDERS: Dict[str, Callable[["ImageClient"], Provider]] = {
+    "local": ComfyUIProvider,
+    "api": OpenAIImagesProvider,
+}
+
+
+class ImageClient:
+    def __init__(
+        self,
+        provider: str,
+        output_dir: Path,
+        config: Optional[ClientConfig] = None,
+        **provider_options,
+    ):
+        try:
+            import requests
+            from requests.adapters import HTTPAdapter
+        except ImportError:
+            raise RuntimeError(
+                f"IMG_PROVIDER={provider} needs the requests package (pip install requests)"
+            )
+        if provider not in PROVIDERS:
+            raise ValueError(
+                f"unknown image provider {provider!r} (expected one of {', '.join(PROVIDERS)})"
+            )
+        self.config = config or ClientConfig.from_env(provider)
+        self.output_dir = Path(output_dir)
+        self.stats = ClientStats()
+        self.bucket = TokenBucket(self.config.rate, self.config.burst)
+        self.limit = AdaptiveLimit(self.config.concurrency)
+        self.session = requests.Session()
+        # One pooled connection per concurrent request; retries are ours, not urllib3's
+        adapter = HTTPAdapter(
+            pool_connections=4,
+            pool_maxsize=max(1, self.config.concurrency),
+            max_retries=0,
+        )
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self._transient = (
+            requests.ConnectionError,
+            requests.Timeout,
+            requests.exceptions.ChunkedEncodingError,
+        )
+        self.provider = PROVIDERS[provider](self, **provider_options)
+
+    def generate(self, job: ImageJob) -> ImageResult:
+        """Generate one image into output_dir/<content_id>.png, retrying transient failures"""
+        start = time.monotonic()
+        config = self.config
+        handle = None
+        for attempt in range(config.max_retries + 1):
+            try:
+                with self.limit:
+                    if handle is None:
+                        handle = self.provider.submit(job)
+                    size = self._save(
+                        self.provider.fetch(handle),
+                        self.output_dir / f"{job.content_id}.png",
+                    )
+                self.limit.success()
+                self.stats.add(images=1, bytes=size)
+                return ImageResult(
+                    job.content_id,
+                    self.output_dir / f"{job.content_id}.png",
+                    size,
+                    attempt + 1,
+                    time.monotonic() - start,
+                )
+            except ProviderError as exc:
+                error, retry_after = exc, exc.retry_after
+                if exc.resubmit:
+                    handle = None
+                if exc.status == 429:
+                    self.stats.add(throttled=1)
+                    self.limit.throttled(retry_after or config.backoff_base)
+                if not exc.retryable:
+                    break
+            except self._transient as exc:
+                error, retry_after = ProviderError(f"{type(exc).__name__}: {exc}"), None
+            if attempt == config.max_retries:
+                break
+            # Full jitter, on top of any Retry-After (which also holds back every
+            # thread sharing the bucket) so retries do not arrive in lockstep
+            delay = random.uniform(
+                0, min(config.backoff_cap, config.backoff_base * 2**attempt)
+            )
+            if retry_after is not None:
+                self.bucket.pause(retry_after)
+                delay += retry_after
+            self.stats.add(retries=1)
+            time.sleep(delay)
+        self.stats.add(failed=1)
+        raise error
+
+    def generate_many(self, jobs: List[ImageJob]) -> List[Tuple[ImageJob, object]]:
+        """(job, ImageResult or the exception) for each job, in order"""
+
+        def run(job):
+            try:
+                return job, self.generate(job)
+            except Exception as exc:
+                return job, exc
+
+        with ThreadPoolExecutor(max_workers=max(1, self.config.concurrency)) as pool:
+            return list(pool.map(run, jobs))
+
+    def _save(self, source, path: Path) -> int:
+        """Stream a response (or write bytes) to path via a .part file"""
+        path.parent.mkdir(parents=True, exist_ok=True)
+        part = path.with_name(f"{path.name}.{threading.get_ident()}.part")
+        size = 0
+        try:
+            with open(part, "wb") as f:
+                if isinstance(source, bytes):
+                    f.write(source)
+                    size = len(source)
+                else:
+                    with source:
+                        expected = source.headers.get("Content-Length")
+                        for chunk in source.iter_content(CHUNK_SIZE):
+                            f.write(chunk)
+                            size += len(chunk)
+                    if expected is not None and int(expected) != size:
+                        raise ProviderError(
+                            f"truncated download: {size} of {expected} bytes"
+                        )
+            os.replace(part, path)
+        finally:
+            if part.exists():
+                part.unlink()
+        return size
+
+    def close(self):
+        self.session.close()
@@ -0,0 +1,172 @@
+"""Streaming JSON aggregates for the Unity importer.
+
+Entities are encoded one at a time and streamed through a ContentWriter,
+so no aggregate document is ever built in memory. Two layouts:
+
+* single: unity/Assets/Game/Data/cards.json, {"cards": [...]}; the pretty
+  form is byte-identical to json.dump(..., indent=2).
+* sharded: unity/Assets/Game/Data/cards/cards-00000.json, ... with up to
+  `shard_size` entities each, plus cards/index.json:
+
+      {"version": 1, "kind": "cards", "count": 2500, "shardSize": 1000, "compact": true,
+       "shards": [{"file": "cards-00000.json", "count": 1000, "bytes": 351234, "sha256": "..."}],
+       "entries": [{"id": "card_ban_birds_forever", "shard": 0, "offset": 11, "length": 342}]}
+
+  Every shard is itself a {"cards": [...]} document with one entity per
+  line, so it can be imported on its own (CodexDataImporter reimports only
+  shards whose sha256 changed), and offset/length locate one entity's JSON
+  in its shard without parsing the rest.
+
+`compact` drops indentation and spaces from the encoding.
+"""
+
+import json
+from itertools import islice
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional
+
+from content_manifest import ContentWriter
+
+BUNDLE_VERSION = 1
+INDEX_FILE = "index.json"
+DEFAULT_SHARD_SIZE = 1000
+
+
+def encode(entity: Dict, compact: bool = False) -> str:
+    if compact:
+        return json.dumps(entity, separators=(",", ":"))
+    return json.dumps(entity, indent=2)
+
+
+def write_document(
+    writer: ContentWriter,
+    path: Path,
+    key: str,
+    entities: Iterable[Dict],
+    compact: bool = False,
+):
+    """Stream {key: [entities]} to `path`"""
+    with writer.open_file(path) as f:
+        if compact:
+            f.write("{" + json.dumps(key) + ":[")
+            for idx, entity in enumerate(entities):
+                f.write(("," if idx else "") + encode(entity, compact=True))
+            f.write("]}")
+            return
+        empty = True
+        f.write("{\n  " + json.dumps(key) + ": [")
+        for entity in entities:
+            f.write(
+                ("\n    " if empty else ",\n    ")
+                + encode(entity).replace("\n", "\n    ")
+            )
+            empty = False
+        f.write("]\n}" if empty else "\n  ]\n}")
+
+
+def shard_name(key: str, number: int) -> str:
+    return f"{key}-{number:05d}.json"
+
+
+def write_shards(
+    writer: ContentWriter,
+    directory: Path,
+    key: str,
+    entities: Iterable[Dict],
+    shard_size: int = DEFAULT_SHARD_SIZE,
+    compact: bool = False,
+) -> Dict:
+    """Stream entities into shards of `shard_size` under `directory` and write
+    the index; only one shard's entities are held at a time. Returns the index."""
+    if shard_size < 1:
+        raise ValueError("shard_size must be at least 1")
+    index = {
+        "version": BUNDLE_VERSION,
+        "kind": key,
+        "count": 0,
+        "shardSize": shard_size,
+        "compact": compact,
+        "shards": [],
+        "entries": [],
+    }
+    remaining = iter(entities)
+    while True:
+        batch = list(islice(remaining, shard_size))
+        if not batch:
+            break
+        number = len(index["shards"])
+        path = directory / shard_name(key, number)
+        with writer.open_file(path) as f:
+            f.write("{" + json.dumps(key) + ":[\n")
+            for idx, entity in enumerate(batch):
+                text = encode(entity, compact)
+                index["entries"].append(
+                    {
+                        "id": entity["id"],
+                        "shard": number,
+                        "offset": f.size,
+                        "length": len(text.encode("utf-8")),
+                    }
+                )
+                f.write(text + (",\n" if idx < len(batch) - 1 else "\n"))
+            f.write("]}\n")
+        index["shards"].append(
+            {
+                "file": path.name,
+                "count": len(batch),
+                "bytes": f.size,
+                "sha256": f.digest,
+            }
+        )
+        index["count"] += len(batch)
+    with writer.open_file(directory / INDEX_FILE) as f:
+        if compact:
+            f.write(json.dumps(index, separators=(",", ":")))
+        else:
+            f.write(json.dumps(index, indent=2))
+    return index
+
+
+class ShardedBundle:
+    """Lazy reader of a sharded layout: entities are read by seeking to their
+    offset, and a shard is parsed only when iterated"""
+
+    def __init__(self, directory: Path):
+        self.directory = Path(directory)
+        self.index = json.loads(
+            (self.directory / INDEX_FILE).read_text(encoding="utf-8")
+        )
+        if self.index.get("version") != BUNDLE_VERSION:
+            raise ValueError(
+                f"unsupported bundle version {self.index.get('version')!r}"
+            )
+        self.key = self.index["kind"]
+        self._entries = {entry["id"]: entry for entry in self.index["entries"]}
+
+    def __len__(self) -> int:
+        return self.index["count"]
+
+    def __contains__(self, entity_id: str) -> bool:
+        return entity_id in self._entries
+
+    def ids(self) -> List[str]:
+        return [entry["id"] for entry in self.index["entries"]]
+
+    def get(self, entity_id: str, default: Optional[Dict] = None) -> Optional[Dict]:
+        entry = self._entries.get(entity_id)
+        if entry is None:
+            return default
+        shard = self.index["shards"][entry["shard"]]
+        with open(self.directory / shard["file"], "rb") as f:
+            f.seek(entry["offset"])
+            return json.loads(f.read(entry["length"]))
+
+    def shard(self, number: int) -> List[Dict]:
+        shard = self.index["shards"][number]
+        return json.loads((self.directory / shard["file"]).read_text(encoding="utf-8"))[
+            self.key
+        ]
+
+    def __iter__(self) -> Iterator[Dict]:
+        for number in range(len(self.index["shards"])):
+            yield from self.shard(number)
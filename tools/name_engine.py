@@ -0,0 +1,307 @@
+"""Combinatorial name engine for generated content.
+
+A grammar is a list of patterns such as "{verb} {subject} {modifier}" and a
+word list per slot. Every pattern spans the product of its slots' word
+lists; the name space is the concatenation of those products, so each
+name has an integer index and index -> name is a mixed-radix decode.
+
+Names are drawn without replacement by walking a seeded permutation of
+the index space (a small Feistel network with cycle walking), so the n-th
+name costs O(1) whatever n is and the same seed always yields the same
+sequence. Nothing is rejected and retried except the rare index whose
+text or slug repeats an earlier one (possible only when two patterns can
+spell the same string).
+
+Grammars are extended from theme.json:
+
+    "card_names": {
+        "words": {"verb": ["Audit"], "scandal": ["Yacht Leaks", "Burner Phones"]},
+        "patterns": ["{verb} the {scandal}"],
+        "replace": false
+    }
+
+New words are appended to the default lists, new slots and patterns are
+added; with "replace": true the theme's grammar is used on its own.
+"""
+
+import re
+from dataclasses import dataclass
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+DEFAULT_CARD_WORDS: Dict[str, List[str]] = {
+    "verb": [
+        "Ban",
+        "Privatize",
+        "Tax",
+        "Mandate",
+        "Gamify",
+        "Streamline",
+        "Crowdsource",
+        "Nationalize",
+        "Outlaw",
+        "Celebrate",
+        "Subsidize",
+        "Deregulate",
+        "Rebrand",
+        "Audit",
+        "Livestream",
+        "Monetize",
+        "Classify",
+        "Decentralize",
+        "Crowdfund",
+        "Tokenize",
+    ],
+    "adjective": [
+        "Mandatory",
+        "Artisanal",
+        "Patriotic",
+        "Invisible",
+        "Emergency",
+        "Decorative",
+        "Bipartisan",
+        "Premium",
+        "Unlicensed",
+        "Interim",
+        "Viral",
+        "Federal",
+        "Haunted",
+        "Subsidized",
+        "Offshore",
+        "Sentient",
+        "Vintage",
+        "Encrypted",
+        "Ceremonial",
+        "Inflatable",
+    ],
+    "subject": [
+        "Birds",
+        "Oxygen",
+        "Memes",
+        "Reality",
+        "Hands",
+        "Dance Battles",
+        "Pigeons",
+        "Conspiracies",
+        "Bureaucracy",
+        "Inflation",
+        "Weather",
+        "Parades",
+        "Lobbyists",
+        "Podcasts",
+        "Potholes",
+        "Mascots",
+        "Napping",
+        "Traffic Cones",
+        "Opinion Polls",
+        "Press Releases",
+        "Handshakes",
+        "Emojis",
+        "Committees",
+        "Holidays",
+        "Statues",
+        "Ribbons",
+        "Slogans",
+        "Fireworks",
+        "Influencers",
+        "Spreadsheets",
+    ],
+    "modifier": [
+        "Forever",
+        "for Votes",
+        "for Clout",
+        "with Jazz",
+        "on Tuesdays",
+        "Underwater",
+        "via Polls",
+        "at Scale",
+        "for Charity",
+        "by Decree",
+        "Retroactively",
+        "in Secret",
+        "on Live TV",
+        "for the Children",
+        "Ironically",
+        "Twice",
+        "by Lottery",
+        "in Space",
+        "Before Lunch",
+        "per Capita",
+    ],
+}
+
+DEFAULT_CARD_PATTERNS: List[str] = [
+    "{verb} {subject} {modifier}",
+    "{verb} {adjective} {subject}",
+    "{verb} {adjective} {subject} {modifier}",
+]
+
+# A {slot}, or a doubled brace that stands for a literal one (as in str.format)
+_SLOT = re.compile(r"\{\{|\}\}|\{(\w+)\}")
+_MASK64 = (1 << 64) - 1
+
+
+class NameSpaceExhausted(Exception):
+    pass
+
+
+def _mix(value: int) -> int:
+    """splitmix64 finalizer: a cheap, well-distributed 64-bit hash"""
+    value = (value + 0x9E3779B97F4A7C15) & _MASK64
+    value = ((value ^ (value >> 30)) * 0xBF58476D1CE4E5B9) & _MASK64
+    value = ((value ^ (value >> 27)) * 0x94D049BB133111EB) & _MASK64
+    return value ^ (value >> 31)
+
+
+class Permutation:
+    """Seeded bijection of range(size) computed one index at a time.
+
+    A balanced Feistel network permutes the smallest even-bit power of two
+    covering `size`; outputs outside the range are fed back in (cycle
+    walking), which needs fewer than four passes per index on average.
+    """
+
+    ROUNDS = 4
+
+    def __init__(self, size: int, seed: int):
+        self.size = size
+        bits = max(2, (max(size - 1, 1)).bit_length())
+        self.half = (bits + 1) // 2
+        self.mask = (1 << self.half) - 1
+        self.shift = 64 - self.half
+        self.keys = [_mix(seed * self.ROUNDS + r) for r in range(self.ROUNDS)]
+
+    def _feistel(self, value: int) -> int:
+        # Round function: multiplicative hash of the keyed right half
+        half, mask, shift = self.half, self.mask, self.shift
+        left, right = value >> half, value & mask
+        for key in self.keys:
+            left, right = right, left ^ (
+                (((right ^ key) * 0x9E3779B97F4A7C15) & _MASK64) >> shift
+            )
+        return (left << half) | right
+
+    def __getitem__(self, index: int) -> int:
+        if not 0 <= index < self.size:
+            raise IndexError(index)
+        value = self._feistel(index)
+        while value >= self.size:
+            value = self._feistel(value)
+        return value
+
+
+@dataclass(frozen=True)
+class Pattern:
+    template: str
+    format: str
+    slots: Tuple[str, ...]
+    radices: Tuple[int, ...]
+    size: int
+
+
+class NameGrammar:
+    """Patterns over named word lists, with index <-> name addressing"""
+
+    def __init__(self, words: Dict[str, Sequence[str]], patterns: Sequence[str]):
+        self.words = {
+            slot: list(dict.fromkeys(w.strip() for w in options if w and w.strip()))
+            for slot, options in words.items()
+        }
+        self.patterns: List[Pattern] = []
+        self.offsets: List[int] = []
+        total = 0
+        for template in dict.fromkeys(patterns):
+            slots = tuple(m.group(1) for m in _SLOT.finditer(template) if m.group(1))
+            missing = [slot for slot in slots if not self.words.get(slot)]
+            if missing:
+                raise ValueError(
+                    f"name pattern {template!r} uses slots without words: {', '.join(missing)}"
+                )
+            radices = tuple(len(self.words[slot]) for slot in slots)
+            size = 1
+            for radix in radices:
+                size *= radix
+            positions = iter(range(len(slots)))
+            fmt = _SLOT.sub(
+                lambda m: f"{{{next(positions)}}}" if m.group(1) else m.group(0),
+                template,
+            )
+            self.offsets.append(total)
+            self.patterns.append(Pattern(template, fmt, slots, radices, size))
+            total += size
+        if not self.patterns:
+            raise ValueError("name grammar has no patterns")
+        self.size = total
+
+    @classmethod
+    def from_config(
+        cls,
+        config: Optional[Dict],
+        default_words: Dict[str, List[str]],
+        default_patterns: List[str],
+    ) -> "NameGrammar":
+        config = config or {}
+        if config.get("replace"):
+            words: Dict[str, List[str]] = {}
+            patterns: List[str] = []
+        else:
+            words = {slot: list(options) for slot, options in default_words.items()}
+            patterns = list(default_patterns)
+        for slot, options in config.get("words", {}).items():
+            words.setdefault(slot, []).extend(options)
+        patterns.extend(config.get("patterns", []))
+        return cls(words, patterns)
+
+    def name(self, index: int) -> str:
+        """The name at `index` of the (unpermuted) name space"""
+        if not 0 <= index < self.size:
+            raise IndexError(index)
+        lo, hi = 0, len(self.offsets) - 1
+        while lo < hi:
+            mid = (lo + hi + 1) // 2
+            if self.offsets[mid] <= index:
+                lo = mid
+            else:
+                hi = mid - 1
+        pattern = self.patterns[lo]
+        rest = index - self.offsets[lo]
+        chosen = [""] * len(pattern.slots)
+        for position in range(len(pattern.slots) - 1, -1, -1):
+            rest, digit = divmod(rest, pattern.radices[position])
+            chosen[position] = self.words[pattern.slots[position]][digit]
+        return pattern.format.format(*chosen)
+
+
+class NameSampler:
+    """Unique names from a grammar in seeded pseudo-random order"""
+
+    def __init__(
+        self, grammar: NameGrammar, seed: int, key: Callable[[str], str] = str
+    ):
+        self.grammar = grammar
+        self.permutation = Permutation(grammar.size, seed)
+        self.key = key
+        self.position = 0
+        self.seen: set = set()
+
+    def __iter__(self) -> Iterator[str]:
+        return self
+
+    def __next__(self) -> str:
+        while self.position < self.grammar.size:
+            name = self.grammar.name(self.permutation[self.position])
+            self.position += 1
+            key = self.key(name)
+            if key not in self.seen:
+                self.seen.add(key)
+                return name
+        raise NameSpaceExhausted(
+            f'name grammar exhausted after {len(self.seen)} names; add words or patterns under "card_names" in theme.json'
+        )
+
+    def take(self, count: int) -> List[str]:
+        if count > self.grammar.size:
+            raise NameSpaceExhausted(
+                f"{count} names requested but the grammar spans {self.grammar.size}; "
+                'add words or patterns under "card_names" in theme.json'
+            )
+        return [next(self) for _ in range(count)]
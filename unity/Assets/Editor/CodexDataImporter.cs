@@ -10,11 +10,21 @@ using ExecutiveDisorder.Game.Data;
 /// <summary>
 /// Converts JSON content in Assets/Game/Data into ScriptableObject assets
 /// under Assets/Game/Generated. Provides menu items and a CLI entrypoint.
+///
+/// Each kind is either a single file (cards.json) or, with
+/// `gen_content.py --json-layout sharded`, a folder of shards plus an
+/// index (cards/index.json) giving each shard's sha256 and each entity's
+/// shard, byte offset and length. Shards imported before are remembered in
+/// Library/CodexDataImporterState.json; ImportChanged reparses only shards
+/// whose hash changed, and ReadEntityJson reads one entity without parsing
+/// its shard.
 /// </summary>
 public static class CodexDataImporter
 {
     private const string DataRoot = "Assets/Game/Data";
     private const string OutRoot = "Assets/Game/Generated";
+    private const string IndexFile = "index.json";
+    private const string StatePath = "Library/CodexDataImporterState.json";
 
     [Serializable]
     private class CardList { public List<CardJson> cards = new(); }
@@ -25,6 +35,60 @@ public static class CodexDataImporter
     [Serializable]
     private class CrisisList { public List<CrisisJson> crises = new(); }
 
+    [Serializable]
+    private class BundleIndex
+    {
+        public int version;
+        public string kind;
+        public int count;
+        public int shardSize;
+        public bool compact;
+        public List<ShardInfo> shards = new();
+        public List<EntryInfo> entries = new();
+    }
+
+    [Serializable]
+    private class ShardInfo
+    {
+        public string file;
+        public int count;
+        public long bytes;
+        public string sha256;
+    }
+
+    [Serializable]
+    private class EntryInfo
+    {
+        public string id;
+        public int shard;
+        public long offset;
+        public int length;
+    }
+
+    [Serializable]
+    private class ImportState
+    {
+        public List<ShardState> shards = new();
+
+        public bool Matches(string path, string sha256) =>
+            shards.Any(s => s.path == path && s.sha256 == sha256);
+
+        public void Set(string path, string sha256)
+        {
+            shards.RemoveAll(s => s.path == path);
+            shards.Add(new ShardState { path = path, sha256 = sha256 });
+        }
+    }
+
+    [Serializable]
+    private class ShardState
+    {
+        public string path;
+        public string sha256;
+    }
+
+    private static readonly Dictionary<string, (DateTime stamp, BundleIndex index, Dictionary<string, EntryInfo> byId)> IndexCache = new();
+
     [Serializable]
     private class CardJson
     {
@@ -82,14 +146,32 @@ public static class CodexDataImporter
 
     [MenuItem("Codex/Data/Import All")]
     public static void ImportAll()
+    {
+        Import(onlyChanged: false);
+    }
+
+    /// <summary>
+    /// Like ImportAll, but shards whose sha256 matches the last import keep
+    /// their existing assets instead of being parsed again.
+    /// </summary>
+    [MenuItem("Codex/Data/Import Changed Shards")]
+    public static void ImportChanged()
+    {
+        Import(onlyChanged: true);
+    }
+
+    private static void Import(bool onlyChanged)
     {
         EnsureDirs();
         var database = GetOrCreateDatabase();
+        var state = LoadState();
+        var reparsed = 0;
 
-        var cards = ImportCards(Path.Combine(DataRoot, "cards.json"));
-        var leaders = ImportLeaders(Path.Combine(DataRoot, "leaders.json"));
-        var factions = ImportFactions(Path.Combine(DataRoot, "factions.json"));
-        var crises = ImportCrises(Path.Combine(DataRoot, "crises.json"));
+        var cards = ImportKind("cards", "Cards", ImportCards, onlyChanged, state, ref reparsed);
+        var leaders = ImportKind("leaders", "Leaders", ImportLeaders, onlyChanged, state, ref reparsed);
+        var factions = ImportKind("factions", "Factions", ImportFactions, onlyChanged, state, ref reparsed);
+        var crises = ImportKind("crises", "Crises", ImportCrises, onlyChanged, state, ref reparsed);
+        SaveState(state);
 
         database.cards = cards;
         database.leaders = leaders;
@@ -102,7 +184,121 @@ public static class CodexDataImporter
         AssetDatabase.SaveAssets();
         AssetDatabase.Refresh();
 
-        Debug.Log($"✅ CodexDataImporter: Imported {cards.Count} cards, {leaders.Count} leaders, {factions.Count} factions, {crises.Count} crises.");
+        Debug.Log($"✅ CodexDataImporter: Imported {cards.Count} cards, {leaders.Count} leaders, {factions.Count} factions, {crises.Count} crises ({reparsed} files parsed).");
+    }
+
+    /// <summary>
+    /// Imports one kind from its single JSON file or, when an index exists,
+    /// shard by shard. Unchanged shards (onlyChanged) reuse their assets as
+    /// long as every one of them still exists.
+    /// </summary>
+    private static List<T> ImportKind<T>(string kind, string assetFolder, Func<string, List<T>> importFile,
+        bool onlyChanged, ImportState state, ref int reparsed) where T : UnityEngine.Object
+    {
+        var indexPath = Path.Combine(DataRoot, kind, IndexFile);
+        if (!File.Exists(indexPath))
+        {
+            reparsed++;
+            return importFile(Path.Combine(DataRoot, kind + ".json"));
+        }
+
+        var (index, _) = LoadIndex(indexPath);
+        var result = new List<T>();
+        for (int number = 0; number < index.shards.Count; number++)
+        {
+            var shard = index.shards[number];
+            var shardPath = Path.Combine(DataRoot, kind, shard.file).Replace('\\', '/');
+            if (onlyChanged && state.Matches(shardPath, shard.sha256))
+            {
+                var existing = LoadShardAssets<T>(index, number, assetFolder);
+                if (existing != null)
+                {
+                    result.AddRange(existing);
+                    continue;
+                }
+            }
+            result.AddRange(importFile(shardPath));
+            state.Set(shardPath, shard.sha256);
+            reparsed++;
+        }
+        return result;
+    }
+
+    private static List<T> LoadShardAssets<T>(BundleIndex index, int shard, string assetFolder) where T : UnityEngine.Object
+    {
+        var assets = new List<T>();
+        foreach (var entry in index.entries)
+        {
+            if (entry.shard != shard) continue;
+            var asset = AssetDatabase.LoadAssetAtPath<T>($"{OutRoot}/{assetFolder}/{entry.id}.asset");
+            if (asset == null) return null;
+            assets.Add(asset);
+        }
+        return assets;
+    }
+
+    private static (BundleIndex index, Dictionary<string, EntryInfo> byId) LoadIndex(string indexPath)
+    {
+        var stamp = File.GetLastWriteTimeUtc(indexPath);
+        if (IndexCache.TryGetValue(indexPath, out var cached) && cached.stamp == stamp)
+        {
+            return (cached.index, cached.byId);
+        }
+        var index = JsonUtility.FromJson<BundleIndex>(File.ReadAllText(indexPath)) ?? new BundleIndex();
+        var byId = new Dictionary<string, EntryInfo>();
+        foreach (var entry in index.entries) byId[entry.id] = entry;
+        IndexCache[indexPath] = (stamp, index, byId);
+        return (index, byId);
+    }
+
+    /// <summary>
+    /// The JSON of one entity of a sharded kind, read at its offset without
+    /// parsing the rest of its shard; null if the kind is not sharded or the
+    /// id is unknown.
+    /// </summary>
+    public static string ReadEntityJson(string kind, string id)
+    {
+        var indexPath = Path.Combine(DataRoot, kind, IndexFile);
+        if (!File.Exists(indexPath)) return null;
+
+        var (index, byId) = LoadIndex(indexPath);
+        if (!byId.TryGetValue(id, out var entry)) return null;
+
+        var buffer = new byte[entry.length];
+        using (var stream = File.OpenRead(Path.Combine(DataRoot, kind, index.shards[entry.shard].file)))
+        {
+            stream.Seek(entry.offset, SeekOrigin.Begin);
+            var read = 0;
+            while (read < buffer.Length)
+            {
+                var n = stream.Read(buffer, read, buffer.Length - read);
+                if (n == 0) throw new EndOfStreamException($"{kind}/{id}: shard is shorter than its index");
+                read += n;
+            }
+        }
+        return System.Text.Encoding.UTF8.GetString(buffer);
+    }
+
+    private static ImportState LoadState()
+    {
+        try
+        {
+            if (File.Exists(StatePath))
+            {
+                return JsonUtility.FromJson<ImportState>(File.ReadAllText(StatePath)) ?? new ImportState();
+            }
+        }
+        catch (Exception ex)
+        {
+            Debug.LogWarning($"CodexDataImporter: ignoring unreadable {StatePath}: {ex.Message}");
+        }
+        return new ImportState();
+    }
+
+    private static void SaveState(ImportState state)
+    {
+        Directory.CreateDirectory(Path.GetDirectoryName(StatePath));
+        File.WriteAllText(StatePath, JsonUtility.ToJson(state));
     }
 
     /// <summary>
@@ -114,7 +310,7 @@ public static class CodexDataImporter
         {
             if (!Directory.Exists(DataRoot)) return;
 
-            var jsonFiles = Directory.GetFiles(DataRoot, "*.json", SearchOption.TopDirectoryOnly);
+            var jsonFiles = Directory.GetFiles(DataRoot, "*.json", SearchOption.AllDirectories);
             if (jsonFiles.Length == 0) return;
 
             var newestJson = jsonFiles.Select(File.GetLastWriteTimeUtc).DefaultIfEmpty(DateTime.MinValue).Max();
@@ -132,7 +328,7 @@ public static class CodexDataImporter
             if (newestJson > newestAsset)
             {
                 Debug.Log("📥 CodexDataImporter: JSON changed; re-importing.");
-                ImportAll();
+                ImportChanged();
             }
         }
         catch (Exception ex)